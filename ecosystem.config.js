@@ -50,6 +50,151 @@ module.exports = {
       autorestart: true,
       watch: false,
       max_memory_restart: '1G'
+    },
+    {
+      // Worker de la cola de correo (security/cola_correo.py): envía lo
+      // encolado por las vistas y reintenta los fallidos.
+      name: 'cola-correo',
+      cwd: './tenants-backend',
+      script: 'venv/bin/python',
+      args: 'manage.py procesar_cola_correo',
+      instances: 1,
+      exec_mode: 'fork',
+      env_production: {
+        DJANGO_SETTINGS_MODULE: 'django_test_app.settings',
+        PYTHONUNBUFFERED: '1'
+      },
+      env_development: {
+        DJANGO_SETTINGS_MODULE: 'django_test_app.settings',
+        PYTHONUNBUFFERED: '1',
+        DEBUG: 'True'
+      },
+      error_file: './logs/cola-correo-error.log',
+      out_file: './logs/cola-correo-out.log',
+      log_date_format: 'YYYY-MM-DD HH:mm:ss Z',
+      merge_logs: true,
+      autorestart: true,
+      watch: false,
+      max_memory_restart: '512M'
+    },
+    {
+      // Worker del buzón de notificaciones (notificaciones/outbox.py): entrega
+      // las NotificacionPendiente que no haya vaciado el hilo de un worker web
+      // (caídas, reinicios).
+      name: 'outbox-notificaciones',
+      cwd: './tenants-backend',
+      script: 'venv/bin/python',
+      args: 'manage.py procesar_outbox_notificaciones',
+      instances: 1,
+      exec_mode: 'fork',
+      env_production: {
+        DJANGO_SETTINGS_MODULE: 'django_test_app.settings',
+        PYTHONUNBUFFERED: '1'
+      },
+      env_development: {
+        DJANGO_SETTINGS_MODULE: 'django_test_app.settings',
+        PYTHONUNBUFFERED: '1',
+        DEBUG: 'True'
+      },
+      error_file: './logs/outbox-notificaciones-error.log',
+      out_file: './logs/outbox-notificaciones-out.log',
+      log_date_format: 'YYYY-MM-DD HH:mm:ss Z',
+      merge_logs: true,
+      autorestart: true,
+      watch: false,
+      max_memory_restart: '512M'
+    },
+    {
+      // Worker de las tareas de actualización de precios (productos/services/
+      // cola_tareas.py): ejecuta lo que encolan las vistas Lanzar* (Likewize,
+      // Swappie, Backmarket). Si muere, las tareas RUNNING sin heartbeat se
+      // reencolan; el backoff evita reinicios en bucle si la BD no responde.
+      name: 'tareas-actualizacion',
+      cwd: './tenants-backend',
+      script: 'venv/bin/python',
+      args: 'manage.py procesar_tareas_actualizacion',
+      instances: 1,
+      exec_mode: 'fork',
+      env_production: {
+        DJANGO_SETTINGS_MODULE: 'django_test_app.settings',
+        PYTHONUNBUFFERED: '1'
+      },
+      env_development: {
+        DJANGO_SETTINGS_MODULE: 'django_test_app.settings',
+        PYTHONUNBUFFERED: '1',
+        DEBUG: 'True'
+      },
+      error_file: './logs/tareas-actualizacion-error.log',
+      out_file: './logs/tareas-actualizacion-out.log',
+      log_date_format: 'YYYY-MM-DD HH:mm:ss Z',
+      merge_logs: true,
+      autorestart: true,
+      exp_backoff_restart_delay: 1000,  // 1s, 1.5s, 2.25s... hasta 15s; se reinicia tras 30s estable
+      min_uptime: '30s',
+      max_restarts: 15,
+      kill_timeout: 30000,              // SIGTERM: el worker termina el proceso hijo (hasta 10s) y sale
+      watch: false,
+      max_memory_restart: '1G'
+    },
+    {
+      // Tarea programada: reconstruye PrecioVigente y la rejilla de tramos
+      // (purga versiones caducadas y recoge importaciones con update()).
+      name: 'refrescar-precios-vigentes',
+      cwd: './tenants-backend',
+      script: 'venv/bin/python',
+      args: 'manage.py refrescar_precios_vigentes',
+      instances: 1,
+      exec_mode: 'fork',
+      cron_restart: '15 * * * *',
+      autorestart: false,
+      env_production: {
+        DJANGO_SETTINGS_MODULE: 'django_test_app.settings',
+        PYTHONUNBUFFERED: '1'
+      },
+      error_file: './logs/cron-error.log',
+      out_file: './logs/cron-out.log',
+      log_date_format: 'YYYY-MM-DD HH:mm:ss Z',
+      merge_logs: true
+    },
+    {
+      // Tarea programada: captura en public las oportunidades marcadas por
+      // las señales y lo nuevo desde la marca de cada tenant.
+      name: 'sync-analitica',
+      cwd: './tenants-backend',
+      script: 'venv/bin/python',
+      args: 'manage.py sync_analitica',
+      instances: 1,
+      exec_mode: 'fork',
+      cron_restart: '*/5 * * * *',
+      autorestart: false,
+      env_production: {
+        DJANGO_SETTINGS_MODULE: 'django_test_app.settings',
+        PYTHONUNBUFFERED: '1'
+      },
+      error_file: './logs/cron-error.log',
+      out_file: './logs/cron-out.log',
+      log_date_format: 'YYYY-MM-DD HH:mm:ss Z',
+      merge_logs: true
+    },
+    {
+      // Tarea nocturna: recalcula KpiDiario de los dos últimos días en cada
+      // tenant (red de seguridad para update()/bulk_create sin señales).
+      name: 'recalcular-kpis-diarios',
+      cwd: './tenants-backend',
+      script: 'venv/bin/python',
+      args: 'manage.py recalcular_kpis_diarios --dias 2',
+      instances: 1,
+      exec_mode: 'fork',
+      cron_restart: '30 3 * * *',
+      autorestart: false,
+      env_production: {
+        DJANGO_SETTINGS_MODULE: 'django_test_app.settings',
+        PYTHONUNBUFFERED: '1'
+      },
+      error_file: './logs/cron-error.log',
+      out_file: './logs/cron-out.log',
+      log_date_format: 'YYYY-MM-DD HH:mm:ss Z',
+      merge_logs: true
     }
   ]
 };
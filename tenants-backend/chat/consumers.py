@@ -1,16 +1,18 @@
+import asyncio
 import json
 import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django_tenants.utils import schema_context
 from django_test_app.logging_utils import log_exception, log_ws_event
+from notificaciones.soporte import GRUPO_SOPORTE, debe_entregarse, empleados_internos, evento_soporte
+
+from .services import puede_conectar, registrar_mensaje
 
 logger = logging.getLogger(__name__)
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        from .models import Chat, Mensaje
         user = self.scope.get("user")
         self.chat_id = self.scope["url_route"]["kwargs"]["chat_id"]
         self.group_name = f"chat_{self.chat_id}"
@@ -33,6 +35,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
             if puede:
                 await self.channel_layer.group_add(self.group_name, self.channel_name)
                 await self.channel_layer.group_add(self.user_group_name, self.channel_name)
+                if await self.es_empleado_interno(self.user_id):
+                    await self.channel_layer.group_add(GRUPO_SOPORTE, self.channel_name)
                 await self.accept()
                 log_ws_event(user, f"✅ Conexión aceptada al chat {self.chat_id}", extra={"schema": self.tenant_schema})
             else:
@@ -45,6 +49,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
         await self.channel_layer.group_discard(f"user_{self.scope['user'].id}", self.channel_name)
+        await self.channel_layer.group_discard(GRUPO_SOPORTE, self.channel_name)
         logger.debug("Desconectado WebSocket: code=%s, user=%s", close_code, self.scope.get('user'))
 
     async def receive(self, text_data):
@@ -59,48 +64,50 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
             log_ws_event(self.scope["user"], "✉️ Mensaje recibido", texto)
 
-            # Guardar mensaje y actualizar fecha del último mensaje
-            mensaje = await self.guardar_mensaje(self.user_id, texto, oportunidad_id, None)
-            await self.actualizar_ultimo_mensaje_fecha(self.chat_id)
-
-            # Enviar mensaje a todos los del grupo
-            await self.channel_layer.group_send(
-                self.group_name,
-                {
-                    "type": "chat_message",
-                    "autor": self.user_nombre,
-                    "texto": texto,
-                    "oportunidad_id": oportunidad_id,
-                    "tenant": self.tenant_schema,
-                }
+            # Un solo viaje a BD: mensaje + ultimo_mensaje_fecha + notificación al cliente
+            _, chat, notificacion = await database_sync_to_async(registrar_mensaje)(
+                self.tenant_schema, self.chat_id, self.user_id, self.user_nombre, texto, oportunidad_id,
             )
 
-            # Enviar notificación al cliente del chat (si no es el que envió el mensaje)
-            cliente_id = await self.get_cliente_id(self.chat_id)
-            if cliente_id and cliente_id != self.user_id:
-                # Crear notificación persistente
-                notificacion = await self.crear_notificacion(
-                    cliente_id,
-                    f"Nuevo mensaje de {self.user_nombre}: {texto[:50]}...",
-                    "chat",
-                    f"/chat"  # URL relacionada
-                )
-
-                # Enviar notificación en tiempo real si el usuario está conectado
-                await self.channel_layer.group_send(
-                    f"user_{cliente_id}",
+            envios = [
+                # Mensaje a todos los del chat
+                self.channel_layer.group_send(
+                    self.group_name,
+                    {
+                        "type": "chat_message",
+                        "autor": self.user_nombre,
+                        "texto": texto,
+                        "oportunidad_id": oportunidad_id,
+                        "tenant": self.tenant_schema,
+                    }
+                ),
+                # Aviso a soporte (tipo WhatsApp): un único envío al grupo, sin eco al autor
+                self.channel_layer.group_send(
+                    GRUPO_SOPORTE,
+                    evento_soporte(
+                        f"Nuevo mensaje de {chat['cliente_nombre']}: {texto[:50]}{'...' if len(texto) > 50 else ''}",
+                        "nuevo_mensaje_chat",
+                        excluir_usuario=self.user_id,
+                        chat_id=self.chat_id,
+                        tenant=self.tenant_schema,
+                        url="/chat",
+                    ),
+                ),
+            ]
+            if notificacion:
+                # Notificación en tiempo real al cliente si está conectado
+                envios.append(self.channel_layer.group_send(
+                    f"user_{chat['cliente_id']}",
                     {
                         "type": "nueva_notificacion",
                         "mensaje": f"Nuevo mensaje de {self.user_nombre}",
                         "tipo": "chat",
-                        "url": f"/chat",
-                        "id": notificacion.id if notificacion else None,
-                        "creada": mensaje.creada.isoformat() if mensaje else None,
+                        "url": "/chat",
+                        "id": notificacion.id,
+                        "creada": notificacion.creada.isoformat(),
                     }
-                )
-
-            # Notificar a managers/admins sobre nuevo mensaje (tipo WhatsApp)
-            await self.notificar_managers_nuevo_mensaje(texto)
+                ))
+            await asyncio.gather(*envios)
 
         except Exception as e:
             log_exception("receive", e)
@@ -116,14 +123,16 @@ class ChatConsumer(AsyncWebsocketConsumer):
         }))
 
     async def nueva_notificacion(self, event):
-        await self.send_json({
+        if event.get("soporte") and not await database_sync_to_async(debe_entregarse)(event, self.user_id):
+            return
+        await self.send(text_data=json.dumps({
             "type": "nueva_notificacion",
             "mensaje": event["mensaje"],
             "tipo": event["tipo"],
             "url": event.get("url", ""),
             "id": event.get("id"),
             "creada": event.get("creada"),
-        })
+        }))
 
     async def chat_closed(self, event):
         """Notifica a los clientes conectados que el chat ha sido cerrado"""
@@ -133,150 +142,10 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'cerrado_por': event.get('cerrado_por', 'Soporte'),
         }))
 
-    
-    @database_sync_to_async
-    def guardar_mensaje(self, user_id, texto, oportunidad_id, dispositivo_id):
-        from .models import Mensaje
-        from django_tenants.utils import schema_context
-        from django.db import connection
-
-        with schema_context(self.tenant_schema):
-            logger.debug("Guardando mensaje en schema: %s", connection.schema_name)
-            mensaje = Mensaje.objects.create(
-                chat_id=self.chat_id,
-                autor_id=user_id,
-                texto=texto,
-                oportunidad_id=oportunidad_id,
-                dispositivo_id=dispositivo_id,
-            )
-            return mensaje
-
-    @database_sync_to_async
-    def get_cliente_id(self, chat_id):
-        from .models import Chat
-        from django_tenants.utils import schema_context
-
-        with schema_context(self.tenant_schema):
-            try:
-                chat = Chat.objects.only('cliente_id').get(id=chat_id)
-                return chat.cliente_id
-            except Chat.DoesNotExist:
-                return None
-
-    @database_sync_to_async
-    def crear_notificacion(self, user_id, mensaje, tipo, url):
-        from notificaciones.models import Notificacion
-        from django_tenants.utils import schema_context
-
-        with schema_context(self.tenant_schema):
-            try:
-                notificacion = Notificacion.objects.create(
-                    usuario_id=user_id,
-                    schema=self.tenant_schema,
-                    mensaje=mensaje,
-                    tipo='chat',  # Agregar 'chat' a TIPO_CHOICES en el modelo
-                    url_relacionada=url,
-                    leida=False
-                )
-                logger.info("Notificación creada: ID=%s, usuario=%s, schema=%s", notificacion.id, user_id, self.tenant_schema)
-                return notificacion
-            except Exception as e:
-                logger.error("❌ Error creando notificación: %s", e)
-                return None
-
-
-        
     @database_sync_to_async
     def usuario_puede_conectar(self, user_id, chat_id):
-        from .models import Chat
-        from progeek.models import UserGlobalRole
-        from django.db import connection
-        
-
-        
-
-        with schema_context(self.tenant_schema):
-            logger.debug("Schema actual al validar conexión: %s", connection.schema_name)
-
-            try:
-                chat = Chat.objects.only("cliente_id").get(id=chat_id)
-                logger.debug("Chat encontrado: chat_id=%s, cliente_id=%s", chat.id, chat.cliente_id)
-
-                if chat.cliente_id == user_id:
-                    return True
-
-                es_soporte = UserGlobalRole.objects.filter(user_id=user_id, es_empleado_interno=True).exists()
-                return es_soporte
-
-            except Chat.DoesNotExist:
-                return False
-
-    @staticmethod
-    @database_sync_to_async
-    def _es_empleado_interno(user_id):
-        from progeek.models import UserGlobalRole
-        return UserGlobalRole.objects.filter(user_id=user_id, es_empleado_interno=True).exists()
-
-    @database_sync_to_async
-    def actualizar_ultimo_mensaje_fecha(self, chat_id):
-        """Actualiza la fecha del último mensaje del chat"""
-        from .models import Chat
-        from django_tenants.utils import schema_context
-        from django.utils import timezone
-
-        with schema_context(self.tenant_schema):
-            try:
-                chat = Chat.objects.get(id=chat_id)
-                chat.ultimo_mensaje_fecha = timezone.now()
-                chat.save(update_fields=['ultimo_mensaje_fecha'])
-                logger.debug("Actualizada fecha último mensaje para chat %s", chat_id)
-            except Chat.DoesNotExist:
-                logger.warning("❌ Chat %s no encontrado al actualizar fecha", chat_id)
-
-    async def notificar_managers_nuevo_mensaje(self, texto):
-        """Notifica a managers/admins que hay un nuevo mensaje (tipo WhatsApp)"""
-        from progeek.models import UserGlobalRole
-
-        # Obtener todos los managers/admins
-        managers = await self._get_managers()
-        cliente_nombre = await self._get_cliente_nombre(self.chat_id)
-
-        for manager_id in managers:
-            # Solo notificar si el manager NO es quien envió el mensaje
-            if manager_id != self.user_id:
-                await self.channel_layer.group_send(
-                    f"user_{manager_id}",
-                    {
-                        "type": "nueva_notificacion",
-                        "mensaje": f"Nuevo mensaje de {cliente_nombre}: {texto[:50]}{'...' if len(texto) > 50 else ''}",
-                        "tipo": "nuevo_mensaje_chat",
-                        "chat_id": self.chat_id,
-                        "tenant": self.tenant_schema,
-                        "url": "/chat",
-                    }
-                )
-
-        logger.info("Notificación enviada a %s managers sobre mensaje en chat %s", len(managers), self.chat_id)
+        return puede_conectar(self.tenant_schema, user_id, chat_id)
 
     @database_sync_to_async
-    def _get_managers(self):
-        """Obtiene lista de IDs de managers/admins"""
-        from progeek.models import UserGlobalRole
-        return list(
-            UserGlobalRole.objects.filter(
-                es_empleado_interno=True
-            ).values_list('user_id', flat=True)
-        )
-
-    @database_sync_to_async
-    def _get_cliente_nombre(self, chat_id):
-        """Obtiene el nombre del cliente del chat"""
-        from .models import Chat
-        from django_tenants.utils import schema_context
-
-        with schema_context(self.tenant_schema):
-            try:
-                chat = Chat.objects.select_related('cliente').get(id=chat_id)
-                return chat.cliente.name if chat.cliente else "Cliente"
-            except Chat.DoesNotExist:
-                return "Cliente"
+    def es_empleado_interno(self, user_id):
+        return user_id in empleados_internos()
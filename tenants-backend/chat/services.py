@@ -0,0 +1,97 @@
+"""
+Canal de mensajes del chat.
+
+Un mensaje entrante se resuelve en un único viaje a BD (registrar_mensaje):
+mensaje, ultimo_mensaje_fecha y notificación al cliente en una transacción.
+El cliente de cada chat no cambia, así que se cachea por schema y chat.
+"""
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+from django_tenants.utils import schema_context
+
+from notificaciones.soporte import cache_timeout, empleados_internos
+
+logger = logging.getLogger(__name__)
+
+
+def _clave_chat(schema, chat_id):
+    return f"chat:{schema}:{chat_id}"
+
+
+def datos_chat(schema, chat_id):
+    """
+    Cliente del chat, cacheado.
+
+    Returns:
+        {"cliente_id", "cliente_nombre"} o None si el chat no existe
+    """
+    clave = _clave_chat(schema, chat_id)
+    datos = cache.get(clave)
+    if datos is None:
+        from .models import Chat
+
+        with schema_context(schema):
+            fila = Chat.objects.filter(id=chat_id).values_list("cliente_id", "cliente__name").first()
+        if fila is None:
+            return None
+        datos = {"cliente_id": fila[0], "cliente_nombre": fila[1] or "Cliente"}
+        cache.set(clave, datos, cache_timeout())
+    return datos
+
+
+def invalidar_chat(schema, chat_id):
+    cache.delete(_clave_chat(schema, chat_id))
+
+
+def puede_conectar(schema, user_id, chat_id):
+    """El cliente del chat o cualquier empleado interno."""
+    datos = datos_chat(schema, chat_id)
+    if datos is None:
+        return False
+    return datos["cliente_id"] == user_id or user_id in empleados_internos()
+
+
+def registrar_mensaje(schema, chat_id, autor_id, autor_nombre, texto, oportunidad_id=None, dispositivo_id=None):
+    """
+    Guarda el mensaje y actualiza ultimo_mensaje_fecha en una transacción. Si
+    no escribe el propio cliente, le crea también la notificación persistente.
+
+    Returns:
+        (mensaje, datos_chat, notificacion o None)
+    """
+    from notificaciones.models import Notificacion
+    from .models import Chat, Mensaje
+
+    datos = datos_chat(schema, chat_id)
+    if datos is None:
+        raise Chat.DoesNotExist(f"Chat {chat_id} no existe en {schema}")
+
+    notificacion = None
+    with schema_context(schema), transaction.atomic():
+        mensaje = Mensaje.objects.create(
+            chat_id=chat_id,
+            autor_id=autor_id,
+            texto=texto,
+            oportunidad_id=oportunidad_id,
+            dispositivo_id=dispositivo_id,
+        )
+        Chat.objects.filter(id=chat_id).update(ultimo_mensaje_fecha=mensaje.enviado)
+
+        cliente_id = datos["cliente_id"]
+        if cliente_id and cliente_id != autor_id:
+            try:
+                with transaction.atomic():
+                    notificacion = Notificacion.objects.create(
+                        usuario_id=cliente_id,
+                        schema=schema,
+                        mensaje=f"Nuevo mensaje de {autor_nombre}: {texto[:50]}...",
+                        tipo="chat",
+                        url_relacionada="/chat",
+                        leida=False,
+                    )
+            except Exception as e:
+                logger.error("❌ Error creando notificación: %s", e)
+
+    return mensaje, datos, notificacion
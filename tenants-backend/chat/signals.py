@@ -0,0 +1,11 @@
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Chat
+from .services import invalidar_chat
+
+
+@receiver(post_delete, sender=Chat)
+def invalidar_cache_chat(sender, instance, **kwargs):
+    invalidar_chat(connection.schema_name, instance.id)
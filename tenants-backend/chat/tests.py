@@ -1,3 +1,130 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django_tenants.utils import schema_context
+
+User = get_user_model()
+
+
+class CapaGrabadora:
+    """Channel layer que solo apunta los group_send."""
+
+    def __init__(self):
+        self.enviados = []
+
+    async def group_send(self, grupo, evento):
+        self.enviados.append((grupo, evento))
+
+
+@pytest.fixture
+def chat_soporte(db, create_tenant):
+    from progeek.models import UserGlobalRole
+
+    cache.clear()
+    owner = User.objects.create_user(email="owner@chat.com", password="x")
+    cliente = User.objects.create_user(email="cliente@chat.com", password="x", name="Cliente Chat")
+    soporte = User.objects.create_user(email="soporte@chat.com", password="x", name="Soporte")
+    UserGlobalRole.objects.create(user=soporte, es_empleado_interno=True)
+    tenant = create_tenant(owner, "chat")
+    with schema_context(tenant.schema_name):
+        from chat.models import Chat
+
+        yield tenant.schema_name, Chat.objects.create(cliente=cliente), cliente, soporte
+    cache.clear()
+
+
+def _alta_empleados(n):
+    from progeek.models import UserGlobalRole
+
+    with schema_context("public"):
+        for k in range(n):
+            user = User.objects.create_user(email=f"emp{k}@chat.com", password="x")
+            UserGlobalRole.objects.create(user=user, es_empleado_interno=True)
+
+
+def _recibir(monkeypatch, schema, chat, autor, texto):
+    """Pasa un mensaje por ChatConsumer.receive; devuelve (group_send, queries)."""
+    from chat import consumers
+
+    # database_sync_to_async cierra la conexión del test; sync_to_async usa la misma
+    monkeypatch.setattr(consumers, "database_sync_to_async", sync_to_async)
+    consumer = consumers.ChatConsumer()
+    consumer.scope = {"user": autor}
+    consumer.chat_id, consumer.group_name, consumer.tenant_schema = chat.id, f"chat_{chat.id}", schema
+    consumer.user_id, consumer.user_nombre = autor.id, autor.name
+    consumer.channel_layer = CapaGrabadora()
+    errores = []
+
+    async def _send(text_data=None, **kwargs):
+        errores.append(text_data)
+
+    consumer.send = _send
+    with CaptureQueriesContext(connection) as ctx:
+        async_to_sync(consumer.receive)(json.dumps({"texto": texto}))
+    assert errores == []
+    return consumer.channel_layer.enviados, len([q for q in ctx.captured_queries if "search_path" not in q["sql"]])
+
+
+@pytest.mark.django_db
+def test_mensaje_en_una_transaccion_y_fanout_constante(chat_soporte, monkeypatch):
+    """Enviar un mensaje cuesta lo mismo con 1 que con 20 empleados de soporte"""
+    from chat.models import Mensaje
+    from notificaciones.models import Notificacion
+    from notificaciones.soporte import GRUPO_SOPORTE
+
+    schema, chat, cliente, soporte = chat_soporte
+    _recibir(monkeypatch, schema, chat, soporte, "calentar caché")
+
+    enviados, queries = _recibir(monkeypatch, schema, chat, soporte, "Hola, ¿en qué podemos ayudarte?")
+    _alta_empleados(20)
+    enviados_grande, queries_grande = _recibir(monkeypatch, schema, chat, soporte, "Seguimos aquí")
+
+    assert queries == queries_grande
+    assert [g for g, _ in enviados] == [g for g, _ in enviados_grande] == [f"chat_{chat.id}", GRUPO_SOPORTE, f"user_{cliente.id}"]
+    aviso = dict(enviados)[GRUPO_SOPORTE]
+    assert aviso["excluir_usuario"] == soporte.id
+    assert aviso["mensaje"].startswith("Nuevo mensaje de Cliente Chat")
+
+    chat.refresh_from_db()
+    ultimo = Mensaje.objects.filter(chat=chat).latest("id")
+    assert chat.ultimo_mensaje_fecha == ultimo.enviado
+    assert Notificacion.objects.filter(usuario=cliente, tipo="chat").count() == 3
+
+    # Si escribe el cliente no se le notifica a sí mismo
+    enviados, _ = _recibir(monkeypatch, schema, chat, cliente, "Gracias")
+    assert [g for g, _ in enviados] == [f"chat_{chat.id}", GRUPO_SOPORTE]
+
+
+@pytest.mark.django_db
+def test_cache_de_soporte_se_invalida_con_el_rol(chat_soporte):
+    """La lista de empleados y el acceso al chat se cachean y siguen los cambios de UserGlobalRole"""
+    from chat.services import puede_conectar
+    from notificaciones.soporte import debe_entregarse, empleados_internos, evento_soporte
+
+    schema, chat, cliente, soporte = chat_soporte
+    with schema_context("public"):
+        otro = User.objects.create_user(email="otro@chat.com", password="x")
+
+    assert puede_conectar(schema, cliente.id, chat.id)
+    assert puede_conectar(schema, soporte.id, chat.id)
+    assert not puede_conectar(schema, otro.id, chat.id)
+    assert not puede_conectar(schema, cliente.id, chat.id + 1000)
+    with CaptureQueriesContext(connection) as ctx:
+        assert puede_conectar(schema, soporte.id, chat.id)
+        assert empleados_internos() == {soporte.id}
+    assert [q for q in ctx.captured_queries if "search_path" not in q["sql"]] == []
+
+    evento = evento_soporte("aviso", "nuevo_mensaje_chat", excluir_usuario=soporte.id)
+    assert not debe_entregarse(evento, soporte.id)
+
+    rol = soporte.global_role
+    rol.es_empleado_interno = False
+    rol.save()
+    assert not puede_conectar(schema, soporte.id, chat.id)
+    assert not debe_entregarse(evento_soporte("aviso", "nuevo_mensaje_chat"), soporte.id)
+    assert debe_entregarse({"type": "nueva_notificacion", "mensaje": "x", "tipo": "chat"}, otro.id)
@@ -15,28 +15,31 @@ class DashboardManagerSerializer(serializers.Serializer):
                 pct = (Decimal(str(raw_pct)) / Decimal("100"))
         except Exception:
             pass
+        # Un único plan: ámbito de rol, filtros y tramos se resuelven una vez
+        plan = kpis.PlanKpis(fecha_inicio, fecha_fin, filtros, opciones, request, granularidad)
+
         # 1) Bloque negocio (factura adelante)
-        valor_total = kpis.kpi_valor_total(fecha_inicio, fecha_fin, filtros, opciones, request)
-        ticket_medio = kpis.kpi_ticket_medio(fecha_inicio, fecha_fin, filtros, opciones, request)
+        valor_total = plan.valor_total()
+        ticket_medio = plan.ticket_medio()
         comision_total = (valor_total or Decimal("0")) * pct
         comision_media = (ticket_medio or Decimal("0")) * pct
 
         margen_medio = kpis.kpi_margen_medio(fecha_inicio, fecha_fin, filtros, opciones, request)  # si procede (puede ser None)
 
-        evolucion = kpis.serie_evolucion_valor(fecha_inicio, fecha_fin, granularidad, filtros, opciones, request)
-        comparativa = kpis.comparativa_periodo(evolucion, fecha_inicio, fecha_fin, granularidad, filtros, opciones, opciones.get("comparar", False), request)
+        evolucion = plan.evolucion()
+        comparativa = plan.comparativa(evolucion)
 
         rankings = {
-            "productos": kpis.rank_productos(fecha_inicio, fecha_fin, filtros, opciones, limit=10, request=request),
-            "tiendas_por_valor": kpis.rank_tiendas_valor(fecha_inicio, fecha_fin, filtros, opciones, limit=10, request=request),
-            "usuarios_por_valor": kpis.rank_usuarios_valor(fecha_inicio, fecha_fin, filtros, opciones, limit=10, request=request),
-            "tiendas_por_operaciones": kpis.rank_tiendas_ops(fecha_inicio, fecha_fin, filtros, opciones, limit=10, request=request),
-            "usuarios_por_operaciones": kpis.rank_usuarios_ops(fecha_inicio, fecha_fin, filtros, opciones, limit=10, request=request),
+            "productos": plan.ranking("modelo", "valor", limit=10),
+            "tiendas_por_valor": plan.ranking("tienda", "valor", limit=10),
+            "usuarios_por_valor": plan.ranking("usuario", "valor", limit=10),
+            "tiendas_por_operaciones": plan.ranking("tienda", "ops", limit=10),
+            "usuarios_por_operaciones": plan.ranking("usuario", "ops", limit=10),
         }
 
-        pipeline = kpis.kpi_pipeline_actual(filtros, request)
+        pipeline = plan.pipeline()
 
-        operativa = kpis.kpi_operativa(fecha_inicio, fecha_fin, filtros, opciones, request)
+        operativa = plan.operativa()
 
         return {
             "resumen": {
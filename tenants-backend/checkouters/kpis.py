@@ -3,7 +3,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.db.models import OuterRef, Subquery, F, ExpressionWrapper, DurationField, Avg,Count, Q
 from .models.dispositivo import Dispositivo,DispositivoReal
-from .models.oportunidad import Oportunidad,HistorialOportunidad
+from .models.oportunidad import HistorialOportunidad
 from .models.tienda import Tienda
 from django.utils.dateparse import parse_date
 from datetime import timedelta
@@ -12,6 +12,8 @@ from datetime import timedelta, datetime,time
 from django.db.models.functions import TruncMonth, TruncWeek, TruncDay
 from django.db.models import Sum,DecimalField
 from .serializers import DashboardManagerSerializer
+from .utils.role_filters import ACCESO_TOTAL
+from .utils.utilskpis import PlanKpis
 from django.db.models.functions import Coalesce
 from django.db.models import F, Sum, ExpressionWrapper, DecimalField,Value
 
@@ -31,38 +33,16 @@ class RankingProductosAPIView(APIView):
     """
     def get(self, request):
         estado = request.GET.get('estado', 'Pagado')
-        tienda_id = request.GET.get('tienda')
-        usuario_id = request.GET.get('usuario')  # ajusta el campo si en Oportunidad es 'creado_por'
-        fecha_inicio = request.GET.get('fecha_inicio')  # YYYY-MM-DD
-        fecha_fin = request.GET.get('fecha_fin')        # YYYY-MM-DD
         orden = request.GET.get('orden', 'valor')       # 'valor' | 'cantidad'
         try:
             limit = int(request.GET.get('limit')) if request.GET.get('limit') else None
         except ValueError:
             limit = None
 
-        qs = DispositivoReal.objects.all()
-
-        # Filtrado por estado de la oportunidad
-        if estado:
-            qs = qs.filter(oportunidad__estado=estado)
-
-        # Filtros de tienda / usuario (ajusta el campo de usuario si procede)
-        if tienda_id:
-            qs = qs.filter(oportunidad__tienda_id=tienda_id)
-        if usuario_id:
-            qs = qs.filter(oportunidad__usuario_id=usuario_id)
-
-        # Fechas: usa la que te interese para el KPI. Si tienes fecha de pago, úsala.
-        # Aquí mantengo fecha_creacion por compatibilidad con tu código actual.
-        if fecha_inicio:
-            fi = parse_date(fecha_inicio)
-            if fi:
-                qs = qs.filter(oportunidad__fecha_creacion__date__gte=fi)
-        if fecha_fin:
-            ff = parse_date(fecha_fin)
-            if ff:
-                qs = qs.filter(oportunidad__fecha_creacion__date__lte=ff)
+        # Tienda/usuario y fechas (fecha_creacion) los resuelve el plan de KPIs;
+        # filtrado por estado de la oportunidad
+        plan = PlanKpis.desde_request(request, ambito=ACCESO_TOTAL)
+        qs = plan.dispositivos([estado] if estado else None)
 
         agg = (
             qs.values('modelo__descripcion')
@@ -84,26 +64,13 @@ class RankingProductosAPIView(APIView):
     
 class TasaConversionAPIView(APIView):
     def get(self, request):
-        tienda_id = request.GET.get('tienda')
-        usuario_id = request.GET.get('usuario')
-        fecha_inicio = request.GET.get('fecha_inicio')
-        fecha_fin = request.GET.get('fecha_fin')
-        qs = Oportunidad.objects.all()
-
-        if tienda_id:
-            qs = qs.filter(tienda_id=tienda_id)
-            
-        if usuario_id:
-            qs = qs.filter(usuario_id=usuario_id)
-           
-        if fecha_inicio:
-            qs = qs.filter(fecha_creacion__date__gte=parse_date(fecha_inicio))
-            logger.debug("Tras filtro fecha_inicio: %s oportunidades", qs.count())
-        if fecha_fin:
-            qs = qs.filter(fecha_creacion__date__lte=parse_date(fecha_fin))
-            logger.debug("Tras filtro fecha_fin: %s oportunidades", qs.count())
-        total = qs.count()
-        finalizadas = qs.filter(estado__in=['Pagado']).count()
+        # Total y finalizadas en una sola query (agregación condicional)
+        conteo = PlanKpis.desde_request(request, ambito=ACCESO_TOTAL).oportunidades().aggregate(
+            total=Count('id'),
+            finalizadas=Count('id', filter=Q(estado__in=['Pagado'])),
+        )
+        total = conteo['total']
+        finalizadas = conteo['finalizadas']
         logger.debug("Total oportunidades: %s", total)
         logger.debug("Oportunidades finalizadas (pagado): %s", finalizadas)
         tasa_conversion = (finalizadas / total) * 100 if total > 0 else 0
@@ -123,21 +90,7 @@ class TiempoEntreEstadosAPIView(APIView):
         if not estado_inicio or not estado_fin:
             return Response({"error": "Debes indicar estado_inicio y estado_fin"}, status=400)
 
-        tienda_id = request.GET.get('tienda')
-        usuario_id = request.GET.get('usuario')
-        fecha_inicio = request.GET.get('fecha_inicio')
-        fecha_fin = request.GET.get('fecha_fin')
-
-        oportunidades = Oportunidad.objects.all()
-
-        if tienda_id:
-            oportunidades = oportunidades.filter(tienda_id=tienda_id)
-        if usuario_id:
-            oportunidades = oportunidades.filter(usuario_id=usuario_id)
-        if fecha_inicio:
-            oportunidades = oportunidades.filter(fecha_creacion__date__gte=parse_date(fecha_inicio))
-        if fecha_fin:
-            oportunidades = oportunidades.filter(fecha_creacion__date__lte=parse_date(fecha_fin))
+        oportunidades = PlanKpis.desde_request(request, ambito=ACCESO_TOTAL).oportunidades()
 
         # Subconsulta: primera vez que llega al estado_inicio
         sub_inicio = HistorialOportunidad.objects.filter(
@@ -177,21 +130,7 @@ class TiempoEntreEstadosAPIView(APIView):
 
 class PipelineEstadosAPIView(APIView):
     def get(self, request):
-        tienda_id = request.GET.get('tienda')
-        usuario_id = request.GET.get('usuario')
-        fecha_inicio = request.GET.get('fecha_inicio')
-        fecha_fin = request.GET.get('fecha_fin')
-
-        qs = Oportunidad.objects.all()
-
-        if tienda_id:
-            qs = qs.filter(tienda_id=tienda_id)
-        if usuario_id:
-            qs = qs.filter(usuario_id=usuario_id)
-        if fecha_inicio:
-            qs = qs.filter(fecha_creacion__date__gte=parse_date(fecha_inicio))
-        if fecha_fin:
-            qs = qs.filter(fecha_creacion__date__lte=parse_date(fecha_fin))
+        qs = PlanKpis.desde_request(request, ambito=ACCESO_TOTAL).oportunidades()
 
         resultados = (
             qs.values('estado')
@@ -203,23 +142,9 @@ class PipelineEstadosAPIView(APIView):
     
 class RechazosPorEstadoAPIView(APIView):
     def get(self, request):
-        tienda_id = request.GET.get('tienda')
-        usuario_id = request.GET.get('usuario')
-        fecha_inicio = request.GET.get('fecha_inicio')
-        fecha_fin = request.GET.get('fecha_fin')
-
         estados_rechazo = ['cancelado', 'Recibido por el cliente']
 
-        qs = Oportunidad.objects.filter(estado__in=estados_rechazo)
-
-        if tienda_id:
-            qs = qs.filter(tienda_id=tienda_id)
-        if usuario_id:
-            qs = qs.filter(usuario_id=usuario_id)
-        if fecha_inicio:
-            qs = qs.filter(fecha_creacion__date__gte=parse_date(fecha_inicio))
-        if fecha_fin:
-            qs = qs.filter(fecha_creacion__date__lte=parse_date(fecha_fin))
+        qs = PlanKpis.desde_request(request, ambito=ACCESO_TOTAL).oportunidades(estados_rechazo)
 
         resultado = (
             qs.values('estado')
@@ -267,29 +192,17 @@ class ValorPorUsuarioAPIView(APIView):
 
        
 
-        # A. Valor total por usuario y periodo
-        valores = (
-            Dispositivo.objects.filter(
-                oportunidad__estado__in=estados_filtrados,
-                oportunidad__fecha_creacion__range=[fecha_inicio, fecha_fin]
-            )
-            .annotate(grupo=truncador("oportunidad__fecha_creacion"))
-            .values("grupo", "oportunidad__usuario__name")
-            .annotate(
-                total=Sum(F("precio_orientativo") * F("cantidad"))
-            )
-        )
+        plan = PlanKpis(fecha_inicio, fecha_fin, ambito=ACCESO_TOTAL, granularidad=granularidad)
+        oportunidades_qs = plan.oportunidades(estados_filtrados)
 
-        # B. Dispositivos por usuario y periodo
-        dispositivos = (
-            Dispositivo.objects.filter(
-                oportunidad__estado__in=estados_filtrados,
-                oportunidad__fecha_creacion__range=[fecha_inicio, fecha_fin]
-            )
+        # A+B. Valor total y dispositivos por usuario y periodo (una sola query)
+        valores = dispositivos = list(
+            Dispositivo.objects.filter(oportunidad__in=oportunidades_qs.values("id"))
             .annotate(grupo=truncador("oportunidad__fecha_creacion"))
             .values("grupo", "oportunidad__usuario__name")
             .annotate(
-                cantidad=Sum("cantidad")
+                total=Sum(F("precio_orientativo") * F("cantidad")),
+                cantidad=Sum("cantidad"),
             )
         )
          # Usuarios detectados
@@ -297,10 +210,7 @@ class ValorPorUsuarioAPIView(APIView):
 
         # C. Oportunidades por usuario y periodo
         oportunidades = (
-            Oportunidad.objects.filter(
-                estado__in=estados_filtrados,
-                fecha_creacion__range=[fecha_inicio, fecha_fin]
-            )
+            oportunidades_qs
             .annotate(grupo=truncador("fecha_creacion"))
             .values("grupo", "usuario__name")
             .annotate(
@@ -419,45 +329,29 @@ class ValorPorTiendaManagerAPIView(APIView):
         tiendas = list(Tienda.objects.values_list("nombre", flat=True))
 
         # Base de pago (sólo Pagado y por fecha de pago)
-        filtro_pago = dict(
-            oportunidad__estado__iexact="Pagado",
-            oportunidad__fecha_inicio_pago__range=[fecha_inicio, fecha_fin],
+        plan = PlanKpis(
+            fecha_inicio, fecha_fin,
+            filtros={"tienda_id": tienda_id, "usuario_id": usuario_id},
+            ambito=ACCESO_TOTAL,
+            campo_fecha="fecha_inicio_pago",
         )
-        if tienda_id:
-            filtro_pago["oportunidad__tienda_id"] = tienda_id
-        if usuario_id:
-            filtro_pago["oportunidad__usuario_id"] = usuario_id
-
-        # 1) Valor pagado = suma de precio_final de DispositivoReal
-        valores = (
-            DispositivoReal.objects.filter(**filtro_pago)
+        pagadas = plan.oportunidades().filter(estado__iexact="Pagado")
+
+        # 1+2) Valor pagado (suma de precio_final) y dispositivos (reales en las
+        # mismas oportunidades), en una sola query
+        valores = dispositivos = list(
+            DispositivoReal.objects.filter(oportunidad__in=pagadas.values("id"))
             .annotate(grupo=truncador("oportunidad__fecha_inicio_pago"))
             .values("grupo", "oportunidad__tienda__nombre")
             .annotate(
-                total=Sum(Coalesce(F("precio_final"), ZERO_DEC, output_field=DecimalField(max_digits=12, decimal_places=2)))
+                total=Sum(Coalesce(F("precio_final"), ZERO_DEC, output_field=DecimalField(max_digits=12, decimal_places=2))),
+                cantidad_dispositivos=Count("id"),
             )
         )
 
-        # 2) Dispositivos = contar reales en las mismas oportunidades
-        dispositivos = (
-            DispositivoReal.objects.filter(**filtro_pago)
-            .annotate(grupo=truncador("oportunidad__fecha_inicio_pago"))
-            .values("grupo", "oportunidad__tienda__nombre")
-            .annotate(cantidad_dispositivos=Count("id"))
-        )
-
         # 3) Oportunidades = contar oportunidades Pagado por fecha_inicio_pago
-        oportunidades_filtro = dict(
-            estado__iexact="Pagado",
-            fecha_inicio_pago__range=[fecha_inicio, fecha_fin],
-        )
-        if tienda_id:
-            oportunidades_filtro["tienda_id"] = tienda_id
-        if usuario_id:
-            oportunidades_filtro["usuario_id"] = usuario_id
-
         oportunidades = (
-            Oportunidad.objects.filter(**oportunidades_filtro)
+            pagadas
             .annotate(grupo=truncador("fecha_inicio_pago"))
             .values("grupo", "tienda__nombre")
             .annotate(cantidad_oportunidades=Count("id", distinct=True))
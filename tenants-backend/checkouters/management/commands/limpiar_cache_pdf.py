@@ -0,0 +1,25 @@
+"""
+Management command para borrar los PDF de la caché (pdf-cache/ en el
+almacenamiento privado) que llevan N días sin servirse.
+
+La clave de la caché cambia con el contenido, así que las versiones viejas de
+un documento quedan huérfanas; conviene lanzarlo a diario desde cron.
+
+Uso:
+    python manage.py limpiar_cache_pdf
+    python manage.py limpiar_cache_pdf --dias 7
+"""
+from django.core.management.base import BaseCommand
+
+from checkouters.services.pdf_cache import purgar
+
+
+class Command(BaseCommand):
+    help = 'Borra los PDF cacheados que no se han usado en los últimos N días'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=30, help='Días sin uso (por defecto 30)')
+
+    def handle(self, *args, **options):
+        borrados = purgar(options['dias'])
+        self.stdout.write(self.style.SUCCESS(f'{borrados} PDF borrados de la caché'))
@@ -0,0 +1,49 @@
+"""
+Management command para reconstruir los agregados diarios de KPIs (KpiDiario).
+
+Las señales de Oportunidad y DispositivoReal mantienen la tabla al día; este
+comando la recalcula desde las tablas base para un rango de días. Útil tras
+update()/bulk_create masivos o como red de seguridad nocturna (--dias 2).
+
+Uso:
+    python manage.py recalcular_kpis_diarios
+    python manage.py recalcular_kpis_diarios --schema=tenant1 --desde=2025-01-01
+    python manage.py recalcular_kpis_diarios --dias 2
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django_tenants.utils import get_public_schema_name, get_tenant_model, schema_context
+
+from checkouters.services.kpis_diarios import reconstruir_kpis
+from checkouters.utils.utilskpis import parse_date_str
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los agregados diarios de KPIs (KpiDiario) de cada tenant'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', help='Solo este tenant (por defecto, todos)')
+        parser.add_argument('--desde', help='Primer día (YYYY-MM-DD)')
+        parser.add_argument('--hasta', help='Último día (YYYY-MM-DD)')
+        parser.add_argument('--dias', type=int, help='Solo los últimos N días (incluido hoy)')
+
+    def handle(self, *args, **options):
+        desde = parse_date_str(options.get('desde'))
+        hasta = parse_date_str(options.get('hasta'))
+        if options.get('dias'):
+            desde = timezone.localdate() - timedelta(days=options['dias'] - 1)
+        if (options.get('desde') and not desde) or (options.get('hasta') and not hasta):
+            raise CommandError('Fechas inválidas: usa YYYY-MM-DD')
+
+        schemas = [options['schema']] if options.get('schema') else list(
+            get_tenant_model().objects
+            .exclude(schema_name=get_public_schema_name())
+            .values_list('schema_name', flat=True)
+        )
+        for schema in schemas:
+            with schema_context(schema):
+                total = reconstruir_kpis(desde=desde, hasta=hasta)
+            self.stdout.write(f'  {schema}: {total} filas')
+        self.stdout.write(self.style.SUCCESS(f'✅ KPIs diarios recalculados en {len(schemas)} tenants'))
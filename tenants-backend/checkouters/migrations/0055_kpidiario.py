@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:38
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkouters', '0054_dispositivo_es_manual'),
+        ('productos', '0036_cola_tareas_actualizacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KpiDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(max_length=50)),
+                ('valor', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('valor_auditado', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('dispositivos', models.PositiveIntegerField(default=0)),
+                ('ops', models.PositiveIntegerField(default=0)),
+                ('modelo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='productos.modelo')),
+                ('tienda', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='checkouters.tienda')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'checkouters_kpi_diario',
+                'indexes': [models.Index(fields=['fecha', 'estado'], name='kpi_diario_fecha_estado'), models.Index(fields=['tienda', 'usuario', 'fecha', 'estado'], name='kpi_diario_bucket')],
+            },
+        ),
+    ]
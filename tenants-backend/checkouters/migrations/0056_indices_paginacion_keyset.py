@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkouters', '0055_kpidiario'),
+        ('productos', '0036_cola_tareas_actualizacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dispositivo',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='dispositivo_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='historialoportunidad',
+            index=models.Index(fields=['oportunidad', 'fecha', 'id'], name='historial_opp_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='oportunidad',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='oportunidad_keyset'),
+        ),
+    ]
@@ -12,6 +12,7 @@ from .dispositivo import (
 from .cliente import Cliente, ComentarioCliente, ConsultaCliente
 from .tienda import Tienda, UserTenantExtension
 from .objetivo import Objetivo
+from .kpi import KpiDiario
 from .legal import B2CContrato, LegalTemplate
 from .documento import Documento
 from .utils import validar_imei
@@ -33,6 +34,7 @@ __all__ = [
     "Tienda",
     "UserTenantExtension",
     "Objetivo",
+    "KpiDiario",
     "B2CContrato",
     "LegalTemplate",
     "Documento",
@@ -174,6 +174,10 @@ class Dispositivo(models.Model):
                 condition=Q(imei__isnull=False) & ~Q(imei=''),
             ),
         ]
+        indexes = [
+            # Paginación por cursor (views/pagination.py)
+            models.Index(fields=["fecha_creacion", "id"], name="dispositivo_keyset"),
+        ]
 
 
 class DispositivoReal(models.Model):
@@ -0,0 +1,44 @@
+from decimal import Decimal
+from django.conf import settings
+from django.db import models
+
+
+class KpiDiario(models.Model):
+    """
+    Agregado diario de oportunidades para los KPIs del dashboard de manager.
+
+    Una fila por (día de creación, tienda, usuario, estado, modelo) con la suma
+    de precio_final de sus DispositivoReal. Cada oportunidad aporta ops=1 a una
+    sola de sus filas (las oportunidades sin dispositivos reales aportan una
+    fila con modelo vacío y dispositivos=0), así que Sum("ops") cuenta
+    oportunidades distintas sin importar la agrupación.
+
+    Se mantiene desde checkouters.signals (ver services/kpis_diarios.py).
+    """
+
+    fecha = models.DateField()
+    tienda = models.ForeignKey("Tienda", on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    estado = models.CharField(max_length=50)
+    modelo = models.ForeignKey(
+        "productos.Modelo",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+
+    valor = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0"))
+    valor_auditado = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0"))
+    dispositivos = models.PositiveIntegerField(default=0)
+    ops = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "checkouters_kpi_diario"
+        indexes = [
+            models.Index(fields=["fecha", "estado"], name="kpi_diario_fecha_estado"),
+            models.Index(fields=["tienda", "usuario", "fecha", "estado"], name="kpi_diario_bucket"),
+        ]
+
+    def __str__(self):
+        return f"KPI {self.fecha} {self.estado} tienda={self.tienda_id} usuario={self.usuario_id}"
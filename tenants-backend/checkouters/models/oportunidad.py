@@ -65,6 +65,10 @@ class Oportunidad(models.Model):
 
     class Meta:
         db_table = 'checkouters_oportunidad'
+        indexes = [
+            # Paginación por cursor (views/pagination.py)
+            models.Index(fields=["fecha_creacion", "id"], name="oportunidad_keyset"),
+        ]
 
     def __str__(self):
         return f"Oportunidad {self.id} - {self.nombre or 'Sin nombre'}"
@@ -83,6 +87,11 @@ class HistorialOportunidad(models.Model):
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     fecha = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["oportunidad", "fecha", "id"], name="historial_opp_keyset"),
+        ]
+
 
 class ComentarioOportunidad(models.Model):
     oportunidad = models.ForeignKey("Oportunidad", on_delete=models.CASCADE, related_name="comentarios", null=True)
@@ -5,7 +5,11 @@ from ..models.tienda import Tienda
 from .dispositivo import DispositivoSerializer
 from .base import ClienteSimpleSerializer
 from .documento import DocumentoSerializer
-from django.db.models import Sum, F
+from ..models.documento import Documento
+from ..models.dispositivo import Dispositivo, DispositivoReal
+from decimal import Decimal
+from django.db.models import DecimalField, F, OuterRef, Prefetch, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 
 User = get_user_model()
 
@@ -78,21 +82,59 @@ class OportunidadSerializer(serializers.ModelSerializer):
         fields = "__all__"
         read_only_fields = ["usuario", "fecha_creacion"]
 
+    @staticmethod
+    def preparar_listado(queryset):
+        """
+        Prepara un queryset de oportunidades para serializar listados sin N+1.
+
+        Anota valor_total/valor_total_final con subconsultas agregadas y
+        precarga facturas, comentarios y dispositivos con sus relaciones.
+        El serializer usa estos valores si están y, si no, consulta por fila.
+        """
+        return queryset.select_related("cliente", "tienda", "usuario").annotate(
+            valor_total=_suma_por_oportunidad(Dispositivo, F("precio_orientativo") * F("cantidad")),
+            valor_total_final=_suma_por_oportunidad(DispositivoReal, F("precio_final")),
+        ).prefetch_related(
+            Prefetch("comentarios", queryset=ComentarioOportunidad.objects.select_related("autor")),
+            Prefetch(
+                "dispositivos_oportunidad",
+                queryset=Dispositivo.objects.select_related("modelo", "capacidad", "dispositivo_personalizado").order_by("id"),
+            ),
+            Prefetch("documentos", queryset=Documento.objects.filter(tipo="factura"), to_attr="facturas_listado"),
+        )
+
     def get_hashid(self, obj):
         return obj.hashid
 
     def get_facturas(self, obj):
-        return DocumentoSerializer(
-            obj.documentos.filter(tipo="factura"), many=True, context=self.context
-        ).data
+        facturas = getattr(obj, "facturas_listado", None)
+        if facturas is None:
+            facturas = obj.documentos.filter(tipo="factura")
+        return DocumentoSerializer(facturas, many=True, context=self.context).data
 
     def get_valor_total(self, obj):
         """Calcula el valor total inicial (valoración del partner)"""
+        if hasattr(obj, "valor_total"):
+            return float(obj.valor_total or 0)
         agg = obj.dispositivos_oportunidad.aggregate(
             s=Sum(F('precio_orientativo') * F('cantidad'))
         )
         return float(agg["s"] or 0)
 
     def get_valor_total_final(self, obj):
+        if hasattr(obj, "valor_total_final"):
+            return float(obj.valor_total_final or 0)
         agg = obj.dispositivos_reales.aggregate(s=Sum("precio_final"))
         return float(agg["s"] or 0)
+
+
+def _suma_por_oportunidad(modelo, expresion):
+    """Subconsulta con la suma de `expresion` sobre las filas de `modelo` de cada oportunidad."""
+    salida = DecimalField(max_digits=14, decimal_places=2)
+    suma = (modelo.objects
+            .filter(oportunidad=OuterRef("pk"))
+            .order_by()
+            .values("oportunidad")
+            .annotate(s=Sum(expresion, output_field=salida))
+            .values("s"))
+    return Coalesce(Subquery(suma, output_field=salida), Value(Decimal("0")), output_field=salida)
@@ -21,9 +21,11 @@ class CapacidadSerializer(serializers.ModelSerializer):
     # Mini-caché por petición para evitar N+1 fuerte
     @property
     def _precio_cache(self):
-        if not hasattr(self, '__precio_cache'):
-            self.__precio_cache = {}
-        return self.__precio_cache
+        # El nombre no puede empezar por "__": hasattr no ve el atributo
+        # con name mangling y la caché se vaciaba en cada llamada
+        if not hasattr(self, '_cache_precios'):
+            self._cache_precios = {}
+        return self._cache_precios
 
     def _resolver_canal(self, request):
         """
@@ -0,0 +1,173 @@
+# checkouters/services/kpis_diarios.py
+"""
+Agregados diarios de KPIs (tabla checkouters_kpi_diario).
+
+Los KPIs del dashboard de manager (utils/utilskpis.py) leen los días cerrados
+de KpiDiario en lugar de recorrer Oportunidad/DispositivoReal/Historial en
+cada carga; el día en curso se sigue calculando en vivo.
+
+Cada fila agrega un "bucket" (día de creación, tienda, usuario, estado) por
+modelo. Ante cualquier cambio se recalculan enteros los buckets afectados
+(el anterior y el nuevo) desde las tablas base, así que el resultado es
+idempotente y no depende del orden de las señales.
+
+Sincronización:
+- Señales pre_save/post_save/post_delete de Oportunidad y DispositivoReal
+  (checkouters.signals)
+- Comando recalcular_kpis_diarios para reconstruir un rango de fechas
+  (p.ej. tras update() masivos que no disparan señales)
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from typing import Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models import DispositivoReal, KpiDiario, Oportunidad
+
+BULK_BATCH_SIZE = 1000
+
+DEC_ZERO = Decimal("0")
+_DEC = DecimalField(max_digits=24, decimal_places=6)
+
+# (fecha, tienda_id, usuario_id, estado)
+Bucket = Tuple[object, Optional[int], int, str]
+
+
+def inicio_dia(d) -> datetime:
+    """Inicio (aware, zona horaria local) del día d."""
+    return timezone.make_aware(datetime.combine(d, time.min))
+
+
+def bucket_de(fecha_creacion, tienda_id, usuario_id, estado) -> Bucket:
+    return (timezone.localdate(fecha_creacion), tienda_id, usuario_id, estado)
+
+
+def buckets_de_oportunidades(ids: Iterable[int]) -> set:
+    ids = {i for i in ids if i}
+    if not ids:
+        return set()
+    return {
+        bucket_de(o["fecha_creacion"], o["tienda_id"], o["usuario_id"], o["estado"])
+        for o in Oportunidad.objects.filter(id__in=ids).values("fecha_creacion", "tienda_id", "usuario_id", "estado")
+    }
+
+
+def filas_kpi(oportunidades) -> list:
+    """
+    Calcula (sin guardar) las filas KpiDiario de un queryset de oportunidades.
+
+    Cada oportunidad aporta ops=1 a su primera fila por modelo; las que no
+    tienen dispositivos reales aportan una fila con modelo vacío.
+    """
+    opps = {
+        o["id"]: bucket_de(o["fecha_creacion"], o["tienda_id"], o["usuario_id"], o["estado"])
+        for o in oportunidades.values("id", "fecha_creacion", "tienda_id", "usuario_id", "estado")
+    }
+    if not opps:
+        return []
+
+    dr = (DispositivoReal.objects
+          .filter(oportunidad_id__in=oportunidades.values("id"))
+          .values("oportunidad_id", "modelo_id")
+          .annotate(
+              valor=Coalesce(Sum("precio_final", output_field=_DEC), DEC_ZERO, output_field=_DEC),
+              valor_auditado=Coalesce(Sum("precio_final", filter=Q(auditado=True), output_field=_DEC), DEC_ZERO, output_field=_DEC),
+              dispositivos=Count("id"),
+          )
+          .order_by("oportunidad_id", "modelo_id"))
+
+    acc = {}
+    con_ops = set()
+
+    def _sumar(key, valor=DEC_ZERO, valor_auditado=DEC_ZERO, dispositivos=0, ops=0):
+        fila = acc.setdefault(key, [DEC_ZERO, DEC_ZERO, 0, 0])
+        fila[0] += valor
+        fila[1] += valor_auditado
+        fila[2] += dispositivos
+        fila[3] += ops
+
+    for r in dr:
+        opp_id = r["oportunidad_id"]
+        ops = 0 if opp_id in con_ops else 1
+        con_ops.add(opp_id)
+        _sumar(opps[opp_id] + (r["modelo_id"],), r["valor"], r["valor_auditado"], r["dispositivos"], ops)
+
+    for opp_id, bucket in opps.items():
+        if opp_id not in con_ops:
+            _sumar(bucket + (None,), ops=1)
+
+    return [
+        KpiDiario(
+            fecha=fecha, tienda_id=tienda_id, usuario_id=usuario_id, estado=estado, modelo_id=modelo_id,
+            valor=valor, valor_auditado=valor_auditado, dispositivos=dispositivos, ops=ops,
+        )
+        for (fecha, tienda_id, usuario_id, estado, modelo_id), (valor, valor_auditado, dispositivos, ops) in acc.items()
+    ]
+
+
+def recalcular_buckets(buckets: Iterable[Bucket]) -> int:
+    """
+    Recalcula desde las tablas base las filas de los buckets indicados.
+
+    Returns:
+        Número de filas KpiDiario escritas
+    """
+    buckets = set(buckets)
+    if not buckets:
+        return 0
+
+    q_opps = Q()
+    q_filas = Q()
+    for fecha, tienda_id, usuario_id, estado in buckets:
+        q_opps |= Q(
+            fecha_creacion__gte=inicio_dia(fecha),
+            fecha_creacion__lt=inicio_dia(fecha + timedelta(days=1)),
+            tienda_id=tienda_id, usuario_id=usuario_id, estado=estado,
+        )
+        q_filas |= Q(fecha=fecha, tienda_id=tienda_id, usuario_id=usuario_id, estado=estado)
+
+    with transaction.atomic():
+        filas = filas_kpi(Oportunidad.objects.filter(q_opps))
+        KpiDiario.objects.filter(q_filas).delete()
+        KpiDiario.objects.bulk_create(filas, batch_size=BULK_BATCH_SIZE)
+    return len(filas)
+
+
+def reconstruir_kpis(desde=None, hasta=None) -> int:
+    """
+    Reconstruye KpiDiario para los días [desde, hasta] (todo si no se indican).
+
+    Returns:
+        Número de filas KpiDiario escritas
+    """
+    opps = Oportunidad.objects.all()
+    filas_qs = KpiDiario.objects.all()
+    if desde:
+        opps = opps.filter(fecha_creacion__gte=inicio_dia(desde))
+        filas_qs = filas_qs.filter(fecha__gte=desde)
+    if hasta:
+        opps = opps.filter(fecha_creacion__lt=inicio_dia(hasta + timedelta(days=1)))
+        filas_qs = filas_qs.filter(fecha__lte=hasta)
+
+    with transaction.atomic():
+        filas = filas_kpi(opps)
+        filas_qs.delete()
+        KpiDiario.objects.bulk_create(filas, batch_size=BULK_BATCH_SIZE)
+    return len(filas)
+
+
+def bucket_anterior(instance) -> Optional[Bucket]:
+    """Bucket guardado en BD para una oportunidad (antes de un save)."""
+    if not instance.pk:
+        return None
+    row = (Oportunidad.objects
+           .filter(pk=instance.pk)
+           .values("fecha_creacion", "tienda_id", "usuario_id", "estado")
+           .first())
+    if not row:
+        return None
+    return bucket_de(row["fecha_creacion"], row["tienda_id"], row["usuario_id"], row["estado"])
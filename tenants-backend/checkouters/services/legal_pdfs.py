@@ -1,10 +1,19 @@
-from django.template.loader import render_to_string
+from django.template.loader import get_template, render_to_string
 from weasyprint import HTML
 from io import BytesIO
 from hashlib import sha256
+import hashlib
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.utils import timezone
 from django.conf import settings
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from checkouters.services import pdf_cache
+from checkouters.utils.pdf import generar_pdf_contrato
 import io
 # pypdf (fallback a PyPDF2 si no está)
 try:
@@ -15,22 +24,46 @@ except Exception:
     except Exception:
         PdfReader = PdfWriter = None
 
+
+def _empresa_legal() -> dict:
+    # LEGAL_COMPANY_* si están definidos; si no, el operador de LEGAL_DEFAULT_OVERRIDES
+    operador = (getattr(settings, "LEGAL_DEFAULT_OVERRIDES", None) or {}).get("operador", {})
+    return {
+        "nombre": getattr(settings, "LEGAL_COMPANY_NAME", operador.get("nombre", "")),
+        "cif":     getattr(settings, "LEGAL_COMPANY_TAXID", operador.get("cif", "")),
+        "direccion": getattr(settings, "LEGAL_COMPANY_ADDRESS", operador.get("direccion", "")),
+        "email":   getattr(settings, "LEGAL_SUPPORT_EMAIL", operador.get("email", "")),
+        "telefono": getattr(settings, "LEGAL_SUPPORT_PHONE", operador.get("telefono", "")),
+    }
+
+
+def html_a_pdf(html: str) -> bytes:
+    return HTML(string=html, base_url=str(settings.BASE_DIR)).write_pdf()
+
+
 def build_condiciones_b2c_pdf(tenant, version="v1.3", lang="es", extra_ctx=None):
+    """
+    PDF de condiciones B2C del tenant. Es un documento estático: weasyprint
+    solo se ejecuta una vez por (tenant, versión, idioma, plantilla) y el resto
+    de peticiones lo sirven desde la caché de PDFs; la fecha impresa es la de
+    ese primer render.
+    """
     tpl = f"legal/condiciones_b2c_{version.replace('.','_')}_{lang}.html"
     ctx = {
         "tenant": {"slug": tenant.schema_name, "nombre": tenant.name},
-        "empresa": {
-            "nombre": settings.LEGAL_COMPANY_NAME,
-            "cif":     settings.LEGAL_COMPANY_TAXID,
-            "direccion": settings.LEGAL_COMPANY_ADDRESS,
-            "email":   settings.LEGAL_SUPPORT_EMAIL,
-            "telefono": settings.LEGAL_SUPPORT_PHONE,
-        },
-        "hoy": timezone.localdate().strftime("%d/%m/%Y"),
+        "empresa": _empresa_legal(),
         **(extra_ctx or {}),
     }
-    html = render_to_string(tpl, ctx)
-    pdf_bytes = HTML(string=html, base_url=settings.BASE_DIR).write_pdf()
+    instantanea = {
+        "plantilla": [tpl, pdf_cache.version_fichero(get_template(tpl).origin.name)],
+        "ctx": ctx,
+    }
+    clave = pdf_cache.clave("condiciones_b2c", instantanea)
+    pdf_bytes = pdf_cache.leer("condiciones_b2c", clave)
+    if pdf_bytes is None:
+        html = render_to_string(tpl, {"hoy": timezone.localdate().strftime("%d/%m/%Y"), **ctx})
+        pdf_bytes = pdf_cache.renderizar(html_a_pdf, html)
+        pdf_cache.guardar("condiciones_b2c", clave, pdf_bytes)
     digest = sha256(pdf_bytes).hexdigest()
     path = f"legal/condiciones-b2c/{tenant.schema_name}/{version}/condiciones-b2c-{version}-{lang}-{digest[:8]}.pdf"
     if not default_storage.exists(path):
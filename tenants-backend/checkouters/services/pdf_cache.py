@@ -0,0 +1,255 @@
+"""
+Caché de PDFs por contenido y pool de procesos para renderizarlos.
+
+Las ofertas, la vista previa del contrato y las condiciones B2C se volvían a
+generar en cada petición (ReportLab/weasyprint en el hilo del worker web,
+cientos de ms por documento). Aquí:
+
+- La clave es el sha256 de una instantánea JSON de todo lo que entra en el
+  documento (datos, branding del tenant, versión del código/plantilla):
+  mismo contenido → mismo fichero, sin invalidaciones explícitas
+- Los PDF se guardan en el almacenamiento privado, en
+  pdf-cache/<schema>/<tipo>/<hh>/<clave>.pdf
+- Los fallos de caché se renderizan en un ProcessPoolExecutor acotado
+  (PDF_RENDER_WORKERS procesos; 0 = en el propio proceso)
+- renderizar_y_avisar() genera en segundo plano y avisa al usuario con una
+  notificación que enlaza a la descarga (lotes grandes)
+
+`manage.py limpiar_cache_pdf --dias N` borra lo que lleve N días sin usarse.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection
+from django.urls import reverse
+from django_tenants.utils import schema_context
+
+from checkouters.storage_backends import PrivateFileSystemStorage
+
+logger = logging.getLogger(__name__)
+
+# Subir si cambia la forma de las instantáneas
+VERSION = "1"
+TIPOS = ("oportunidad", "oferta_formal", "contrato_preview", "condiciones_b2c")
+_CLAVE_RE = re.compile(r"^[0-9a-f]{64}$")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _workers() -> int:
+    return getattr(settings, "PDF_RENDER_WORKERS", 2)
+
+
+# ---------------------------------------------------------------------------
+# Claves
+# ---------------------------------------------------------------------------
+
+def valores(obj) -> Optional[dict]:
+    """Valores de los campos concretos de una instancia, para instantáneas."""
+    if obj is None:
+        return None
+    return {f.attname: getattr(obj, f.attname) for f in obj._meta.concrete_fields}
+
+
+@lru_cache(maxsize=None)
+def version_fichero(ruta) -> str:
+    """Huella del contenido de un fichero de código o plantilla."""
+    try:
+        with open(ruta, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+    except OSError:
+        return ""
+
+
+def clave(tipo, instantanea) -> str:
+    datos = json.dumps([VERSION, tipo, instantanea], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(datos.encode()).hexdigest()
+
+
+def clave_valida(tipo, valor) -> bool:
+    return tipo in TIPOS and bool(_CLAVE_RE.match(valor or ""))
+
+
+# ---------------------------------------------------------------------------
+# Almacenamiento
+# ---------------------------------------------------------------------------
+
+def _storage():
+    return PrivateFileSystemStorage()
+
+
+def ruta(tipo, valor, schema=None) -> str:
+    schema = schema or connection.schema_name
+    return f"pdf-cache/{schema}/{tipo}/{valor[:2]}/{valor}.pdf"
+
+
+def leer(tipo, valor) -> Optional[bytes]:
+    """PDF cacheado o None."""
+    path = _storage().path(ruta(tipo, valor))
+    try:
+        with open(path, "rb") as f:
+            pdf = f.read()
+    except FileNotFoundError:
+        return None
+    # La fecha de acceso marca qué está en uso para limpiar_cache_pdf
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return pdf
+
+
+def guardar(tipo, valor, pdf) -> None:
+    # Escritura atómica: dos renders concurrentes de la misma clave no se pisan
+    path = _storage().path(ruta(tipo, valor))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporal = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(pdf)
+    os.replace(temporal, path)
+
+
+def purgar(dias) -> int:
+    """Borra los PDF cacheados sin usar en `dias` días. Devuelve cuántos."""
+    base = _storage().path("pdf-cache")
+    limite = time.time() - dias * 86400
+    borrados = 0
+    for raiz, _, ficheros in os.walk(base):
+        for nombre in ficheros:
+            path = os.path.join(raiz, nombre)
+            try:
+                if os.path.getmtime(path) < limite:
+                    os.remove(path)
+                    borrados += 1
+            except OSError:
+                continue
+    return borrados
+
+
+# ---------------------------------------------------------------------------
+# Render
+# ---------------------------------------------------------------------------
+
+def _iniciar_proceso():
+    import django
+
+    django.setup()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: un fork heredaría conexiones y hilos del worker web
+            _pool = ProcessPoolExecutor(
+                max_workers=_workers(),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_iniciar_proceso,
+            )
+        return _pool
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, _workers()), thread_name_prefix="pdf-render")
+        return _executor
+
+
+def _en_proceso(funcion, schema, args, kwargs) -> bytes:
+    try:
+        with schema_context(schema):
+            return funcion(*args, **kwargs)
+    finally:
+        connection.close()
+
+
+def renderizar(funcion, *args, **kwargs) -> bytes:
+    """
+    Ejecuta funcion(*args, **kwargs) → bytes en el pool de procesos, en el
+    schema actual. `funcion` y los argumentos tienen que poder serializarse
+    con pickle (funciones de módulo e instancias de modelos).
+    """
+    global _pool
+    if _workers() <= 0:
+        return funcion(*args, **kwargs)
+    try:
+        futuro = _get_pool().submit(_en_proceso, funcion, connection.schema_name, args, kwargs)
+        return futuro.result(timeout=getattr(settings, "PDF_RENDER_TIMEOUT", 120))
+    except BrokenProcessPool:
+        logger.exception("[PDF] pool de render roto; renderizando en el proceso")
+        with _pool_lock:
+            _pool = None
+        return funcion(*args, **kwargs)
+
+
+def obtener_o_renderizar(tipo, instantanea, funcion, *args, **kwargs):
+    """
+    PDF de la caché o, si no está, renderizado y guardado.
+
+    Returns:
+        (bytes, clave)
+    """
+    valor = clave(tipo, instantanea)
+    pdf = leer(tipo, valor)
+    if pdf is None:
+        inicio = time.monotonic()
+        pdf = renderizar(funcion, *args, **kwargs)
+        guardar(tipo, valor, pdf)
+        logger.info("[PDF] %s %s renderizado en %.2fs", tipo, valor[:12], time.monotonic() - inicio)
+    return pdf, valor
+
+
+def url_descarga(tipo, valor) -> str:
+    return reverse("descargar_pdf_cacheado", kwargs={"tipo": tipo, "clave": valor})
+
+
+def renderizar_y_avisar(tipo, instantanea, usuario_id, mensaje, funcion, *args, **kwargs) -> str:
+    """
+    Genera el PDF en segundo plano y, cuando está en caché, notifica al
+    usuario con el enlace de descarga. Con PDF_RENDER_WORKERS=0 todo se hace
+    en el propio proceso, también esto (antes de devolver).
+
+    Returns:
+        Clave del PDF (la descarga es url_descarga(tipo, clave))
+    """
+    valor = clave(tipo, instantanea)
+    tarea = (connection.schema_name, tipo, valor, usuario_id, mensaje, funcion, args, kwargs)
+    if _workers() <= 0:
+        _generar_y_avisar(*tarea)
+    else:
+        _get_executor().submit(_generar_y_avisar_en_hilo, *tarea)
+    return valor
+
+
+def _generar_y_avisar(schema, tipo, valor, usuario_id, mensaje, funcion, args, kwargs):
+    from notificaciones.outbox import encolar
+
+    with schema_context(schema):
+        if leer(tipo, valor) is None:
+            guardar(tipo, valor, renderizar(funcion, *args, **kwargs))
+        encolar(usuario_id, mensaje, tipo="otro", url=url_descarga(tipo, valor), schema=schema)
+
+
+def _generar_y_avisar_en_hilo(*tarea):
+    try:
+        _generar_y_avisar(*tarea)
+    except Exception:
+        logger.exception("[PDF] Error generando %s %s en segundo plano", tarea[1], tarea[2][:12])
+    finally:
+        connection.close()
@@ -1,7 +1,9 @@
-
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from .models.oportunidad import Oportunidad, HistorialOportunidad, ComentarioOportunidad
+from .models.dispositivo import DispositivoReal
+from .services import kpis_diarios
+from progeek.analitica import programar_captura
 
 @receiver(post_save, sender=Oportunidad)
 def registrar_creacion_oportunidad(sender, instance, created, **kwargs):
@@ -21,4 +23,94 @@ def registrar_comentario(sender, instance, created, **kwargs):
             tipo_evento="comentario",
             descripcion=f"Nuevo comentario: {instance.texto[:80]}",
             usuario=instance.autor
-        )
\ No newline at end of file
+        )
+
+
+# --- Agregados diarios de KPIs (KpiDiario) ---
+
+KPI_CAMPOS_OPORTUNIDAD = {"estado", "tienda", "tienda_id", "usuario", "usuario_id", "fecha_creacion"}
+KPI_CAMPOS_DISPOSITIVO = {"oportunidad", "oportunidad_id", "modelo", "modelo_id", "precio_final", "auditado"}
+
+
+def _afecta_kpis(update_fields, campos):
+    return update_fields is None or bool(set(update_fields) & campos)
+
+
+@receiver(pre_save, sender=Oportunidad)
+def kpis_recordar_bucket_oportunidad(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not _afecta_kpis(update_fields, KPI_CAMPOS_OPORTUNIDAD):
+        return
+    instance._kpi_bucket_anterior = kpis_diarios.bucket_anterior(instance)
+
+
+@receiver(post_save, sender=Oportunidad)
+def kpis_actualizar_oportunidad(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not _afecta_kpis(update_fields, KPI_CAMPOS_OPORTUNIDAD):
+        return
+    anterior = getattr(instance, "_kpi_bucket_anterior", None)
+    nuevo = kpis_diarios.bucket_de(instance.fecha_creacion, instance.tienda_id, instance.usuario_id, instance.estado)
+    if not created and anterior == nuevo:
+        return
+    kpis_diarios.recalcular_buckets({nuevo, anterior} - {None})
+
+
+@receiver(pre_delete, sender=Oportunidad)
+def kpis_recordar_bucket_borrado(sender, instance, **kwargs):
+    instance._kpi_bucket_anterior = kpis_diarios.bucket_anterior(instance)
+
+
+@receiver(post_delete, sender=Oportunidad)
+def kpis_borrar_oportunidad(sender, instance, **kwargs):
+    kpis_diarios.recalcular_buckets({getattr(instance, "_kpi_bucket_anterior", None)} - {None})
+
+
+@receiver(pre_save, sender=DispositivoReal)
+def kpis_recordar_dispositivo(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not instance.pk or not _afecta_kpis(update_fields, KPI_CAMPOS_DISPOSITIVO):
+        return
+    instance._kpi_anterior = (DispositivoReal.objects
+                              .filter(pk=instance.pk)
+                              .values_list("oportunidad_id", "modelo_id", "precio_final", "auditado")
+                              .first())
+
+
+@receiver(post_save, sender=DispositivoReal)
+def kpis_actualizar_dispositivo(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not _afecta_kpis(update_fields, KPI_CAMPOS_DISPOSITIVO):
+        return
+    anterior = getattr(instance, "_kpi_anterior", None)
+    actual = (instance.oportunidad_id, instance.modelo_id, instance.precio_final, instance.auditado)
+    if not created and anterior == actual:
+        return
+    opp_ids = {instance.oportunidad_id, anterior[0] if anterior else None}
+    kpis_diarios.recalcular_buckets(kpis_diarios.buckets_de_oportunidades(opp_ids))
+
+
+@receiver(post_delete, sender=DispositivoReal)
+def kpis_borrar_dispositivo(sender, instance, **kwargs):
+    # Si se borra en cascada con su oportunidad, ya la recalcula kpis_borrar_oportunidad
+    kpis_diarios.recalcular_buckets(kpis_diarios.buckets_de_oportunidades({instance.oportunidad_id}))
+
+
+# --- Analítica global en public (progeek/analitica.py) ---
+
+@receiver(post_save, sender=Oportunidad)
+@receiver(post_delete, sender=Oportunidad)
+def analitica_oportunidad(sender, instance, raw=False, **kwargs):
+    if not raw:
+        programar_captura(instance.pk)
+
+
+@receiver(post_save, sender=DispositivoReal)
+@receiver(post_delete, sender=DispositivoReal)
+def analitica_dispositivo(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, "_kpi_anterior", None)
+    programar_captura(instance.oportunidad_id, anterior[0] if anterior else None)
+
+
+@receiver(post_save, sender=HistorialOportunidad)
+def analitica_historial(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        programar_captura(instance.oportunidad_id)
@@ -0,0 +1,195 @@
+import pytest
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_tenants.utils import schema_context
+
+User = get_user_model()
+
+FACTURA_ADELANTE = {"Factura recibida", "Pendiente de pago", "Pagado"}
+
+
+@pytest.fixture
+def tenant_kpis(db, create_tenant):
+    owner = User.objects.create_user(email="owner@kpis.com", password="x")
+    comerciales = [User.objects.create_user(email=f"c{i}@kpis.com", password="x", name=f"Comercial {i}") for i in (1, 2)]
+    tenant = create_tenant(owner, "kpis")
+    with schema_context(tenant.schema_name):
+        yield comerciales
+
+
+def _escenario(comerciales, n=1):
+    """n tandas de oportunidades repartidas en los últimos 40 días y hoy."""
+    from checkouters.models import Cliente, DispositivoReal, Oportunidad, Tienda
+    from productos.models import Modelo
+
+    cliente = Cliente.objects.create(razon_social="ACME", tipo_cliente="empresa", canal="b2b")
+    tiendas = [Tienda.objects.create(nombre=f"Tienda {i}") for i in (1, 2)]
+    modelos = [Modelo.objects.create(descripcion=f"iPhone {i}", tipo="iPhone", marca="Apple") for i in (13, 14)]
+    estados = ["Pagado", "Factura recibida", "Pendiente", "En revisión", "Rechazada"]
+
+    hoy = timezone.localtime()
+    opps = []
+    for k in range(n * 10):
+        opp = Oportunidad.objects.create(
+            cliente=cliente, usuario=comerciales[k // 5 % 2], tienda=tiendas[k % 3 % 2], estado=estados[k % 5],
+        )
+        for j in range(k % 3):
+            DispositivoReal.objects.create(
+                oportunidad=opp, modelo=modelos[j % 2], precio_final=Decimal(100 + 10 * k + j), auditado=bool(j),
+            )
+        dias = 0 if k % 4 == 0 else k * 4 % 40 + 1
+        Oportunidad.objects.filter(pk=opp.pk).update(fecha_creacion=hoy - timedelta(days=dias))
+        opps.append(opp)
+    return opps
+
+
+def _collect(desde, hasta):
+    from checkouters.kpimanager.dashboard_manager_serializers import DashboardManagerSerializer
+
+    return DashboardManagerSerializer.collect(
+        request=None,
+        fecha_inicio=timezone.make_aware(datetime.combine(desde, time.min)),
+        fecha_fin=timezone.make_aware(datetime.combine(hasta, time.max)),
+        granularidad="semana",
+        filtros={},
+        opciones={"comparar": True, "estados_factura_adelante": FACTURA_ADELANTE},
+    )
+
+
+def _snapshot():
+    from checkouters.models import KpiDiario
+
+    return sorted(
+        KpiDiario.objects.values_list("fecha", "tienda_id", "usuario_id", "estado", "modelo_id", "valor", "valor_auditado", "dispositivos", "ops")
+    )
+
+
+@pytest.mark.django_db
+def test_kpis_diarios_incrementales_y_dashboard(tenant_kpis):
+    """Las señales dejan KpiDiario igual que una reconstrucción y los KPIs cuadran con el cálculo en vivo"""
+    from checkouters.models import DispositivoReal, Oportunidad
+    from checkouters.services.kpis_diarios import reconstruir_kpis
+    from checkouters.utils import utilskpis as kpis
+
+    opps = _escenario(tenant_kpis)
+    # update() no dispara señales: la reconstrucción recoge las fechas movidas
+    reconstruir_kpis()
+    hoy = timezone.localdate()
+    antes = _collect(hoy - timedelta(days=60), hoy)
+
+    # Cambios de estado y de dispositivos de días pasados, vía señales
+    pasada = next(o for o in opps if timezone.localdate(Oportunidad.objects.get(pk=o.pk).fecha_creacion) < hoy)
+    pasada.refresh_from_db()
+    pasada.estado = "Pagado"
+    pasada.save()
+    dr = DispositivoReal.objects.create(oportunidad=pasada, precio_final=Decimal("55.00"))
+    dr.precio_final = Decimal("65.00")
+    dr.save()
+    DispositivoReal.objects.filter(oportunidad=opps[1]).first().delete()
+    opps[2].delete()
+
+    incremental = _snapshot()
+    reconstruir_kpis()
+    assert _snapshot() == incremental
+
+    despues = _collect(hoy - timedelta(days=60), hoy)
+    assert despues != antes
+
+    # Mismo resultado que el cálculo en vivo sobre DispositivoReal
+    fi = timezone.make_aware(datetime.combine(hoy - timedelta(days=60), time.min))
+    ff = timezone.make_aware(datetime.combine(hoy, time.max))
+    vivo = kpis._base_qs(fi, ff, {}, {"estados_factura_adelante": FACTURA_ADELANTE})
+    assert despues["resumen"]["valor_total"] == sum(d.precio_final for d in vivo)
+    ops = vivo.values("oportunidad_id").distinct().count()
+    assert despues["resumen"]["ticket_medio"] == despues["resumen"]["valor_total"] / ops
+    assert sum(p["valor"] for p in despues["evolucion"]) == despues["resumen"]["valor_total"]
+    assert sum(r["ops"] for r in despues["rankings"]["tiendas_por_operaciones"]) == ops
+    assert {r["nombre"] for r in despues["rankings"]["usuarios_por_valor"]} == {"Comercial 1", "Comercial 2"}
+
+    abiertas = Oportunidad.objects.filter(estado__in=kpis.PIPELINE_ESTADOS)
+    assert despues["pipeline"]["abiertas"] == sum(
+        abiertas.filter(estado=e).count() for e in kpis.PIPELINE_ESTADOS
+    )
+    assert despues["operativa"]["recibidas"] == Oportunidad.objects.filter(fecha_creacion__range=[fi, ff]).count()
+    assert despues["operativa"]["rechazos"]["total"] == Oportunidad.objects.filter(estado="Rechazada").count()
+
+
+@pytest.mark.django_db
+def test_dashboard_un_anio_no_crece_con_los_datos(tenant_kpis):
+    """El número de queries del dashboard no depende del volumen de oportunidades"""
+    hoy = timezone.localdate()
+    _escenario(tenant_kpis, n=1)
+
+    def _queries():
+        with CaptureQueriesContext(connection) as ctx:
+            _collect(hoy - timedelta(days=365), hoy)
+        return len([q for q in ctx.captured_queries if "search_path" not in q["sql"]])
+
+    pocas = _queries()
+    _escenario(tenant_kpis, n=3)
+    assert _queries() == pocas
+    # rollup + tramo en vivo (2) + nombres (3) + pipeline + operativa
+    assert pocas <= 8
+
+
+def test_tramos():
+    """Días completos anteriores a hoy salen de KpiDiario; bordes parciales y hoy, en vivo"""
+    from checkouters.utils.utilskpis import _tramos
+
+    hoy = timezone.localdate()
+    inicio = lambda d: timezone.make_aware(datetime.combine(d, time.min))
+    fin = lambda d: timezone.make_aware(datetime.combine(d, time.max))
+
+    dias, vivo = _tramos(inicio(hoy - timedelta(days=30)), fin(hoy - timedelta(days=1)))
+    assert dias == (hoy - timedelta(days=30), hoy - timedelta(days=1)) and vivo is None
+
+    dias, vivo = _tramos(inicio(hoy - timedelta(days=30)), fin(hoy))
+    assert dias == (hoy - timedelta(days=30), hoy - timedelta(days=1)) and vivo is not None
+
+    dias, vivo = _tramos(inicio(hoy - timedelta(days=5)) + timedelta(hours=12), inicio(hoy - timedelta(days=1)))
+    assert dias == (hoy - timedelta(days=4), hoy - timedelta(days=2))
+    assert len(vivo.children) == 2
+
+    dias, vivo = _tramos(inicio(hoy), fin(hoy))
+    assert dias is None and vivo is not None
+
+
+@pytest.mark.django_db
+def test_plan_kpis_ambito_y_periodo_anterior(tenant_kpis):
+    """El plan aplica el ámbito de rol a todas las métricas y compara con el periodo anterior"""
+    from checkouters.models import Tienda
+    from checkouters.services.kpis_diarios import reconstruir_kpis
+    from checkouters.utils.role_filters import AmbitoRol
+    from checkouters.utils.utilskpis import PlanKpis
+
+    _escenario(tenant_kpis, n=2)
+    reconstruir_kpis()
+    hoy = timezone.localdate()
+    tienda = Tienda.objects.get(nombre="Tienda 2")
+    opciones = {"comparar": True, "estados_factura_adelante": FACTURA_ADELANTE}
+
+    def _plan(desde, hasta, **kwargs):
+        return PlanKpis(
+            timezone.make_aware(datetime.combine(desde, time.min)),
+            timezone.make_aware(datetime.combine(hasta, time.max)),
+            {}, opciones, granularidad="dia", **kwargs,
+        )
+
+    def _vivo(plan):
+        return sum(d.precio_final for d in plan.dispositivos(FACTURA_ADELANTE))
+
+    plan = _plan(hoy - timedelta(days=14), hoy)
+    acotado = _plan(hoy - timedelta(days=14), hoy, ambito=AmbitoRol(tienda_ids=(tienda.id,)))
+    assert 0 < acotado.valor_total() == _vivo(acotado) < plan.valor_total()
+    assert {r["tienda_id"] for r in acotado.ranking("tienda")} == {tienda.id}
+    assert acotado.pipeline()["abiertas"] < plan.pipeline()["abiertas"]
+
+    # Periodo anterior: mismo número de días, terminando el día antes del inicio
+    fin_ant = timezone.make_aware(datetime.combine(hoy - timedelta(days=15), time.min))
+    anterior = PlanKpis(fin_ant - timedelta(days=14), fin_ant, {}, opciones, granularidad="dia")
+    assert plan.comparativa()["anterior"] == anterior.valor_total() == _vivo(anterior)
+    assert plan.comparativa()["actual"] == plan.valor_total() == _vivo(plan)
@@ -0,0 +1,141 @@
+import pytest
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django_tenants.utils import schema_context
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+User = get_user_model()
+
+# Oportunidades + comentarios + dispositivos + facturas + precio por capacidad
+QUERIES_LISTADO = 5
+
+
+@pytest.fixture
+def tenant_listado(db, create_tenant):
+    owner = User.objects.create_user(email="owner@listado.com", password="x")
+    comercial = User.objects.create_user(email="c@listado.com", password="x", name="Comercial")
+    tenant = create_tenant(owner, "listado")
+    with schema_context(tenant.schema_name):
+        yield comercial
+
+
+def _escenario(usuario, n):
+    from checkouters.models import Cliente, ComentarioOportunidad, Dispositivo, DispositivoReal, Documento, Oportunidad, Tienda
+    from productos.models import Capacidad, Modelo
+
+    cliente = Cliente.objects.create(razon_social="ACME", tipo_cliente="empresa", canal="b2b")
+    tienda = Tienda.objects.create(nombre="Tienda")
+    modelo = Modelo.objects.create(descripcion="iPhone 13", tipo="iPhone", marca="Apple")
+    capacidad = Capacidad.objects.create(modelo=modelo, tamaño="128 GB")
+    for k in range(n):
+        opp = Oportunidad.objects.create(cliente=cliente, usuario=usuario, tienda=tienda, estado="Pendiente")
+        for j in range(k % 3):
+            Dispositivo.objects.create(
+                oportunidad=opp, usuario=usuario, modelo=modelo, capacidad=capacidad, tipo="iPhone",
+                precio_orientativo=Decimal(100 + j), cantidad=j + 1,
+            )
+            DispositivoReal.objects.create(oportunidad=opp, modelo=modelo, precio_final=Decimal(90 + j))
+        ComentarioOportunidad.objects.create(oportunidad=opp, texto="Hola", autor=usuario)
+        Documento.objects.create(oportunidad=opp, archivo=f"facturas/{k}.pdf", tipo="factura")
+        Documento.objects.create(oportunidad=opp, archivo=f"otros/{k}.pdf", tipo="otro")
+
+
+def _contexto():
+    return {"request": Request(APIRequestFactory().get("/oportunidades/"))}
+
+
+def _listar(page_size):
+    from checkouters.models import Oportunidad
+    from checkouters.serializers import OportunidadSerializer
+
+    with CaptureQueriesContext(connection) as ctx:
+        qs = OportunidadSerializer.preparar_listado(Oportunidad.objects.order_by("-fecha_creacion"))
+        data = OportunidadSerializer(qs[:page_size], many=True, context=_contexto()).data
+    return data, len([q for q in ctx.captured_queries if "search_path" not in q["sql"]])
+
+
+@pytest.mark.django_db
+def test_listado_oportunidades_queries_constantes(tenant_listado):
+    """El número de queries del listado no depende del tamaño de página"""
+    _escenario(tenant_listado, 30)
+
+    pequena, queries_pequena = _listar(5)
+    grande, queries_grande = _listar(30)
+    assert len(pequena) == 5 and len(grande) == 30
+    assert queries_pequena == queries_grande == QUERIES_LISTADO
+
+
+@pytest.mark.django_db
+def test_listado_oportunidades_igual_que_detalle(tenant_listado):
+    """Los totales anotados y las facturas precargadas coinciden con el cálculo por fila"""
+    from checkouters.models import Oportunidad
+    from checkouters.serializers import OportunidadSerializer
+
+    _escenario(tenant_listado, 6)
+    listado, _ = _listar(6)
+    for fila in listado:
+        detalle = OportunidadSerializer(Oportunidad.objects.get(pk=fila["id"]), context=_contexto()).data
+        for campo in ("valor_total", "valor_total_final", "hashid"):
+            assert fila[campo] == detalle[campo], campo
+        for campo in ("facturas", "dispositivos", "comentarios"):
+            assert sorted(fila[campo], key=lambda x: x["id"]) == sorted(detalle[campo], key=lambda x: x["id"]), campo
+    assert {len(f["facturas"]) for f in listado} == {1}
+    assert sorted(f["valor_total"] for f in listado) == [0.0, 0.0, 100.0, 100.0, 302.0, 302.0]
+
+
+def _superadmin(**rol):
+    from progeek.models import UserGlobalRole
+
+    with schema_context("public"):
+        user = User.objects.create_user(email=f"admin{len(rol)}@listado.com", password="x")
+        UserGlobalRole.objects.create(user=user, **rol)
+        return User.objects.select_related("global_role").get(pk=user.pk)
+
+
+def _get(vista, usuario, url):
+    from django.core.cache import cache
+    from rest_framework.test import force_authenticate
+
+    cache.clear()  # el total del listado se cachea unos segundos
+    request = APIRequestFactory().get(url)
+    force_authenticate(request, user=usuario)
+    with CaptureQueriesContext(connection) as ctx:
+        response = vista(request)
+        response.render()
+    assert response.status_code == 200, response.data
+    return response.data, len([q for q in ctx.captured_queries if "search_path" not in q["sql"]])
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("params", ["page_size={n}", "pageIndex=0&pageSize={n}"], ids=["keyset", "tanstack"])
+def test_viewset_listado_queries_constantes(tenant_listado, params):
+    """OportunidadViewSet.list no hace queries por fila en ninguna de sus ramas"""
+    from checkouters.views.oportunidad import OportunidadViewSet
+
+    _escenario(tenant_listado, 30)
+    admin = _superadmin(es_superadmin=True)
+    vista = OportunidadViewSet.as_view({"get": "list"})
+
+    pequena, queries_pequena = _get(vista, admin, "/oportunidades/?" + params.format(n=5))
+    grande, queries_grande = _get(vista, admin, "/oportunidades/?" + params.format(n=30))
+    assert len(pequena["results"]) == 5 and len(grande["results"]) == 30
+    assert queries_pequena == queries_grande
+
+
+@pytest.mark.django_db
+def test_listado_global_queries_constantes(tenant_listado):
+    """OportunidadesGlobalesView no hace queries por oportunidad"""
+    from progeek.views import OportunidadesGlobalesView
+
+    interno = _superadmin(es_empleado_interno=True)
+    vista = OportunidadesGlobalesView.as_view()
+
+    _escenario(tenant_listado, 5)
+    pocas, queries_pocas = _get(vista, interno, "/oportunidades-globales/?limit=100")
+    _escenario(tenant_listado, 25)
+    muchas, queries_muchas = _get(vista, interno, "/oportunidades-globales/?limit=100")
+    assert pocas["total"] == 5 and muchas["total"] == 30
+    assert queries_pocas == queries_muchas
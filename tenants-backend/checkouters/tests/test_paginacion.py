@@ -0,0 +1,132 @@
+import pytest
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_tenants.utils import schema_context
+
+User = get_user_model()
+
+ORDEN = ("-fecha_creacion", "-id")
+
+
+@pytest.fixture
+def tenant_paginacion(db, create_tenant):
+    owner = User.objects.create_user(email="owner@paginacion.com", password="x")
+    tenant = create_tenant(owner, "paginacion")
+    cache.clear()
+    with schema_context(tenant.schema_name):
+        yield owner
+
+
+def _escenario(usuario, n):
+    """n oportunidades; de tres en tres comparten fecha_creacion (empates en la clave)."""
+    from checkouters.models import Cliente, Oportunidad
+
+    cliente = Cliente.objects.create(razon_social="ACME", tipo_cliente="empresa", canal="b2b")
+    ahora = timezone.now()
+    for k in range(n):
+        opp = Oportunidad.objects.create(cliente=cliente, usuario=usuario, estado="Pendiente")
+        Oportunidad.objects.filter(pk=opp.pk).update(fecha_creacion=ahora - timedelta(minutes=k // 3))
+    return Oportunidad.objects.all()
+
+
+def _queries(fn):
+    with CaptureQueriesContext(connection) as ctx:
+        resultado = fn()
+    return resultado, len([q for q in ctx.captured_queries if "search_path" not in q["sql"]])
+
+
+@pytest.mark.django_db
+def test_keyset_recorre_todo_en_orden_con_empates(tenant_paginacion):
+    """Adelante y atrás por cursor se ve cada fila una vez y en el mismo orden que con OFFSET"""
+    from checkouters.utils.paginacion import paginar_keyset
+
+    qs = _escenario(tenant_paginacion, 23)
+    esperado = list(qs.order_by(*ORDEN).values_list("id", flat=True))
+
+    vistos, cursores, cursor = [], [], None
+    while True:
+        filas, siguiente, anterior = paginar_keyset(qs, ORDEN, 5, cursor=cursor)
+        vistos += [o.id for o in filas]
+        cursores.append(anterior)
+        if not siguiente:
+            break
+        cursor = siguiente
+    assert vistos == esperado
+    assert cursores[0] is None and all(cursores[1:])
+
+    # Hacia atrás desde la última página
+    pagina_atras, _, anterior = paginar_keyset(qs, ORDEN, 5, cursor=cursores[-1])
+    assert [o.id for o in pagina_atras] == esperado[15:20]
+    primera, siguiente, anterior = paginar_keyset(qs, ORDEN, 10, cursor=paginar_keyset(qs, ORDEN, 10, pagina=1)[2])
+    assert [o.id for o in primera] == esperado[:10] and anterior is None and siguiente
+
+    # Las primeras páginas siguen disponibles por OFFSET
+    filas, _, _ = paginar_keyset(qs, ORDEN, 5, pagina=2)
+    assert [o.id for o in filas] == esperado[10:15]
+
+
+@pytest.mark.django_db
+def test_keyset_pagina_profunda_cuesta_lo_mismo(tenant_paginacion):
+    """Una página profunda por cursor es una sola query, como la primera"""
+    from checkouters.utils.paginacion import paginar_keyset
+
+    qs = _escenario(tenant_paginacion, 40)
+    (_, cursor, _), primera = _queries(lambda: paginar_keyset(qs, ORDEN, 5))
+    for _ in range(6):
+        _, cursor, _ = paginar_keyset(qs, ORDEN, 5, cursor=cursor)
+    (filas, _, _), profunda = _queries(lambda: paginar_keyset(qs, ORDEN, 5, cursor=cursor))
+    assert primera == profunda == 1
+    assert len(filas) == 5
+
+
+@pytest.mark.django_db
+def test_total_cacheado_por_ambito_y_filtros(tenant_paginacion):
+    """El total se cachea por tenant y SQL: otro filtro u otro ámbito cuentan aparte"""
+    from checkouters.utils.paginacion import contar_cacheado
+    from checkouters.utils.role_filters import AmbitoRol
+
+    qs = _escenario(tenant_paginacion, 7)
+    assert _queries(lambda: contar_cacheado(qs)) == (7, 1)
+    assert _queries(lambda: contar_cacheado(qs)) == (7, 0)
+
+    propio = AmbitoRol(usuario_id=tenant_paginacion.pk + 1).aplicar(qs, creador_field="usuario")
+    assert _queries(lambda: contar_cacheado(propio)) == (0, 1)
+    assert _queries(lambda: contar_cacheado(qs.filter(estado="Pagado"))) == (0, 1)
+
+
+@pytest.mark.django_db
+def test_total_vacio_y_por_peticion(tenant_paginacion):
+    """Un queryset vacío por construcción cuenta 0 sin query; con clave de petición se cachea por usuario y filtros"""
+    from django.contrib.auth.models import AnonymousUser
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from checkouters.utils.paginacion import clave_peticion, contar_cacheado
+    from checkouters.utils.role_filters import SIN_ACCESO
+
+    qs = _escenario(tenant_paginacion, 4)
+    assert _queries(lambda: contar_cacheado(SIN_ACCESO.aplicar(qs))) == (0, 0)
+    assert _queries(lambda: contar_cacheado(qs.filter(id__in=[]))) == (0, 0)
+
+    def _clave(url, usuario):
+        request = Request(APIRequestFactory().get(url))
+        request.user = usuario
+        return clave_peticion(request, ignorar=("page", "cursor"))
+
+    clave = _clave("/oportunidades/?estado=Pendiente&page=1", tenant_paginacion)
+    assert clave == _clave("/oportunidades/?page=3&estado=Pendiente", tenant_paginacion)
+    assert clave != _clave("/oportunidades/?estado=Pagado", tenant_paginacion)
+    assert clave != _clave("/oportunidades/?estado=Pendiente", AnonymousUser())
+    assert _queries(lambda: contar_cacheado(qs, clave=clave)) == (4, 1)
+    assert _queries(lambda: contar_cacheado(qs.filter(estado="Pendiente"), clave=clave)) == (4, 0)
+
+
+def test_cursor_invalido():
+    from rest_framework.exceptions import NotFound
+    from checkouters.utils.paginacion import _decodificar_cursor
+
+    with pytest.raises(NotFound):
+        _decodificar_cursor("no-es-un-cursor")
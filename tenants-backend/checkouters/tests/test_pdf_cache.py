@@ -0,0 +1,120 @@
+import os
+
+import pytest
+from django.contrib.auth import get_user_model
+from django_tenants.utils import schema_context
+
+User = get_user_model()
+
+RENDERS = []
+
+
+def _pdf_falso(texto):
+    RENDERS.append(texto)
+    return f"%PDF-falso {texto} {os.getpid()}".encode()
+
+
+class CapaGrabadora:
+    async def group_send(self, grupo, evento):
+        pass
+
+
+@pytest.fixture
+def cache_pdf(settings, tmp_path):
+    settings.PRIVATE_MEDIA_ROOT = tmp_path
+    RENDERS.clear()
+    return tmp_path
+
+
+def test_pdf_se_sirve_de_cache_hasta_que_cambia(cache_pdf, settings):
+    """Misma instantánea → mismo PDF sin volver a renderizar"""
+    from checkouters.services import pdf_cache
+
+    instantanea = {"oportunidad": {"id": 1}, "dispositivos": [{"precio": "100"}]}
+
+    pdf, clave = pdf_cache.obtener_o_renderizar("oportunidad", instantanea, _pdf_falso, "a")
+    assert pdf.startswith(b"%PDF-falso a")
+    assert pdf_cache.obtener_o_renderizar("oportunidad", dict(instantanea), _pdf_falso, "a") == (pdf, clave)
+    assert RENDERS == ["a"]
+    assert pdf_cache.leer("oportunidad", clave) == pdf
+
+    # Cualquier cambio en lo que sale en el documento es otra clave
+    otra = {**instantanea, "dispositivos": [{"precio": "120"}]}
+    _, clave_otra = pdf_cache.obtener_o_renderizar("oportunidad", otra, _pdf_falso, "b")
+    assert clave_otra != clave
+    assert pdf_cache.clave("oferta_formal", instantanea) != clave
+
+    # Sin usar desde hace más de un día → se purga
+    path = cache_pdf / pdf_cache.ruta("oportunidad", clave)
+    os.utime(path, (0, 0))
+    assert pdf_cache.purgar(1) == 1 and not path.exists()
+
+
+def test_pool_renderiza_en_otro_proceso(settings):
+    from checkouters.services import pdf_cache
+
+    settings.PDF_RENDER_WORKERS = 1
+    futuro = pdf_cache._get_pool().submit(pdf_cache._en_proceso, _pdf_falso, "public", ("pool",), {})
+    pdf = futuro.result(timeout=120)
+    assert pdf.startswith(b"%PDF-falso pool") and not pdf.endswith(str(os.getpid()).encode())
+
+
+@pytest.mark.django_db
+def test_pdf_en_segundo_plano_avisa_con_el_enlace(cache_pdf, create_tenant, monkeypatch, django_capture_on_commit_callbacks):
+    # El enlace se resuelve con las urls de checkouters, que cargan weasyprint
+    pytest.importorskip("weasyprint", exc_type=OSError)
+    from checkouters.services import pdf_cache
+    from notificaciones.models import Notificacion
+
+    monkeypatch.setattr("notificaciones.outbox.get_channel_layer", CapaGrabadora)
+    usuario = User.objects.create_user(email="c@pdf.com", password="x")
+    tenant = create_tenant(usuario, "pdfcache")
+
+    with schema_context(tenant.schema_name):
+        with django_capture_on_commit_callbacks(execute=True):
+            clave = pdf_cache.renderizar_y_avisar("oportunidad", {"id": 7}, usuario.id, "PDF listo", _pdf_falso, "lote")
+        assert pdf_cache.leer("oportunidad", clave).startswith(b"%PDF-falso lote")
+        url = pdf_cache.url_descarga("oportunidad", clave)
+
+        # Ya en caché: se avisa sin volver a renderizar
+        with django_capture_on_commit_callbacks(execute=True):
+            pdf_cache.renderizar_y_avisar("oportunidad", {"id": 7}, usuario.id, "PDF listo", _pdf_falso, "lote")
+    assert RENDERS == ["lote"]
+
+    aviso = Notificacion.objects.filter(usuario=usuario).get()
+    assert (aviso.url_relacionada, aviso.schema) == (url, tenant.schema_name)
+    assert url.endswith(f"/pdf-cache/oportunidad/{clave}/")
+    assert pdf_cache.clave_valida("oportunidad", clave)
+    assert not pdf_cache.clave_valida("../../secreto", clave)
+    assert not pdf_cache.clave_valida("oportunidad", "../" + clave[3:])
+
+
+@pytest.mark.django_db
+def test_vista_pdf_autentica_y_encola(create_tenant, monkeypatch):
+    """La vista del PDF exige JWT (DRF) y con ?async=1 responde 202 con el enlace"""
+    pytest.importorskip("weasyprint", exc_type=OSError)
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from checkouters.models import Cliente, Oportunidad
+    from checkouters.views import contrato
+
+    encolados = []
+    monkeypatch.setattr(
+        contrato, "generar_pdf_oportunidad_en_segundo_plano",
+        lambda oportunidad, usuario_id, **kwargs: encolados.append((oportunidad.pk, usuario_id)) or "/pdf-cache/x/",
+    )
+    usuario = User.objects.create_user(email="v@pdf.com", password="x")
+    tenant = create_tenant(usuario, "pdfvista")
+
+    with schema_context(tenant.schema_name):
+        cliente = Cliente.objects.create(razon_social="ACME", tipo_cliente="empresa", canal="b2b")
+        opp = Oportunidad.objects.create(cliente=cliente, usuario=usuario)
+        factory = APIRequestFactory()
+
+        anonima = contrato.generar_pdf_view(factory.get(f"/oportunidades/{opp.pk}/generar-pdf/?async=1"), pk=opp.pk)
+        assert anonima.status_code == 401
+
+        request = factory.get(f"/oportunidades/{opp.pk}/generar-pdf/?async=1")
+        force_authenticate(request, user=usuario)
+        response = contrato.generar_pdf_view(request, pk=opp.pk)
+    assert response.status_code == 202
+    assert encolados == [(opp.pk, usuario.id)]
@@ -51,7 +51,7 @@ from .views import (
 )
 # ELIMINADO: DispositivoPersonalizadoViewSet ahora está en productos (SHARED_APPS)
 # from .views.dispositivo_personalizado import DispositivoPersonalizadoViewSet
-from .views.contrato import generar_pdf_view, generar_pdf_oferta_formal, enviar_correo_oferta
+from .views.contrato import generar_pdf_view, generar_pdf_oferta_formal, enviar_correo_oferta, descargar_pdf_cacheado
 
 from .views.dispositivo import (
     capacidades_por_modelo
@@ -89,6 +89,7 @@ urlpatterns = [
     path("oportunidades/<str:oportunidad_id>/historial/", HistorialOportunidadViewSet.as_view({'get': 'list'})),
     path("oportunidades/<int:pk>/generar-pdf/", generar_pdf_view),
     path("oportunidades/<int:pk>/generar-pdf-formal/", generar_pdf_oferta_formal),
+    path("pdf-cache/<str:tipo>/<str:clave>/", descargar_pdf_cacheado, name="descargar_pdf_cacheado"),
     path("oportunidades/<str:oportunidad_id>/dispositivos-reales/", DispositivosRealesDeOportunidadView.as_view(), name="dispositivos-reales-de-oportunidad"),
 
     # Router (incluye oportunidades viewset)
@@ -14,11 +14,15 @@ import locale
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
 from django.utils import timezone
 from django.db import models  # (ya estaba)
+from django.db import connection
 from django.db.models import Q
 from productos.models.precios import PrecioRecompra
+from productos.services.precios_vigentes import precios_vigentes, precios_vigentes_personalizados
+from productos.services import grade_mapping
 from productos.services.grade_mapping import (
     GRADE_LABELS, GRADE_DESCRIPTIONS, legacy_to_grade, valoracion_to_grade, format_grade_full
 )
+from checkouters.services import pdf_cache
 
 import os, logging
 logger = logging.getLogger(__name__)
@@ -95,6 +99,28 @@ def _precio_recompra_vigente(capacidad_id: int, canal: str, fecha=None, cache: d
     return precio
 
 
+def _precargar_precios_vigentes(dispositivos, canal: str) -> dict:
+    """
+    Cache para _precio_recompra_vigente/_precio_dispositivo_personalizado_vigente
+    con los precios de todos los dispositivos del PDF (una query por tipo),
+    resolviendo el override del tenant actual.
+    """
+    hoy = timezone.now().date()
+    schema = getattr(connection, "schema_name", None)
+    tenant_schema = schema if schema and schema != "public" else None
+
+    cap_ids = {getattr(d, "capacidad_id", None) for d in dispositivos} - {None}
+    pers_ids = {getattr(d, "dispositivo_personalizado_id", None) for d in dispositivos} - {None}
+
+    cache = {(cap_id, canal, hoy): None for cap_id in cap_ids}
+    for cap_id, precio in precios_vigentes(cap_ids, canal, tenant_schema).items():
+        cache[(cap_id, canal, hoy)] = precio
+    cache.update({(f"pers_{pers_id}", canal, hoy): None for pers_id in pers_ids})
+    for pers_id, precio in precios_vigentes_personalizados(pers_ids, canal, tenant_schema).items():
+        cache[(f"pers_{pers_id}", canal, hoy)] = precio
+    return cache
+
+
 def _precio_dispositivo_personalizado_vigente(dispositivo_pers_id: int, canal: str, fecha=None, cache: dict | None = None):
     """
     Obtiene el precio vigente de un dispositivo personalizado desde PrecioDispositivoPersonalizado.
@@ -710,7 +736,7 @@ def generar_pdf_oportunidad(oportunidad, tenant=None, dispositivos_override=None
 
         precios_data = [precios_headers]
         canal_pdf = _canal_from_oportunidad(oportunidad)
-        _cache_precios = {}
+        _cache_precios = _precargar_precios_vigentes(dispositivos, canal_pdf)
 
         elementos_mostrados = set()
         for d in dispositivos:
@@ -875,3 +901,102 @@ def generar_pdf_oportunidad(oportunidad, tenant=None, dispositivos_override=None
     doc.build(elements, onFirstPage=_draw_footer, onLaterPages=_draw_footer)
     buffer.seek(0)
     return buffer
+
+
+# ==========================
+# Caché de PDFs
+# ==========================
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except (OSError, TypeError, ValueError):
+        return None
+
+
+def instantanea_pdf_oportunidad(oportunidad, tenant=None, dispositivos_override=None) -> dict:
+    """
+    Todo lo que entra en generar_pdf_oportunidad, para la clave de la caché
+    de PDFs (checkouters.services.pdf_cache).
+    """
+    es_oferta_formal = dispositivos_override is not None
+    if es_oferta_formal:
+        dispositivos = list(dispositivos_override)
+    else:
+        dispositivos = list(Dispositivo.objects.filter(oportunidad=oportunidad).select_related(
+            'modelo', 'capacidad', 'dispositivo_personalizado'
+        ))
+
+    tenant_logo = getattr(tenant, 'logo', None) if tenant else None
+    logo_path = None
+    if tenant_logo:
+        try:
+            logo_path = tenant_logo.path
+        except (ValueError, NotImplementedError):
+            logo_path = None
+    usuario = getattr(oportunidad, "usuario", None)
+
+    instantanea = {
+        "codigo": [pdf_cache.version_fichero(__file__), pdf_cache.version_fichero(grade_mapping.__file__)],
+        "fecha": datetime.now().strftime("%d/%m/%Y"),
+        "logo": [getattr(tenant_logo, "name", None), _mtime(logo_path), LOGO_PATH, _mtime(LOGO_PATH)],
+        "comercial": usuario.get_full_name() if usuario else None,
+        "oportunidad": pdf_cache.valores(oportunidad),
+        "cliente": pdf_cache.valores(oportunidad.cliente),
+        "formal": es_oferta_formal,
+        "dispositivos": [
+            [
+                pdf_cache.valores(d),
+                pdf_cache.valores(getattr(d, "modelo", None)),
+                pdf_cache.valores(getattr(d, "capacidad", None)),
+                pdf_cache.valores(getattr(d, "dispositivo_personalizado", None)),
+            ]
+            for d in dispositivos
+        ],
+    }
+    if not es_oferta_formal:
+        # La tabla de precios vigentes solo sale en la oferta orientativa
+        precios = _precargar_precios_vigentes(dispositivos, _canal_from_oportunidad(oportunidad))
+        instantanea["precios"] = sorted([str(k), str(v)] for k, v in precios.items())
+    return instantanea
+
+
+def pdf_oportunidad_bytes(oportunidad, tenant=None, dispositivos_override=None) -> bytes:
+    return generar_pdf_oportunidad(oportunidad, tenant=tenant, dispositivos_override=dispositivos_override).getvalue()
+
+
+def _tipo_pdf(dispositivos_override):
+    return "oportunidad" if dispositivos_override is None else "oferta_formal"
+
+
+def generar_pdf_oportunidad_cacheado(oportunidad, tenant=None, dispositivos_override=None) -> bytes:
+    """
+    Igual que generar_pdf_oportunidad pero servido desde la caché de PDFs
+    mientras no cambie nada de lo que sale en el documento.
+
+    Returns:
+        Bytes del PDF
+    """
+    instantanea = instantanea_pdf_oportunidad(oportunidad, tenant, dispositivos_override)
+    pdf, _ = pdf_cache.obtener_o_renderizar(
+        _tipo_pdf(dispositivos_override), instantanea,
+        pdf_oportunidad_bytes, oportunidad, tenant, dispositivos_override,
+    )
+    return pdf
+
+
+def generar_pdf_oportunidad_en_segundo_plano(oportunidad, usuario_id, tenant=None, dispositivos_override=None) -> str:
+    """
+    Para lotes grandes: genera el PDF fuera de la petición y avisa al usuario
+    con una notificación cuando está listo.
+
+    Returns:
+        URL de descarga del PDF (válida en cuanto llegue el aviso)
+    """
+    tipo = _tipo_pdf(dispositivos_override)
+    instantanea = instantanea_pdf_oportunidad(oportunidad, tenant, dispositivos_override)
+    ref = getattr(oportunidad, 'hashid', None) or getattr(oportunidad, 'uuid', '')
+    clave = pdf_cache.renderizar_y_avisar(
+        tipo, instantanea, usuario_id, f"PDF de la oportunidad #{ref} listo para descargar",
+        pdf_oportunidad_bytes, oportunidad, tenant, dispositivos_override,
+    )
+    return pdf_cache.url_descarga(tipo, clave)
@@ -0,0 +1,155 @@
+"""
+Paginación por clave (keyset) y totales cacheados para listados grandes.
+
+En lugar de OFFSET/LIMIT, cada página filtra por la clave de orden de la
+última fila de la anterior (p.ej. fecha_creacion, id): con un índice sobre
+esas columnas una página profunda cuesta lo mismo que la primera. El cursor
+es opaco para el cliente (base64 de los valores de la clave).
+
+Las clases de paginación DRF están en views/pagination.py.
+"""
+import base64
+import binascii
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+
+
+def clave_peticion(request, ignorar=()):
+    """
+    Clave de un listado: ruta, parámetros de la petición y usuario.
+
+    El ámbito del rol depende solo del usuario y de los parámetros (schema,
+    filtros), así que esta clave lo distingue sin compilar el queryset.
+
+    Args:
+        request: Petición DRF del listado
+        ignorar: Parámetros que no cambian el total (página, cursor, tamaño)
+    """
+    params = sorted(
+        (k, request.query_params.getlist(k)) for k in request.query_params if k not in ignorar
+    )
+    return f"{request.path}|{params!r}|{getattr(request.user, 'pk', None)}"
+
+
+def contar_cacheado(queryset, clave=None, timeout=None):
+    """
+    queryset.count() cacheado por tenant y clave del listado.
+
+    Args:
+        clave: Identifica los filtros y el ámbito (ver clave_peticion); sin
+            ella se usa el SQL del queryset
+        timeout: Segundos en caché (por defecto LISTADOS_COUNT_CACHE_TIMEOUT);
+            el total puede ir hasta ese tiempo por detrás de los datos
+
+    Returns:
+        Número de filas (0 sin consultar si el queryset es vacío por
+        construcción, p.ej. .none() de un usuario sin acceso)
+    """
+    if queryset.query.is_empty():
+        return 0
+    if clave is None:
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0  # p.ej. id__in=[]
+        clave = f"{sql}|{params!r}"
+    huella = hashlib.sha1(f"{connection.schema_name}|{clave}".encode()).hexdigest()
+    key = f"listados:count:{huella}"
+    total = cache.get(key)
+    if total is None:
+        total = queryset.count()
+        timeout = timeout if timeout is not None else getattr(settings, "LISTADOS_COUNT_CACHE_TIMEOUT", 30)
+        cache.set(key, total, timeout)
+    return total
+
+
+def _codificar_cursor(valores, atras=False):
+    datos = {"v": valores, "a": 1} if atras else {"v": valores}
+    return base64.urlsafe_b64encode(json.dumps(datos, default=str).encode()).decode()
+
+
+def _decodificar_cursor(cursor):
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return list(datos["v"]), bool(datos.get("a"))
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise NotFound("Cursor inválido.")
+
+
+def filtro_keyset(ordering, valores, atras=False):
+    """
+    Q de las filas posteriores (o anteriores) a `valores` en `ordering`.
+
+    Con ordering ("-fecha_creacion", "-id") y valores (f, i):
+    fecha_creacion < f OR (fecha_creacion = f AND id < i)
+    """
+    q = Q()
+    iguales = {}
+    for campo, valor in zip(ordering, valores):
+        nombre = campo.lstrip("-")
+        desc = campo.startswith("-")
+        op = "gt" if desc == atras else "lt"
+        q |= Q(**iguales, **{f"{nombre}__{op}": valor})
+        iguales[nombre] = valor
+    return q
+
+
+def _clave(obj, ordering):
+    return [getattr(obj, campo.lstrip("-")) for campo in ordering]
+
+
+def _valores(model, ordering, crudos):
+    try:
+        return [
+            model._meta.get_field(campo.lstrip("-")).to_python(valor)
+            for campo, valor in zip(ordering, crudos)
+        ]
+    except Exception:
+        raise NotFound("Cursor inválido.")
+
+
+def paginar_keyset(queryset, ordering, page_size, cursor=None, pagina=0):
+    """
+    Una página del queryset (ya filtrado) y los cursores vecinos.
+
+    Args:
+        ordering: Campos de orden; no nulos y el último único (normalmente "id")
+        cursor: Cursor devuelto por una página anterior (None = por OFFSET)
+        pagina: Índice de página (desde 0) cuando no hay cursor
+
+    Returns:
+        (filas, cursor_siguiente o None, cursor_anterior o None)
+    """
+    atras = False
+    if cursor:
+        crudos, atras = _decodificar_cursor(cursor)
+        valores = _valores(queryset.model, ordering, crudos)
+        qs = queryset.filter(filtro_keyset(ordering, valores, atras))
+        if atras:
+            qs = qs.order_by(*[c[1:] if c.startswith("-") else f"-{c}" for c in ordering])
+        else:
+            qs = qs.order_by(*ordering)
+        filas = list(qs[:page_size + 1])
+    else:
+        inicio = pagina * page_size
+        filas = list(queryset.order_by(*ordering)[inicio:inicio + page_size + 1])
+
+    hay_mas = len(filas) > page_size
+    filas = filas[:page_size]
+    if not filas:
+        return filas, None, None
+    if atras:
+        filas.reverse()
+        siguiente = _codificar_cursor(_clave(filas[-1], ordering))
+        anterior = _codificar_cursor(_clave(filas[0], ordering), atras=True) if hay_mas else None
+    else:
+        siguiente = _codificar_cursor(_clave(filas[-1], ordering)) if hay_mas else None
+        anterior = _codificar_cursor(_clave(filas[0], ordering), atras=True) if (cursor or pagina) else None
+    return filas, siguiente, anterior
@@ -11,14 +11,17 @@ from django.utils import timezone
 from django.utils.html import strip_tags
 from checkouters.legal.resolver import resolve_legal_template
 from checkouters.utils.legal_render import render_blocklist
-from django_tenants.utils import get_tenant_model
+from django_tenants.utils import get_public_schema_name, get_tenant_model, schema_context
 from checkouters.utils.legal_context import build_legal_context
 from django.db import connection
+from django.db.models import Count, Max
 from markdown import markdown
 from django.template import engines
 from reportlab.lib.enums import TA_RIGHT
 from xml.sax.saxutils import escape as xesc
 from productos.services.grade_mapping import GRADE_LABELS, legacy_to_grade
+from checkouters.services import pdf_cache
+from checkouters.utils import legal_context, legal_render
 
 logger = logging.getLogger(__name__)
 ALLOWED_TAGS = {"b","i","u","br","font","a"}
@@ -579,6 +582,51 @@ def generar_pdf_contrato(contrato, preview: bool = False, override_cuerpo_html:
     return ContentFile(pdf_bytes, name=f"contrato_{getattr(contrato,'id','') or 'b2c'}.pdf"), sha
 
 
+def instantanea_pdf_contrato(contrato, override_cuerpo_html: str | None = None) -> dict:
+    """
+    Entradas de generar_pdf_contrato para la clave de la caché de PDFs.
+    La fecha y el contexto legal usan la hora actual, así que la clave cambia
+    cada minuto: la caché absorbe las peticiones repetidas de la vista previa
+    (visor, recargas, enlace KYC), no sustituye al PDF final.
+    """
+    from progeek.models import PublicLegalTemplate
+
+    tenant = get_tenant_model().objects.filter(schema_name=connection.schema_name).first()
+    with schema_context(get_public_schema_name()):
+        plantillas = PublicLegalTemplate.objects.aggregate(n=Count("id"), ultima=Max("updated_at"))
+    principal = getattr(contrato, "principal", None)
+    return {
+        "codigo": [pdf_cache.version_fichero(m.__file__) for m in (legal_context, legal_render)]
+                  + [pdf_cache.version_fichero(__file__)],
+        "minuto": timezone.now().strftime("%Y-%m-%d %H:%M"),
+        "contrato": pdf_cache.valores(contrato),
+        "principal_sha256": getattr(principal, "pdf_sha256", None),
+        "tenant": pdf_cache.valores(tenant),
+        "plantillas": plantillas,
+        "cuerpo": override_cuerpo_html,
+    }
+
+
+def pdf_contrato_bytes(contrato, preview: bool = False, override_cuerpo_html: str | None = None) -> bytes:
+    content_file, _ = generar_pdf_contrato(contrato, preview=preview, override_cuerpo_html=override_cuerpo_html)
+    return content_file.read()
+
+
+def generar_pdf_contrato_preview(contrato, override_cuerpo_html: str | None = None):
+    """
+    generar_pdf_contrato(preview=True) pasando por la caché de PDFs.
+
+    Returns:
+        (ContentFile, sha256) como generar_pdf_contrato
+    """
+    pdf_bytes, _ = pdf_cache.obtener_o_renderizar(
+        "contrato_preview", instantanea_pdf_contrato(contrato, override_cuerpo_html),
+        pdf_contrato_bytes, contrato, True, override_cuerpo_html,
+    )
+    sha = hashlib.sha256(pdf_bytes).hexdigest()
+    return ContentFile(pdf_bytes, name=f"contrato_{getattr(contrato,'id','') or 'b2c'}.pdf"), sha
+
+
 def generar_pdf_condiciones_b2c(contrato, version: str = "v1.3"):
     """
     Devuelve (ContentFile, sha) con el PDF de condiciones v1.3.
@@ -7,7 +7,10 @@ Roles (de menor a mayor rango):
 - Manager: Ve/edita datos de tiendas gestionadas (regional o todas si es general)
 """
 
-from django.db.models import Q, QuerySet
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from django.db.models import QuerySet
 from django.db import connection
 
 
@@ -39,92 +42,138 @@ def get_user_rol_tenant(user, tenant_slug=None):
         return None
 
 
-def filter_queryset_by_role(queryset: QuerySet, user, tenant_slug=None, tienda_field="tienda", creador_field="creado_por", read_only_for_comercial=False):
+@dataclass(frozen=True)
+class AmbitoRol:
     """
-    Filtra un queryset basándose en el rol del usuario y sus permisos.
+    Qué filas puede ver un usuario según su rol, resuelto una sola vez.
+
+    - ninguno: sin acceso
+    - tienda_ids: tiendas visibles (None = todas)
+    - usuario_id: solo los registros creados por este usuario (comercial)
+    """
+    ninguno: bool = False
+    tienda_ids: Optional[Tuple[int, ...]] = None
+    usuario_id: Optional[int] = None
+
+    @property
+    def tienda_ids_permitidas(self):
+        """Mismo formato que get_tienda_ids_for_user: None = todas, [] = ninguna."""
+        if self.ninguno:
+            return []
+        return None if self.tienda_ids is None else list(self.tienda_ids)
+
+    def aplicar(self, queryset: QuerySet, tienda_field="tienda", creador_field="creado_por") -> QuerySet:
+        if self.ninguno:
+            return queryset.none()
+        if self.tienda_ids is not None:
+            queryset = queryset.filter(**{f"{tienda_field}__in": self.tienda_ids})
+        if self.usuario_id is not None and creador_field:
+            queryset = queryset.filter(**{creador_field: self.usuario_id})
+        return queryset
+
+
+SIN_ACCESO = AmbitoRol(ninguno=True)
+ACCESO_TOTAL = AmbitoRol()
+
+
+def ambito_rol(user, tenant_slug=None, read_only_for_comercial=False) -> AmbitoRol:
+    """
+    Resuelve el ámbito de datos visible para el usuario en el tenant.
 
     Args:
-        queryset: QuerySet a filtrar
         user: Usuario autenticado
         tenant_slug: Schema del tenant (opcional, usa el actual si no se especifica)
-        tienda_field: Nombre del campo de tienda en el modelo (default: "tienda")
-        creador_field: Nombre del campo de creador en el modelo (default: "creado_por")
         read_only_for_comercial: Si True, comercial ve TODO en su tienda (read-only).
                                   Si False, comercial solo ve sus propios datos (default: False)
 
     Returns:
-        QuerySet filtrado según el rol del usuario
+        AmbitoRol reutilizable para filtrar cualquier queryset
 
     Comportamiento por rol:
         - Superadmin/Soporte: Ve todo (sin filtrar)
         - Manager (general): Ve todo (sin filtrar)
         - Manager (regional): Solo tiendas gestionadas
-        - Store Manager: Solo su tienda
+        - Store Manager: Sus tiendas gestionadas (todas si la lista está vacía) o su tienda
         - Comercial (read_only=True): Ve todo en su tienda (solo lectura)
         - Comercial (read_only=False): Solo sus propios datos en su tienda
         - Auditor: Ve todo (read-only, pero sin filtrar)
     """
     if not user or not user.is_authenticated:
-        return queryset.none()
+        return SIN_ACCESO
 
     gr = getattr(user, "global_role", None)
     if not gr:
-        return queryset.none()
+        return SIN_ACCESO
 
     # Superadmin o soporte interno: acceso total
     if getattr(gr, "es_superadmin", False) or getattr(gr, "es_empleado_interno", False):
-        return queryset
+        return ACCESO_TOTAL
 
     # Obtener rol en tenant
     rol_tenant = get_user_rol_tenant(user, tenant_slug)
     if not rol_tenant:
-        return queryset.none()
+        return SIN_ACCESO
 
     rol = rol_tenant.rol
 
     # Auditor: ve todo (read-only)
     if rol == "auditor":
-        return queryset
+        return ACCESO_TOTAL
 
     # Manager: depende si es general o regional
     if rol == "manager":
         # General Manager (sin tiendas específicas): ve todo
         if rol_tenant.gestiona_todas_tiendas():
-            return queryset
+            return ACCESO_TOTAL
         # Regional Manager: solo tiendas gestionadas
-        managed_ids = rol_tenant.managed_store_ids or []
-        return queryset.filter(**{f"{tienda_field}__in": managed_ids})
+        return AmbitoRol(tienda_ids=tuple(rol_tenant.managed_store_ids or []))
 
     # Store Manager: puede gestionar múltiples tiendas
     if rol == "store_manager":
         # Si managed_store_ids está definido y es lista vacía, gestiona TODAS las tiendas
         if hasattr(rol_tenant, 'managed_store_ids') and rol_tenant.managed_store_ids is not None:
             if len(rol_tenant.managed_store_ids) == 0:
-                return queryset  # Lista vacía = todas las tiendas
-            else:
-                return queryset.filter(**{f"{tienda_field}__in": rol_tenant.managed_store_ids})
+                return ACCESO_TOTAL  # Lista vacía = todas las tiendas
+            return AmbitoRol(tienda_ids=tuple(rol_tenant.managed_store_ids))
         # Fallback: filtrar por tienda_id (comportamiento original para registros antiguos)
         if not rol_tenant.tienda_id:
-            return queryset.none()
-        return queryset.filter(**{tienda_field: rol_tenant.tienda_id})
+            return SIN_ACCESO
+        return AmbitoRol(tienda_ids=(rol_tenant.tienda_id,))
 
     # Comercial: comportamiento depende de read_only_for_comercial
     if rol == "comercial":
         if not rol_tenant.tienda_id:
-            return queryset.none()
-
+            return SIN_ACCESO
         # Si read_only_for_comercial=True: ve TODO en su tienda (para lectura)
         if read_only_for_comercial:
-            return queryset.filter(**{tienda_field: rol_tenant.tienda_id})
-
+            return AmbitoRol(tienda_ids=(rol_tenant.tienda_id,))
         # Si read_only_for_comercial=False: solo ve sus propios datos (para escritura)
-        filters = Q(**{tienda_field: rol_tenant.tienda_id})
-        if creador_field:
-            filters &= Q(**{creador_field: user})
-        return queryset.filter(filters)
+        return AmbitoRol(tienda_ids=(rol_tenant.tienda_id,), usuario_id=user.pk)
 
     # Por defecto, sin acceso
-    return queryset.none()
+    return SIN_ACCESO
+
+
+def filter_queryset_by_role(queryset: QuerySet, user, tenant_slug=None, tienda_field="tienda", creador_field="creado_por", read_only_for_comercial=False):
+    """
+    Filtra un queryset basándose en el rol del usuario y sus permisos.
+
+    Args:
+        queryset: QuerySet a filtrar
+        user: Usuario autenticado
+        tenant_slug: Schema del tenant (opcional, usa el actual si no se especifica)
+        tienda_field: Nombre del campo de tienda en el modelo (default: "tienda")
+        creador_field: Nombre del campo de creador en el modelo (default: "creado_por")
+        read_only_for_comercial: Si True, comercial ve TODO en su tienda (read-only).
+                                  Si False, comercial solo ve sus propios datos (default: False)
+
+    Returns:
+        QuerySet filtrado según el rol del usuario (ver ambito_rol). Para
+        filtrar varios querysets en la misma petición, resolver ambito_rol
+        una vez y usar AmbitoRol.aplicar.
+    """
+    ambito = ambito_rol(user, tenant_slug, read_only_for_comercial=read_only_for_comercial)
+    return ambito.aplicar(queryset, tienda_field=tienda_field, creador_field=creador_field)
 
 
 def can_user_edit_object(user, obj, tenant_slug=None, tienda_field="tienda", creador_field="creado_por"):
@@ -240,50 +289,4 @@ def get_tienda_ids_for_user(user, tenant_slug=None):
     Retorna [] para "sin acceso"
     Retorna [ids] para acceso limitado
     """
-    if not user or not user.is_authenticated:
-        return []
-
-    gr = getattr(user, "global_role", None)
-    if not gr:
-        return []
-
-    # Superadmin o soporte interno: acceso a todas
-    if getattr(gr, "es_superadmin", False) or getattr(gr, "es_empleado_interno", False):
-        return None
-
-    # Obtener rol en tenant
-    rol_tenant = get_user_rol_tenant(user, tenant_slug)
-    if not rol_tenant:
-        return []
-
-    rol = rol_tenant.rol
-
-    # Auditor: acceso a todas (read-only)
-    if rol == "auditor":
-        return None
-
-    # Manager: depende si es general o regional
-    if rol == "manager":
-        # General Manager: acceso a todas
-        if rol_tenant.gestiona_todas_tiendas():
-            return None
-        # Regional Manager: lista de tiendas gestionadas
-        return rol_tenant.managed_store_ids or []
-
-    # Store Manager: puede gestionar múltiples tiendas
-    if rol == "store_manager":
-        # Si managed_store_ids está definido y es lista vacía, acceso a TODAS
-        if hasattr(rol_tenant, 'managed_store_ids') and rol_tenant.managed_store_ids is not None:
-            if len(rol_tenant.managed_store_ids) == 0:
-                return None  # Lista vacía = acceso a todas las tiendas
-            else:
-                return rol_tenant.managed_store_ids
-        # Fallback: solo su tienda (comportamiento original)
-        return [rol_tenant.tienda_id] if rol_tenant.tienda_id else []
-
-    # Comercial: solo su tienda
-    if rol == "comercial":
-        return [rol_tenant.tienda_id] if rol_tenant.tienda_id else []
-
-    # Por defecto, sin acceso
-    return []
+    return ambito_rol(user, tenant_slug, read_only_for_comercial=True).tienda_ids_permitidas
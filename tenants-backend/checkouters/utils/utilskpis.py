@@ -1,15 +1,19 @@
-from datetime import timedelta, date
+from datetime import timedelta, date, datetime
 from decimal import Decimal
 from collections import defaultdict
-from django.db.models import Sum, Count, F, Q, Value,DecimalField,CharField,Min
-from django.db.models.functions import Coalesce, TruncDay, TruncWeek, TruncMonth,Cast, Concat
-from django.core.exceptions import FieldError
+from django.contrib.auth import get_user_model
+from django.db.models import Sum, Count, F, Q, Value,DecimalField,CharField,Min, Case, When, OuterRef, Subquery
+from django.db.models.functions import Coalesce, TruncDay, TruncWeek, TruncMonth
+from django.utils import timezone
 
 # Ajusta import paths a tus modelos reales:
 from ..models.dispositivo import DispositivoReal
-from ..models.oportunidad import Oportunidad,HistorialOportunidad
+from ..models.oportunidad import Oportunidad
 from ..models.tienda import Tienda
-from .role_filters import filter_queryset_by_role, get_tienda_ids_for_user
+from ..models.kpi import KpiDiario
+from ..services.kpis_diarios import filas_kpi, inicio_dia
+from .role_filters import ACCESO_TOTAL, ambito_rol
+from productos.models import Modelo
 # Estados pipeline abiertos y cierre:
 PIPELINE_ESTADOS = [
     "Pendiente","Aceptado","Recogida solicitada", "Recogida generada", "En tránsito", "Check in OK","Recibido","Pendiente factura",
@@ -20,31 +24,6 @@ DEC_ZERO = Value(Decimal("0"), output_field=DecimalField(max_digits=24, decimal_
 ACCEPTED_STATES = {"Aceptada", "Oferta aceptada", "Aceptado"}
 PICKUP_STATES = {"Recogida generada", "Recogida programada", "En tránsito", "Recogido", "Recibido"}
 
-def _first_dr_date_map(opp_ids, field_name: str = "fecha_recepcion"):
-    """
-    Devuelve {oportunidad_id: primera fecha en DispositivoReal.<field_name>} como fallback.
-    """
-    if not opp_ids:
-        return {}
-    qs = (DispositivoReal.objects
-          .filter(oportunidad_id__in=opp_ids)
-          .exclude(**{f"{field_name}__isnull": True}))
-    rows = (qs.values("oportunidad_id").annotate(ts=Min(field_name)))
-    return {r["oportunidad_id"]: r["ts"] for r in rows}
-
-def _first_ts_hist(opp_ids, estados_objetivo):
-    """
-    Devuelve {oportunidad_id: primer timestamp (fecha) cuando entra en cualquiera de 'estados_objetivo'}.
-    Usa HistorialOportunidad(estado_nuevo, fecha).
-    """
-    if not opp_ids:
-        return {}
-    qs = (HistorialOportunidad.objects
-          .filter(oportunidad_id__in=opp_ids, estado_nuevo__in=list(estados_objetivo))
-          .values("oportunidad_id")
-          .annotate(ts=Min("fecha")))
-    return {r["oportunidad_id"]: r["ts"] for r in qs}
-
 def _avg_hours_from_pairs(pairs):
     """
     pairs: iterable de (t_inicio, t_fin) -> devuelve media en horas (float con 2 decimales) o None.
@@ -69,83 +48,430 @@ def parse_date_str(s):
         return date(int(y), int(m), int(d))
     except Exception:
         return None
-def _oportunidades_ids_en_rango(fecha_inicio, fecha_fin):
+# Los KPIs por rango leen los días completos anteriores a hoy de KpiDiario
+# (services/kpis_diarios.py) y calculan en vivo sobre Oportunidad/DispositivoReal
+# solo el resto: hoy y los bordes de día parciales del rango.
+CAMPO_FECHA = "fecha_creacion"
+_DEC = DecimalField(max_digits=24, decimal_places=6)
+
+def _aware(dt):
+    return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+
+def _tramos(fecha_inicio, fecha_fin):
     """
-    Devuelve IDs de Oportunidad cuyo campo de creación esté en rango.
-    Prueba varios nombres comunes del campo de fecha para ser compatible
-    con esquemas distintos sin romper el QuerySet.
+    Divide [fecha_inicio, fecha_fin] en días cerrados (KpiDiario) y tramo en vivo.
+
+    Returns:
+        ((primer_dia, ultimo_dia) o None, Q sobre fecha_creacion o None)
     """
-    candidatos = ["creado_en", "creado", "created_at", "fecha_creacion"]
-    for campo in candidatos:
-        try:
-            qs = Oportunidad.objects.filter(**{f"{campo}__range": [fecha_inicio, fecha_fin]})
-            # Si el ORM acepta el lookup, devolvemos resultados (vacío o no)
-            list(qs[:1])  # fuerza evaluación ligera para detectar FieldError temprano
-            return qs.values_list("id", flat=True)
-        except FieldError:
-            continue
-    # Fallback: sin filtro por fecha si ninguno coincide (mejor que romper)
-    return Oportunidad.objects.all().values_list("id", flat=True)
+    ini = timezone.localtime(_aware(fecha_inicio))
+    fin = timezone.localtime(_aware(fecha_fin))
+    d0 = ini.date() if ini == inicio_dia(ini.date()) else ini.date() + timedelta(days=1)
+    d1 = fin.date() if fin >= inicio_dia(fin.date() + timedelta(days=1)) - timedelta(microseconds=1) else fin.date() - timedelta(days=1)
+    d1 = min(d1, timezone.localdate() - timedelta(days=1))
+    if d0 > d1:
+        return None, Q(**{f"{CAMPO_FECHA}__range": [ini, fin]})
+
+    vivo = Q()
+    if ini < inicio_dia(d0):
+        vivo |= Q(**{f"{CAMPO_FECHA}__gte": ini, f"{CAMPO_FECHA}__lt": inicio_dia(d0)})
+    corte = inicio_dia(d1 + timedelta(days=1))
+    if fin >= corte:
+        vivo |= Q(**{f"{CAMPO_FECHA}__gte": corte, f"{CAMPO_FECHA}__lte": fin})
+    return (d0, d1), (vivo or None)
 
-def _base_qs(fecha_inicio, fecha_fin, filtros, opciones, request=None):
+def _fechas_periodo_anterior(fecha_inicio, fecha_fin):
+    # mismo número de días; fin anterior = día antes del inicio actual
+    dias = (fecha_fin.date() - fecha_inicio.date()).days + 1
+    fin_ant = fecha_inicio - timedelta(days=1)
+    ini_ant = fin_ant - timedelta(days=dias - 1)
+    return ini_ant, fin_ant
+
+_TRUNC = {"dia": TruncDay, "semana": TruncWeek, "mes": TruncMonth}
+
+def _inicio_periodo(d, granularidad):
+    """Primer día del periodo (día, semana ISO o mes) que contiene d."""
+    if granularidad == "dia":
+        return d
+    if granularidad == "semana":
+        return d - timedelta(days=d.weekday())
+    return d.replace(day=1)
+
+def _campo_nombre_usuario():
+    # Campo de nombre del usuario: name → email → id
+    nombres = {f.name for f in get_user_model()._meta.get_fields()}
+    return next((c for c in ("name", "email") if c in nombres), "id")
+
+
+class PlanKpis:
     """
-    QS de DispositivoReal con join a Oportunidad, filtrando por
-    estados >= factura recibida (opciones['estados_factura_adelante']).
-    Aplica filtros de rol si se proporciona request.
+    Plan de cálculo de los KPIs de una petición.
+
+    Resuelve una sola vez el ámbito de rol del usuario, los filtros de
+    tienda/usuario, el campo de fecha y los tramos (días cerrados de KpiDiario
+    y tramo en vivo) del periodo actual y del anterior. Las métricas de
+    negocio, series, rankings y la operativa salen de las mismas filas:
+
+    - una sola query agrupada sobre KpiDiario para los días cerrados de ambos
+      periodos (el periodo se distingue con un CASE)
+    - filas_kpi sobre las oportunidades del tramo en vivo (2 queries)
+
+    Las oportunidades del rango no se materializan en Python: oportunidades()
+    devuelve un queryset que se usa como subconsulta.
+
+    Args:
+        fecha_inicio, fecha_fin: Rango (aware); None = sin límite
+        filtros: {"tienda_id", "usuario_id"}
+        opciones: {"estados_factura_adelante", "comparar"}
+        request: Petición DRF; su usuario determina el ámbito de rol
+        granularidad: "dia" | "semana" | "mes"
+        campo_fecha: Campo de fecha de Oportunidad que delimita el rango.
+            KpiDiario solo se usa con fecha_creacion.
+        ambito: AmbitoRol ya resuelto (por defecto, el del usuario de la petición)
     """
-    estados_ok = set(opciones.get("estados_factura_adelante") or [])
-    opp_ids = _oportunidades_ids_en_rango(fecha_inicio, fecha_fin)
-
-    # Aplicar filtro de rol a Oportunidades primero
-    opp_qs = Oportunidad.objects.filter(id__in=opp_ids, estado__in=estados_ok)
-
-    if request and hasattr(request, 'user'):
-        # Aplicar filtros basados en rol del usuario
-        opp_qs = filter_queryset_by_role(
-            opp_qs,
-            request.user,
-            tienda_field="tienda",
-            creador_field="usuario"
+
+    def __init__(self, fecha_inicio=None, fecha_fin=None, filtros=None, opciones=None, request=None,
+                 granularidad="mes", campo_fecha=CAMPO_FECHA, ambito=None):
+        self.fecha_inicio = fecha_inicio and _aware(fecha_inicio)
+        self.fecha_fin = fecha_fin and _aware(fecha_fin)
+        self.filtros = filtros or {}
+        self.opciones = opciones or {}
+        self.granularidad = granularidad if granularidad in _TRUNC else "mes"
+        self.campo_fecha = campo_fecha
+        self.estados_ok = set(self.opciones.get("estados_factura_adelante") or [])
+        self.hoy = timezone.localdate()
+
+        if ambito is None:
+            user = getattr(request, "user", None) if request else None
+            ambito = ambito_rol(user) if user is not None else ACCESO_TOTAL
+        self.ambito = ambito
+
+        # Tramos del periodo actual y, si se compara, del anterior
+        self.tramos = {}
+        if self.fecha_inicio and self.fecha_fin and campo_fecha == CAMPO_FECHA:
+            self.tramos["actual"] = _tramos(self.fecha_inicio, self.fecha_fin)
+            if self.opciones.get("comparar"):
+                self.tramos["anterior"] = _tramos(*_fechas_periodo_anterior(self.fecha_inicio, self.fecha_fin))
+        self._cache = {}
+
+    @classmethod
+    def desde_request(cls, request, tienda_param="tienda", usuario_param="usuario", **kwargs):
+        """
+        Plan con los parámetros GET habituales de las vistas de KPIs
+        (tienda, usuario, fecha_inicio, fecha_fin en YYYY-MM-DD).
+        """
+        params = request.GET
+        fi = parse_date_str(params.get("fecha_inicio"))
+        ff = parse_date_str(params.get("fecha_fin"))
+        return cls(
+            fecha_inicio=fi and inicio_dia(fi),
+            fecha_fin=ff and inicio_dia(ff + timedelta(days=1)) - timedelta(microseconds=1),
+            filtros={"tienda_id": params.get(tienda_param), "usuario_id": params.get(usuario_param)},
+            request=request,
+            **kwargs,
+        )
+
+    def _cached(self, clave, fn):
+        if clave not in self._cache:
+            self._cache[clave] = fn()
+        return self._cache[clave]
+
+    # ------------------------------------------------------------------
+    # Querysets base
+    # ------------------------------------------------------------------
+    def acotar(self, qs, prefijo=""):
+        """Ámbito de rol + tienda_id/usuario_id sobre un queryset con tienda y usuario."""
+        qs = self.ambito.aplicar(qs, tienda_field=f"{prefijo}tienda", creador_field=f"{prefijo}usuario")
+        if self.filtros.get("tienda_id"):
+            qs = qs.filter(**{f"{prefijo}tienda_id": self.filtros["tienda_id"]})
+        if self.filtros.get("usuario_id"):
+            qs = qs.filter(**{f"{prefijo}usuario_id": self.filtros["usuario_id"]})
+        return qs
+
+    def oportunidades(self, estados=None):
+        """Oportunidades del rango (sobre campo_fecha) visibles para el usuario."""
+        qs = Oportunidad.objects.all()
+        if self.fecha_inicio:
+            qs = qs.filter(**{f"{self.campo_fecha}__gte": self.fecha_inicio})
+        if self.fecha_fin:
+            qs = qs.filter(**{f"{self.campo_fecha}__lte": self.fecha_fin})
+        if estados is not None:
+            qs = qs.filter(estado__in=estados)
+        return self.acotar(qs)
+
+    def dispositivos(self, estados=None):
+        """DispositivoReal de oportunidades() (subconsulta, sin materializar ids)."""
+        return DispositivoReal.objects.filter(oportunidad__in=self.oportunidades(estados).values("id"))
+
+    # ------------------------------------------------------------------
+    # Filas agregadas (KpiDiario + tramo en vivo)
+    # ------------------------------------------------------------------
+    @property
+    def filas(self):
+        """
+        Filas (tramo, periodo, tienda_id, usuario_id, estado, modelo_id) con
+        valor, valor_auditado, dispositivos y ops, de todos los estados.
+        """
+        return self._cached("filas", lambda: self._filas_cerradas() + self._filas_vivo())
+
+    def _filas_cerradas(self):
+        rangos = {k: dias for k, (dias, _) in self.tramos.items() if dias}
+        if not rangos:
+            return []
+        q = Q()
+        for dias in rangos.values():
+            q |= Q(fecha__range=dias)
+        if "actual" in rangos:
+            tramo = Case(When(fecha__range=rangos["actual"], then=Value("actual")), default=Value("anterior"), output_field=CharField())
+        else:
+            tramo = Value("anterior", output_field=CharField())
+        periodo = F("fecha") if self.granularidad == "dia" else _TRUNC[self.granularidad]("fecha")
+        rows = (self.acotar(KpiDiario.objects.filter(q))
+                .values("tienda_id", "usuario_id", "estado", "modelo_id", tramo=tramo, periodo=periodo)
+                .annotate(valor=Sum("valor"), valor_auditado=Sum("valor_auditado"),
+                          dispositivos=Sum("dispositivos"), ops=Sum("ops"))
+                .order_by())
+        return [{**r, "periodo": r["periodo"].date() if isinstance(r["periodo"], datetime) else r["periodo"]} for r in rows]
+
+    def _filas_vivo(self):
+        q = Q()
+        for _, q_vivo in self.tramos.values():
+            if q_vivo is not None:
+                q |= q_vivo
+        if not q:
+            return []
+        d_actual = timezone.localdate(self.fecha_inicio)
+        return [
+            {
+                "tramo": "actual" if f.fecha >= d_actual else "anterior",
+                "periodo": _inicio_periodo(f.fecha, self.granularidad),
+                "fecha": f.fecha,
+                "tienda_id": f.tienda_id, "usuario_id": f.usuario_id, "estado": f.estado, "modelo_id": f.modelo_id,
+                "valor": f.valor, "valor_auditado": f.valor_auditado, "dispositivos": f.dispositivos, "ops": f.ops,
+            }
+            for f in filas_kpi(self.acotar(Oportunidad.objects.filter(q)))
+        ]
+
+    def filas_negocio(self, tramo="actual"):
+        """Filas con dispositivos de oportunidades en estados >= factura recibida."""
+        return [
+            f for f in self.filas
+            if f["tramo"] == tramo and f["estado"] in self.estados_ok and f["dispositivos"]
+        ]
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+    def valor_total(self, tramo="actual"):
+        return sum((f["valor"] or Decimal("0") for f in self.filas_negocio(tramo)), Decimal("0"))
+
+    def operaciones(self, tramo="actual"):
+        return sum(f["ops"] or 0 for f in self.filas_negocio(tramo))
+
+    def ticket_medio(self):
+        return self.valor_total() / Decimal(self.operaciones() or 1)
+
+    def evolucion(self):
+        real = defaultdict(Decimal)
+        for f in self.filas_negocio():
+            real[_clave_periodo(f["periodo"], self.granularidad)] += f["valor"] or Decimal("0")
+        return [
+            {"periodo": key, "valor": real.get(key, Decimal("0"))}
+            for key in _serie_vacia_desde_hasta(self.fecha_inicio, self.fecha_fin, self.granularidad)
+        ]
+
+    def comparativa(self, evolucion=None):
+        actual = _sum_evolucion(self.evolucion() if evolucion is None else evolucion)
+        if "anterior" not in self.tramos:
+            return {"actual": actual, "anterior": None, "variacion_pct": None}
+
+        anterior = self.valor_total("anterior")
+        variacion = None
+        if anterior and anterior != Decimal("0"):
+            variacion = ((actual - anterior) / anterior) * Decimal("100")
+        return {
+            "actual": actual,
+            "anterior": anterior,
+            "variacion_pct": None if variacion is None else round(variacion, 2),
+        }
+
+    def _nombres(self, dimension):
+        """{id: nombre} de las tiendas/usuarios/modelos presentes en las filas."""
+        def _cargar():
+            campo = f"{dimension}_id"
+            ids = {f[campo] for f in self.filas if f[campo] is not None}
+            if not ids:
+                return {}
+            if dimension == "tienda":
+                return dict(Tienda.objects.filter(id__in=ids).values_list("id", "nombre"))
+            if dimension == "usuario":
+                return dict(get_user_model().objects.filter(id__in=ids).values_list("id", _campo_nombre_usuario()))
+            return dict(Modelo.objects.filter(id__in=ids).values_list("id", "descripcion"))
+        return self._cached(f"nombres_{dimension}", _cargar)
+
+    def ranking(self, dimension, metrica="valor", limit=10):
+        """
+        Ranking por "modelo" (agrupado por descripción), "tienda" o "usuario".
+
+        Returns:
+            Lista de dicts con nombre (y tienda_id/usuario_id) y la métrica
+        """
+        nombres = self._nombres(dimension)
+        grupos = {}
+        for f in self.filas_negocio():
+            obj_id = f[f"{dimension}_id"]
+            if dimension == "modelo":
+                clave = {"nombre": nombres.get(obj_id)}
+            else:
+                clave = {f"{dimension}_id": obj_id, "nombre": nombres.get(obj_id)}
+            g = grupos.setdefault(tuple(clave.values()), {**clave, "valor": Decimal("0"), "ops": 0})
+            g["valor"] += f["valor"] or Decimal("0")
+            g["ops"] += f["ops"] or 0
+        filas = sorted(grupos.values(), key=lambda g: g[metrica], reverse=True)
+        otra = "ops" if metrica == "valor" else "valor"
+        return [{k: v for k, v in g.items() if k != otra} for g in filas[:limit]]
+
+    def pipeline(self):
+        # Abiertas creadas antes de hoy desde KpiDiario; las de hoy, en vivo
+        acc = defaultdict(lambda: {"count": 0, "valor": Decimal("0")})
+        rows = (self.acotar(KpiDiario.objects.filter(fecha__lt=self.hoy, estado__in=PIPELINE_ESTADOS))
+                .values("estado")
+                .annotate(ops=Sum("ops"), valor_auditado=Sum("valor_auditado"))
+                .order_by())
+        # Valor estimado: si ya hay DispositivoReal auditado, sumar precio_final; si no, 0
+        for r in list(rows) + [f for f in self._filas_hoy() if f["estado"] in PIPELINE_ESTADOS]:
+            acc[r["estado"]]["count"] += r["ops"] or 0
+            acc[r["estado"]]["valor"] += r["valor_auditado"] or Decimal("0")
+
+        por_estado = []
+        total_abiertas = 0
+        total_valor = Decimal("0")
+        for est in PIPELINE_ESTADOS:
+            count, valor = acc[est]["count"], acc[est]["valor"]
+            por_estado.append({"estado": est, "count": count, "valor": valor})
+            total_abiertas += count
+            total_valor += valor
+
+        return {
+            "abiertas": total_abiertas,
+            "valor_estimado": total_valor,
+            "por_estado": por_estado
+        }
+
+    def _filas_hoy(self):
+        """Filas en vivo de las oportunidades creadas hoy (reutiliza el tramo en vivo si lo cubre)."""
+        ahora = timezone.now()
+        cubre_hoy = (
+            "actual" in self.tramos
+            and self.fecha_inicio <= inicio_dia(self.hoy)
+            and self.fecha_fin >= ahora
+        )
+        if cubre_hoy:
+            return [f for f in self.filas if f.get("fecha") == self.hoy]
+        return self._cached("filas_hoy", lambda: [
+            {"estado": f.estado, "valor_auditado": f.valor_auditado, "ops": f.ops}
+            for f in filas_kpi(self.acotar(Oportunidad.objects.filter(**{f"{CAMPO_FECHA}__gte": inicio_dia(self.hoy)})))
+        ])
+
+    def operativa(self):
+        # Recibidas = todas las Oportunidades creadas en rango (independiente del estado)
+        por_estado = defaultdict(int)
+        for f in self.filas:
+            if f["tramo"] == "actual":
+                por_estado[f["estado"]] += f["ops"] or 0
+        recibidas = sum(por_estado.values())
+
+        # Completadas = estado Pagado
+        completadas = sum(por_estado[e] for e in CERRADA_ESTADOS)
+        conversion_pct = (completadas * 100.0 / recibidas) if recibidas else 0.0
+
+        # Tiempos medios: primer paso por cada hito en HistorialOportunidad
+        # (estado_nuevo, fecha), todos en una sola query con agregación condicional.
+        # Dependen de cada oportunidad, así que no salen de KpiDiario
+        def _primera(estados):
+            return Min("historial__fecha", filter=Q(historial__estado_nuevo__in=list(estados)))
+
+        recepcion = (DispositivoReal.objects
+                     .filter(oportunidad_id=OuterRef("pk"), fecha_recepcion__isnull=False)
+                     .order_by("fecha_recepcion")
+                     .values("fecha_recepcion")[:1])
+        hitos = list(
+            self.oportunidades()
+            .values("id", CAMPO_FECHA)
+            .annotate(
+                t_transito=_primera({"En tránsito"}),
+                t_oferta=_primera({"Oferta confirmada", "Nueva oferta enviada"}),
+                t_aceptada=_primera(ACCEPTED_STATES),
+                t_recogida=_primera(PICKUP_STATES),
+                t_pagado=_primera({"Pagado"}),
+                t_recepcion=Subquery(recepcion),
+            )
+            .order_by()
         )
 
-    qs = (DispositivoReal.objects
-          .select_related("oportunidad", "oportunidad__tienda", "oportunidad__usuario")
-          .filter(oportunidad_id__in=opp_qs.values_list('id', flat=True)))
+        # 17) Respuesta al cliente: En tránsito -> (Oferta confirmada | Nueva oferta enviada)
+        tmed_respuesta_h = _avg_hours_from_pairs([(h["t_transito"], h["t_oferta"]) for h in hitos])
+        # 18) Recogida: Aceptada -> (Recogida generada | En tránsito);
+        # si no hay historial, la primera fecha_recepcion en DR
+        tmed_recogida_h = _avg_hours_from_pairs([(h["t_aceptada"], h["t_recogida"] or h["t_recepcion"]) for h in hitos])
+        # 19) Cierre completo: fecha_creación -> Pagado
+        tmed_cierre_h = _avg_hours_from_pairs([(h[CAMPO_FECHA], h["t_pagado"]) for h in hitos])
+
+        # Rechazos con motivo (si tienes campo motivo_rechazo)
+        rechazadas = por_estado["Rechazada"]
+
+        # Abandono (heurística): estado “Cancelado” o sin movimiento X días (a definir)
+        abandonadas = por_estado["Cancelado"]
+        abandono_pct = (abandonadas * 100.0 / recibidas) if recibidas else 0.0
+
+        return {
+            "recibidas": recibidas,
+            "completadas": completadas,
+            "conversion_pct": round(conversion_pct, 2),
+            "tmed_respuesta_h": tmed_respuesta_h,
+            "tmed_recogida_h": tmed_recogida_h,
+            "tmed_cierre_h": tmed_cierre_h,
+            "rechazos": {"total": rechazadas, },
+            "abandono_pct": round(abandono_pct, 2),
+        }
+
+    def progreso(self, estado="Pagado"):
+        """
+        Valor y operaciones por (tienda_id, usuario_id) de las oportunidades del
+        rango en `estado`, en una sola query (para objetivos).
+
+        Returns:
+            {(tienda_id, usuario_id): {"valor": Decimal, "ops": int}}
+        """
+        qs = Oportunidad.objects.filter(estado__iexact=estado)
+        if self.fecha_inicio:
+            qs = qs.filter(**{f"{self.campo_fecha}__gte": self.fecha_inicio})
+        if self.fecha_fin:
+            qs = qs.filter(**{f"{self.campo_fecha}__lte": self.fecha_fin})
+        rows = (self.acotar(qs)
+                .values("tienda_id", "usuario_id")
+                .annotate(ops=Count("id", distinct=True), valor=Sum("dispositivos_reales__precio_final", output_field=_DEC))
+                .order_by())
+        return {
+            (r["tienda_id"], r["usuario_id"]): {"valor": Decimal(r["valor"] or 0), "ops": int(r["ops"] or 0)}
+            for r in rows
+        }
 
-    if filtros.get("tienda_id"):
-        qs = qs.filter(oportunidad__tienda_id=filtros["tienda_id"])
-    if filtros.get("usuario_id"):
-        qs = qs.filter(oportunidad__usuario_id=filtros["usuario_id"])
-    return qs
 
-def _valor_total_qs(qs):
+def _base_qs(fecha_inicio, fecha_fin, filtros, opciones, request=None):
     """
-    Calcula el valor total de todos los DispositivoReal en el queryset.
-    Suma segura en Decimal: evita errores de tipos mezclados (DecimalField vs Integer).
+    QS de DispositivoReal de oportunidades creadas en rango, filtrando por
+    estados >= factura recibida (opciones['estados_factura_adelante']).
+    Aplica filtros de rol si se proporciona request.
     """
-    return qs.aggregate(
-        v=Coalesce(
-            Sum(
-                F("precio_final"),
-                output_field=DecimalField(max_digits=24, decimal_places=6)
-            ),
-            DEC_ZERO
-        )
-    )["v"]
+    plan = PlanKpis(fecha_inicio, fecha_fin, filtros, opciones, request)
+    return plan.dispositivos(plan.estados_ok)
 
 def kpi_valor_total(fecha_inicio, fecha_fin, filtros, opciones, request=None):
-    return _valor_total_qs(_base_qs(fecha_inicio, fecha_fin, filtros, opciones, request)) or Decimal("0")
-
-def _ops_qs(fecha_inicio, fecha_fin, filtros, opciones, request=None):
-    qs = _base_qs(fecha_inicio, fecha_fin, filtros, opciones, request)
-    # operaciones = oportunidades distintas con al menos un DispositivoReal en el rango y estados válidos
-    return qs.values("oportunidad_id").distinct()
+    return PlanKpis(fecha_inicio, fecha_fin, filtros, opciones, request).valor_total()
 
 def kpi_ticket_medio(fecha_inicio, fecha_fin, filtros, opciones, request=None):
-    qs = _base_qs(fecha_inicio, fecha_fin, filtros, opciones, request)
-    valor = _valor_total_qs(qs)
-    ops = _ops_qs(fecha_inicio, fecha_fin, filtros, opciones, request).count() or 1
-    return (valor or Decimal("0")) / Decimal(ops)
+    return PlanKpis(fecha_inicio, fecha_fin, filtros, opciones, request).ticket_medio()
 
 def kpi_margen_medio(fecha_inicio, fecha_fin, filtros, opciones, request=None):
     """
@@ -153,27 +479,12 @@ def kpi_margen_medio(fecha_inicio, fecha_fin, filtros, opciones, request=None):
     Por ahora None para no inventar.
     """
     return None
-def _campo_fecha_oportunidad():
-    # Intenta estos nombres en orden; en tu modelo existe 'fecha_creacion'
-    candidatos = ["creado_en", "creado", "created_at", "fecha_creacion"]
-    for campo in candidatos:
-        try:
-            # Evalúa de forma ligera para detectar FieldError si el campo no existe
-            list(Oportunidad.objects.filter(**{f"{campo}__isnull": True})[:1])
-            return campo
-        except FieldError:
-            continue
-    # Fallback por compatibilidad (si nada coincide)
-    return "fecha_creacion"
-
-def _trunc_by(granularidad):
-    campo = _campo_fecha_oportunidad()
-    path = f"oportunidad__{campo}"
-    if granularidad == "dia":
-        return TruncDay(path)
-    if granularidad == "semana":
-        return TruncWeek(path)
-    return TruncMonth(path)
+
+def _clave_periodo(p, granularidad):
+    d = p.date() if isinstance(p, datetime) else p
+    if granularidad in ("dia", "semana"):
+        return d.isoformat()
+    return d.strftime("%Y-%m")
 
 def _serie_vacia_desde_hasta(fecha_inicio, fecha_fin, granularidad):
     # genera claves periodo como ISO (YYYY-MM o YYYY-MM-DD) según granularidad
@@ -202,63 +513,17 @@ def _serie_vacia_desde_hasta(fecha_inicio, fecha_fin, granularidad):
             m, y = 1, y + 1
     return puntos
 
-def serie_evolucion_valor(fecha_inicio, fecha_fin, granularidad, filtros, opciones, request=None):
-    qs = _base_qs(fecha_inicio, fecha_fin, filtros, opciones, request)
-    t = _trunc_by(granularidad)
-    rows = (qs
-            .annotate(p=t)
-            .values("p")
-            .annotate(v=Coalesce(
-            Sum(F("precio_final"), output_field=DecimalField(max_digits=24, decimal_places=6)),
-            DEC_ZERO))
-            .order_by("p"))
-
-    # map real → dict
-    real = {}
-    for r in rows:
-        p = r["p"]
-        if granularidad == "dia":
-            key = p.date().isoformat()
-        elif granularidad == "semana":
-            key = p.date().isoformat()
-        else:
-            key = p.strftime("%Y-%m")
-        real[key] = r["v"]
 
-    # rellena huecos
-    out = []
-    for key in _serie_vacia_desde_hasta(fecha_inicio, fecha_fin, granularidad):
-        out.append({"periodo": key, "valor": real.get(key, Decimal("0"))})
-    return out
+def serie_evolucion_valor(fecha_inicio, fecha_fin, granularidad, filtros, opciones, request=None):
+    return PlanKpis(fecha_inicio, fecha_fin, filtros, opciones, request, granularidad).evolucion()
 
 def _sum_evolucion(evolucion):
     return sum(Decimal(str(p["valor"])) for p in evolucion)
 
-def _fechas_periodo_anterior(fecha_inicio, fecha_fin):
-    # mismo número de días; fin anterior = día antes del inicio actual
-    dias = (fecha_fin.date() - fecha_inicio.date()).days + 1
-    fin_ant = fecha_inicio - timedelta(days=1)
-    ini_ant = fin_ant - timedelta(days=dias - 1)
-    return ini_ant, fin_ant
-
 def comparativa_periodo(evolucion_actual, fecha_inicio, fecha_fin, granularidad, filtros, opciones, comparar: bool, request=None):
-    actual = _sum_evolucion(evolucion_actual)
-    if not comparar:
-        return {"actual": actual, "anterior": None, "variacion_pct": None}
-
-    ini_ant, fin_ant = _fechas_periodo_anterior(fecha_inicio, fecha_fin)
-    evolucion_anterior = serie_evolucion_valor(ini_ant, fin_ant, granularidad, filtros, opciones, request)
-    anterior = _sum_evolucion(evolucion_anterior)
-
-    variacion = None
-    if anterior and anterior != Decimal("0"):
-        variacion = ( (actual - anterior) / anterior ) * Decimal("100")
-
-    return {
-        "actual": actual,
-        "anterior": anterior,
-        "variacion_pct": None if variacion is None else round(variacion, 2)
-    }
+    opciones = {**(opciones or {}), "comparar": comparar}
+    plan = PlanKpis(fecha_inicio, fecha_fin, filtros, opciones, request, granularidad)
+    return plan.comparativa(evolucion_actual)
 
 def _rank_qs(fecha_inicio, fecha_fin, filtros, opciones, request=None):
     return _base_qs(fecha_inicio, fecha_fin, filtros, opciones, request)
@@ -275,193 +540,23 @@ def rank_categorias(fecha_inicio, fecha_fin, filtros, opciones, limit=10, reques
     )
 
 def rank_productos(fecha_inicio, fecha_fin, filtros, opciones, limit=10, request=None):
-    qs = _rank_qs(fecha_inicio, fecha_fin, filtros, opciones, request)
-
     # Agrupa por la descripción del modelo (FK a public_productos_modelo)
-    return list(
-        qs.values(nombre=F("modelo__descripcion"))
-          .annotate(
-              valor=Coalesce(
-                  Sum(F("precio_final"), output_field=DecimalField(max_digits=24, decimal_places=6)),
-                  DEC_ZERO
-              )
-          )
-          .order_by("-valor")[:limit]
-    )
-
+    return PlanKpis(fecha_inicio, fecha_fin, filtros, opciones, request).ranking("modelo", "valor", limit)
 
 def rank_tiendas_valor(fecha_inicio, fecha_fin, filtros, opciones, limit=10, request=None):
-    qs = _rank_qs(fecha_inicio, fecha_fin, filtros, opciones, request)
-    return list(
-        qs.values(tienda_id=F("oportunidad__tienda_id"), nombre=F("oportunidad__tienda__nombre"))
-          .annotate(valor=Coalesce(
-          Sum(F("precio_final"), output_field=DecimalField(max_digits=24, decimal_places=6)),
-          DEC_ZERO
-      ))
-          .order_by("-valor")[:limit]
-    )
+    return PlanKpis(fecha_inicio, fecha_fin, filtros, opciones, request).ranking("tienda", "valor", limit)
 
 def rank_usuarios_valor(fecha_inicio, fecha_fin, filtros, opciones, limit=10, request=None):
-    qs = _rank_qs(fecha_inicio, fecha_fin, filtros, opciones, request)
-    # Detecta campo de nombre del usuario (name → email → id)
-    try:
-        list(qs.values(usuario=F("oportunidad__usuario__name"))[:1])
-        campo_nombre = "oportunidad__usuario__name"
-    except FieldError:
-        try:
-            list(qs.values(usuario=F("oportunidad__usuario__email"))[:1])
-            campo_nombre = "oportunidad__usuario__email"
-        except FieldError:
-            campo_nombre = "oportunidad__usuario_id"  # fallback
-
-    return list(
-        qs.values(usuario_id=F("oportunidad__usuario_id"), nombre=F(campo_nombre))
-          .annotate(
-              valor=Coalesce(
-                  Sum(F("precio_final"), output_field=DecimalField(max_digits=24, decimal_places=6)),
-                  DEC_ZERO
-              )
-          )
-          .order_by("-valor")[:limit]
-    )
+    return PlanKpis(fecha_inicio, fecha_fin, filtros, opciones, request).ranking("usuario", "valor", limit)
 
 def rank_tiendas_ops(fecha_inicio, fecha_fin, filtros, opciones, limit=10, request=None):
-    qs = _rank_qs(fecha_inicio, fecha_fin, filtros, opciones, request)
-    return list(
-        qs.values(tienda_id=F("oportunidad__tienda_id"), nombre=F("oportunidad__tienda__nombre"))
-          .annotate(ops=Count("oportunidad", distinct=True))
-          .order_by("-ops")[:limit]
-    )
+    return PlanKpis(fecha_inicio, fecha_fin, filtros, opciones, request).ranking("tienda", "ops", limit)
 
 def rank_usuarios_ops(fecha_inicio, fecha_fin, filtros, opciones, limit=10, request=None):
-    qs = _rank_qs(fecha_inicio, fecha_fin, filtros, opciones, request)
-    # Detecta campo de nombre del usuario (name → email → id)
-    try:
-        list(qs.values(usuario=F("oportunidad__usuario__name"))[:1])
-        campo_nombre = "oportunidad__usuario__name"
-    except FieldError:
-        try:
-            list(qs.values(usuario=F("oportunidad__usuario__email"))[:1])
-            campo_nombre = "oportunidad__usuario__email"
-        except FieldError:
-            campo_nombre = "oportunidad__usuario_id"
-
-    return list(
-        qs.values(usuario_id=F("oportunidad__usuario_id"), nombre=F(campo_nombre))
-          .annotate(ops=Count("oportunidad", distinct=True))
-          .order_by("-ops")[:limit]
-    )
+    return PlanKpis(fecha_inicio, fecha_fin, filtros, opciones, request).ranking("usuario", "ops", limit)
 
 def kpi_pipeline_actual(filtros, request=None):
-    qs = (Oportunidad.objects
-          .select_related("tienda", "usuario")
-          .filter(estado__in=PIPELINE_ESTADOS))
-
-    # Aplicar filtro de rol
-    if request and hasattr(request, 'user'):
-        qs = filter_queryset_by_role(qs, request.user, tienda_field="tienda", creador_field="usuario")
-
-    if filtros.get("tienda_id"):
-        qs = qs.filter(tienda_id=filtros["tienda_id"])
-    if filtros.get("usuario_id"):
-        qs = qs.filter(usuario_id=filtros["usuario_id"])
-
-    # Valor estimado: si ya hay DispositivoReal auditado, sumar precio_final*cantidad; si no, 0
-    dr = (DispositivoReal.objects
-          .filter(oportunidad_id__in=qs.values_list("id", flat=True), auditado=True)
-          .values("oportunidad_id")
-          .annotate(valor=Coalesce(
-          Sum(F("precio_final"), output_field=DecimalField(max_digits=24, decimal_places=6)),
-          DEC_ZERO
-      )))
-    valor_por_opp = {r["oportunidad_id"]: r["valor"] for r in dr}
-
-    por_estado = []
-    total_abiertas = 0
-    total_valor = Decimal("0")
-    for est in PIPELINE_ESTADOS:
-        ids = list(qs.filter(estado=est).values_list("id", flat=True))
-        count = len(ids)
-        valor = sum(valor_por_opp.get(i, Decimal("0")) for i in ids)
-        por_estado.append({"estado": est, "count": count, "valor": valor})
-        total_abiertas += count
-        total_valor += valor
-
-    return {
-        "abiertas": total_abiertas,
-        "valor_estimado": total_valor,
-        "por_estado": por_estado
-    }
+    return PlanKpis(filtros=filtros, request=request).pipeline()
 
 def kpi_operativa(fecha_inicio, fecha_fin, filtros, opciones, request=None):
-    # Recibidas = todas las Oportunidades creadas en rango (independiente del estado)
-    campo_fecha = _campo_fecha_oportunidad()
-    oqs = Oportunidad.objects.filter(**{f"{campo_fecha}__range": [fecha_inicio, fecha_fin]})
-
-    # Aplicar filtro de rol
-    if request and hasattr(request, 'user'):
-        oqs = filter_queryset_by_role(oqs, request.user, tienda_field="tienda", creador_field="usuario")
-
-    if filtros.get("tienda_id"):
-        oqs = oqs.filter(tienda_id=filtros["tienda_id"])
-    if filtros.get("usuario_id"):
-        oqs = oqs.filter(usuario_id=filtros["usuario_id"])
-
-    recibidas = oqs.count()
-
-    # Completadas = estado Pagado
-    completadas = oqs.filter(estado__in=CERRADA_ESTADOS).count()
-    conversion_pct = (completadas * 100.0 / recibidas) if recibidas else 0.0
-
-    # Tiempos medios (requiere timestamps; ajusta campos a tus nombres)
-    # placeholders seguros:
-    # Tiempos medios usando HistorialOportunidad (estado_nuevo, fecha)
-    opp_ids = list(oqs.values_list("id", flat=True))
-
-    # 17) Respuesta al cliente: En tránsito -> (Oferta confirmada | Nueva oferta enviada)
-    t_in_transit = _first_ts_hist(opp_ids, {"En tránsito"})
-    t_offer = _first_ts_hist(opp_ids, {"Oferta confirmada", "Nueva oferta enviada"})
-    tmed_respuesta_h = _avg_hours_from_pairs([(t_in_transit.get(i), t_offer.get(i)) for i in opp_ids])
-
-    # 18) Recogida: Aceptada -> (Recogida generada | En tránsito)
-    t_accepted = _first_ts_hist(opp_ids, ACCEPTED_STATES)
-    t_pick_hist = _first_ts_hist(opp_ids, PICKUP_STATES)
-    t_pick_dr = _first_dr_date_map(opp_ids, "fecha_recepcion")
-    pairs_recogida = []
-    for i in opp_ids:
-        t_ini = t_accepted.get(i)
-        # fin: primero historial si existe; si no, la primera fecha_recepcion en DR
-        t_fin = t_pick_hist.get(i) or t_pick_dr.get(i)
-        pairs_recogida.append((t_ini, t_fin))
-
-    tmed_recogida_h = _avg_hours_from_pairs(pairs_recogida)
-
-    # 19) Cierre completo: fecha_creación -> Pagado
-    campo_fecha = _campo_fecha_oportunidad()  # ya te resuelve 'fecha_creacion'
-    start_map = {r["id"]: r[campo_fecha] for r in oqs.values("id", campo_fecha)}
-    t_paid = _first_ts_hist(opp_ids, {"Pagado"})
-    tmed_cierre_h = _avg_hours_from_pairs([(start_map.get(i), t_paid.get(i)) for i in opp_ids])
-
-
-    # Rechazos con motivo (si tienes campo motivo_rechazo)
-    rechazadas = oqs.filter(estado__in=["Rechazada"]).count()
-    #motivos = (oqs.filter(estado__in=["Rechazada"])
-    #              .values("motivo_rechazo")
-    #              .annotate(count=Count("id"))
-     #             .order_by("-count"))
-    #motivos = [{"motivo": m["motivo_rechazo"] or "—", "count": m["count"]} for m in motivos]
-
-    # Abandono (heurística): estado “Cancelado” o sin movimiento X días (a definir)
-    abandonadas = oqs.filter(estado__in=["Cancelado"]).count()
-    abandono_pct = (abandonadas * 100.0 / recibidas) if recibidas else 0.0
-
-    return {
-        "recibidas": recibidas,
-        "completadas": completadas,
-        "conversion_pct": round(conversion_pct, 2),
-        "tmed_respuesta_h": tmed_respuesta_h,
-        "tmed_recogida_h": tmed_recogida_h,
-        "tmed_cierre_h": tmed_cierre_h,
-        "rechazos": {"total": rechazadas, },
-        "abandono_pct": round(abandono_pct, 2),
-    }
+    return PlanKpis(fecha_inicio, fecha_fin, filtros, opciones, request).operativa()
@@ -7,14 +7,14 @@ from ..permissions import IsComercialOrAbove
 from ..mixins.role_based_viewset import RoleBasedQuerysetMixin, RoleInfoMixin
 from ..utils.role_filters import filter_queryset_by_role
 from progeek.models import UserGlobalRole, RolPorTenant
-from .pagination import StandardResultsSetPagination
+from .pagination import ClientePagination
 from decimal import Decimal
 from django.db.models import Sum, Count, Q, Value, DecimalField
 from django.db.models.functions import Coalesce
 
 class ClienteViewSet(RoleBasedQuerysetMixin, RoleInfoMixin, viewsets.ModelViewSet):
     permission_classes = [IsComercialOrAbove]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = ClientePagination
 
     # Configuración para role-based filtering
     tienda_field = "tienda"
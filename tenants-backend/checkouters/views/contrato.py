@@ -7,7 +7,8 @@ from django.db import connection
 from django.db.models import Prefetch
 from ..models.oportunidad import Oportunidad
 from ..models.dispositivo import DispositivoReal, Dispositivo
-from checkouters.utils.createpdf import generar_pdf_oportunidad
+from checkouters.utils.createpdf import generar_pdf_oportunidad_cacheado, generar_pdf_oportunidad_en_segundo_plano
+from checkouters.services import pdf_cache
 from django.http import HttpResponse,JsonResponse
 from rest_framework.response import Response
 from progeek.utils import enviar_correo
@@ -16,6 +17,20 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+def _en_segundo_plano(request):
+    """?async=1: lotes grandes, se genera fuera de la petición y se avisa al terminar."""
+    return request.query_params.get("async") in ("1", "true")
+
+
+def _respuesta_en_cola(oportunidad, usuario_id, tenant, dispositivos_override=None):
+    url = generar_pdf_oportunidad_en_segundo_plano(
+        oportunidad, usuario_id, tenant=tenant, dispositivos_override=dispositivos_override
+    )
+    return JsonResponse({"estado": "en_cola", "url": url}, status=202)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
 def generar_pdf_view(request, pk):
     logger.info("Generando PDF para oportunidad %s...", pk)
 
@@ -31,8 +46,11 @@ def generar_pdf_view(request, pk):
     # Obtener el tenant actual para usar su logo en el PDF
     tenant = connection.tenant
 
+    if _en_segundo_plano(request):
+        return _respuesta_en_cola(oportunidad, request.user.id, tenant)
+
     try:
-        pdf_buffer = generar_pdf_oportunidad(oportunidad, tenant=tenant)
+        pdf_buffer = generar_pdf_oportunidad_cacheado(oportunidad, tenant=tenant)
         logger.info("PDF generado correctamente para oportunidad %s", pk)
     except Exception as e:
         logger.exception(f"❌ Error al generar el PDF para oportunidad {pk}: {e}")
@@ -43,6 +61,8 @@ def generar_pdf_view(request, pk):
     return response
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
 def generar_pdf_oferta_formal(request, pk):
     """
     Genera PDF de oferta formal con dispositivos auditados (DispositivoReal).
@@ -64,15 +84,19 @@ def generar_pdf_oferta_formal(request, pk):
         oportunidad=oportunidad
     ).select_related('modelo', 'capacidad', 'dispositivo_personalizado')
 
-    if not dispositivos_reales.exists():
+    dispositivos_reales = list(dispositivos_reales)
+    if not dispositivos_reales:
         logger.warning(f"⚠️ No hay dispositivos reales para oportunidad {pk}, generando PDF vacío")
 
+    if _en_segundo_plano(request):
+        return _respuesta_en_cola(oportunidad, request.user.id, tenant, dispositivos_reales)
+
     try:
         # Generar PDF usando los dispositivos reales
-        pdf_buffer = generar_pdf_oportunidad(
+        pdf_buffer = generar_pdf_oportunidad_cacheado(
             oportunidad,
             tenant=tenant,
-            dispositivos_override=list(dispositivos_reales)
+            dispositivos_override=dispositivos_reales
         )
         logger.info("PDF oferta formal generado correctamente para oportunidad %s", pk)
     except Exception as e:
@@ -84,6 +108,20 @@ def generar_pdf_oferta_formal(request, pk):
     return response
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def descargar_pdf_cacheado(request, tipo, clave):
+    """PDF ya generado de la caché del tenant actual (enlace de las notificaciones)."""
+    if not pdf_cache.clave_valida(tipo, clave):
+        raise Http404("PDF no encontrado")
+    pdf = pdf_cache.leer(tipo, clave)
+    if pdf is None:
+        raise Http404("PDF no encontrado")
+    response = HttpResponse(pdf, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename={tipo}_{clave[:12]}.pdf'
+    return response
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def enviar_correo_oferta(request, id):
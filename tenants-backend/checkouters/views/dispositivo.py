@@ -13,6 +13,8 @@ from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView
 from productos.models.modelos import Modelo, Capacidad
 from productos.models.precios import PrecioRecompra
+from productos.services.precios_vigentes import precio_vigente
+from django.db import connection
 from django.db.models import Q
 from django.utils import timezone  # ya lo usas más abajo; si ya estaba, ignora esta línea
 from ..models.dispositivo import Dispositivo, DispositivoReal
@@ -25,6 +27,7 @@ from django.shortcuts import get_object_or_404
 from ..serializers.producto import ModeloSerializer, CapacidadSerializer
 import re
 from rest_framework.pagination import PageNumberPagination
+from .pagination import DispositivoPagination
 
 UUID_REGEX = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[1-5][0-9a-fA-F]{3}-[89abAB][0-9a-fA-F]{3}-[0-9a-fA-F]{12}$")
 NUM_REGEX = re.compile(r"^\d+$")
@@ -37,6 +40,7 @@ class ModeloPagination(PageNumberPagination):
 class DispositivoViewSet(RoleBasedQuerysetMixin, RoleInfoMixin, viewsets.ModelViewSet):
     serializer_class = DispositivoSerializer
     permission_classes = [IsComercialOrAbove]
+    pagination_class = DispositivoPagination
 
     # Configuración para role-based filtering
     # Los dispositivos se filtran por la oportunidad a la que pertenecen
@@ -94,9 +98,12 @@ class DispositivoViewSet(RoleBasedQuerysetMixin, RoleInfoMixin, viewsets.ModelVi
             """
             Devuelve el precio_neto vigente en PrecioRecompra para (capacidad, canal) a 'fecha'.
             Rango semiabierto [valid_from, valid_to).
+            Sin fecha lee del almacén PrecioVigente (override del tenant actual o global).
             """
             if fecha is None:
-                fecha = timezone.now()
+                schema = getattr(connection, 'schema_name', None)
+                tenant_schema = schema if schema and schema != 'public' else None
+                return precio_vigente(capacidad_id, canal, tenant_schema)
 
             return (PrecioRecompra.objects
                     .filter(capacidad_id=capacidad_id, canal=canal, valid_from__lte=fecha)
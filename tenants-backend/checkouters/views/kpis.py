@@ -7,18 +7,21 @@ from rest_framework import status as http_status
 from django.utils.dateparse import parse_date
 from django.utils.timezone import make_aware
 from datetime import datetime, time
+from collections import defaultdict
 from django.db.models import Sum, Count
 from django.db.models.functions import TruncMonth, TruncWeek, TruncDay
-from django.db.models import F, Value, DecimalField, When, Case, IntegerField
+from django.db.models import F, DecimalField, When, Case, IntegerField
 from django.db.models.functions import Coalesce
 from decimal import Decimal
 import logging
 
-from ..models.dispositivo import Dispositivo, DispositivoReal
+from ..models.dispositivo import Dispositivo
 from ..models.oportunidad import Oportunidad
 from ..models.tienda import Tienda
 from ..permissions import IsComercialOrAbove, IsStoreManagerOrAbove, IsManagerOnly
-from ..utils.role_filters import get_user_rol_tenant
+from ..services.kpis_diarios import inicio_dia
+from ..utils.role_filters import ACCESO_TOTAL, get_user_rol_tenant
+from ..utils.utilskpis import PlanKpis
 from progeek.models import RolPorTenant
 from datetime import timedelta
 logger = logging.getLogger(__name__)
@@ -87,58 +90,36 @@ class ValorPorTiendaAPIView(APIView):
         }.get(granularidad, TruncMonth)
 
         tiendas = list(Tienda.objects.values_list("nombre", flat=True))
-
-        # Valores: Solo dispositivos reales de OPERACIONES (con valor confirmado)
-        valores = DispositivoReal.objects.filter(
-            oportunidad__estado__in=estados_filtrados,
-            oportunidad__fecha_creacion__date__range=[fecha_inicio.date(), fecha_fin.date()]
-        ).exclude(
-            oportunidad__estado__in=ESTADOS_EXCLUIDOS_VALOR
-        )
-
-        if usuario_id:
-            valores = valores.filter(oportunidad__usuario_id=usuario_id)
-
-        valores = valores.annotate(
-            grupo=truncador("oportunidad__fecha_creacion")
-        ).values(
-            "grupo", "oportunidad__tienda__nombre"
-        ).annotate(
-            total=Sum(Coalesce("precio_final", Value(0), output_field=DecimalField(max_digits=12, decimal_places=0)))
-        )
-
-        # Dispositivos: De OPERACIONES (confirmadas)
-        dispositivos = Dispositivo.objects.filter(
-            oportunidad__estado__in=estados_filtrados,
-            oportunidad__fecha_creacion__date__range=[fecha_inicio.date(), fecha_fin.date()]
-        )
-
-        if usuario_id:
-            dispositivos = dispositivos.filter(oportunidad__usuario_id=usuario_id)
-
-        dispositivos = dispositivos.annotate(
-            grupo=truncador("oportunidad__fecha_creacion")
-        ).values(
-            "grupo", "oportunidad__tienda__nombre"
-        ).annotate(
-            cantidad_dispositivos=Sum("cantidad")
+        nombres_tienda = dict(Tienda.objects.values_list("id", "nombre"))
+
+        # Plan de KPIs: el rango se resuelve una vez; valor y
+        # oportunidades salen de las mismas filas agregadas (KpiDiario + vivo)
+        plan = PlanKpis(
+            fecha_inicio, fecha_fin,
+            filtros={"usuario_id": usuario_id},
+            ambito=ACCESO_TOTAL,
+            granularidad=granularidad,
         )
+        estados_valor = set(estados_filtrados) - set(ESTADOS_EXCLUIDOS_VALOR)
 
+        # Valores: Solo dispositivos reales de OPERACIONES (con valor confirmado)
         # Oportunidades: Solo estados de OPORTUNIDAD (antes de confirmación)
-        oportunidades = Oportunidad.objects.filter(
-            estado__in=ESTADOS_OPORTUNIDAD,
-            fecha_creacion__date__range=[fecha_inicio.date(), fecha_fin.date()]
-        )
+        valores = defaultdict(Decimal)
+        oportunidades = defaultdict(int)
+        for f in plan.filas:
+            clave = (inicio_dia(f["periodo"]), f["tienda_id"])
+            if f["estado"] in estados_valor:
+                valores[clave] += f["valor"] or Decimal("0")
+            if f["estado"] in ESTADOS_OPORTUNIDAD:
+                oportunidades[clave] += f["ops"] or 0
 
-        if usuario_id:
-            oportunidades = oportunidades.filter(usuario_id=usuario_id)
-
-        oportunidades = oportunidades.annotate(
-            grupo=truncador("fecha_creacion")
-        ).values(
-            "grupo", "tienda__nombre"
-        ).annotate(
-            cantidad_oportunidades=Count("id", distinct=True)
+        # Dispositivos: De OPERACIONES (confirmadas)
+        dispositivos = (
+            Dispositivo.objects.filter(oportunidad__in=plan.oportunidades(estados_filtrados).values("id"))
+            .annotate(grupo=truncador("oportunidad__fecha_creacion"))
+            .values("grupo", "oportunidad__tienda_id")
+            .annotate(cantidad_dispositivos=Sum("cantidad"))
+            .order_by()
         )
 
         data = {}
@@ -157,26 +138,28 @@ class ValorPorTiendaAPIView(APIView):
             d.update({f"{t}__n_oportunidades": 0 for t in tiendas})
             return d
 
-        for row in valores:
-            clave = format_grupo(row["grupo"])
-            tienda = row["oportunidad__tienda__nombre"] or "Sin tienda"
+        for (grupo, tienda_id), total in valores.items():
+            clave = format_grupo(grupo)
+            tienda = nombres_tienda.get(tienda_id) or "Sin tienda"
             data.setdefault(clave, init_mes())
-            data[clave][tienda] = float(row["total"] or 0)
-            data[clave]["__orden"] = row["grupo"]
+            data[clave][tienda] = float(total)
+            data[clave]["__orden"] = grupo
 
         for row in dispositivos:
             clave = format_grupo(row["grupo"])
-            tienda = row["oportunidad__tienda__nombre"] or "Sin tienda"
+            tienda = nombres_tienda.get(row["oportunidad__tienda_id"]) or "Sin tienda"
             data.setdefault(clave, init_mes())
             data[clave][f"{tienda}__n_dispositivos"] = int(row["cantidad_dispositivos"] or 0)
             data[clave]["__orden"] = row["grupo"]
 
-        for row in oportunidades:
-            clave = format_grupo(row["grupo"])
-            tienda = row["tienda__nombre"] or "Sin tienda"
+        for (grupo, tienda_id), total in oportunidades.items():
+            if not total:
+                continue
+            clave = format_grupo(grupo)
+            tienda = nombres_tienda.get(tienda_id) or "Sin tienda"
             data.setdefault(clave, init_mes())
-            data[clave][f"{tienda}__n_oportunidades"] = int(row["cantidad_oportunidades"] or 0)
-            data[clave]["__orden"] = row["grupo"]
+            data[clave][f"{tienda}__n_oportunidades"] = total
+            data[clave]["__orden"] = grupo
 
         claves_posibles = {}
         actual = fecha_inicio
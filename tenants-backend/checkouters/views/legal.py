@@ -8,6 +8,7 @@ from django.db import transaction
 from django_tenants.utils import schema_context, get_public_schema_name
 from django.http import FileResponse, HttpResponse, JsonResponse
 from django.core.files.base import ContentFile
+from django.template import TemplateDoesNotExist
 from django.conf import settings
 from django.core.mail import send_mail, EmailMessage
 from django_filters.rest_framework import DjangoFilterBackend
@@ -23,7 +24,7 @@ from ..models.legal import B2CContrato, LegalTemplate
 from ..serializers import B2CContratoCreateSerializer, B2CContratoDetailSerializer, B2CContratoKYCFlagsSerializer, LegalTemplateSerializer
 from ..permissions import EsTecnicoOAdmin
 from ..utils.otp import check_otp, generar_otp, hash_otp
-from ..utils.pdf import generar_pdf_contrato, persistir_pdf_final
+from ..utils.pdf import generar_pdf_contrato, generar_pdf_contrato_preview, persistir_pdf_final
 from ..utils.images import sanitize_image
 from ..services.legal_pdfs import build_condiciones_b2c_pdf
 from progeek.models import B2CKycIndex
@@ -398,7 +399,7 @@ class B2CContratoViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["get"], url_path="pdf-preview")
     def pdf_preview(self, request, **kwargs):
         contrato = self.get_object()
-        pdf_file, sha = generar_pdf_contrato(contrato, preview=True)
+        pdf_file, sha = generar_pdf_contrato_preview(contrato)
         
         bio = io.BytesIO(pdf_file.read())
         resp = FileResponse(bio, content_type="application/pdf")
@@ -1002,7 +1003,7 @@ class B2CContratoPdfPreviewByToken(APIView):
 
         with schema_context(idx.tenant_slug):
             contrato = get_object_or_404(B2CContrato, pk=idx.contrato_id)
-            content_file, sha = generar_pdf_contrato(contrato, preview=True)
+            content_file, sha = generar_pdf_contrato_preview(contrato)
             content_file.seek(0)
             pdf_bytes = content_file.read()
 
@@ -1023,8 +1024,17 @@ def condiciones_b2c_pdf(request):
     lang = request.query_params.get("lang", "es")
     if not tenant_slug:
         return HttpResponse("tenant_slug requerido", status=400)
-    with schema_context(tenant_slug):
-        out = build_condiciones_b2c_pdf(tenant=type("T",(),{"schema_name":tenant_slug,"name":tenant_slug}))
+    try:
+        with schema_context(tenant_slug):
+            out = build_condiciones_b2c_pdf(
+                tenant=type("T",(),{"schema_name":tenant_slug,"name":tenant_slug}), version=version, lang=lang
+            )
+    except TemplateDoesNotExist:
+        return HttpResponse("Versión o idioma no disponible", status=404)
+    if request.headers.get("If-None-Match") == out["sha256"]:
+        resp = HttpResponse(status=304)
+        resp["ETag"] = out["sha256"]
+        return resp
     resp = HttpResponse(out["bytes"], content_type="application/pdf")
     resp["Content-Disposition"] = f'inline; filename="condiciones-b2c-{version}.pdf"'
     resp["ETag"] = out["sha256"]
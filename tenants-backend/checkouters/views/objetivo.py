@@ -5,8 +5,6 @@ from datetime import date, datetime, time, timedelta
 from decimal import Decimal
 from typing import Dict, Iterable, List
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Sum
-from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django_tenants.utils import get_public_schema_name, schema_context
 from rest_framework import viewsets
@@ -17,10 +15,11 @@ from rest_framework.decorators import action
 
 from progeek.models import RolPorTenant
 
-from ..models import DispositivoReal, Objetivo, Oportunidad, Tienda
+from ..models import Objetivo, Tienda
 from ..permissions import IsTenantManagerOrSuper
 from ..serializers.objetivo import ObjetivoSerializer, _parse_periodo
-from ..utils.role_filters import get_tienda_ids_for_user
+from ..utils.role_filters import ambito_rol
+from ..utils.utilskpis import PlanKpis
 
 
 def _period_bounds(periodo: str, periodo_tipo: str) -> tuple[date, datetime, datetime]:
@@ -126,7 +125,8 @@ class ObjetivoResumenAPIView(APIView):
         tenant_slug = (tenant_slug or "").lower()
 
         # Obtener IDs de tiendas permitidas según rol del usuario
-        tienda_ids_permitidas = get_tienda_ids_for_user(request.user, tenant_slug)
+        ambito = ambito_rol(request.user, tenant_slug, read_only_for_comercial=True)
+        tienda_ids_permitidas = ambito.tienda_ids_permitidas
 
         if scope == "tienda":
             objetivos = Objetivo.objects.filter(
@@ -141,8 +141,6 @@ class ObjetivoResumenAPIView(APIView):
             if tienda_ids_permitidas is not None:  # None = acceso a todas
                 tiendas_qs = tiendas_qs.filter(id__in=tienda_ids_permitidas)
             targets: Iterable[Tienda] = tiendas_qs
-
-            group_field = "oportunidad__tienda_id"
         else:
             objetivos = Objetivo.objects.filter(
                 tipo="usuario",
@@ -152,119 +150,25 @@ class ObjetivoResumenAPIView(APIView):
             objetivos_map = {obj.usuario_id: obj for obj in objetivos if obj.usuario_id}
             # Filtrar usuarios por tiendas permitidas
             targets = _fetch_usuarios_manager(tenant_slug, tienda_ids_permitidas)
-            group_field = "oportunidad__usuario_id"
 
+        # Progreso: una sola query agrupada por (tienda, usuario) sobre las
+        # oportunidades pagadas en el periodo (por fecha de inicio de pago)
+        plan = PlanKpis(inicio_dt, fin_dt, campo_fecha="fecha_inicio_pago", ambito=ambito)
         valor_por_target = defaultdict(lambda: Decimal("0"))
-        valor_filter = {
-            "oportunidad__estado__iexact": "Pagado",
-            "oportunidad__fecha_inicio_pago__gte": inicio_dt,
-            "oportunidad__fecha_inicio_pago__lte": fin_dt,
-        }
-        # Filtrar por tiendas permitidas (tanto para scope tienda como usuario)
-        if tienda_ids_permitidas is not None:
-            valor_filter["oportunidad__tienda_id__in"] = tienda_ids_permitidas
-
-        valor_rows = (
-            DispositivoReal.objects.filter(**valor_filter)
-            .values(group_field)
-            .annotate(total=Coalesce(Sum("precio_final"), Decimal("0")))
-        )
-        for row in valor_rows:
-            target_id = row[group_field]
-            if target_id is not None:
-                valor_por_target[target_id] = Decimal(row["total"] or 0)
-
         operaciones_por_target = defaultdict(int)
-        if scope == "tienda":
-            group_values = "tienda_id"
-        else:
-            group_values = "usuario_id"
-
-        operaciones_filter = {
-            "estado__iexact": "Pagado",
-            "fecha_inicio_pago__gte": inicio_dt,
-            "fecha_inicio_pago__lte": fin_dt,
-        }
-        # Filtrar por tiendas permitidas (tanto para scope tienda como usuario)
-        if tienda_ids_permitidas is not None:
-            operaciones_filter["tienda_id__in"] = tienda_ids_permitidas
-
-        operaciones_rows = (
-            Oportunidad.objects.filter(**operaciones_filter)
-            .values(group_values)
-            .annotate(total=Count("id"))
-        )
-        for row in operaciones_rows:
-            target_id = row[group_values]
+        usuarios_por_tienda: Dict[int, Dict[int, dict]] = defaultdict(dict)
+        for (tienda_id, usuario_id), progreso in plan.progreso("Pagado").items():
+            target_id = tienda_id if scope == "tienda" else usuario_id
             if target_id is not None:
-                operaciones_por_target[target_id] = int(row["total"] or 0)
+                valor_por_target[target_id] += progreso["valor"]
+                operaciones_por_target[target_id] += progreso["ops"]
+            if scope == "tienda" and tienda_id is not None and usuario_id is not None:
+                usuarios_por_tienda[tienda_id][usuario_id] = {
+                    "progreso_valor": progreso["valor"],
+                    "progreso_operaciones": progreso["ops"],
+                }
 
-        usuarios_por_tienda: Dict[int, Dict[int, dict]] = defaultdict(dict)
         if scope == "tienda":
-            usuarios_valor_filter = {
-                "oportunidad__estado__iexact": "Pagado",
-                "oportunidad__fecha_inicio_pago__gte": inicio_dt,
-                "oportunidad__fecha_inicio_pago__lte": fin_dt,
-            }
-            # Filtrar por tiendas permitidas
-            if tienda_ids_permitidas is not None:
-                usuarios_valor_filter["oportunidad__tienda_id__in"] = tienda_ids_permitidas
-
-            usuarios_valor_rows = (
-                DispositivoReal.objects.filter(**usuarios_valor_filter)
-                .values("oportunidad__tienda_id", "oportunidad__usuario_id")
-                .annotate(total=Coalesce(Sum("precio_final"), Decimal("0")))
-            )
-
-            for row in usuarios_valor_rows:
-                tienda_id = row["oportunidad__tienda_id"]
-                usuario_id = row["oportunidad__usuario_id"]
-                if tienda_id is None or usuario_id is None:
-                    continue
-                usuarios_por_tienda[tienda_id].setdefault(
-                    usuario_id,
-                    {
-                        "progreso_valor": Decimal("0"),
-                        "progreso_operaciones": 0,
-                    },
-                )["progreso_valor"] = Decimal(row["total"] or 0)
-
-            usuarios_ops_filter = {
-                "estado__iexact": "Pagado",
-                "fecha_inicio_pago__gte": inicio_dt,
-                "fecha_inicio_pago__lte": fin_dt,
-            }
-            # Filtrar por tiendas permitidas
-            if tienda_ids_permitidas is not None:
-                usuarios_ops_filter["tienda_id__in"] = tienda_ids_permitidas
-
-            usuarios_ops_rows = (
-                Oportunidad.objects.filter(**usuarios_ops_filter)
-                .values("tienda_id", "usuario_id")
-                .annotate(total=Count("id"))
-            )
-            for row in usuarios_ops_rows:
-                tienda_id = row["tienda_id"]
-                usuario_id = row["usuario_id"]
-                if tienda_id is None or usuario_id is None:
-                    continue
-                usuarios_por_tienda.setdefault(
-                    tienda_id,
-                    {
-                        usuario_id: {
-                            "progreso_valor": Decimal("0"),
-                            "progreso_operaciones": 0,
-                        }
-                    },
-                )
-                usuarios_por_tienda[tienda_id].setdefault(
-                    usuario_id,
-                    {
-                        "progreso_valor": Decimal("0"),
-                        "progreso_operaciones": 0,
-                    },
-                )["progreso_operaciones"] = int(row["total"] or 0)
-
             usuario_objetivos_map: Dict[int, Objetivo] = {
                 obj.usuario_id: obj
                 for obj in Objetivo.objects.filter(
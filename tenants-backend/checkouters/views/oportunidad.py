@@ -12,6 +12,7 @@ from checkouters.mixins import SchemaAwareCreateMixin
 from checkouters.mixins.role_based_viewset import RoleBasedQuerysetMixin, RoleInfoMixin
 import re
 from rest_framework.pagination import PageNumberPagination
+from .pagination import OportunidadPagination, HistorialPagination, clave_peticion, contar_cacheado
 
 from ..models.oportunidad import Oportunidad, HistorialOportunidad,ComentarioOportunidad
 from ..models.dispositivo import Dispositivo, DispositivoReal
@@ -31,6 +32,7 @@ NUM_REGEX = re.compile(r"^\d+$")
 class OportunidadViewSet(RoleBasedQuerysetMixin, RoleInfoMixin, viewsets.ModelViewSet):
     serializer_class = OportunidadSerializer
     permission_classes = [IsComercialOrAbove]
+    pagination_class = OportunidadPagination
     tanstack_page_index_param = "pageIndex"
     tanstack_page_size_param = "pageSize"
 
@@ -41,32 +43,35 @@ class OportunidadViewSet(RoleBasedQuerysetMixin, RoleInfoMixin, viewsets.ModelVi
     def list(self, request, *args, **kwargs):
         page_index_raw = request.query_params.get(self.tanstack_page_index_param)
         page_size_raw = request.query_params.get(self.tanstack_page_size_param)
+        cursor = request.query_params.get(self.pagination_class.cursor_query_param)
 
         if page_index_raw is not None or page_size_raw is not None:
             queryset = self.filter_queryset(self.get_queryset())
+            paginator = self.pagination_class()
 
             try:
                 page_index = max(0, int(page_index_raw)) if page_index_raw is not None else 0
             except (TypeError, ValueError):
                 page_index = 0
 
-            default_page_size = getattr(self.pagination_class, 'page_size', None) or 20
+            default_page_size = paginator.page_size
             try:
                 requested_page_size = int(page_size_raw) if page_size_raw is not None else default_page_size
             except (TypeError, ValueError):
                 requested_page_size = default_page_size
 
-            page_size = max(1, requested_page_size)
-            max_page_size = getattr(self.pagination_class, 'max_page_size', None)
-            if max_page_size is not None:
-                page_size = min(page_size, max_page_size)
+            page_size = min(max(1, requested_page_size), paginator.max_page_size)
 
-            total = queryset.count()
-            start = page_index * page_size
-            end = start + page_size
-            page_queryset = queryset[start:end]
+            # Total cacheado unos segundos; con cursor la página no usa OFFSET
+            total = contar_cacheado(queryset, clave=clave_peticion(request, ignorar=(
+                self.tanstack_page_index_param, self.tanstack_page_size_param,
+                self.pagination_class.cursor_query_param,
+            )))
+            filas, next_cursor, prev_cursor = paginator.paginar(
+                queryset, page_size, cursor=cursor, pagina=page_index,
+            )
 
-            serializer = self.get_serializer(page_queryset, many=True)
+            serializer = self.get_serializer(filas, many=True)
             page_count = math.ceil(total / page_size) if page_size else 0
 
             return Response(
@@ -76,6 +81,8 @@ class OportunidadViewSet(RoleBasedQuerysetMixin, RoleInfoMixin, viewsets.ModelVi
                     "pageSize": page_size,
                     "total": total,
                     "pageCount": page_count,
+                    "nextCursor": next_cursor,
+                    "prevCursor": prev_cursor,
                 }
             )
 
@@ -104,11 +111,9 @@ class OportunidadViewSet(RoleBasedQuerysetMixin, RoleInfoMixin, viewsets.ModelVi
         user = self.request.user
         schema = self.request.query_params.get("schema")
 
-        # Base queryset con optimizaciones
-        base_qs = (
-            Oportunidad.objects.select_related("cliente", "tienda", "usuario")
-            .prefetch_related("comentarios", "dispositivos_oportunidad", "dispositivos_reales")
-        )
+        # Base queryset con optimizaciones: totales anotados y facturas,
+        # comentarios y dispositivos precargados (ver preparar_listado)
+        base_qs = OportunidadSerializer.preparar_listado(Oportunidad.objects.all())
 
         # Filtros adicionales de búsqueda
         cliente = self.request.query_params.get("cliente") or ""
@@ -364,6 +369,7 @@ class OportunidadViewSet(RoleBasedQuerysetMixin, RoleInfoMixin, viewsets.ModelVi
 
 class HistorialOportunidadViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = HistorialOportunidadSerializer
+    pagination_class = HistorialPagination
 
     def _get_lookup_value(self):
         return (
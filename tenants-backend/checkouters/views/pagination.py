@@ -1,7 +1,112 @@
-from rest_framework.pagination import PageNumberPagination
+"""
+Paginación de listados de tenant.
+
+- StandardResultsSetPagination: por número de página (OFFSET/LIMIT)
+- KeysetPagination: por cursor sobre el orden del listado (ver
+  utils/paginacion.py); una página profunda cuesta lo mismo que la primera
+"""
+from collections import OrderedDict
+
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from ..utils.paginacion import clave_peticion, contar_cacheado, paginar_keyset
+
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 25                      # por defecto
     page_size_query_param = "page_size" # habilita ?page_size=...
     max_page_size = 200                 # tapa superior
-    page_query_param = "page"           # ?page=2
\ No newline at end of file
+    page_query_param = "page"           # ?page=2
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor sobre `ordering`.
+
+    Los campos de `ordering` no pueden ser nulos y el último debe ser único
+    (normalmente "id"). Sin ?cursor devuelve la primera página, o la ?page=N
+    por OFFSET; la respuesta trae siempre next_cursor para seguir por clave.
+
+    Con solo_si_se_pide=True no pagina si la petición no trae cursor,
+    page ni page_size (compatibilidad con clientes que esperan la lista
+    completa).
+    """
+    ordering = ("-fecha_creacion", "-id")
+    page_size = 25
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    page_query_param = "page"
+    cursor_query_param = "cursor"
+    solo_si_se_pide = False
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            page_size = self.page_size
+        return min(max(1, page_size), self.max_page_size)
+
+    def paginar(self, queryset, page_size, cursor=None, pagina=0):
+        """Ver utils.paginacion.paginar_keyset."""
+        return paginar_keyset(queryset, self.ordering, page_size, cursor=cursor, pagina=pagina)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        cursor = params.get(self.cursor_query_param)
+        if self.solo_si_se_pide and not (
+            cursor or self.page_query_param in params or self.page_size_query_param in params
+        ):
+            return None
+
+        try:
+            pagina = max(1, int(params.get(self.page_query_param, 1))) - 1
+        except (TypeError, ValueError):
+            pagina = 0
+
+        self.request = request
+        self.count = contar_cacheado(queryset, clave=clave_peticion(request, ignorar=(
+            self.cursor_query_param, self.page_query_param, self.page_size_query_param,
+        )))
+        filas, self.siguiente, self.anterior = self.paginar(
+            queryset, self.get_page_size(request), cursor=cursor, pagina=pagina,
+        )
+        return filas
+
+    def _enlace(self, cursor):
+        if not cursor:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("count", self.count),
+            ("next", self._enlace(self.siguiente)),
+            ("previous", self._enlace(self.anterior)),
+            ("next_cursor", self.siguiente),
+            ("previous_cursor", self.anterior),
+            ("results", data),
+        ]))
+
+
+class OportunidadPagination(KeysetPagination):
+    ordering = ("-fecha_creacion", "-id")
+    page_size = 20
+    max_page_size = 500
+    solo_si_se_pide = True
+
+
+class DispositivoPagination(KeysetPagination):
+    ordering = ("-fecha_creacion", "-id")
+    solo_si_se_pide = True
+
+
+class ClientePagination(KeysetPagination):
+    ordering = ("id",)
+
+
+class HistorialPagination(KeysetPagination):
+    ordering = ("-fecha", "-id")
+    solo_si_se_pide = True
@@ -19,8 +19,12 @@ try:
     from notificaciones.routing import websocket_urlpatterns as noti_ws
 except Exception:
     noti_ws = []
+try:
+    from productos.routing import websocket_urlpatterns as productos_ws
+except Exception:
+    productos_ws = []
 
-websocket_routes = list(chat_ws) + list(noti_ws)
+websocket_routes = list(chat_ws) + list(noti_ws) + list(productos_ws)
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
@@ -0,0 +1,59 @@
+# django_test_app/lote_transaccion.py
+"""
+Lotes por transacción: agrupa lo que aportan varias señales/llamadas de la
+misma transacción y lo vuelca con un único callback de transaction.on_commit.
+
+Cada hilo guarda en un threading.local una referencia débil al lote abierto.
+Django retiene el callback (el propio lote) hasta el commit; si la transacción
+o el savepoint se deshacen, lo descarta, la referencia muere y la siguiente
+llamada abre un lote nuevo. Al ejecutarse, el lote se desengancha del hilo.
+"""
+import threading
+import weakref
+from typing import Any, Callable
+
+from django.db import transaction
+
+_local = threading.local()
+
+
+class _Lote:
+    def __init__(self, nombre: str, datos: Any, volcar: Callable[[Any], None]):
+        self.nombre = nombre
+        self.datos = datos
+        self.volcar = volcar
+
+    def __call__(self) -> None:
+        ref = getattr(_local, self.nombre, None)
+        if ref is not None and ref() is self:
+            setattr(_local, self.nombre, None)
+        self.volcar(self.datos)
+
+
+def agregar_al_lote(
+    nombre: str,
+    agregar: Callable[[Any], None],
+    volcar: Callable[[Any], None],
+    vacio: Callable[[], Any] = dict,
+) -> None:
+    """
+    Añade datos al lote `nombre` de la transacción en curso.
+
+    El primer aporte de cada transacción crea el lote y registra su callback;
+    sin transacción, on_commit lo vuelca en el acto.
+
+    Args:
+        nombre: Identificador del tipo de lote (uno por módulo)
+        agregar: Recibe los datos del lote y les añade lo suyo
+        volcar: Recibe los datos del lote al confirmar la transacción
+        vacio: Crea los datos de un lote nuevo
+    """
+    ref = getattr(_local, nombre, None)
+    lote = ref() if ref is not None else None
+    if lote is not None:
+        agregar(lote.datos)
+        return
+    lote = _Lote(nombre, vacio(), volcar)
+    agregar(lote.datos)
+    setattr(_local, nombre, weakref.ref(lote))
+    transaction.on_commit(lote)
@@ -24,6 +24,35 @@ CAPACIDAD_GB_FIELD = config("CAPACIDAD_GB_FIELD", default="tamaño")
 CAPACIDAD_REL_MODEL_FIELD = config("CAPACIDAD_REL_MODEL_FIELD", default="modelo")
 REL_MODELO_NAME_FIELD = config("REL_MODELO_NAME_FIELD", default="descripcion")
 EQUIVALENCIAS_CSV = config("EQUIVALENCIAS_CSV", default="/srv/checkouters/Partners/tenants-backend/equivalencias_modelos.csv")
+# Procesos para DeviceMapperService.map_many() (1 = secuencial en el proceso actual)
+MAPPING_V4_WORKERS = config("MAPPING_V4_WORKERS", default=os.cpu_count() or 1, cast=int)
+# Caché persistente de resultados del mapeo v4 (tabla productos_mapping_result_cache)
+MAPPING_V4_RESULT_CACHE = config("MAPPING_V4_RESULT_CACHE", default=True, cast=bool)
+# Segundos tras los que CatalogIndex se recarga aunque no haya invalidaciones (0 = nunca)
+CATALOG_INDEX_MAX_AGE = config("CATALOG_INDEX_MAX_AGE", default=300, cast=int)
+# Ídem para la caché en memoria de costes de pieza (productos.services.costes_pieza)
+COSTES_PIEZA_MAX_AGE = config("COSTES_PIEZA_MAX_AGE", default=300, cast=int)
+# Cliente HTTP de Likewize (productos.services.likewize_http)
+LIKEWIZE_BASE_URL = config("LIKEWIZE_BASE_URL", default="https://appleb2bonlineesp.likewize.com")
+LIKEWIZE_HTTP_CONCURRENCY = config("LIKEWIZE_HTTP_CONCURRENCY", default=8, cast=int)
+LIKEWIZE_HTTP_RATE = config("LIKEWIZE_HTTP_RATE", default=10, cast=float)  # peticiones/segundo por host, 0 = sin límite
+LIKEWIZE_HTTP_RETRIES = config("LIKEWIZE_HTTP_RETRIES", default=3, cast=int)
+# Cola de tareas de actualización de precios (productos.services.cola_tareas)
+TAREAS_ACTUALIZACION_CONCURRENCIA = {  # tareas simultáneas por fuente
+    "likewize": config("TAREAS_CONCURRENCIA_LIKEWIZE", default=1, cast=int),
+    "swappie": config("TAREAS_CONCURRENCIA_SWAPPIE", default=1, cast=int),
+    "backmarket": config("TAREAS_CONCURRENCIA_BACKMARKET", default=1, cast=int),
+    "remapeo": config("TAREAS_CONCURRENCIA_REMAPEO", default=1, cast=int),  # remapear_likewize (pool de procesos)
+}
+TAREAS_ACTUALIZACION_HEARTBEAT_INTERVAL = config("TAREAS_HEARTBEAT_INTERVAL", default=10, cast=float)
+TAREAS_ACTUALIZACION_HEARTBEAT_TIMEOUT = config("TAREAS_HEARTBEAT_TIMEOUT", default=120, cast=int)
+TAREAS_ACTUALIZACION_MAX_INTENTOS = config("TAREAS_MAX_INTENTOS", default=3, cast=int)
+# Endpoints globales: tenants consultados en paralelo (una conexión por hilo;
+# 0 = en serie en el propio hilo) y timeout por tenant
+TENANT_FANOUT_WORKERS = config("TENANT_FANOUT_WORKERS", default=8, cast=int)
+TENANT_FANOUT_TIMEOUT = config("TENANT_FANOUT_TIMEOUT", default=20, cast=float)
+# Listados paginados: segundos que se cachea el total por tenant, ámbito y filtros
+LISTADOS_COUNT_CACHE_TIMEOUT = config("LISTADOS_COUNT_CACHE_TIMEOUT", default=30, cast=int)
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.2/howto/deployment/checklist/
@@ -150,14 +179,29 @@ REST_FRAMEWORK = {
         'sensitive': config('THROTTLE_RATE_SENSITIVE', default='10/minute'),  # Endpoints sensibles
     },
 }
+REDIS_HOST = config("REDIS_HOST", default="127.0.0.1")
+REDIS_PORT = config("REDIS_PORT", default=6379, cast=int)
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [(config("REDIS_HOST", default="127.0.0.1"), config("REDIS_PORT", default=6379, cast=int))],
+            "hosts": [(REDIS_HOST, REDIS_PORT)],
         },
     },
 }
+# Cache compartida por los workers de uvicorn y los comandos (versiones del
+# índice de catálogo y de los costes de pieza, conteos de listados, axes...).
+# Con LocMemCache cada worker tendría la suya y no verían las invalidaciones
+# de los demás; CACHE_BACKEND=locmem solo para un único proceso (desarrollo).
+if config("CACHE_BACKEND", default="redis") == "locmem":
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": config("CACHE_REDIS_URL", default=f"redis://{REDIS_HOST}:{REDIS_PORT}/1"),
+        },
+    }
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
@@ -188,6 +232,8 @@ CORS_ALLOWED_ORIGIN_REGEXES = [
 CORS_ALLOW_HEADERS = list(default_headers) + ["Authorization", "X-Tenant"]
 CORS_ALLOWED_ORIGINS = config("CORS_ALLOWED_ORIGINS", cast=Csv())
 CORS_ALLOW_CREDENTIALS = True
+# Resultado parcial de los endpoints globales (progeek.tenant_fanout)
+CORS_EXPOSE_HEADERS = ["X-Tenants-Total", "X-Tenants-Error", "X-Tenants-Timeout"]
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -206,7 +252,17 @@ USE_TZ = True
 # La configuración se toma desde .env:
 # - Para Microsoft OAuth2: EMAIL_BACKEND=security.email_backend.MicrosoftOAuth2EmailBackend
 # - Para SMTP tradicional: EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend
-EMAIL_BACKEND = config("EMAIL_BACKEND", default="django.core.mail.backends.smtp.EmailBackend")
+# Con CORREO_COLA (por defecto) las vistas solo encolan el correo y ese backend
+# lo usan los workers de security/cola_correo.py (manage.py procesar_cola_correo,
+# proceso "cola-correo" de ecosystem.config.js: debe estar en marcha)
+CORREO_BACKEND_ENVIO = config("EMAIL_BACKEND", default="django.core.mail.backends.smtp.EmailBackend")
+EMAIL_BACKEND = (
+    "security.cola_correo.ColaCorreoBackend"
+    if config("CORREO_COLA", default=True, cast=bool)
+    else CORREO_BACKEND_ENVIO
+)
+CORREO_MAX_INTENTOS = config("CORREO_MAX_INTENTOS", default=5, cast=int)
+CORREO_RESERVA_SEGUNDOS = config("CORREO_RESERVA_SEGUNDOS", default=600, cast=int)
 DEFAULT_FROM_EMAIL = config("DEFAULT_FROM_EMAIL", default="noreply@zirqulotech.com")
 
 # Microsoft 365 OAuth2 Configuration
@@ -214,6 +270,7 @@ DEFAULT_FROM_EMAIL = config("DEFAULT_FROM_EMAIL", default="noreply@zirqulotech.c
 MICROSOFT_CLIENT_ID = config("MICROSOFT_CLIENT_ID", default="")
 MICROSOFT_CLIENT_SECRET = config("MICROSOFT_CLIENT_SECRET", default="")
 MICROSOFT_TENANT_ID = config("MICROSOFT_TENANT_ID", default="")
+MICROSOFT_GRAPH_ENDPOINT = config("MICROSOFT_GRAPH_ENDPOINT", default="https://graph.microsoft.com/v1.0")
 
 # SMTP Configuration (fallback)
 # Usado si EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend
@@ -237,6 +294,12 @@ MEDIA_ROOT = Path(config("MEDIA_ROOT", default="/srv/checkouters/Partners/media"
 # carpeta privada dentro de MEDIA_ROOT
 PRIVATE_MEDIA_ROOT = MEDIA_ROOT / "media_private"
 
+# Caché de PDFs (checkouters/services/pdf_cache.py): procesos que renderizan
+# los PDF que no están en caché (0 = en el propio proceso, sin hilos ni pool)
+# y espera máxima
+PDF_RENDER_WORKERS = config("PDF_RENDER_WORKERS", default=2, cast=int)
+PDF_RENDER_TIMEOUT = config("PDF_RENDER_TIMEOUT", default=120, cast=int)
+
 OTP_TTL_MINUTES = config("OTP_TTL_MINUTES", default=10, cast=int)
 OTP_COOLDOWN_SECONDS = config("OTP_COOLDOWN_SECONDS", default=60, cast=int)
 
@@ -1,7 +1,10 @@
 import logging
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from django_test_app.logging_utils import log_ws_event
 
+from .soporte import GRUPO_SOPORTE, debe_entregarse, empleados_internos
+
 logger = logging.getLogger(__name__)
 
 class NotificacionesConsumer(AsyncJsonWebsocketConsumer):
@@ -12,8 +15,12 @@ class NotificacionesConsumer(AsyncJsonWebsocketConsumer):
             await self.close()
             return
 
+        self.user_id = user.id
         self.group_name = f"user_{user.id}"
         await self.channel_layer.group_add(self.group_name, self.channel_name)
+        # Los empleados internos reciben además los avisos de soporte (un único grupo para todos)
+        if user.id in await database_sync_to_async(empleados_internos)():
+            await self.channel_layer.group_add(GRUPO_SOPORTE, self.channel_name)
         await self.accept()
         logger.info("Conexión WebSocket notificaciones aceptada: user=%s", user.email if hasattr(user, 'email') else user.id)
 
@@ -21,9 +28,12 @@ class NotificacionesConsumer(AsyncJsonWebsocketConsumer):
         user = self.scope.get("user")
         if hasattr(self, 'group_name'):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await self.channel_layer.group_discard(GRUPO_SOPORTE, self.channel_name)
         logger.debug("WebSocket notificaciones desconectado: code=%s, user=%s", close_code, user.email if user and hasattr(user, 'email') else 'anon')
 
     async def nueva_notificacion(self, event):
+        if event.get("soporte") and not await database_sync_to_async(debe_entregarse)(event, self.user_id):
+            return
         await self.send_json({
             "type": "nueva_notificacion",
             "mensaje": event["mensaje"],
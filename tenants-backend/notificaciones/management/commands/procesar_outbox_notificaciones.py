@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notificaciones.outbox import vaciar_outbox
+
+
+class Command(BaseCommand):
+    help = 'Entrega las notificaciones pendientes del buzón de salida (NotificacionPendiente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Vacía el buzón y termina (para cron) en lugar de quedarse escuchando',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=5,
+            help='Segundos entre pasadas cuando el buzón está vacío (por defecto 5)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            procesadas = vaciar_outbox()
+            if procesadas:
+                self.stdout.write(f"🔔 {procesadas} notificaciones entregadas")
+            if options['una_vez']:
+                return
+            if not procesadas:
+                time.sleep(options['intervalo'])
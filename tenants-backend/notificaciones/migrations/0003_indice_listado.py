@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notificaciones', '0002_alter_notificacion_tipo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['usuario', '-creada', '-id'], name='noti_usuario_creada_idx'),
+        ),
+    ]
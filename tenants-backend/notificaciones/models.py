@@ -24,3 +24,23 @@ class Notificacion(models.Model):
 
     class Meta:
         ordering = ['-creada']
+        indexes = [
+            # Listado por cursor y deduplicación del outbox
+            models.Index(fields=['usuario', '-creada', '-id'], name='noti_usuario_creada_idx'),
+        ]
+
+
+class NotificacionPendiente(models.Model):
+    """
+    Notificación emitida y aún sin entregar (buzón de salida, ver outbox.py).
+
+    Se inserta en la transacción de quien la emite, así que solo existe si
+    esta se confirma; el hilo del proceso o el worker de PM2 la convierten en
+    Notificacion y la borran.
+    """
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    schema = models.CharField(max_length=100)
+    mensaje = models.TextField()
+    tipo = models.CharField(max_length=30)
+    url_relacionada = models.CharField(max_length=300, blank=True)
+    creada = models.DateTimeField(auto_now_add=True)
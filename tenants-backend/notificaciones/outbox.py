@@ -0,0 +1,226 @@
+# notificaciones/outbox.py
+"""
+Buzón de salida de notificaciones.
+
+emitir_notificacion no crea la Notificacion ni la envía en el momento: inserta
+una NotificacionPendiente en la transacción en curso (si se deshace, se va
+con ella) y, al confirmarse, despierta una sola vez el hilo del proceso que
+vacía el buzón. Cada lote se entrega con un bulk_create y los group_send
+lanzados a la vez en un solo bucle (en vez de un INSERT y un viaje síncrono a
+Redis por notificación).
+
+Las pendientes sobreviven a una caída o a un reinicio del proceso:
+`manage.py procesar_outbox_notificaciones` (worker "outbox-notificaciones" de
+PM2) vacía el buzón en bucle. Hilo y worker pueden convivir: cada lote se
+reserva con SELECT ... FOR UPDATE SKIP LOCKED y se borra en la misma
+transacción que crea sus notificaciones. Con NOTIFICACIONES_OUTBOX_EN_HILO=False
+(tests) se vacía en el propio callback de on_commit.
+
+Deduplicación: dentro del lote y frente a las notificaciones no leídas de
+los últimos NOTIFICACIONES_VENTANA_DEDUP segundos, solo sale una por
+(usuario, tipo, url).
+
+El contador de no leídas se cachea por usuario (contador_no_leidas): la
+entrega lo incrementa y marcar como leídas lo invalida.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Optional
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from django_test_app.lote_transaccion import agregar_al_lote
+
+from .models import Notificacion, NotificacionPendiente
+
+logger = logging.getLogger(__name__)
+
+LOTE = 1000
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # Un solo hilo por proceso: los lotes se entregan en orden y con una única conexión
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="notificaciones-outbox")
+        return _executor
+
+
+def _clave_no_leidas(usuario_id):
+    return f"notificaciones:no_leidas:{usuario_id}"
+
+
+def contador_no_leidas(usuario_id) -> int:
+    """Notificaciones sin leer del usuario (cacheado)."""
+    clave = _clave_no_leidas(usuario_id)
+    total = cache.get(clave)
+    if total is None:
+        total = Notificacion.objects.filter(usuario_id=usuario_id, leida=False).count()
+        cache.set(clave, total, getattr(settings, "NOTIFICACIONES_CONTADOR_TIMEOUT", 600))
+    return total
+
+
+def invalidar_no_leidas(*usuario_ids) -> None:
+    cache.delete_many([_clave_no_leidas(u) for u in usuario_ids])
+
+
+def encolar(usuario_id, mensaje, tipo="otro", url="", schema=None) -> None:
+    """
+    Deja una notificación en el buzón dentro de la transacción en curso (se
+    entrega al confirmarla, o enseguida si no hay transacción).
+
+    Args:
+        schema: Schema donde se generó (por defecto, el de la conexión)
+    """
+    NotificacionPendiente.objects.create(
+        usuario_id=usuario_id,
+        mensaje=mensaje,
+        tipo=tipo,
+        url_relacionada=url,
+        schema=schema or connection.schema_name,
+    )
+    # Un solo aviso al hilo por transacción, aunque se emitan cientos
+    agregar_al_lote("notificaciones", lambda datos: None, lambda datos: _despertar())
+
+
+def _despertar() -> None:
+    # Sin hilo (NOTIFICACIONES_OUTBOX_EN_HILO=False) se vacía en el callback
+    if getattr(settings, "NOTIFICACIONES_OUTBOX_EN_HILO", True):
+        _get_executor().submit(_vaciar_en_hilo)
+    else:
+        vaciar_outbox()
+
+
+def _vaciar_en_hilo() -> None:
+    try:
+        vaciar_outbox()
+    except Exception:
+        # Las pendientes siguen en el buzón: las recoge el worker
+        logger.exception("Outbox: error vaciando el buzón de notificaciones")
+    finally:
+        connection.close()
+
+
+def vaciar_outbox(max_lotes=50) -> int:
+    """Entrega lotes hasta vaciar el buzón. Devuelve las pendientes procesadas."""
+    total = 0
+    for _ in range(max_lotes):
+        procesadas = procesar_lote()
+        total += procesadas
+        if procesadas < LOTE:
+            break
+    return total
+
+
+def procesar_lote(limite=LOTE) -> int:
+    """
+    Convierte un lote de pendientes en notificaciones y las envía.
+
+    Las pendientes se reservan y se borran con un solo DELETE ... RETURNING
+    (FOR UPDATE SKIP LOCKED) en la misma transacción que crea sus
+    notificaciones: si algo falla, vuelven al buzón. El contador y el
+    WebSocket van tras confirmarla.
+
+    Returns:
+        Pendientes procesadas (incluidas las deduplicadas)
+    """
+    tabla = NotificacionPendiente._meta.db_table
+    with transaction.atomic():
+        filas = sorted(
+            NotificacionPendiente.objects.raw(
+                f'DELETE FROM "{tabla}" WHERE id IN ('
+                f'SELECT id FROM "{tabla}" ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED'
+                f') RETURNING *',
+                [limite],
+            ),
+            key=lambda fila: fila.id,
+        )
+        if not filas:
+            return 0
+        pendientes = {}
+        for fila in filas:
+            # Dentro del lote gana la última para cada (usuario, tipo, url)
+            pendientes[(fila.usuario_id, fila.tipo, fila.url_relacionada)] = (fila.mensaje, fila.schema)
+        nuevas = _crear(pendientes)
+    _avisar(nuevas)
+    return len(filas)
+
+
+def _crear(pendientes) -> list:
+    """
+    Crea las notificaciones de un lote, sin las ya avisadas en la ventana.
+
+    Args:
+        pendientes: {(usuario_id, tipo, url): (mensaje, schema)}
+    """
+    ventana = getattr(settings, "NOTIFICACIONES_VENTANA_DEDUP", 60)
+    recientes = set()
+    if ventana:
+        recientes = set(
+            Notificacion.objects.filter(
+                usuario_id__in={u for u, _, _ in pendientes},
+                tipo__in={t for _, t, _ in pendientes},
+                leida=False,
+                creada__gte=timezone.now() - timedelta(seconds=ventana),
+            ).values_list("usuario_id", "tipo", "url_relacionada")
+        )
+
+    nuevas = [
+        Notificacion(usuario_id=usuario_id, tipo=tipo, url_relacionada=url, mensaje=mensaje, schema=schema)
+        for (usuario_id, tipo, url), (mensaje, schema) in pendientes.items()
+        if (usuario_id, tipo, url) not in recientes
+    ]
+    if nuevas:
+        Notificacion.objects.bulk_create(nuevas)
+    return nuevas
+
+
+def _avisar(nuevas) -> None:
+    """Incrementa los contadores y envía las notificaciones por WebSocket."""
+    if not nuevas:
+        return
+    for noti in nuevas:
+        try:
+            cache.incr(_clave_no_leidas(noti.usuario_id))
+        except ValueError:
+            pass  # sin contador cacheado: se calculará al pedirlo
+
+    try:
+        async_to_sync(_enviar)([
+            (f"user_{noti.usuario_id}", {
+                "type": "nueva_notificacion",
+                "mensaje": noti.mensaje,
+                "tipo": noti.tipo,
+                "url": noti.url_relacionada,
+                "id": noti.id,
+                "creada": noti.creada.isoformat(),
+            })
+            for noti in nuevas
+        ])
+    except Exception:
+        # Ya están guardadas: el cliente las verá al recargar
+        logger.exception("Outbox: error enviando %s notificaciones por WebSocket", len(nuevas))
+
+
+async def _enviar(eventos) -> None:
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    resultados = await asyncio.gather(
+        *(layer.group_send(grupo, evento) for grupo, evento in eventos), return_exceptions=True
+    )
+    fallos = [r for r in resultados if isinstance(r, Exception)]
+    if fallos:
+        logger.warning("Outbox: %s de %s envíos fallidos (%s)", len(fallos), len(eventos), fallos[0])
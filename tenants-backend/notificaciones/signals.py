@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from progeek.models import UserGlobalRole
+
+from .models import Notificacion
+from .outbox import invalidar_no_leidas
+from .soporte import invalidar_empleados_internos
+
+
+@receiver(post_save, sender=UserGlobalRole)
+@receiver(post_delete, sender=UserGlobalRole)
+def invalidar_cache_soporte(sender, **kwargs):
+    invalidar_empleados_internos()
+
+
+@receiver(post_save, sender=Notificacion)
+@receiver(post_delete, sender=Notificacion)
+def invalidar_contador_no_leidas(sender, instance, **kwargs):
+    # Las del outbox (bulk_create) no pasan por aquí: el volcado ya incrementa el contador
+    invalidar_no_leidas(instance.usuario_id)
@@ -0,0 +1,70 @@
+# notificaciones/soporte.py
+"""
+Avisos al equipo de soporte (empleados internos).
+
+En lugar de un group_send a user_{id} por cada empleado, sus conexiones se
+unen al grupo GRUPO_SOPORTE y cada aviso es un único group_send, tenga el
+equipo el tamaño que tenga. La lista de empleados se cachea y se invalida
+al cambiar UserGlobalRole (ver signals.py); CHAT_CACHE_TIMEOUT acota lo que
+puede tardar en verse el cambio en otros procesos si la caché no es compartida.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+GRUPO_SOPORTE = "soporte_interno"
+CLAVE_EMPLEADOS = "notificaciones:empleados_internos"
+
+
+def cache_timeout():
+    return getattr(settings, "CHAT_CACHE_TIMEOUT", 300)
+
+
+def empleados_internos():
+    """
+    IDs de los usuarios con es_empleado_interno.
+
+    Returns:
+        frozenset de user_id
+    """
+    ids = cache.get(CLAVE_EMPLEADOS)
+    if ids is None:
+        from progeek.models import UserGlobalRole
+
+        ids = frozenset(
+            UserGlobalRole.objects.filter(es_empleado_interno=True).values_list("user_id", flat=True)
+        )
+        cache.set(CLAVE_EMPLEADOS, ids, cache_timeout())
+    return ids
+
+
+def invalidar_empleados_internos():
+    cache.delete(CLAVE_EMPLEADOS)
+
+
+def evento_soporte(mensaje, tipo, excluir_usuario=None, **extra):
+    """
+    Evento nueva_notificacion para GRUPO_SOPORTE.
+
+    Args:
+        excluir_usuario: id del usuario que no debe recibirlo (el que lo originó)
+    """
+    return {
+        "type": "nueva_notificacion",
+        "mensaje": mensaje,
+        "tipo": tipo,
+        "soporte": True,
+        "excluir_usuario": excluir_usuario,
+        **extra,
+    }
+
+
+def debe_entregarse(event, user_id):
+    """
+    Filtro en el consumer para los eventos de GRUPO_SOPORTE: se descarta el
+    eco al autor y a quien haya dejado de ser empleado interno sin reconectar.
+    """
+    if not event.get("soporte"):
+        return True
+    if event.get("excluir_usuario") == user_id:
+        return False
+    return user_id in empleados_internos()
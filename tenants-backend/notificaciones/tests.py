@@ -1,3 +1,139 @@
-from django.test import TestCase
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
 
-# Create your tests here.
+User = get_user_model()
+
+
+class CapaGrabadora:
+    def __init__(self):
+        self.enviados = []
+
+    async def group_send(self, grupo, evento):
+        self.enviados.append((grupo, evento))
+
+
+@pytest.fixture
+def capa(monkeypatch):
+    cache.clear()
+    capa = CapaGrabadora()
+    monkeypatch.setattr("notificaciones.outbox.get_channel_layer", lambda: capa)
+    yield capa
+    cache.clear()
+
+
+def _usuarios(n):
+    return [User.objects.create_user(email=f"u{k}@noti.com", password="x") for k in range(n)]
+
+
+@pytest.mark.django_db
+def test_outbox_vuelca_en_bloque_y_deduplica(capa, django_capture_on_commit_callbacks):
+    """500 avisos en una transacción: un solo aviso al hilo, un INSERT y los envíos en un lote, sin duplicados"""
+    from notificaciones.models import Notificacion, NotificacionPendiente
+    from notificaciones.outbox import contador_no_leidas
+    from notificaciones.utils import emitir_notificacion
+
+    usuarios = _usuarios(5)
+    assert contador_no_leidas(usuarios[0].id) == 0
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        for k in range(500):
+            usuario = usuarios[k % 5]
+            emitir_notificacion(usuario, f"Oportunidad {k} cambiada", tipo="estado_cambiado", url=f"/oportunidades/{k}")
+        # Repetido dentro del lote: sale una sola vez
+        emitir_notificacion(usuarios[0], "Oportunidad 0 cambiada otra vez", tipo="estado_cambiado", url="/oportunidades/0")
+    assert len(callbacks) == 1
+    assert Notificacion.objects.count() == 0
+    assert NotificacionPendiente.objects.count() == 501
+
+    with CaptureQueriesContext(connection) as ctx:
+        callbacks[0]()
+    queries = [q for q in ctx.captured_queries if "search_path" not in q["sql"] and "SAVEPOINT" not in q["sql"]]
+
+    assert Notificacion.objects.count() == 500
+    assert NotificacionPendiente.objects.count() == 0
+    # reserva y borrado de pendientes + deduplicación + bulk_create
+    assert len(queries) <= 3
+    assert len(capa.enviados) == 500
+    assert capa.enviados[0][0] == f"user_{usuarios[0].id}"
+    assert Notificacion.objects.get(url_relacionada="/oportunidades/0").mensaje == "Oportunidad 0 cambiada otra vez"
+    assert contador_no_leidas(usuarios[0].id) == 100
+
+    # Dentro de la ventana, lo mismo sin leer no se repite
+    with django_capture_on_commit_callbacks(execute=True):
+        emitir_notificacion(usuarios[0], "De nuevo", tipo="estado_cambiado", url="/oportunidades/0")
+        emitir_notificacion(usuarios[0], "Otra", tipo="estado_cambiado", url="/oportunidades/nueva")
+    assert Notificacion.objects.count() == 501
+    assert contador_no_leidas(usuarios[0].id) == 101
+
+
+@pytest.mark.django_db
+def test_outbox_pendientes_las_entrega_el_worker(capa, django_capture_on_commit_callbacks):
+    """Si el proceso cae tras el commit sin vaciar el buzón, el worker de PM2 las entrega"""
+    from django.core.management import call_command
+    from notificaciones.models import Notificacion, NotificacionPendiente
+    from notificaciones.utils import emitir_notificacion
+
+    usuario = _usuarios(1)[0]
+    # El callback de on_commit no llega a ejecutarse
+    with django_capture_on_commit_callbacks():
+        emitir_notificacion(usuario, "Pendiente", tipo="estado_cambiado", url="/oportunidades/1")
+    assert NotificacionPendiente.objects.count() == 1
+
+    call_command("procesar_outbox_notificaciones", "--una-vez")
+    assert list(Notificacion.objects.values_list("mensaje", flat=True)) == ["Pendiente"]
+    assert NotificacionPendiente.objects.count() == 0
+    assert len(capa.enviados) == 1
+
+
+@pytest.mark.django_db
+def test_outbox_descarta_si_se_deshace(capa, django_capture_on_commit_callbacks):
+    from django.db import transaction
+    from notificaciones.models import Notificacion, NotificacionPendiente
+    from notificaciones.utils import emitir_notificacion
+
+    usuario = _usuarios(1)[0]
+    with django_capture_on_commit_callbacks(execute=True):
+        with pytest.raises(RuntimeError), transaction.atomic():
+            emitir_notificacion(usuario, "No debe salir")
+            raise RuntimeError
+        emitir_notificacion(usuario, "Sí sale", url="/x")
+    assert list(Notificacion.objects.values_list("mensaje", flat=True)) == ["Sí sale"]
+    assert not NotificacionPendiente.objects.exists()
+    assert len(capa.enviados) == 1
+
+
+@pytest.mark.django_db
+def test_mis_notificaciones_por_cursor_y_no_leidas(capa):
+    from notificaciones.models import Notificacion
+    from notificaciones.views import MisNotificacionesAPIView, NotificacionesNoLeidasAPIView
+
+    usuario, otro = _usuarios(2)
+    for k in range(7):
+        Notificacion.objects.create(usuario=usuario, mensaje=f"n{k}", tipo="otro", schema="public")
+    Notificacion.objects.create(usuario=otro, mensaje="ajena", tipo="otro", schema="public")
+    factory = APIRequestFactory()
+
+    def _get(vista, url):
+        request = factory.get(url)
+        force_authenticate(request, user=usuario)
+        return vista.as_view()(request).data
+
+    vistos, cursor = [], None
+    while True:
+        data = _get(MisNotificacionesAPIView, "/notificaciones/?page_size=3" + (f"&cursor={cursor}" if cursor else ""))
+        vistos += [n["mensaje"] for n in data["results"]]
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    assert vistos == [f"n{k}" for k in reversed(range(7))]
+    assert len(_get(MisNotificacionesAPIView, "/notificaciones/")) == 7
+
+    assert _get(NotificacionesNoLeidasAPIView, "/notificaciones/no-leidas/") == {"no_leidas": 7}
+    request = factory.post("/notificaciones/", {"ids": list(Notificacion.objects.filter(usuario=usuario).values_list("id", flat=True)[:2])}, format="json")
+    force_authenticate(request, user=usuario)
+    MisNotificacionesAPIView.as_view()(request)
+    assert _get(NotificacionesNoLeidasAPIView, "/notificaciones/no-leidas/") == {"no_leidas": 5}
@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import MisNotificacionesAPIView
+from .views import MisNotificacionesAPIView, NotificacionesNoLeidasAPIView
 
 urlpatterns = [
     path('notificaciones/', MisNotificacionesAPIView.as_view(), name='mis_notificaciones'),
+    path('notificaciones/no-leidas/', NotificacionesNoLeidasAPIView.as_view(), name='notificaciones_no_leidas'),
 ]
@@ -1,42 +1,17 @@
 # notificaciones/utils.py
 
-from .models import Notificacion
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from .outbox import encolar
 
 def emitir_notificacion(usuario, mensaje, tipo='otro', url=''):
     """
-    Crea una notificación persistente y la envía por WebSocket si hay conexión activa.
+    Encola una notificación persistente que se envía por WebSocket si hay conexión activa.
+
+    Se crea y se envía en bloque al confirmar la transacción en curso (ver
+    outbox.py), así que no devuelve la instancia.
     """
-    from django_tenants.utils import get_tenant
     from django.db import connection
 
-    # Persistente en base de datos
-    noti = Notificacion.objects.create(
-        usuario=usuario,
-        mensaje=mensaje,
-        tipo=tipo,
-        url_relacionada=url,
-        schema=connection.tenant.schema_name
-    )
-
-    # Enviar por WebSocket
-    channel_layer = get_channel_layer()
-    group_name = f"user_{usuario.id}"
-    print(f"📡 Enviando notificación a grupo: {group_name}"),
-    async_to_sync(channel_layer.group_send)(  
-        group_name,
-        {
-            "type": "nueva_notificacion",
-            "mensaje": mensaje,
-            "tipo": tipo,
-            "url": url,
-            "id": noti.id,
-            "creada": noti.creada.isoformat(),
-        }
-    )
-
-    return noti
+    encolar(usuario.id, mensaje, tipo=tipo, url=url, schema=connection.tenant.schema_name)
 
 def construir_url_oportunidad(usuario, oportunidad, schema):
     """
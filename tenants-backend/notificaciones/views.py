@@ -1,17 +1,58 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+
+from checkouters.utils.paginacion import paginar_keyset
+
 from .models import Notificacion
+from .outbox import contador_no_leidas, invalidar_no_leidas
 from .serializers import NotificacionSerializer
 
+ORDEN_NOTIFICACIONES = ("-creada", "-id")
+
+
 class MisNotificacionesAPIView(APIView):
+    """
+    GET: notificaciones del usuario, de la más reciente a la más antigua.
+    Con ?cursor= o ?page_size= pagina por cursor ({results, next_cursor,
+    previous_cursor}); sin ellos devuelve la lista completa como antes.
+
+    POST: marca como leídas las notificaciones de "ids" (o todas con "todas").
+    """
     permission_classes = [IsAuthenticated]
+    page_size = 20
+    max_page_size = 100
 
     def get(self, request):
-        notificaciones = Notificacion.objects.filter(usuario=request.user).order_by("-creada")
-        return Response(NotificacionSerializer(notificaciones, many=True).data)
+        notificaciones = Notificacion.objects.filter(usuario=request.user).order_by(*ORDEN_NOTIFICACIONES)
+        params = request.query_params
+        cursor = params.get("cursor")
+        if not (cursor or "page_size" in params):
+            return Response(NotificacionSerializer(notificaciones, many=True).data)
+
+        try:
+            page_size = min(max(1, int(params.get("page_size", self.page_size))), self.max_page_size)
+        except (TypeError, ValueError):
+            page_size = self.page_size
+        filas, siguiente, anterior = paginar_keyset(notificaciones, ORDEN_NOTIFICACIONES, page_size, cursor=cursor)
+        return Response({
+            "results": NotificacionSerializer(filas, many=True).data,
+            "next_cursor": siguiente,
+            "previous_cursor": anterior,
+        })
 
     def post(self, request):
-        ids = request.data.get("ids", [])
-        Notificacion.objects.filter(id__in=ids, usuario=request.user).update(leida=True)
+        qs = Notificacion.objects.filter(usuario=request.user, leida=False)
+        if not request.data.get("todas"):
+            qs = qs.filter(id__in=request.data.get("ids", []))
+        qs.update(leida=True)
+        invalidar_no_leidas(request.user.id)
         return Response({"ok": True})
+
+
+class NotificacionesNoLeidasAPIView(APIView):
+    """Número de notificaciones sin leer (para el badge), servido desde caché."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({"no_leidas": contador_no_leidas(request.user.id)})
@@ -0,0 +1,58 @@
+import logging
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from productos.services.log_tareas import grupo_tarea, log_de_tarea
+
+logger = logging.getLogger(__name__)
+
+
+class TareaProgresoConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Progreso en vivo de una tarea de actualización de precios (ws/tareas/<uuid>/).
+
+    Al conectar envía el estado actual; después reenvía los eventos
+    tarea_progreso que publican los comandos. `log_offset` indica cuántos
+    eventos tiene el log: el cliente pide solo los nuevos con ?after=.
+    """
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if not user or not user.is_authenticated or not user.is_staff:
+            logger.warning("WebSocket tareas rechazado: usuario sin permisos")
+            await self.close()
+            return
+
+        self.tarea_id = self.scope["url_route"]["kwargs"]["tarea_id"]
+        self.group_name = grupo_tarea(self.tarea_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        estado = await self._estado_actual()
+        if estado:
+            await self.send_json(estado)
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def tarea_progreso(self, event):
+        await self.send_json(event)
+
+    @database_sync_to_async
+    def _estado_actual(self):
+        from productos.models import TareaActualizacionLikewize
+
+        tarea = TareaActualizacionLikewize.objects.filter(pk=self.tarea_id).first()
+        if tarea is None:
+            return None
+        task_log = log_de_tarea(tarea)
+        return {
+            "type": "tarea_progreso",
+            "tarea_id": str(tarea.id),
+            "estado": tarea.estado,
+            "progreso": tarea.progreso,
+            "subestado": tarea.subestado,
+            "log_offset": task_log.count() if task_log else 0,
+        }
@@ -17,6 +17,7 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 
 from productos.models import TareaActualizacionLikewize, LikewizeItemStaging
+from productos.services.log_tareas import TaskLog, actualizar_progreso
 
 
 BACKMARKET_URL = "https://www.backmarket.es/buyback-funnel/api/v1/funnel/regular/offer"
@@ -82,9 +83,7 @@ def gb_from_text(txt: str) -> Optional[int]:
 
 
 def _set_progress(tarea: TareaActualizacionLikewize, pct: int, msg: str) -> None:
-    tarea.progreso = max(0, min(100, int(pct)))
-    tarea.subestado = msg[:120]
-    tarea.save(update_fields=["progreso", "subestado"])
+    actualizar_progreso(tarea, pct, msg)
 
 
 class Command(BaseCommand):
@@ -142,9 +141,10 @@ class Command(BaseCommand):
         tarea.log_path = str(log_path)
         tarea.save(update_fields=["log_path"])
 
+        task_log = TaskLog(log_path)
+
         def log(msg: str):
-            with open(log_path, "a", encoding="utf-8") as fh:
-                fh.write(f"{timezone.now().isoformat()} {msg}\n")
+            task_log.append(msg)
 
         # Cleanup staging
         LikewizeItemStaging.objects.filter(tarea=tarea).delete()
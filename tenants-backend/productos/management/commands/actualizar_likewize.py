@@ -1,11 +1,12 @@
 import os
 import re
 import csv
-import json
 import logging
 from decimal import Decimal
 from pathlib import Path
 
+import pandas as pd
+
 from django.apps import apps
 from django.conf import settings
 from django.core.management.base import BaseCommand
@@ -18,7 +19,9 @@ from typing import List, Dict, Optional
 from productos.models import TareaActualizacionLikewize, LikewizeItemStaging, LikewizeCazadorTarea
 from productos.likewize_config import get_apple_presets, get_extra_presets
 from playwright.sync_api import sync_playwright
-import requests
+from productos.services.likewize_http import get_client
+from productos.services.log_tareas import TaskLog, TaskLogHandler, actualizar_progreso
+from productos.services.diff_precios import CLAVE_CAPACIDAD, claves_capacidades, clasificar_s_vs_e
 from typing import Optional
 
 # ==========================
@@ -179,9 +182,7 @@ def save_cazado_result(
 
 
 def set_progress(tarea: TareaActualizacionLikewize, pct: int, msg: str) -> None:
-    tarea.progreso = max(0, min(100, int(pct)))
-    tarea.subestado = msg[:120]
-    tarea.save(update_fields=["progreso", "subestado"])
+    actualizar_progreso(tarea, pct, msg)
 
 
 def _base_sin_storage(nombre: str) -> str:
@@ -992,56 +993,19 @@ def obtener_cookies() -> dict[str, str]:
 
 
 def obtener_modelos_por_categoria(cookies: dict[str, str], categoria_id: int, *, brand_id: int | None = None) -> list[dict]:
-    if brand_id:
-        url = "https://appleb2bonlineesp.likewize.com/Home.aspx/GetSelectedModels"
-        payload = json.dumps({"productId": str(categoria_id), "brandId": str(brand_id)})
-    else:
-        url = "https://appleb2bonlineesp.likewize.com/Home.aspx/GetList"
-        payload = json.dumps({"id": categoria_id})
-    headers = {
-        "Content-Type": "application/json; charset=UTF-8",
-        "Origin": "https://appleb2bonlineesp.likewize.com",
-        "Referer": "https://appleb2bonlineesp.likewize.com/",
-        "User-Agent": "Mozilla/5.0",
-        "X-Requested-With": "XMLHttpRequest",
-    }
-    r = requests.post(url, headers=headers, cookies=cookies, data=payload, timeout=30)
-    if not r.ok:
-        return []
-    data = r.json()
-    if isinstance(data, dict) and "d" in data:
-        data = data["d"]
-    elif isinstance(data, str):
-        data = json.loads(data)
-    return data if isinstance(data, list) else []
+    return get_client(cookies).modelos(categoria_id, brand_id)
 
 def obtener_capacidades_por_master(cookies: dict[str, str], master_model_id: str | int) -> list[dict]:
     """
     Llama a https://appleb2bonlineesp.likewize.com/Home.aspx/GetSelectedCapacitys
     con {'masterModelId': '<id>'} y devuelve la lista de variantes (hijos) por capacidad.
     """
-    url = "https://appleb2bonlineesp.likewize.com/Home.aspx/GetSelectedCapacitys"
-    payload = json.dumps({"masterModelId": str(master_model_id)})
-    headers = {
-        "Content-Type": "application/json; charset=UTF-8",
-        "Origin": "https://appleb2bonlineesp.likewize.com",
-        "Referer": "https://appleb2bonlineesp.likewize.com/",
-        "User-Agent": "Mozilla/5.0",
-        "X-Requested-With": "XMLHttpRequest",
-    }
-    try:
-        r = requests.post(url, headers=headers, cookies=cookies, data=payload, timeout=30)
-        if not r.ok:
-            return []
-        data = r.json()
-        if isinstance(data, dict) and "d" in data:
-            data = data["d"]
-        elif isinstance(data, str):
-            data = json.loads(data)
-        return data if isinstance(data, list) else []
-    except Exception:
-        return []
-    
+    return get_client(cookies).capacidades(master_model_id)
+
+def obtener_capacidades_por_masters(cookies: dict[str, str], master_model_ids) -> dict[str, list[dict]]:
+    """Variantes de varios MasterModelId descargadas en paralelo: {master_id: [hijos]}."""
+    return get_client(cookies).capacidades_many(master_model_ids)
+
 def _norm(s: str) -> str:
     return (s or "").strip().lower()
 
@@ -1305,9 +1269,7 @@ class Command(BaseCommand):
         logger = logging.getLogger(f"likewize.{tarea.id}")
         logger.setLevel(logging.INFO)
         logger.handlers.clear()
-        fh = logging.FileHandler(log_path, encoding="utf-8")
-        fh.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
-        logger.addHandler(fh)
+        logger.addHandler(TaskLogHandler(TaskLog(log_path)))
         logger.propagate = False
 
         def log(msg: str):
@@ -1445,11 +1407,16 @@ class Command(BaseCommand):
                 if brand_id:
                     seen_ids: set[int] = set()
                     expanded: list[dict] = []
+                    hijos_por_master = obtener_capacidades_por_masters(
+                        cookies,
+                        (m.get("MasterModelId") or m.get("masterModelId") or m.get("MasterModelID") or "" for m in arr or []),
+                    )
+                    capacidades_cache.update(hijos_por_master)
                     for m in arr or []:
                         mmid = (m.get("MasterModelId") or m.get("masterModelId") or m.get("MasterModelID") or "")
                         mmid = str(mmid).strip()
                         if mmid:
-                            hijos = obtener_capacidades_por_master(cookies, mmid)
+                            hijos = hijos_por_master.get(mmid)
                             if hijos:
                                 for h in hijos:
                                     pid = h.get("PhoneModelId") or h.get("ModelId") or h.get("Id")
@@ -1469,6 +1436,13 @@ class Command(BaseCommand):
                     arr = expanded
                 log(f"✅ {len(arr)} modelos {marca_por_defecto} {tipo}")
 
+                # Variantes por MasterModelId descargadas en paralelo antes del bucle
+                pendientes = {
+                    str(m.get("MasterModelId") or m.get("MasterModelID") or "").strip()
+                    for m in arr
+                } - set(capacidades_cache) - {""}
+                capacidades_cache.update(obtener_capacidades_por_masters(cookies, pendientes))
+
                 for m in arr:
                     nombre_raw = (m.get("ModelName") or m.get("FullName") or "").strip()
                     if not nombre_raw:
@@ -1825,149 +1799,53 @@ class Command(BaseCommand):
             LikewizeItemStaging.objects.bulk_create(objs, ignore_conflicts=True)
 
             try:
-                from collections import defaultdict
-
-                def _year(row):
-                    return row.get("any") or row.get("año") or row.get("year")
-
-                def _device_key(row):
-                    return (row.get("a_number") or "",
-                            row.get("pulgadas"),
-                            _year(row))
-
-                def _cap_key(row):
-                    return _device_key(row) + (int(row.get("almacenamiento_gb") or 0),)
-
-                def _variant_sig(row):
-                    return (row.get("cpu") or "", row.get("gpu_cores"))
-
                 # --- STAGING (S) ---
-                S_rows = list(
-                    LikewizeItemStaging.objects
-                    .filter(tarea=tarea)
-                    .values("a_number", "pulgadas", "any", "almacenamiento_gb", "cpu")
+                S_df = pd.DataFrame.from_records(
+                    list(LikewizeItemStaging.objects
+                         .filter(tarea=tarea)
+                         .values_list(*CLAVE_CAPACIDAD)),
+                    columns=CLAVE_CAPACIDAD,
                 )
 
-                S_caps = set()
-                S_by_dev_caps = defaultdict(set)
-                S_by_dev_capsig = defaultdict(lambda: defaultdict(set))
-                for r in S_rows:
-                    k = _cap_key(r)
-                    S_caps.add(k)
-                    dev = _device_key(r)
-                    gb = int(r.get("almacenamiento_gb") or 0)
-                    S_by_dev_caps[dev].add(gb)
-                    S_by_dev_capsig[dev][gb].add(_variant_sig(r))
-
-                # --- OFICIAL/BD (E) ---
+                # --- OFICIAL/BD (E) --- claves extraídas por columnas, sin regex por fila
                 fam_ok = {"iPhone", "iPad", "Mac", "MacBook Pro", "MacBook Air", "iMac", "Mac mini", "Mac Studio", "Mac Pro"}
-                caps_qs = (CapacidadModel.objects
-                           .select_related(REL_FIELD)
-                           .filter(**{f"{REL_FIELD}__tipo__in": list(fam_ok)}))
-
-                def _parse_gb(txt):
-                    return extraer_storage_gb(txt or "")
-
-                def _pulgadas_from_model(m):
-                    # usa pantalla si está, si no re-usa la descripción
-                    base = (getattr(m, "pantalla", "") or "")
-                    if base:
-                        m_ = re.search(r"(\d{1,2})", base)
-                        if m_:
-                            try:
-                                return int(m_.group(1))
-                            except:  # noqa: E722
-                                pass
-                    return extraer_pulgadas(getattr(m, REL_NAME, "") or "")
-
-                E_rows = []
-                for cap in caps_qs:
-                    m = getattr(cap, REL_FIELD)
-                    descr = getattr(m, REL_NAME, "") or ""
-                    E_rows.append({
-                        "cap_id": cap.id,
-                        "a_number": extraer_a_number(descr),
-                        "pulgadas": _pulgadas_from_model(m),
-                        "any": getattr(m, "año", None),
-                        "almacenamiento_gb": _parse_gb(getattr(cap, GB_FIELD, "") or ""),
-                        "cpu": (getattr(m, "procesador", "") or ""),
-                        "gpu_cores": extraer_gpu_cores(descr),
-                    })
-
-                E_caps = set()
-                E_by_dev_caps = defaultdict(set)
-                E_by_dev_capsig = defaultdict(lambda: defaultdict(set))
-                E_cap_to_id = {}
-                for r in E_rows:
-                    k = _cap_key(r)
-                    E_caps.add(k)
-                    E_cap_to_id.setdefault(k, []).append(r["cap_id"])
-                    dev = _device_key(r)
-                    gb = int(r.get("almacenamiento_gb") or 0)
-                    E_by_dev_caps[dev].add(gb)
-                    E_by_dev_capsig[dev][gb].add(_variant_sig(r))
-
-                # --- Conjuntos ---
-                delete_caps = E_caps - S_caps
-                insert_caps = S_caps - E_caps
-
-                # --- Clasificación ---
-                A1, A2, A2_star, B_cap, C_dev = [], [], [], [], []
-
-                S_devices = set(S_by_dev_caps.keys())
-                E_devices = set(E_by_dev_caps.keys())
-
-                for cap in delete_caps:
-                    dev = cap[:3]   # (a_number, pulgadas, año)
-                    gb = cap[3]
-                    if dev not in S_devices:
-                        A1.append(cap)  # Likewize ya no trae el dispositivo entero
-                    else:
-                        if gb not in S_by_dev_caps[dev]:
-                            A2.append(cap)  # el dispositivo está, pero falta esa capacidad en S
-                        else:
-                            # misma capacidad pero distinta variante (cpu/gpu cores)
-                            if S_by_dev_capsig[dev][gb] != E_by_dev_capsig[dev][gb]:
-                                A2_star.append(cap)
-                            else:
-                                A2.append(cap)
-
-                for cap in insert_caps:
-                    dev = cap[:3]
-                    if dev in E_devices:
-                        B_cap.append(cap)  # me falta capacidad en BD
-                    else:
-                        C_dev.append(cap)  # me falta dispositivo en BD
-
-                def _fmt_cap(cap):
-                    a, p, y, gb = cap
-                    ids = E_cap_to_id.get(cap, [])
-                    suf = f"  (cap_id={ids[0]})" if ids else ""
-                    return f"A={a or '-'} · {p or '-'}\" · {y or '-'} · {gb}GB{suf}"
+                columnas_e = ["cap_id", "descripcion", "pantalla", "any", "tamaño", "procesador"]
+                E_df = claves_capacidades(pd.DataFrame.from_records(
+                    list(CapacidadModel.objects
+                         .filter(**{f"{REL_FIELD}__tipo__in": list(fam_ok)})
+                         .values_list("id", f"{REL_FIELD}__{REL_NAME}", f"{REL_FIELD}__pantalla",
+                                      f"{REL_FIELD}__año", GB_FIELD, f"{REL_FIELD}__procesador")),
+                    columns=columnas_e,
+                ))
+
+                buckets = clasificar_s_vs_e(S_df, E_df)
+                n_s = len(S_df.drop_duplicates(CLAVE_CAPACIDAD))
+                n_e = len(E_df.drop_duplicates(CLAVE_CAPACIDAD))
+
+                def _fmt_cap(row):
+                    cap_id = row.get("cap_id")
+                    suf = f"  (cap_id={cap_id})" if pd.notna(cap_id) else ""
+                    p = row["pulgadas"] if pd.notna(row["pulgadas"]) else "-"
+                    y = row["any"] if pd.notna(row["any"]) else "-"
+                    return f"A={row['a_number'] or '-'} · {p}\" · {y} · {row['almacenamiento_gb']}GB{suf}"
 
                 # --- Log resumen + muestras ---
                 print("\n=== POST-STAGING: Conjuntos S vs E ===")
-                print(f"S_caps={len(S_caps)}  E_caps={len(E_caps)}  DELETEs(E\\S)={len(delete_caps)}  INSERTs(S\\E)={len(insert_caps)}")
+                print(f"S_caps={n_s}  E_caps={n_e}  "
+                      f"DELETEs(E\\S)={len(buckets['A1']) + len(buckets['A2'])}  "
+                      f"INSERTs(S\\E)={len(buckets['B']) + len(buckets['C'])}")
                 print("\n=== CLASIFICACIÓN DETALLADA ===")
-                print(f"A1 (E\\S) falta dispositivo entero en S: {len(A1)}")
-                for cap in A1[:30]:
-                    print("  - " + _fmt_cap(cap))
-
-                print(f"\nA2 (E\\S) falta capacidad en S: {len(A2)}")
-                for cap in A2[:30]:
-                    print("  - " + _fmt_cap(cap))
-
-                print(f"\nA2* (E\\S) misma capacidad pero variante/cores distinta: {len(A2_star)}")
-                for cap in A2_star[:30]:
-                    print("  - " + _fmt_cap(cap))
-
-                print(f"\nB (S\\E) me falta capacidad en BD: {len(B_cap)}")
-                for cap in B_cap[:30]:
-                    print("  - " + _fmt_cap(cap))
-
-                print(f"\nC (S\\E) me falta dispositivo en BD: {len(C_dev)}")
-                for cap in C_dev[:30]:
-                    print("  - " + _fmt_cap(cap))
+                titulos = {
+                    "A1": "A1 (E\\S) falta dispositivo entero en S",
+                    "A2": "\nA2 (E\\S) falta capacidad en S",
+                    "A2*": "\nA2* (E\\S) misma capacidad pero variante/cores distinta",
+                    "B": "\nB (S\\E) me falta capacidad en BD",
+                    "C": "\nC (S\\E) me falta dispositivo en BD",
+                }
+                for bucket, titulo in titulos.items():
+                    print(f"{titulo}: {len(buckets[bucket])}")
+                    for row in buckets[bucket].head(30).to_dict("records"):
+                        print("  - " + _fmt_cap(row))
 
             except Exception as _e:
                 print(f"⚠️ Error en diff/clasificación S vs E: {type(_e).__name__}: {_e}")
@@ -25,7 +25,7 @@ from productos.services.metadata_extractors import (
 
 # Importar funciones necesarias del comando original
 from productos.management.commands.actualizar_likewize import (
-    obtener_cookies, obtener_modelos_por_categoria, obtener_capacidades_por_master,
+    obtener_cookies, obtener_modelos_por_categoria, obtener_capacidades_por_masters,
     extraer_storage_gb, norm_modelo, set_progress
 )
 
@@ -225,10 +225,13 @@ class Command(BaseCommand):
         # Expandir por capacidades si es necesario
         if brand_id:
             expanded_models = []
+            capacidades = obtener_capacidades_por_masters(
+                cookies, (m.get("MasterModelId") or m.get("masterModelId") for m in models)
+            )
             for model in models:
                 master_id = model.get("MasterModelId") or model.get("masterModelId")
                 if master_id:
-                    capacities = obtener_capacidades_por_master(cookies, master_id)
+                    capacities = capacidades.get(str(master_id).strip())
                     if capacities:
                         expanded_models.extend(capacities)
                     else:
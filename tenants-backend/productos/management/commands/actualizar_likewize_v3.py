@@ -1,10 +1,10 @@
 import asyncio
-import aiohttp
 import json
 import logging
 import re
 import time
 from decimal import Decimal
+from pathlib import Path
 from typing import Dict, List, Optional
 
 from django.core.management.base import BaseCommand
@@ -14,7 +14,6 @@ from django.db import models
 from django.apps import apps
 from django.conf import settings
 from playwright.async_api import async_playwright
-from asgiref.sync import sync_to_async
 
 from productos.models import TareaActualizacionLikewize, LikewizeItemStaging
 from productos.models.autoaprendizaje import LearningSession
@@ -24,6 +23,8 @@ from productos.services.metadata_extractors import (
     SamsungMetadataExtractor
 )
 from productos.likewize_config import get_apple_presets, get_extra_presets
+from productos.services.likewize_http import LikewizeClient
+from productos.services.log_tareas import actualizar_progreso, publicar_progreso
 
 logger = logging.getLogger(__name__)
 
@@ -78,6 +79,12 @@ class Command(BaseCommand):
             choices=['v4'],
             help='Sistema de mapeo (v4 únicamente)'
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.MAPPING_V4_WORKERS,
+            help='Procesos para el mapeo v4 en lote (1 = secuencial)'
+        )
 
     def handle(self, *args, **options):
         start_time = time.time()
@@ -124,6 +131,7 @@ class Command(BaseCommand):
             tarea.estado = "SUCCESS"
             tarea.finalizado_en = timezone.now()
             tarea.save()
+            publicar_progreso(tarea)
 
             # Mostrar resumen
             self._show_summary(tarea, learning_session, execution_time)
@@ -135,6 +143,7 @@ class Command(BaseCommand):
                 tarea.error_message = str(e)
                 tarea.finalizado_en = timezone.now()
                 tarea.save()
+                publicar_progreso(tarea)
             self.stdout.write(
                 self.style.ERROR(f'Error: {e}')
             )
@@ -167,50 +176,74 @@ class Command(BaseCommand):
 
         # Actualizar estado
         tarea.estado = "RUNNING"
-        tarea.iniciado_en = timezone.now()
+        tarea.iniciado_en = tarea.iniciado_en or timezone.now()
         tarea.subestado = "Obteniendo cookies"
+        if not tarea.log_path:
+            # add_log() también escribe aquí: log incremental para LogTailLikewizeView
+            tarea.log_path = str(self._raw_path(tarea).with_name(f"{tarea.id}_log.txt"))
         tarea.save()
+        publicar_progreso(tarea)
 
-        # 1. Obtener cookies (async)
-        tarea.add_log("🔑 Obteniendo cookies de Likewize...", "INFO")
-        cookies = asyncio.run(self._get_cookies())
-        tarea.add_log(f"✅ Cookies obtenidas exitosamente", "SUCCESS")
-        self.stdout.write("Cookies obtenidas exitosamente")
+        # Reanudación (cola de tareas): `etapa` es la última etapa completada
+        raw_path = self._raw_path(tarea)
+        if tarea.etapa == "staging":
+            tarea.add_log("♻️ Reanudando: el staging ya estaba guardado", "INFO")
+        else:
+            if tarea.etapa == "descarga" and raw_path.exists():
+                likewize_data = json.loads(raw_path.read_text(encoding="utf-8"))
+                tarea.add_log(f"♻️ Reanudando: {len(likewize_data)} items descargados en el intento anterior", "INFO")
+            else:
+                # 1. Obtener cookies (async)
+                tarea.add_log("🔑 Obteniendo cookies de Likewize...", "INFO")
+                cookies = asyncio.run(self._get_cookies())
+                tarea.add_log(f"✅ Cookies obtenidas exitosamente", "SUCCESS")
+                self.stdout.write("Cookies obtenidas exitosamente")
+
+                # 2. Obtener datos de Likewize
+                tarea.subestado = "Descargando datos de Likewize"
+                tarea.add_log("📥 Descargando datos de Likewize...", "INFO")
+                tarea.save()
 
-        # 2. Obtener datos de Likewize (async)
-        tarea.subestado = "Descargando datos de Likewize"
-        tarea.add_log("📥 Descargando datos de Likewize...", "INFO")
-        tarea.save()
+                likewize_data = self._fetch_likewize_data(cookies, options, tarea)
 
-        likewize_data = asyncio.run(self._fetch_likewize_data(
-            cookies, options, tarea
-        ))
+                tarea.add_log(f"✅ Descargados {len(likewize_data)} items de Likewize", "SUCCESS")
+                self.stdout.write(f"Descargados {len(likewize_data)} items de Likewize")
 
-        tarea.add_log(f"✅ Descargados {len(likewize_data)} items de Likewize", "SUCCESS")
-        self.stdout.write(f"Descargados {len(likewize_data)} items de Likewize")
+                if not options['dry_run']:
+                    raw_path.parent.mkdir(parents=True, exist_ok=True)
+                    raw_path.write_text(json.dumps(likewize_data), encoding="utf-8")
+                    tarea.etapa = "descarga"
+                    tarea.save(update_fields=["etapa"])
 
-        # 3. Procesar con v4 (síncrono)
-        tarea.subestado = "Procesando con v4"
-        tarea.add_log(f"🤖 Procesando {len(likewize_data)} items con v4...", "INFO")
-        tarea.save()
+            # 3. Procesar con v4 (síncrono)
+            tarea.subestado = "Procesando con v4"
+            tarea.add_log(f"🤖 Procesando {len(likewize_data)} items con v4...", "INFO")
+            tarea.save()
 
-        processed_items = self._process_with_v4(
-            likewize_data, learning_session, options, tarea
-        )
+            processed_items = self._process_with_v4(
+                likewize_data, learning_session, options, tarea
+            )
 
-        # 4. Guardar en staging (síncrono)
-        if not options['dry_run']:
-            tarea.subestado = "Guardando en staging"
-            tarea.add_log(f"💾 Guardando {len(processed_items)} items en staging...", "INFO")
-            tarea.save()
+            # 4. Guardar en staging (síncrono)
+            if not options['dry_run']:
+                tarea.subestado = "Guardando en staging"
+                tarea.add_log(f"💾 Guardando {len(processed_items)} items en staging...", "INFO")
+                tarea.save()
 
-            self._save_to_staging(processed_items, tarea, learning_session)
-            tarea.add_log(f"✅ Items guardados en staging correctamente", "SUCCESS")
+                self._save_to_staging(processed_items, tarea, learning_session)
+                tarea.add_log(f"✅ Items guardados en staging correctamente", "SUCCESS")
+                tarea.etapa = "staging"
+                tarea.save(update_fields=["etapa"])
+                raw_path.unlink(missing_ok=True)
 
         tarea.subestado = "Completado"
         tarea.add_log(f"🎉 Actualización completada exitosamente (sistema: V4)", "SUCCESS")
         tarea.save()
 
+    def _raw_path(self, tarea: TareaActualizacionLikewize) -> Path:
+        """Fichero con la descarga cruda, para reanudar sin volver a scrapear"""
+        return Path(settings.MEDIA_ROOT) / "likewize" / "tareas" / f"{tarea.id}_raw.json"
+
     async def _get_cookies(self) -> Dict[str, str]:
         """Obtiene cookies usando Playwright"""
         async with async_playwright() as p:
@@ -228,32 +261,15 @@ class Command(BaseCommand):
             finally:
                 await browser.close()
 
-    async def _fetch_likewize_data(
+    def _fetch_likewize_data(
         self,
         cookies: Dict[str, str],
         options: Dict,
         tarea: TareaActualizacionLikewize
     ) -> List[Dict]:
-        """Obtiene datos de Likewize de forma asíncrona"""
-
-        headers = {
-            "Content-Type": "application/json; charset=UTF-8",
-            "Accept": "application/json, text/javascript, */*; q=0.01",
-            "X-Requested-With": "XMLHttpRequest",
-            "Origin": "https://appleb2bonlineesp.likewize.com",
-            "Referer": "https://appleb2bonlineesp.likewize.com/",
-            "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36"
-        }
+        """Obtiene datos de Likewize con el cliente HTTP compartido (pool + concurrencia acotada)"""
 
-        connector = aiohttp.TCPConnector(limit=options['max_concurrent'])
-        timeout = aiohttp.ClientTimeout(total=60)
-
-        async with aiohttp.ClientSession(
-            cookies=cookies,
-            headers=headers,
-            connector=connector,
-            timeout=timeout
-        ) as session:
+        with LikewizeClient(cookies, concurrency=options['max_concurrent']) as client:
 
             all_data = []
 
@@ -272,33 +288,32 @@ class Command(BaseCommand):
 
             for preset in presets:
                 try:
-                    # Actualizar progreso
+                    # Actualizar progreso (push por Channels, persistencia espaciada)
+                    marca = preset.get('marca', 'Unknown')
                     progress = int((processed_presets / total_presets) * 100)
-                    tarea.progreso = progress
-                    await sync_to_async(tarea.save)()
+                    actualizar_progreso(tarea, progress, f"Descargando {marca}")
 
-                    marca = preset.get('marca', 'Unknown')
-                    await sync_to_async(tarea.add_log)(f"⏳ Procesando {marca}...", "INFO")
-                    preset_data = await self._fetch_preset_data(session, preset)
+                    tarea.add_log(f"⏳ Procesando {marca}...", "INFO")
+                    preset_data = self._fetch_preset_data(client, preset)
                     all_data.extend(preset_data)
 
                     processed_presets += 1
 
-                    await sync_to_async(tarea.add_log)(f"✅ {marca}: {len(preset_data)} items descargados", "SUCCESS")
+                    tarea.add_log(f"✅ {marca}: {len(preset_data)} items descargados", "SUCCESS")
                     self.stdout.write(
                         f"Procesado preset {marca}: {len(preset_data)} items"
                     )
 
                 except Exception as e:
-                    await sync_to_async(tarea.add_log)(f"❌ Error procesando {preset.get('marca', 'Unknown')}: {str(e)}", "ERROR")
+                    tarea.add_log(f"❌ Error procesando {preset.get('marca', 'Unknown')}: {str(e)}", "ERROR")
                     logger.error(f"Error procesando preset {preset}: {e}")
                     continue
 
         return all_data
 
-    async def _fetch_preset_data(
+    def _fetch_preset_data(
         self,
-        session: aiohttp.ClientSession,
+        client: LikewizeClient,
         preset: Dict
     ) -> List[Dict]:
         """
@@ -310,49 +325,21 @@ class Command(BaseCommand):
 
         data = []
 
-        # Obtener modelos maestros
-        if preset.get('brand_id'):
-            # Para marcas específicas
-            url = "https://appleb2bonlineesp.likewize.com/Home.aspx/GetSelectedModels"
-            payload = {
-                "productId": str(preset['product_id']),
-                "brandId": str(preset['brand_id'])
-            }
-        else:
-            # Para Apple (sin brand_id)
-            url = "https://appleb2bonlineesp.likewize.com/Home.aspx/GetList"
-            payload = {"id": preset['product_id']}
-
         try:
-            async with session.post(url, json=payload) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    models = result.get('d', [])
-                else:
-                    logger.error(f"Error obteniendo modelos: {response.status}")
-                    return data
-
-            # Para cada modelo maestro, obtener capacidades
-            tasks = []
+            # Obtener modelos maestros (GetSelectedModels con brand_id, GetList para Apple)
+            models = client.modelos(preset['product_id'], preset.get('brand_id'))
+
+            # Capacidades de todos los modelos maestros en paralelo
+            capacidades = client.capacidades_many(
+                model.get('MasterModelId') for model in models
+            )
             for model in models:
                 master_id = model.get('MasterModelId')
                 if master_id:
-                    task = self._fetch_model_capacities(session, master_id)
-                    tasks.append(task)
-                else:
+                    data.extend(capacidades.get(str(master_id).strip(), []))
+                elif model.get('ModelValue'):
                     # Modelo sin variantes (respuesta directa de GetList)
-                    if model.get('ModelValue'):
-                        data.append(model)
-
-            # Ejecutar tareas concurrentemente
-            if tasks:
-                capacity_results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                for result in capacity_results:
-                    if isinstance(result, list):
-                        data.extend(result)
-                    elif isinstance(result, Exception):
-                        logger.error(f"Error obteniendo capacidades: {result}")
+                    data.append(model)
 
         except Exception as e:
             logger.error(f"Error en fetch_preset_data: {e}")
@@ -451,29 +438,6 @@ class Command(BaseCommand):
 
         return data
 
-    async def _fetch_model_capacities(
-        self,
-        session: aiohttp.ClientSession,
-        master_model_id: str
-    ) -> List[Dict]:
-        """Obtiene capacidades para un modelo maestro"""
-
-        url = "https://appleb2bonlineesp.likewize.com/Home.aspx/GetSelectedCapacitys"
-        payload = {"masterModelId": str(master_model_id)}
-
-        try:
-            async with session.post(url, json=payload) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    return result.get('d', [])
-                else:
-                    logger.error(f"Error obteniendo capacidades para {master_model_id}: {response.status}")
-                    return []
-
-        except Exception as e:
-            logger.error(f"Error en fetch_model_capacities para {master_model_id}: {e}")
-            return []
-
     def _process_with_v4(
         self,
         likewize_data: List[Dict],
@@ -496,27 +460,54 @@ class Command(BaseCommand):
         CapacidadModel = apps.get_model(settings.CAPACIDAD_MODEL)
 
         # Import de v4
-        from productos.mapping import map_device
+        from productos.mapping import map_devices
 
+        # Solo se mapean items con precio
+        priced_items = []
         for item in likewize_data:
-            try:
-                # Extraer precio
-                precio = self._extract_price(item)
-                if not precio:
-                    continue
-
-                # ============================================
-                # SOLO V4 - Sin fallbacks
-                # ============================================
-                result_v4 = map_device(item, system='v4')
+            precio = self._extract_price(item)
+            if precio:
+                priced_items.append((item, precio))
+
+        # ============================================
+        # SOLO V4 - Sin fallbacks (lote con deduplicación y pool de procesos)
+        # ============================================
+        workers = options.get('workers') or 1
+        tarea.add_log(
+            f"⚙️ Mapeando {len(priced_items)} items con v4 ({workers} procesos)...",
+            "INFO"
+        )
+        results_v4 = map_devices(
+            [item for item, _ in priced_items],
+            system='v4',
+            workers=workers
+        )
 
+        cache_hits = sum(1 for r in results_v4 if r.get('cache_hit'))
+        cache_misses = sum(1 for r in results_v4 if r.get('mapping_version') == 'v4') - cache_hits
+        tarea.add_log(
+            f"🧠 Caché de mapeo: {cache_hits} aciertos, {cache_misses} fallos",
+            "INFO"
+        )
+        self.stdout.write(f"Caché de mapeo: {cache_hits} aciertos, {cache_misses} fallos")
+
+        # Capacidades mapeadas en una sola query
+        capacidades = CapacidadModel.objects.in_bulk({
+            r['capacidad_id'] for r in results_v4 if r.get('success') and r.get('capacidad_id')
+        })
+
+        for (item, precio), result_v4 in zip(priced_items, results_v4):
+            if result_v4.get('error_code') == 'ENGINE_EXCEPTION':
+                # El mapeo de este item falló; el resto del lote sigue
+                tarea.add_log(f"⚠️ Error mapeando item: {str(result_v4.get('error_message'))[:100]}", "WARNING")
+                logger.error(f"Error mapeando item {item.get('ModelName', 'Unknown')}: {result_v4.get('error_message')}")
+            try:
                 capacidad = None
                 confidence = 0.0
                 match_type = None
 
                 if result_v4['success']:
-                    capacidad_id = result_v4['capacidad_id']
-                    capacidad = CapacidadModel.objects.filter(id=capacidad_id).first()
+                    capacidad = capacidades.get(result_v4['capacidad_id'])
                     confidence = result_v4.get('confidence', 0.0)
                     match_type = f"v4_{result_v4.get('strategy', 'unknown')}"
                     mapped_count += 1
@@ -629,6 +620,8 @@ class Command(BaseCommand):
                 # Si hay resultado de v4, incluir campos adicionales
                 if result_v4:
                     mapping_metadata['needs_capacity_creation'] = result_v4.get('needs_capacity_creation', False)
+                    if result_v4.get('cache_signature'):
+                        mapping_metadata['cache_signature'] = result_v4['cache_signature']
                     if result_v4.get('suggested_capacity'):
                         mapping_metadata['suggested_capacity'] = result_v4['suggested_capacity']
                     if result_v4.get('v3_skipped'):
@@ -661,6 +654,8 @@ class Command(BaseCommand):
         total_saved = 0
 
         with transaction.atomic():
+            # Idempotente: un reintento de la tarea reemplaza el staging anterior
+            LikewizeItemStaging.objects.filter(tarea=tarea).delete()
             for i in range(0, len(staging_items), batch_size):
                 batch = staging_items[i:i + batch_size]
                 LikewizeItemStaging.objects.bulk_create(batch, ignore_conflicts=True)
@@ -18,6 +18,7 @@ from django.utils import timezone
 from pathlib import Path
 
 from productos.models import TareaActualizacionLikewize, LikewizeItemStaging
+from productos.services.log_tareas import TaskLog, actualizar_progreso
 
 
 SWAPPIE_URL_V3 = "https://swappie.com/api/sell/api/v3/prices/"
@@ -198,9 +199,7 @@ def obtener_precios_swappie_v3(
 
 
 def _set_progress(tarea: TareaActualizacionLikewize, pct: int, msg: str) -> None:
-    tarea.progreso = max(0, min(100, int(pct)))
-    tarea.subestado = msg[:120]
-    tarea.save(update_fields=["progreso", "subestado"])
+    actualizar_progreso(tarea, pct, msg)
 
 
 class Command(BaseCommand):
@@ -241,9 +240,10 @@ class Command(BaseCommand):
         log_path = base_dir / "log.txt"
         tarea.log_path = str(log_path)
         tarea.save(update_fields=["log_path"])
+        task_log = TaskLog(log_path)
+
         def log(msg: str):
-            with open(log_path, "a", encoding="utf-8") as fh:
-                fh.write(f"{timezone.now().isoformat()} {msg}\n")
+            task_log.append(msg)
 
         # Itera modelos del tipo
         modelos_qs = (ModeloModel.objects
@@ -0,0 +1,28 @@
+"""
+Management command que mide calcular() fila a fila frente a
+calcular_columnas() (productos.services.grading_columnas) sobre entradas
+aleatorias, y comprueba que las ofertas coinciden.
+
+Uso:
+    python manage.py benchmark_grading
+    python manage.py benchmark_grading --n 1000000 --semilla 7
+"""
+from django.core.management.base import BaseCommand
+
+from productos.services.grading_columnas import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Compara el grading escalar con el grading por columnas (numpy)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--n', type=int, default=100_000, help='Entradas a valorar (por defecto 100000)')
+        parser.add_argument('--semilla', type=int, default=0, help='Semilla de las entradas aleatorias')
+
+    def handle(self, *args, **options):
+        r = benchmark(options['n'], options['semilla'])
+        self.stdout.write(f"n={r['n']}")
+        self.stdout.write(f"  escalar:   {r['escalar']:.3f}s")
+        self.stdout.write(f"  codificar: {r['codificar']:.3f}s")
+        self.stdout.write(f"  columnas:  {r['columnas']:.3f}s")
+        self.stdout.write(self.style.SUCCESS(f"Mismas ofertas; x{r['aceleracion']} sin contar la codificación"))
@@ -0,0 +1,39 @@
+"""
+Management command para la búsqueda de modelos por trigramas
+(productos.services.busqueda_modelos): crea el índice si falta (p. ej. si
+pg_trgm se instaló después de migrar) y mide la latencia con consultas
+concurrentes frente al objetivo MODELO_BUSQUEDA_P95_MS.
+
+Uso:
+    python manage.py busqueda_modelos --crear-indice
+    python manage.py busqueda_modelos --hilos 16 --repeticiones 10
+    python manage.py busqueda_modelos --consultas "iphone 13" "macbok air"
+"""
+from django.core.management.base import BaseCommand
+
+from productos.services.busqueda_modelos import benchmark, crear_indice
+
+CONSULTAS = ["iphone 13", "iphnoe 13 pro", "ipad air", "macbok pro m2", "galaxy s23", "watch ultra", "imac 24", "m1"]
+
+
+class Command(BaseCommand):
+    help = 'Crea el índice de trigramas de modelos y mide la latencia de la búsqueda'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--crear-indice', action='store_true', help='Crear pg_trgm y el índice si faltan')
+        parser.add_argument('--consultas', nargs='+', default=CONSULTAS, help='Textos a buscar')
+        parser.add_argument('--hilos', type=int, default=8, help='Peticiones concurrentes (por defecto 8)')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Veces que se lanza cada consulta')
+
+    def handle(self, *args, **options):
+        if options['crear_indice']:
+            if crear_indice():
+                self.stdout.write(self.style.SUCCESS('Índice de trigramas disponible'))
+            else:
+                self.stdout.write(self.style.WARNING('pg_trgm no disponible; se usará icontains'))
+
+        r = benchmark(options['consultas'], options['hilos'], options['repeticiones'])
+        self.stdout.write(f"modo={r['modo']} consultas={r['consultas']} hilos={options['hilos']}")
+        self.stdout.write(f"  p50: {r['p50_ms']} ms  p95: {r['p95_ms']} ms  max: {r['max_ms']} ms")
+        estilo = self.style.SUCCESS if r['cumple'] else self.style.ERROR
+        self.stdout.write(estilo(f"Objetivo p95 <= {r['objetivo_p95_ms']} ms: {'cumple' if r['cumple'] else 'no cumple'}"))
@@ -0,0 +1,53 @@
+"""
+Worker de la cola de tareas de actualización de precios.
+
+Reclama las TareaActualizacionLikewize encoladas por las vistas Lanzar*
+(Likewize, Swappie, Backmarket) y ejecuta su comando en un proceso hijo con
+heartbeat, respetando el límite de concurrencia por fuente. Lanzar tantas
+instancias como se quiera (PM2: app tareas-actualizacion), fuera de los
+workers web.
+
+Uso:
+    python manage.py procesar_tareas_actualizacion
+    python manage.py procesar_tareas_actualizacion --once   # vacía la cola y sale
+"""
+import os
+import signal
+import socket
+import sys
+
+from django.core.management.base import BaseCommand
+
+from productos.services.cola_tareas import procesar
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta las tareas de actualización de precios encoladas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--worker-id',
+            type=str,
+            default=None,
+            help='Identificador del worker (por defecto host:pid)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Salir cuando no queden tareas ejecutables'
+        )
+        parser.add_argument(
+            '--poll',
+            type=float,
+            default=5.0,
+            help='Segundos entre sondeos con la cola vacía'
+        )
+
+    def handle(self, *args, **options):
+        worker = options['worker_id'] or f"{socket.gethostname()}:{os.getpid()}"
+        # pm2 stop/restart envía SIGTERM: salir por SystemExit para que
+        # ejecutar() termine el proceso hijo en curso
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        self.stdout.write(f"👷 Worker {worker} esperando tareas...")
+        ejecutadas = procesar(worker, once=options['once'], poll=options['poll'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {ejecutadas} tareas ejecutadas'))
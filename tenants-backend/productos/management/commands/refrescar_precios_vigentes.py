@@ -0,0 +1,26 @@
+"""
+Management command para reconstruir la tabla de precios vigentes (PrecioVigente)
+y la rejilla de tramos del admin de capacidades (TramoPrecioCapacidad).
+
+Las señales y la aplicación en bloque mantienen la tabla al día; este comando
+la recalcula entera desde PrecioRecompra y PrecioDispositivoPersonalizado,
+por lotes de ids en transacciones cortas (las escrituras concurrentes solo
+esperan al lote de su capacidad).
+Útil tras importaciones con update()/bulk_create; además purga las versiones
+caducadas. Los precios con valid_from futuro ya están en el almacén y entran
+solos a su hora. Programado cada hora en ecosystem.config.js (PM2).
+
+Uso:
+    python manage.py refrescar_precios_vigentes
+"""
+from django.core.management.base import BaseCommand
+
+from productos.services.precios_vigentes import sincronizar_precios_vigentes
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la tabla de precios vigentes desde las tablas versionadas'
+
+    def handle(self, *args, **options):
+        total = sincronizar_precios_vigentes(todo=True)
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} precios vigentes recalculados'))
@@ -0,0 +1,142 @@
+"""
+Management command que remapea los items sin mapear del staging de una tarea
+Likewize. Lo encola RemapearTareaLikewizeView y lo ejecuta el worker de la
+cola (procesar_tareas_actualizacion), así que el mapeo v4 puede usar el pool
+de procesos (MAPPING_V4_WORKERS) que no se crea dentro de una petición web.
+
+Las estadísticas finales quedan en meta["stats"] de la tarea de remapeo.
+
+Uso:
+    python manage.py remapear_likewize --tarea <uuid remapeo> --origen <uuid staging>
+"""
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from productos.mapping import map_devices
+from productos.models import LikewizeItemStaging, TareaActualizacionLikewize
+from productos.services.log_tareas import actualizar_progreso, publicar_progreso
+
+logger = logging.getLogger(__name__)
+
+
+def _metadata(result: dict) -> dict:
+    """mapping_metadata del staging a partir del resultado de map_devices()."""
+    if result.get('success') and result.get('capacidad_id'):
+        metadata = {
+            'confidence_score': result.get('confidence', 0) * 100,  # 0-100
+            'mapping_algorithm': result.get('strategy', 'unknown'),
+            'needs_review': result.get('confidence', 0) < 0.85,
+            'is_mapped': True
+        }
+    else:
+        # Sin match: se guarda igualmente por si v4 sugiere crear la capacidad
+        metadata = {
+            'confidence_score': result.get('confidence', 0) * 100 if result.get('confidence') else None,
+            'mapping_algorithm': result.get('strategy'),
+            'needs_review': True,
+            'is_mapped': False,
+            'needs_capacity_creation': result.get('needs_capacity_creation', False)
+        }
+        if result.get('suggested_capacity'):
+            metadata['suggested_capacity'] = result['suggested_capacity']
+        if result.get('v3_skipped'):
+            metadata['v3_skipped'] = result['v3_skipped']
+            metadata['v3_skip_reason'] = result.get('v3_skip_reason')
+        if result.get('error_code') == 'ENGINE_EXCEPTION':
+            # Fallo de este item: se registra y se sigue con el resto
+            metadata['error'] = result.get('error_message')
+    if result.get('cache_signature'):
+        metadata['cache_signature'] = result['cache_signature']
+    return metadata
+
+
+def remapear(origen: TareaActualizacionLikewize, system: str = 'v4', workers: int = 1) -> dict:
+    """
+    Remapea los items sin capacidad del staging de `origen`.
+
+    Returns:
+        {"total", "mapped", "unmapped", "processed", "failed", "system"}
+    """
+    staging = LikewizeItemStaging.objects.filter(tarea=origen)
+    items, failed = [], 0
+    for item in staging.filter(capacidad_id__isnull=True):
+        full_name = item.modelo_raw or item.modelo_norm or ""
+        if full_name:
+            items.append((item, {'FullName': full_name}))
+        else:
+            failed += 1  # sin nombre no se puede mapear
+
+    # Mapeo en lote (deduplica nombres repetidos)
+    results = map_devices([data for _, data in items], system=system, workers=workers)
+
+    processed = 0
+    for (item, _), result in zip(items, results):
+        if result.get('success') and result.get('capacidad_id'):
+            item.capacidad_id = result['capacidad_id']
+            processed += 1
+        else:
+            failed += 1
+        item.mapping_metadata = _metadata(result)
+    LikewizeItemStaging.objects.bulk_update(
+        [item for item, _ in items], ['capacidad_id', 'mapping_metadata'], batch_size=500
+    )
+
+    mapped = staging.filter(capacidad_id__isnull=False).count()
+    total = staging.count()
+    return {
+        "total": total,
+        "mapped": mapped,
+        "unmapped": total - mapped,
+        "processed": processed,
+        "failed": failed,
+        "system": system,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Remapea los items sin mapear del staging de una tarea Likewize'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tarea', type=str, required=True, help='Tarea de remapeo (la de la cola)')
+        parser.add_argument('--origen', type=str, required=True, help='Tarea cuyo staging se remapea')
+        parser.add_argument(
+            '--system',
+            type=str,
+            default='v4',
+            choices=['v4', 'v3', 'auto'],
+            help='Sistema de mapeo a usar (default: v4)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.MAPPING_V4_WORKERS,
+            help='Procesos para el mapeo v4 en lote (1 = secuencial)'
+        )
+
+    def handle(self, *args, **options):
+        tarea = TareaActualizacionLikewize.objects.get(pk=options['tarea'])
+        try:
+            origen = TareaActualizacionLikewize.objects.get(pk=options['origen'])
+            actualizar_progreso(tarea, 5, "Remapeando staging")
+            stats = remapear(origen, system=options['system'], workers=options['workers'])
+        except Exception as e:
+            logger.error(f"Error remapeando la tarea {options['origen']}: {e}")
+            tarea.estado = "ERROR"
+            tarea.error_message = str(e)
+            tarea.finalizado_en = timezone.now()
+            tarea.save()
+            publicar_progreso(tarea)
+            raise
+
+        tarea.meta = {**(tarea.meta or {}), "stats": stats}
+        tarea.estado = "SUCCESS"
+        tarea.finalizado_en = timezone.now()
+        actualizar_progreso(tarea, 100, f"Remapeo completado: {stats['processed']} dispositivos mapeados")
+        tarea.save()
+        tarea.add_log(f"✅ Remapeo {stats['system']}: {stats['processed']} mapeados, {stats['failed']} sin mapear", "SUCCESS")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {stats['processed']} mapeados, {stats['unmapped']} siguen sin mapear"
+        ))
@@ -21,10 +21,10 @@ Uso:
     result = map_device({'FullName': 'iPhone 13 Pro 128GB'}, system='auto')
 """
 
-from typing import Dict, Any, Optional, Literal
+from typing import Dict, Any, List, Optional, Literal
 import logging
 
-from productos.mapping.adapters.v3_compatibility import map_device_v4
+from productos.mapping.adapters.v3_compatibility import map_device_v4, map_devices_v4
 
 logger = logging.getLogger(__name__)
 
@@ -91,20 +91,10 @@ def map_device(
         ...     print(f"v4 match: {result['comparison']['v4_matched']}")
     """
     # Validar que tenemos datos minimos
-    model_name = (
-        likewize_data.get('FullName') or
-        likewize_data.get('fullName') or
-        likewize_data.get('model_name') or
-        ""
-    )
+    model_name = _extract_model_name(likewize_data)
 
-    if not model_name or not model_name.strip():
-        return {
-            'success': False,
-            'error_message': 'model_name es requerido y no puede estar vacio',
-            'error_code': 'INVALID_INPUT',
-            'mapping_version': None,
-        }
+    if not model_name:
+        return _invalid_input_result()
 
     # Determinar que sistema usar
     if system == 'v3':
@@ -169,6 +159,68 @@ def map_device(
         raise ValueError(f"Sistema invalido: {system}. Usar 'v3', 'v4', o 'auto'")
 
 
+def map_devices(
+    likewize_items: List[Dict[str, Any]],
+    system: Literal['v3', 'v4', 'auto'] = 'v4',
+    workers: int = 1
+) -> List[Dict[str, Any]]:
+    """
+    Mapea un lote de dispositivos de Likewize.
+
+    Con system='v4' usa DeviceMapperService.map_many() (deduplicacion y
+    pool de procesos). El resto de sistemas se mapean item a item con
+    map_device().
+
+    Args:
+        likewize_items: Lista de dicts con datos de Likewize
+        system: Que sistema usar ('v3', 'v4', 'auto')
+        workers: Numero de procesos para v4 (1 = secuencial)
+
+    Returns:
+        Lista de resultados en el mismo orden que likewize_items
+    """
+    if system != 'v4':
+        return [map_device(item, system=system) for item in likewize_items]
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(likewize_items)
+    valid_positions = []
+    for position, item in enumerate(likewize_items):
+        if _extract_model_name(item):
+            valid_positions.append(position)
+        else:
+            results[position] = _invalid_input_result()
+
+    mapped = map_devices_v4(
+        [likewize_items[position] for position in valid_positions],
+        workers=workers
+    )
+    for position, result in zip(valid_positions, mapped):
+        results[position] = result
+
+    return results
+
+
+def _extract_model_name(likewize_data: Dict[str, Any]) -> str:
+    """Nombre del modelo usado para validar el input (vacio si no hay)."""
+    model_name = (
+        likewize_data.get('FullName') or
+        likewize_data.get('fullName') or
+        likewize_data.get('model_name') or
+        ""
+    )
+    return model_name.strip()
+
+
+def _invalid_input_result() -> Dict[str, Any]:
+    """Resultado de error para inputs sin model_name."""
+    return {
+        'success': False,
+        'error_message': 'model_name es requerido y no puede estar vacio',
+        'error_code': 'INVALID_INPUT',
+        'mapping_version': None,
+    }
+
+
 def _map_with_v3(likewize_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Mapea con sistema v3 (legacy).
@@ -273,7 +325,9 @@ def _compare_results(
 # Exportar API principal
 __all__ = [
     'map_device',
+    'map_devices',
     'map_device_v4',
+    'map_devices_v4',
     'MAPPING_V4_ENABLED',
     'MAPPING_V4_ROLLOUT_PERCENT',
 ]
@@ -5,11 +5,12 @@ Convierte entre los formatos de entrada/salida de v3 (dict-based)
 y v4 (dataclass-based) para permitir integración transparente.
 """
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Sequence
 from decimal import Decimal
 
 from productos.mapping.core.types import LikewizeInput, MatchResult
 from productos.mapping.services.device_mapper_service import DeviceMapperService
+from productos.mapping.services.result_cache import input_signature
 
 
 class V3CompatibilityAdapter:
@@ -72,6 +73,49 @@ class V3CompatibilityAdapter:
 
         return result_dict
 
+    def map_many_from_dicts(
+        self,
+        likewize_dicts: Sequence[Dict[str, Any]],
+        workers: int = 1
+    ) -> List[Dict[str, Any]]:
+        """
+        Mapea un lote de dispositivos en formato v3 (dict).
+
+        Usa DeviceMapperService.map_many() (deduplicación + pool de procesos).
+        Los items sin model_name reciben el mismo error INVALID_INPUT que
+        devuelve map_device().
+
+        Args:
+            likewize_dicts: Dicts con formato de Likewize
+            workers: Número de procesos para el mapeo
+
+        Returns:
+            Lista de dicts formato v3, en el mismo orden que la entrada
+        """
+        outputs: List[Optional[Dict[str, Any]]] = [None] * len(likewize_dicts)
+        valid_positions = []
+        valid_inputs = []
+
+        for position, data in enumerate(likewize_dicts):
+            try:
+                input_v4 = self._dict_to_likewize_input(data)
+            except ValueError:
+                outputs[position] = {
+                    'success': False,
+                    'error_message': 'model_name es requerido y no puede estar vacio',
+                    'error_code': 'INVALID_INPUT',
+                    'mapping_version': None,
+                }
+                continue
+            valid_positions.append(position)
+            valid_inputs.append(input_v4)
+
+        results = self._service.map_many(valid_inputs, workers=workers)
+        for position, result in zip(valid_positions, results):
+            outputs[position] = self._match_result_to_dict(result)
+
+        return outputs
+
     def _dict_to_likewize_input(self, data: Dict[str, Any]) -> LikewizeInput:
         """
         Convierte dict v3 → LikewizeInput v4.
@@ -228,6 +272,10 @@ class V3CompatibilityAdapter:
             # Metadata adicional
             'mapping_version': 'v4',
 
+            # Caché persistente de resultados (ver MappingResultCache)
+            'cache_hit': bool(result.context and result.context.metadata.get('result_cache_hit')),
+            'cache_signature': input_signature(result.context.input_data) if result.context else None,
+
             # Flag para indicar que se debe crear la capacidad
             'needs_capacity_creation': should_create_capacity,
         }
@@ -556,3 +604,25 @@ def map_device_v4(likewize_dict: Dict[str, Any]) -> Dict[str, Any]:
     """
     adapter = V3CompatibilityAdapter()
     return adapter.map_from_dict(likewize_dict)
+
+
+def map_devices_v4(
+    likewize_dicts: Sequence[Dict[str, Any]],
+    workers: int = 1
+) -> List[Dict[str, Any]]:
+    """
+    Versión por lotes de map_device_v4().
+
+    Args:
+        likewize_dicts: Dicts con datos de Likewize (formato v3)
+        workers: Número de procesos para el mapeo (1 = secuencial)
+
+    Returns:
+        Lista de dicts con resultado (formato v3), en el orden de entrada
+
+    Example:
+        >>> results = map_devices_v4(items, workers=4)
+        >>> mapped = [r for r in results if r['success']]
+    """
+    adapter = V3CompatibilityAdapter()
+    return adapter.map_many_from_dicts(likewize_dicts, workers=workers)
@@ -0,0 +1,359 @@
+"""
+Índice en memoria del catálogo (Modelo + Capacidad) para el sistema de mapeo v4.
+
+Los matchers necesitan consultar el catálogo por tipo, año, A-number, etc.
+en cada llamada a map(). Hacerlo contra el ORM supone decenas de queries por
+dispositivo (una por modelo para leer sus capacidades). Este módulo carga el
+catálogo UNA vez en estructuras compactas con índices invertidos y lo
+reutiliza entre llamadas hasta que el catálogo cambia.
+
+Invalidación:
+- Señales post_save/post_delete de Modelo y Capacidad (productos.signals)
+  llaman a CatalogIndex.invalidate().
+- La versión se publica también en la cache de Django (Redis, compartida
+  por los workers de uvicorn y los comandos) para que otros procesos
+  detecten el cambio en su siguiente acceso.
+- Como red de seguridad (update()/bulk_create sin señales, cache caída),
+  un snapshot con más de CATALOG_INDEX_MAX_AGE segundos se recarga.
+
+Uso:
+    index = CatalogIndex.current()
+    modelos = index.modelos_por_tipo("iPhone")
+    capacidades = index.capacidades_activas(modelos[0].id)
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_CACHE_KEY = "productos:mapping:catalog_version"
+
+_A_NUMBER_RE = re.compile(r'\bA\d{4}\b', re.I)
+_CHIP_RE = re.compile(r'\b(M\d+)(?:\s+(Pro|Max|Ultra))?\b', re.I)
+_SCREEN_RE = re.compile(r'(\d+(?:[.,]\d+)?)\s*(?:pulgadas|-?inch|\'\'|")', re.I)
+_STORAGE_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(TB|GB)', re.I)
+
+
+@dataclass(frozen=True)
+class ModeloEntry:
+    """
+    Proyección inmutable de un Modelo.
+
+    Expone los mismos nombres de atributo que el modelo Django
+    (id, descripcion, tipo, año...) para que calculate_score() de los
+    matchers funcione igual con ambos.
+    """
+    id: int
+    descripcion: str
+    tipo: str
+    marca: str
+    pantalla: str
+    año: Optional[int]
+    procesador: str
+    likewize_modelo: str
+    descripcion_lower: str = field(default="", repr=False, compare=False)
+
+    def __post_init__(self):
+        if not self.descripcion_lower:
+            object.__setattr__(self, 'descripcion_lower', self.descripcion.lower())
+
+    def contiene(self, texto: str) -> bool:
+        """Equivalente en memoria de descripcion__icontains."""
+        return texto.lower() in self.descripcion_lower
+
+
+@dataclass(frozen=True)
+class CapacidadEntry:
+    """Proyección inmutable de una Capacidad."""
+    id: int
+    modelo_id: int
+    tamaño: str
+    activo: bool
+    storage_gb: int                      # Normalizado: "1 TB" → 1024, 0 si no parseable
+
+
+def parse_storage_gb(tamanio: str) -> int:
+    """
+    Convierte '512 GB' o '1 TB' a GB numérico.
+
+    Args:
+        tamanio: String como "512 GB", "1 TB", "256GB"
+
+    Returns:
+        Capacidad en GB (512, 1024, 256) o 0 si no se reconoce
+    """
+    match = _STORAGE_RE.search(tamanio or "")
+    if not match:
+        return 0
+    value = float(match.group(1))
+    return int(value * 1024 if match.group(2).upper() == 'TB' else value)
+
+
+def _fingerprint(modelos, capacidades) -> str:
+    """
+    Huella del contenido del catálogo, estable entre procesos y reinicios.
+
+    A diferencia de version (local al proceso), también cambia tras
+    operaciones masivas que no disparan señales.
+    """
+    digest = hashlib.sha256()
+    for modelo in modelos:
+        digest.update(repr(modelo).encode())
+    for capacidad in capacidades:
+        digest.update(repr(capacidad).encode())
+    return digest.hexdigest()
+
+
+def _screen_key(value: float) -> str:
+    """Normaliza un tamaño de pantalla a clave de índice ("12.9", "11")."""
+    return f"{float(value):g}"
+
+
+class CatalogIndex:
+    """
+    Snapshot inmutable del catálogo con índices invertidos.
+
+    Índices:
+    - tipo (case-insensitive) → modelos
+    - año → modelos
+    - A-number (A2816...) → modelos que lo mencionan en la descripción
+    - chip (M2, M2 PRO...) → modelos
+    - tamaño de pantalla ("12.9") → modelos
+    - modelo_id → capacidades activas (en orden de Capacidad.Meta)
+    - storage_gb → capacidades activas
+
+    fingerprint identifica el contenido del snapshot (se usa como versión
+    de catálogo en la caché persistente de resultados).
+
+    Todas las listas devueltas respetan el ordering de Modelo.Meta, así el
+    orden de candidatos (y el desempate por score) es el mismo que con el ORM.
+
+    Thread-safe: el snapshot es de solo lectura; la reconstrucción está
+    protegida por un lock.
+    """
+
+    _instance: Optional['CatalogIndex'] = None
+    _lock = threading.Lock()
+    _local_version = 0
+
+    def __init__(
+        self,
+        modelos: List[ModeloEntry],
+        capacidades: List[CapacidadEntry],
+        version: Tuple[int, Optional[str]] = (0, None),
+    ):
+        self.version = version
+        self.built_at = time.time()
+        self.modelos: Tuple[ModeloEntry, ...] = tuple(modelos)
+        self.fingerprint = _fingerprint(self.modelos, capacidades)
+        self._modelos_by_id: Dict[int, ModeloEntry] = {m.id: m for m in self.modelos}
+
+        self._by_tipo: Dict[str, List[ModeloEntry]] = {}
+        self._by_year: Dict[Optional[int], List[ModeloEntry]] = {}
+        self._by_a_number: Dict[str, List[ModeloEntry]] = {}
+        self._by_chip: Dict[str, List[ModeloEntry]] = {}
+        self._by_screen: Dict[str, List[ModeloEntry]] = {}
+
+        for modelo in self.modelos:
+            self._by_tipo.setdefault(modelo.tipo.lower(), []).append(modelo)
+            self._by_year.setdefault(modelo.año, []).append(modelo)
+
+            for a_number in {a.upper() for a in _A_NUMBER_RE.findall(modelo.descripcion)}:
+                self._by_a_number.setdefault(a_number, []).append(modelo)
+
+            chip_text = f"{modelo.procesador} {modelo.descripcion}"
+            chips = {
+                f"{gen} {variant}".strip().upper()
+                for gen, variant in _CHIP_RE.findall(chip_text)
+            }
+            for chip in chips:
+                self._by_chip.setdefault(chip, []).append(modelo)
+
+            screens = {
+                _screen_key(float(size.replace(',', '.')))
+                for size in _SCREEN_RE.findall(f"{modelo.pantalla} {modelo.descripcion}")
+            }
+            for screen in screens:
+                self._by_screen.setdefault(screen, []).append(modelo)
+
+        self._capacidades_by_modelo: Dict[int, List[CapacidadEntry]] = {}
+        self._capacidades_by_storage: Dict[int, List[CapacidadEntry]] = {}
+        for capacidad in capacidades:
+            if not capacidad.activo:
+                continue
+            self._capacidades_by_modelo.setdefault(capacidad.modelo_id, []).append(capacidad)
+            self._capacidades_by_storage.setdefault(capacidad.storage_gb, []).append(capacidad)
+
+    # ===========================
+    # Ciclo de vida
+    # ===========================
+
+    @classmethod
+    def current(cls, revalidar: bool = False) -> 'CatalogIndex':
+        """
+        Retorna el índice vigente, reconstruyéndolo si el catálogo cambió.
+
+        Args:
+            revalidar: Recargar desde la BD aunque la versión no haya
+                cambiado (detecta operaciones masivas sin señales)
+
+        Returns:
+            CatalogIndex compartido por todo el proceso
+        """
+        version = cls._current_version()
+        instance = cls._instance
+        if instance is not None and not revalidar and not cls._obsoleto(instance, version):
+            return instance
+
+        with cls._lock:
+            instance = cls._instance
+            if instance is None or revalidar or cls._obsoleto(instance, version):
+                nuevo = cls.load(version)
+                if instance is not None and nuevo.fingerprint == instance.fingerprint:
+                    # Mismo contenido: se conserva el snapshot, renovado
+                    instance.version, instance.built_at = version, nuevo.built_at
+                else:
+                    instance = nuevo
+                cls._instance = instance
+        return instance
+
+    @staticmethod
+    def _obsoleto(instance: 'CatalogIndex', version: Tuple[int, Optional[str]]) -> bool:
+        max_age = getattr(settings, "CATALOG_INDEX_MAX_AGE", 300)
+        return instance.version != version or (max_age and time.time() - instance.built_at > max_age)
+
+    @classmethod
+    def load(cls, version: Tuple[int, Optional[str]] = (0, None)) -> 'CatalogIndex':
+        """
+        Carga Modelo y Capacidad desde la BD (2 queries).
+
+        Args:
+            version: Versión del catálogo asociada al snapshot
+
+        Returns:
+            Nuevo CatalogIndex
+        """
+        from productos.models.modelos import Modelo, Capacidad
+
+        start = time.perf_counter()
+        modelos = [
+            ModeloEntry(
+                id=row[0],
+                descripcion=row[1] or "",
+                tipo=row[2] or "",
+                marca=row[3] or "",
+                pantalla=row[4] or "",
+                año=row[5],
+                procesador=row[6] or "",
+                likewize_modelo=row[7] or "",
+            )
+            for row in Modelo.objects.values_list(
+                'id', 'descripcion', 'tipo', 'marca', 'pantalla',
+                'año', 'procesador', 'likewize_modelo',
+            )
+        ]
+        capacidades = [
+            CapacidadEntry(
+                id=cap_id,
+                modelo_id=modelo_id,
+                tamaño=tamanio or "",
+                activo=activo,
+                storage_gb=parse_storage_gb(tamanio),
+            )
+            for cap_id, modelo_id, tamanio, activo in Capacidad.objects.values_list(
+                'id', 'modelo_id', 'tamaño', 'activo'
+            )
+        ]
+        index = cls(modelos, capacidades, version=version)
+        logger.info(
+            "CatalogIndex cargado: %d modelos, %d capacidades en %.1f ms",
+            len(modelos), len(capacidades), (time.perf_counter() - start) * 1000,
+        )
+        return index
+
+    @classmethod
+    def invalidate(cls):
+        """
+        Marca el índice como obsoleto (local y en la cache compartida).
+
+        Se llama desde las señales de Modelo/Capacidad y puede llamarse
+        manualmente tras operaciones masivas (bulk_create, update()).
+        """
+        cls._local_version += 1
+        try:
+            cache.set(CATALOG_VERSION_CACHE_KEY, f"{time.time_ns()}", None)
+        except Exception as e:  # La cache no debe romper el guardado del catálogo
+            logger.warning("No se pudo publicar la versión del catálogo: %s", e)
+
+    @classmethod
+    def _current_version(cls) -> Tuple[int, Optional[str]]:
+        try:
+            shared = cache.get(CATALOG_VERSION_CACHE_KEY)
+        except Exception:
+            shared = None
+        return (cls._local_version, shared)
+
+    # ===========================
+    # Consultas
+    # ===========================
+
+    def get_modelo(self, modelo_id: int) -> Optional[ModeloEntry]:
+        """Modelo por ID, o None."""
+        return self._modelos_by_id.get(modelo_id)
+
+    def modelos_por_tipo(self, tipo: str) -> List[ModeloEntry]:
+        """Equivalente de Modelo.objects.filter(tipo__iexact=tipo)."""
+        return list(self._by_tipo.get((tipo or "").lower(), ()))
+
+    def modelos_por_anio(self, year: Optional[int]) -> List[ModeloEntry]:
+        """Equivalente de Modelo.objects.filter(año=year)."""
+        return list(self._by_year.get(year, ()))
+
+    def modelos_por_a_number(self, a_number: str) -> List[ModeloEntry]:
+        """
+        Equivalente de Modelo.objects.filter(descripcion__icontains=a_number).
+
+        Usa el índice invertido si el A-number tiene formato estándar (A1234);
+        en otro caso recorre el catálogo.
+        """
+        if not a_number:
+            return []
+        if _A_NUMBER_RE.fullmatch(a_number):
+            bucket = self._by_a_number.get(a_number.upper(), ())
+        else:
+            bucket = self.modelos
+        return [m for m in bucket if m.contiene(a_number)]
+
+    def modelos_por_chip(self, chip: str) -> List[ModeloEntry]:
+        """Modelos cuyo procesador/descripcion menciona el chip ("M2", "M2 Pro")."""
+        return list(self._by_chip.get((chip or "").strip().upper(), ()))
+
+    def modelos_por_pantalla(self, screen_size: float) -> List[ModeloEntry]:
+        """Modelos con ese tamaño de pantalla (en pulgadas) en pantalla/descripcion."""
+        return list(self._by_screen.get(_screen_key(screen_size), ()))
+
+    def capacidades_activas(self, modelo_id: int) -> List[CapacidadEntry]:
+        """Equivalente de modelo.capacidades.filter(activo=True)."""
+        return list(self._capacidades_by_modelo.get(modelo_id, ()))
+
+    def capacidades_por_storage(self, storage_gb: int) -> List[CapacidadEntry]:
+        """Capacidades activas con ese almacenamiento normalizado."""
+        return list(self._capacidades_by_storage.get(storage_gb, ()))
+
+    def stats(self) -> Dict[str, int]:
+        """Tamaños del índice (para logs de tareas)."""
+        return {
+            'modelos': len(self.modelos),
+            'capacidades_activas': sum(len(v) for v in self._capacidades_by_modelo.values()),
+            'tipos': len(self._by_tipo),
+            'a_numbers': len(self._by_a_number),
+        }
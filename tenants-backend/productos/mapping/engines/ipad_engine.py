@@ -21,6 +21,7 @@ paso es delegado a componentes especializados.
 from typing import List
 import re
 
+from productos.mapping.core.catalog_index import CatalogIndex
 from productos.mapping.core.interfaces import IMappingEngine
 from productos.mapping.core.types import (
     LikewizeInput,
@@ -157,24 +158,21 @@ class iPadEngine(IMappingEngine):
                 # NUEVO: Verificar si el modelo existe (antes de buscar candidatos)
                 # Búsqueda amplia basada en device_type y screen_size (más confiable que generation)
                 # IMPORTANTE: En BD todos los iPads tienen tipo="iPad" (no "iPad Pro", "iPad Air", etc.)
-                from productos.models.modelos import Modelo
-                models_matching_name = Modelo.objects.filter(
-                    tipo__iexact="iPad"
-                )
+                models_matching_name = CatalogIndex.current().modelos_por_tipo("iPad")
 
                 # Si tenemos screen_size (iPad Pro), filtrar por tamaño
                 if features.screen_size:
                     # Buscar modelos con ese tamaño en la descripción
                     # Ej: "10,5" o "10.5"
                     size_str = str(features.screen_size).replace('.', ',')  # 10.5 → 10,5
-                    models_matching_name = models_matching_name.filter(
-                        descripcion__icontains=size_str
-                    )
+                    models_matching_name = [
+                        m for m in models_matching_name if m.contiene(size_str)
+                    ]
 
-                if models_matching_name.exists():
-                    context.info(f"Modelo {features.device_type.value} con tamaño {features.screen_size}\" EXISTE en BD ({models_matching_name.count()} modelos)")
+                if models_matching_name:
+                    context.info(f"Modelo {features.device_type.value} con tamaño {features.screen_size}\" EXISTE en BD ({len(models_matching_name)} modelos)")
                     context.set_metadata('model_found_by_name', True)
-                    context.set_metadata('model_ids_found', list(models_matching_name.values_list('id', flat=True)))
+                    context.set_metadata('model_ids_found', [m.id for m in models_matching_name])
 
                 candidates = self.name_matcher.find_candidates(features, context)
                 if candidates:
@@ -182,7 +180,7 @@ class iPadEngine(IMappingEngine):
                     context.info(f"✓ NameMatcher encontró {len(candidates)} candidatos (confidence: ~80%)")
                 else:
                     # Si modelo existe pero NO hay candidatos, significa que falta la capacidad
-                    if models_matching_name.exists():
+                    if models_matching_name:
                         context.warning(
                             f"⚠️ Modelo {features.device_type.value} existe pero NO tiene "
                             f"capacidad de {features.storage_gb}GB. Sugerir crear capacidad."
@@ -196,24 +194,21 @@ class iPadEngine(IMappingEngine):
                 # NUEVO: Verificar si el modelo existe (antes de buscar candidatos)
                 # Búsqueda amplia basada en device_type y screen_size (más confiable que generation)
                 # IMPORTANTE: En BD todos los iPads tienen tipo="iPad" (no "iPad Pro", "iPad Air", etc.)
-                from productos.models.modelos import Modelo
-                models_matching_gen = Modelo.objects.filter(
-                    tipo__iexact="iPad"
-                )
+                models_matching_gen = CatalogIndex.current().modelos_por_tipo("iPad")
 
                 # Si tenemos screen_size (iPad Pro), filtrar por tamaño
                 if features.screen_size:
                     # Buscar modelos con ese tamaño en la descripción
-                    # Ej: "10,5" or "10.5"
+                    # Ej: "10,5" o "10.5"
                     size_str = str(features.screen_size).replace('.', ',')  # 10.5 → 10,5
-                    models_matching_gen = models_matching_gen.filter(
-                        descripcion__icontains=size_str
-                    )
+                    models_matching_gen = [
+                        m for m in models_matching_gen if m.contiene(size_str)
+                    ]
 
-                if models_matching_gen.exists():
-                    context.info(f"Modelo {features.device_type.value} con tamaño {features.screen_size}\" EXISTE en BD ({models_matching_gen.count()} modelos)")
+                if models_matching_gen:
+                    context.info(f"Modelo {features.device_type.value} con tamaño {features.screen_size}\" EXISTE en BD ({len(models_matching_gen)} modelos)")
                     context.set_metadata('model_found_by_generation', True)
-                    context.set_metadata('model_ids_found', list(models_matching_gen.values_list('id', flat=True)))
+                    context.set_metadata('model_ids_found', [m.id for m in models_matching_gen])
 
                 candidates = self.generation_matcher.find_candidates(features, context)
                 if candidates:
@@ -221,7 +216,7 @@ class iPadEngine(IMappingEngine):
                     context.info(f"✓ GenerationMatcher encontró {len(candidates)} candidatos (confidence: ~70%)")
                 else:
                     # Si modelo existe pero NO hay candidatos, significa que falta la capacidad
-                    if models_matching_gen.exists():
+                    if models_matching_gen:
                         context.warning(
                             f"⚠️ Modelo {features.device_type.value} existe pero NO tiene "
                             f"capacidad de {features.storage_gb}GB. Sugerir crear capacidad."
@@ -22,6 +22,7 @@ Soporta:
 """
 
 from typing import List
+from productos.mapping.core.catalog_index import CatalogIndex
 from productos.mapping.core.interfaces import IMappingEngine
 from productos.mapping.core.types import (
     LikewizeInput,
@@ -165,17 +166,16 @@ class MacEngine(IMappingEngine):
             context.info(f"Intentando ANumberMatcher con A-number: {features.a_number}")
 
             # Verificar si el modelo existe (sin filtrar por capacidad primero)
-            from productos.models.modelos import Modelo
-            models_with_a_number = Modelo.objects.filter(
-                descripcion__icontains=features.a_number,
-                tipo__iexact=features.device_type.value,
-                año=features.year
-            )
-
-            if models_with_a_number.exists():
-                context.info(f"Modelo con A-number {features.a_number} EXISTE en BD ({models_with_a_number.count()} modelos)")
+            tipo = features.device_type.value.lower()
+            models_with_a_number = [
+                m for m in CatalogIndex.current().modelos_por_a_number(features.a_number)
+                if m.tipo.lower() == tipo and m.año == features.year
+            ]
+
+            if models_with_a_number:
+                context.info(f"Modelo con A-number {features.a_number} EXISTE en BD ({len(models_with_a_number)} modelos)")
                 context.set_metadata('model_found_by_a_number', True)
-                context.set_metadata('model_ids_found', list(models_with_a_number.values_list('id', flat=True)))
+                context.set_metadata('model_ids_found', [m.id for m in models_with_a_number])
 
                 # Marcar para activar enriquecimiento de capacidades en V3CompatibilityAdapter
                 context.set_metadata('capacity_missing_for_model', True)
@@ -185,7 +185,7 @@ class MacEngine(IMappingEngine):
                 matcher_used = "ANumberMatcher"
                 context.info(f"✓ ANumberMatcher encontró {len(candidates)} candidatos (confidence: ~85%)")
             else:
-                if models_with_a_number.exists():
+                if models_with_a_number:
                     context.warning(
                         f"⚠️ Modelo con A-number {features.a_number} existe pero NO tiene "
                         f"capacidad de {features.storage_gb}GB. Sugerir crear capacidad."
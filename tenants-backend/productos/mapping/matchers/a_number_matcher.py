@@ -18,16 +18,15 @@ Total máximo: 100% (pero reducido a 85% para indicar que siempre requiere filtr
 Esta estrategia se ejecuta ANTES de GenerationMatcher para mayor precisión.
 """
 
-from typing import Optional
-from django.db.models import Q, QuerySet
+from typing import List
 
+from productos.mapping.core.catalog_index import CatalogIndex, ModeloEntry
 from productos.mapping.matchers.base import BaseMatcher
 from productos.mapping.core.types import (
     ExtractedFeatures,
     MappingContext,
     MatchStrategy,
 )
-from productos.models.modelos import Modelo
 
 
 class ANumberMatcher(BaseMatcher):
@@ -47,61 +46,61 @@ class ANumberMatcher(BaseMatcher):
     Max score: 0.85 (nunca 1.0 porque A-number puede ser ambiguo)
     """
 
-    def _get_filtered_queryset(
+    def _get_filtered_models(
         self,
         features: ExtractedFeatures,
-        context: MappingContext
-    ) -> QuerySet:
+        context: MappingContext,
+        index: CatalogIndex
+    ) -> List[ModeloEntry]:
         """
         Filtra modelos por A-number exacto.
 
         Args:
             features: Features extraídas (debe tener a_number)
             context: Contexto de mapeo
+            index: Índice en memoria del catálogo
 
         Returns:
-            QuerySet de modelos con A-number coincidente
+            Modelos con A-number coincidente
         """
         # Validar que tenemos a_number
         if not features.a_number:
             context.debug("No hay a_number, ANumberMatcher no puede ejecutarse")
-            return Modelo.objects.none()
+            return []
 
         context.info(f"Buscando por A-number: {features.a_number}")
 
-        # Query base: filtrar por A-number en la descripción
+        # Base: filtrar por A-number en la descripción
         # NOTA: El campo 'a_number' no existe en Modelo, buscamos en descripcion
-        queryset = Modelo.objects.filter(descripcion__icontains=features.a_number)
+        models_with_a_number = index.modelos_por_a_number(features.a_number)
+        modelos = models_with_a_number
 
         # Si hay device_type, filtrar también por tipo para mayor precisión
         if features.device_type:
-            queryset = queryset.filter(tipo__iexact=features.device_type.value)
+            tipo = features.device_type.value.lower()
+            modelos = [m for m in modelos if m.tipo.lower() == tipo]
             context.debug(f"Filtrando también por tipo: {features.device_type.value}")
 
         # Filtrar por año si está disponible (para desambiguar generaciones)
         if features.year:
             # Verificar si hay modelos con año configurado
-            models_with_year = Modelo.objects.filter(
-                descripcion__icontains=features.a_number
-            ).exclude(año__in=[0, None]).exists()
-
-            if models_with_year:
-                queryset = queryset.filter(año=features.year)
+            # (misma semántica que exclude(año__in=[0, None]) en SQL: NULL cuenta)
+            if any(m.año != 0 for m in models_with_a_number):
+                modelos = [m for m in modelos if m.año == features.year]
                 context.debug(f"Filtrando también por año: {features.year}")
             else:
                 context.warning(
                     f"No hay modelos con año configurado para A-number {features.a_number}"
                 )
 
-        count = queryset.count()
-        context.info(f"ANumberMatcher encontró {count} modelos con A-number {features.a_number}")
+        context.info(f"ANumberMatcher encontró {len(modelos)} modelos con A-number {features.a_number}")
 
-        return queryset
+        return modelos
 
     def calculate_score(
         self,
         features: ExtractedFeatures,
-        modelo: Modelo
+        modelo: ModeloEntry
     ) -> float:
         """
         Calcula score de coincidencia por A-number.
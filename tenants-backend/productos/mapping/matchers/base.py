@@ -6,15 +6,18 @@ Define la interfaz común para todas las estrategias de matching.
 
 from abc import ABC
 from typing import List
-from django.db.models import QuerySet
 
+from productos.mapping.core.catalog_index import (
+    CapacidadEntry,
+    CatalogIndex,
+    ModeloEntry,
+)
 from productos.mapping.core.interfaces import IMatcher
 from productos.mapping.core.types import (
     ExtractedFeatures,
     MatchCandidate,
     MappingContext,
 )
-from productos.models.modelos import Modelo, Capacidad
 
 
 class BaseMatcher(IMatcher, ABC):
@@ -34,8 +37,8 @@ class BaseMatcher(IMatcher, ABC):
         Encuentra candidatos que coincidan con las features.
 
         Template method pattern:
-        1. Obtener queryset base
-        2. Filtrar queryset (implementado por subclases)
+        1. Obtener el índice del catálogo (compartido entre llamadas)
+        2. Filtrar modelos (implementado por subclases)
         3. Convertir a candidatos con scores
         4. Ordenar por score
         5. Retornar
@@ -49,15 +52,16 @@ class BaseMatcher(IMatcher, ABC):
         """
         context.debug(f"Buscando candidatos con {self.__class__.__name__}")
 
-        # Template method: las subclases implementan _get_filtered_queryset
-        queryset = self._get_filtered_queryset(features, context)
+        # Template method: las subclases implementan _get_filtered_models
+        index = CatalogIndex.current()
+        modelos = self._get_filtered_models(features, context, index)
 
-        if not queryset.exists():
-            context.info("No se encontraron modelos en el queryset")
+        if not modelos:
+            context.info("No se encontraron modelos en el catálogo")
             return []
 
         # Convertir modelos a candidatos
-        candidates = self._models_to_candidates(queryset, features, context)
+        candidates = self._models_to_candidates(modelos, features, context, index)
 
         # Ordenar por score (mejor primero)
         candidates.sort(reverse=True)
@@ -65,13 +69,14 @@ class BaseMatcher(IMatcher, ABC):
         context.info(f"Encontrados {len(candidates)} candidatos")
         return candidates
 
-    def _get_filtered_queryset(
+    def _get_filtered_models(
         self,
         features: ExtractedFeatures,
-        context: MappingContext
-    ) -> QuerySet:
+        context: MappingContext,
+        index: CatalogIndex
+    ) -> List[ModeloEntry]:
         """
-        Obtiene el queryset filtrado de modelos.
+        Obtiene los modelos filtrados desde el índice del catálogo.
 
         Las subclases deben implementar este método con su
         lógica específica de filtrado.
@@ -79,35 +84,38 @@ class BaseMatcher(IMatcher, ABC):
         Args:
             features: Features extraídas
             context: Contexto de mapeo
+            index: Índice en memoria del catálogo
 
         Returns:
-            QuerySet de modelos filtrados
+            Lista de modelos filtrados (en el orden de Modelo.Meta)
         """
         # Implementación por defecto: retornar vacío
-        return Modelo.objects.none()
+        return []
 
     def _models_to_candidates(
         self,
-        queryset: QuerySet,
+        modelos: List[ModeloEntry],
         features: ExtractedFeatures,
-        context: MappingContext
+        context: MappingContext,
+        index: CatalogIndex
     ) -> List[MatchCandidate]:
         """
-        Convierte modelos Django a candidatos con scores.
+        Convierte modelos del catálogo a candidatos con scores.
 
         Args:
-            queryset: QuerySet de modelos
+            modelos: Modelos filtrados
             features: Features para calcular scores
             context: Contexto de mapeo
+            index: Índice en memoria del catálogo
 
         Returns:
             Lista de candidatos con scores
         """
         candidates = []
 
-        for modelo in queryset:
+        for modelo in modelos:
             # Obtener capacidades activas del modelo
-            capacidades = modelo.capacidades.filter(activo=True)
+            capacidades = index.capacidades_activas(modelo.id)
 
             # Filtrar capacidades por storage si está especificado
             if features.storage_gb:
@@ -116,10 +124,14 @@ class BaseMatcher(IMatcher, ABC):
                     features.storage_gb
                 )
 
+            if not capacidades:
+                continue
+
+            score = self.calculate_score(features, modelo)
+            match_details = self._build_match_details(features, modelo)
+
             # Crear candidato por cada capacidad
             for capacidad in capacidades:
-                score = self.calculate_score(features, modelo)
-
                 candidate = MatchCandidate(
                     capacidad_id=capacidad.id,
                     modelo_id=modelo.id,
@@ -128,7 +140,7 @@ class BaseMatcher(IMatcher, ABC):
                     modelo_anio=modelo.año,
                     match_score=score,
                     match_strategy=self._get_match_strategy(),
-                    match_details=self._build_match_details(features, modelo)
+                    match_details=dict(match_details)
                 )
 
                 candidates.append(candidate)
@@ -137,29 +149,26 @@ class BaseMatcher(IMatcher, ABC):
 
     def _filter_capacidades_by_storage(
         self,
-        capacidades: QuerySet,
+        capacidades: List[CapacidadEntry],
         storage_gb: int
-    ) -> QuerySet:
+    ) -> List[CapacidadEntry]:
         """
         Filtra capacidades por almacenamiento.
 
         Args:
-            capacidades: QuerySet de capacidades
+            capacidades: Capacidades activas del modelo
             storage_gb: Almacenamiento buscado en GB
 
         Returns:
-            QuerySet filtrado
+            Capacidades cuyo tamaño contiene alguno de los patrones
         """
-        # Generar patrones de búsqueda
-        patterns = self._get_storage_patterns(storage_gb)
-
-        # Filtrar por cualquiera de los patrones
-        from django.db.models import Q
-        query = Q()
-        for pattern in patterns:
-            query |= Q(tamaño__icontains=pattern)
+        # Generar patrones de búsqueda (mismo criterio que tamaño__icontains)
+        patterns = [p.lower() for p in self._get_storage_patterns(storage_gb)]
 
-        return capacidades.filter(query)
+        return [
+            capacidad for capacidad in capacidades
+            if any(pattern in capacidad.tamaño.lower() for pattern in patterns)
+        ]
 
     def _get_storage_patterns(self, storage_gb: int) -> List[str]:
         """
@@ -189,7 +198,7 @@ class BaseMatcher(IMatcher, ABC):
     def _build_match_details(
         self,
         features: ExtractedFeatures,
-        modelo: Modelo
+        modelo: ModeloEntry
     ) -> dict:
         """
         Construye metadata del matching.
@@ -12,16 +12,15 @@ Scoring:
 """
 
 import re
-from typing import Optional
-from django.db.models import Q, QuerySet
+from typing import List
 
+from productos.mapping.core.catalog_index import CatalogIndex, ModeloEntry
 from productos.mapping.matchers.base import BaseMatcher
 from productos.mapping.core.types import (
     ExtractedFeatures,
     MappingContext,
     MatchStrategy,
 )
-from productos.models.modelos import Modelo
 
 
 class GenerationMatcher(BaseMatcher):
@@ -40,25 +39,27 @@ class GenerationMatcher(BaseMatcher):
     - Tipo de dispositivo coincide: +0.2
     """
 
-    def _get_filtered_queryset(
+    def _get_filtered_models(
         self,
         features: ExtractedFeatures,
-        context: MappingContext
-    ) -> QuerySet:
+        context: MappingContext,
+        index: CatalogIndex
+    ) -> List[ModeloEntry]:
         """
         Filtra modelos por generación y año.
 
         Args:
             features: Features extraídas
             context: Contexto de mapeo
+            index: Índice en memoria del catálogo
 
         Returns:
-            QuerySet de modelos filtrados
+            Modelos filtrados
         """
         # Validar que tenemos device_type
         if not features.device_type:
             context.warning("No hay device_type, no se puede filtrar")
-            return Modelo.objects.none()
+            return []
 
         # Para iPads, el tipo en BD es siempre "iPad", no "iPad Pro"/"iPad Air"/"iPad mini"
         # La variante está en la descripción
@@ -67,23 +68,22 @@ class GenerationMatcher(BaseMatcher):
             tipo_para_filtro = "iPad"
             context.debug(f"iPad Pro/Air/mini detectado, usando tipo base: {tipo_para_filtro}")
 
-        # Query base: filtrar por tipo de dispositivo
-        queryset = Modelo.objects.filter(tipo__iexact=tipo_para_filtro)
+        # Base: filtrar por tipo de dispositivo
+        modelos = index.modelos_por_tipo(tipo_para_filtro)
         context.debug(f"Filtrando por tipo: {tipo_para_filtro}")
 
         # Filtrar por año si está disponible (crítico para diferenciar generaciones)
-        # NOTA: Incluir modelos con año=0 o None (año no especificado) para
-        # compatibilidad con datos legacy
+        # NOTA: Incluir modelos con año=0 (año no especificado) para
+        # compatibilidad con datos legacy. Misma semántica que el filtro SQL
+        # original: año__in=[0, None] no captura NULL, exclude() sí.
         if features.year:
-            models_with_year = Modelo.objects.filter(
-                tipo__iexact=features.device_type.value
-            ).exclude(año__in=[0, None]).exists()
+            models_with_year = any(
+                m.año != 0 for m in index.modelos_por_tipo(features.device_type.value)
+            )
 
             if models_with_year:
-                # Filtrar: año coincide O año no especificado (0/None)
-                queryset = queryset.filter(
-                    Q(año=features.year) | Q(año__in=[0, None])
-                )
+                # Filtrar: año coincide O año no especificado (0)
+                modelos = [m for m in modelos if m.año in (features.year, 0)]
                 context.debug(f"Filtrando por año: {features.year} (incluye modelos sin año)")
             else:
                 context.warning(
@@ -98,82 +98,74 @@ class GenerationMatcher(BaseMatcher):
         is_macbook = "MacBook" in features.device_type.value if features.device_type else False
 
         if features.variant and not is_macbook:
-            queryset = self._filter_by_variant(queryset, features, context)
+            modelos = self._filter_by_variant(modelos, features, context)
 
-        context.info(f"Queryset filtrado: {queryset.count()} modelos encontrados")
-        return queryset
+        context.info(f"Modelos filtrados: {len(modelos)} modelos encontrados")
+        return modelos
 
     def _filter_by_variant(
         self,
-        queryset: QuerySet,
+        modelos: List[ModeloEntry],
         features: ExtractedFeatures,
         context: MappingContext
-    ) -> QuerySet:
+    ) -> List[ModeloEntry]:
         """
         Filtra por variante de iPhone.
 
         Args:
-            queryset: QuerySet base
+            modelos: Modelos base
             features: Features con variante
             context: Contexto de mapeo
 
         Returns:
-            QuerySet filtrado por variante
+            Modelos filtrados por variante
         """
         variant = features.variant
 
         # Casos especiales: variantes que requieren filtrado específico
         if variant == "Pro Max":
             # Pro Max: debe tener "Pro" y "Max" en la descripción
-            queryset = queryset.filter(
-                Q(descripcion__icontains="Pro") &
-                Q(descripcion__icontains="Max")
-            )
+            modelos = [m for m in modelos if m.contiene("Pro") and m.contiene("Max")]
             context.debug("Filtrando por variante: Pro Max")
 
         elif variant == "Pro":
             # Pro: debe tener "Pro" pero NO "Max"
-            queryset = queryset.filter(
-                descripcion__icontains="Pro"
-            ).exclude(
-                descripcion__icontains="Max"
-            )
+            modelos = [m for m in modelos if m.contiene("Pro") and not m.contiene("Max")]
             context.debug("Filtrando por variante: Pro")
 
         elif variant == "Plus":
-            queryset = queryset.filter(descripcion__icontains="Plus")
+            modelos = [m for m in modelos if m.contiene("Plus")]
             context.debug("Filtrando por variante: Plus")
 
         elif variant == "mini":
-            queryset = queryset.filter(descripcion__icontains="mini")
+            modelos = [m for m in modelos if m.contiene("mini")]
             context.debug("Filtrando por variante: mini")
 
         elif variant in ("XS Max", "XS", "XR", "X"):
             # Variantes especiales de gen 10
-            queryset = queryset.filter(descripcion__icontains=variant)
+            modelos = [m for m in modelos if m.contiene(variant)]
             context.debug(f"Filtrando por variante gen 10: {variant}")
 
         elif variant == "SE":
-            queryset = queryset.filter(descripcion__icontains="SE")
+            modelos = [m for m in modelos if m.contiene("SE")]
             context.debug("Filtrando por variante: SE")
 
         else:
             # Si no hay variante específica, filtrar modelos SIN variante
             # (excluir Pro, Max, Plus, mini, SE)
-            queryset = queryset.exclude(
-                Q(descripcion__icontains="Pro") |
-                Q(descripcion__icontains="Plus") |
-                Q(descripcion__icontains="mini") |
-                Q(descripcion__icontains="SE")
-            )
+            excluded = ("Pro", "Plus", "mini", "SE")
+            modelos = [
+                m for m in modelos
+                if not any(m.contiene(word) for word in excluded)
+            ]
             context.debug("Filtrando: iPhone regular (sin variante)")
 
-        return queryset
+        return modelos
 
     def calculate_score(
         self,
         features: ExtractedFeatures,
-        modelo: Modelo
+        modelo: ModeloEntry
     ) -> float:
         """
         Calcula score de coincidencia.
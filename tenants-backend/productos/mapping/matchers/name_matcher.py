@@ -13,16 +13,15 @@ Scoring:
 """
 
 import re
-from typing import Optional
-from django.db.models import Q, QuerySet
+from typing import List, Optional
 
+from productos.mapping.core.catalog_index import CatalogIndex, ModeloEntry
 from productos.mapping.matchers.base import BaseMatcher
 from productos.mapping.core.types import (
     ExtractedFeatures,
     MappingContext,
     MatchStrategy,
 )
-from productos.models.modelos import Modelo
 
 
 class NameMatcher(BaseMatcher):
@@ -43,32 +42,34 @@ class NameMatcher(BaseMatcher):
     Max score: 0.80 (nunca 1.0 porque puede haber ambigüedad)
     """
 
-    def _get_filtered_queryset(
+    def _get_filtered_models(
         self,
         features: ExtractedFeatures,
-        context: MappingContext
-    ) -> QuerySet:
+        context: MappingContext,
+        index: CatalogIndex
+    ) -> List[ModeloEntry]:
         """
         Filtra modelos por nombre completo.
 
         Args:
             features: Features extraídas
             context: Contexto de mapeo
+            index: Índice en memoria del catálogo
 
         Returns:
-            QuerySet de modelos filtrados
+            Modelos filtrados
         """
         # Validar que tenemos device_type
         if not features.device_type:
             context.warning("No hay device_type, no se puede filtrar")
-            return Modelo.objects.none()
+            return []
 
         # Construir el nombre del modelo a buscar
         model_name = self._build_model_name(features, context)
 
         if not model_name:
             context.warning("No se pudo construir nombre del modelo")
-            return Modelo.objects.none()
+            return []
 
         context.info(f"Buscando por nombre: '{model_name}'")
 
@@ -89,48 +90,44 @@ class NameMatcher(BaseMatcher):
             tipo_para_filtro = "SmartPhone"
             context.debug(f"Samsung Galaxy detectado, usando tipo: {tipo_para_filtro}")
 
-        # Query base: filtrar por tipo de dispositivo
-        queryset = Modelo.objects.filter(tipo__iexact=tipo_para_filtro)
+        # Base: filtrar por tipo de dispositivo
+        modelos = index.modelos_por_tipo(tipo_para_filtro)
 
         # Filtrar por nombre del modelo en la descripción
         # Buscar cada palabra del nombre en la descripción
-        for word in model_name.split():
-            queryset = queryset.filter(descripcion__icontains=word)
+        words = model_name.split()
+        modelos = [m for m in modelos if all(m.contiene(word) for word in words)]
 
-        context.debug(f"Queryset con nombre: {queryset.count()} modelos")
+        context.debug(f"Modelos con nombre: {len(modelos)} modelos")
 
         # Si tenemos variante, asegurarnos de que la descripción la incluya
         if features.variant:
-            queryset = self._filter_by_variant(queryset, features, context)
+            modelos = self._filter_by_variant(modelos, features, context)
 
         # Filtrar por 5G (Samsung): si has_5g=False, excluir modelos con "5G"
         if hasattr(features, 'has_5g'):
             if features.has_5g:
                 # Buscamos 5G: solo modelos con "5G" en descripción
-                queryset = queryset.filter(descripcion__icontains="5G")
+                modelos = [m for m in modelos if m.contiene("5G")]
                 context.debug("Filtrando: solo modelos 5G")
             else:
                 # NO buscamos 5G: excluir modelos con "5G"
-                queryset = queryset.exclude(descripcion__icontains="5G")
+                modelos = [m for m in modelos if not m.contiene("5G")]
                 context.debug("Filtrando: excluir modelos 5G (buscando 4G)")
 
         # Filtrar por Dual SIM (Samsung)
         if hasattr(features, 'has_dual_sim'):
             if features.has_dual_sim:
                 # Buscamos Dual SIM: filtrar por "Dual Sim" o "Dual SIM" en descripción
-                queryset = queryset.filter(
-                    Q(descripcion__icontains="Dual Sim") |
-                    Q(descripcion__icontains="Dual SIM")
-                )
+                modelos = [m for m in modelos if m.contiene("Dual Sim")]
                 context.debug("Filtrando: solo modelos Dual SIM")
             else:
                 # NO buscamos Dual SIM: excluir modelos con "Dual Sim"/"Dual SIM"
-                queryset = queryset.exclude(descripcion__icontains="Dual Sim")
-                queryset = queryset.exclude(descripcion__icontains="Dual SIM")
+                modelos = [m for m in modelos if not m.contiene("Dual Sim")]
                 context.debug("Filtrando: excluir modelos Dual SIM")
 
-        context.info(f"Queryset filtrado: {queryset.count()} modelos encontrados")
-        return queryset
+        context.info(f"Modelos filtrados: {len(modelos)} modelos encontrados")
+        return modelos
 
     def _build_model_name(
         self,
@@ -212,120 +209,101 @@ class NameMatcher(BaseMatcher):
 
     def _filter_by_variant(
         self,
-        queryset: QuerySet,
+        modelos: List[ModeloEntry],
         features: ExtractedFeatures,
         context: MappingContext
-    ) -> QuerySet:
+    ) -> List[ModeloEntry]:
         """
         Filtra por variante de iPhone/iPad.
 
         Args:
-            queryset: QuerySet base
+            modelos: Modelos base
             features: Features con variante
             context: Contexto de mapeo
 
         Returns:
-            QuerySet filtrado por variante
+            Modelos filtrados por variante
         """
         variant = features.variant
 
         # Casos especiales: variantes que requieren filtrado específico
         if variant == "Pro Max":
             # Pro Max: debe tener "Pro" y "Max" en la descripción
-            queryset = queryset.filter(
-                Q(descripcion__icontains="Pro") &
-                Q(descripcion__icontains="Max")
-            )
+            modelos = [m for m in modelos if m.contiene("Pro") and m.contiene("Max")]
             context.debug("Filtrando por variante: Pro Max")
 
         elif variant == "Pro":
             # Pro: debe tener "Pro" pero NO "Max"
-            queryset = queryset.filter(
-                descripcion__icontains="Pro"
-            ).exclude(
-                descripcion__icontains="Max"
-            )
+            modelos = [m for m in modelos if m.contiene("Pro") and not m.contiene("Max")]
             context.debug("Filtrando por variante: Pro")
 
         elif variant == "Plus":
-            queryset = queryset.filter(descripcion__icontains="Plus")
+            modelos = [m for m in modelos if m.contiene("Plus")]
             context.debug("Filtrando por variante: Plus")
 
         elif variant == "mini":
-            queryset = queryset.filter(descripcion__icontains="mini")
+            modelos = [m for m in modelos if m.contiene("mini")]
             context.debug("Filtrando por variante: mini")
 
         elif variant in ("XS Max", "XS", "XR", "X"):
             # Variantes especiales de gen 10
-            queryset = queryset.filter(descripcion__icontains=variant)
+            modelos = [m for m in modelos if m.contiene(variant)]
             context.debug(f"Filtrando por variante gen 10: {variant}")
 
         elif variant == "SE":
-            queryset = queryset.filter(descripcion__icontains="SE")
+            modelos = [m for m in modelos if m.contiene("SE")]
             context.debug("Filtrando por variante: SE")
 
         # Pixel-specific variants
         elif variant == "Pro Fold":
             # Pro Fold: debe tener "Pro" y "Fold" en la descripción
-            queryset = queryset.filter(
-                Q(descripcion__icontains="Pro") &
-                Q(descripcion__icontains="Fold")
-            )
+            modelos = [m for m in modelos if m.contiene("Pro") and m.contiene("Fold")]
             context.debug("Filtrando por variante: Pro Fold")
 
         elif variant == "Pro XL":
             # Pro XL: debe tener "Pro" y "XL" en la descripción
-            queryset = queryset.filter(
-                Q(descripcion__icontains="Pro") &
-                Q(descripcion__icontains="XL")
-            )
+            modelos = [m for m in modelos if m.contiene("Pro") and m.contiene("XL")]
             context.debug("Filtrando por variante: Pro XL")
 
         elif variant == "Fold":
             # Fold solo (sin Pro)
-            queryset = queryset.filter(descripcion__icontains="Fold").exclude(
-                descripcion__icontains="Pro"
-            )
+            modelos = [m for m in modelos if m.contiene("Fold") and not m.contiene("Pro")]
             context.debug("Filtrando por variante: Fold")
 
         elif variant == "a":
             # Pixel a (7a, 8a, etc.)
-            queryset = queryset.filter(descripcion__iregex=r'\d+a')
+            modelos = [m for m in modelos if re.search(r'\d+a', m.descripcion, re.I)]
             context.debug("Filtrando por variante: a")
 
         # Samsung-specific variants
         elif variant == "Ultra":
-            queryset = queryset.filter(descripcion__icontains="Ultra")
+            modelos = [m for m in modelos if m.contiene("Ultra")]
             context.debug("Filtrando por variante: Ultra (Samsung)")
 
         elif variant == "Lite":
-            queryset = queryset.filter(descripcion__icontains="Lite")
+            modelos = [m for m in modelos if m.contiene("Lite")]
             context.debug("Filtrando por variante: Lite (Samsung)")
 
         elif variant == "FE":
-            queryset = queryset.filter(descripcion__icontains="FE")
+            modelos = [m for m in modelos if m.contiene("FE")]
             context.debug("Filtrando por variante: FE (Samsung)")
 
         else:
             # Si no hay variante específica, filtrar modelos SIN variante
             # (excluir Pro, Max, Plus, mini, SE, Ultra, Lite, FE)
-            queryset = queryset.exclude(
-                Q(descripcion__icontains="Pro") |
-                Q(descripcion__icontains="Plus") |
-                Q(descripcion__icontains="mini") |
-                Q(descripcion__icontains="SE") |
-                Q(descripcion__icontains="Ultra") |
-                Q(descripcion__icontains="Lite") |
-                Q(descripcion__icontains="FE")
-            )
+            excluded = ("Pro", "Plus", "mini", "SE", "Ultra", "Lite", "FE")
+            modelos = [
+                m for m in modelos
+                if not any(m.contiene(word) for word in excluded)
+            ]
             context.debug("Filtrando: modelo regular (sin variante)")
 
-        return queryset
+        return modelos
 
     def calculate_score(
         self,
         features: ExtractedFeatures,
-        modelo: Modelo
+        modelo: ModeloEntry
     ) -> float:
         """
         Calcula score de coincidencia.
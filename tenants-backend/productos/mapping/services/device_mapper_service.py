@@ -8,8 +8,14 @@ Este servicio implementa el patrón Facade, ocultando la complejidad
 de seleccionar y coordinar engines específicos por tipo de dispositivo.
 """
 
-from typing import List
-
+import copy
+import logging
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from productos.mapping.core.catalog_index import CatalogIndex
 from productos.mapping.core.interfaces import IDeviceMapper, IMappingEngine
 from productos.mapping.core.types import (
     LikewizeInput,
@@ -22,6 +28,9 @@ from productos.mapping.engines.ipad_engine import iPadEngine
 from productos.mapping.engines.macbook_engine import MacEngine
 from productos.mapping.engines.pixel_engine import PixelEngine
 from productos.mapping.engines.samsung_engine import SamsungEngine
+from productos.mapping.services.result_cache import ResultCache
+
+logger = logging.getLogger(__name__)
 
 
 class DeviceMapperService(IDeviceMapper):
@@ -40,12 +49,25 @@ class DeviceMapperService(IDeviceMapper):
         if result.status == MatchStatus.SUCCESS:
             print(f"Match encontrado: {result.matched_capacidad_id}")
 
+    Para lotes (tareas Likewize completas) usar map_many(), que deduplica
+    inputs, sirve desde la caché persistente los ya mapeados y reparte el
+    resto entre procesos.
+
     Thread-safe: Sí (los engines son stateless)
     """
 
-    def __init__(self):
-        """Inicializa el servicio con engines por defecto."""
+    # Tamaño máximo de cada trozo enviado a un worker
+    BATCH_CHUNK_SIZE = 200
+
+    def __init__(self, result_cache: Optional[ResultCache] = None):
+        """
+        Inicializa el servicio con engines por defecto.
+
+        Args:
+            result_cache: Caché persistente usada por map_many()
+        """
         self._engines: List[IMappingEngine] = []
+        self._result_cache = result_cache or ResultCache()
 
         # Registrar engines por defecto
         self._register_default_engines()
@@ -104,6 +126,151 @@ class DeviceMapperService(IDeviceMapper):
         # Delegar al engine seleccionado
         return selected_engine.map(input_data)
 
+    def map_many(
+        self,
+        inputs: Sequence[LikewizeInput],
+        workers: int = 1,
+        use_cache: Optional[bool] = None
+    ) -> List[MatchResult]:
+        """
+        Mapea un lote de inputs.
+
+        Proceso:
+        1. Deduplica inputs idénticos (LikewizeInput es inmutable y hashable)
+        2. Sirve desde ResultCache los inputs ya mapeados con la
+           versión actual del catálogo (antes de seleccionar engine)
+        3. Agrupa los inputs restantes por engine
+        4. Reparte los grupos en trozos sobre un pool de procesos; cada worker
+           hereda (fork) o carga el CatalogIndex, sin queries por item
+        5. Guarda los nuevos resultados en la caché y reconstruye la lista
+           en el orden de entrada
+
+        Cada resultado conserva su propio MappingContext; los servidos desde
+        caché llevan context.metadata['result_cache_hit'] = True. Los
+        duplicados reciben una copia del resultado de su primera aparición.
+        Si un engine lanza una excepción con un input, ese input recibe un
+        resultado ERROR (error_code ENGINE_EXCEPTION) y el resto del lote sigue.
+
+        Args:
+            inputs: Inputs de Likewize a mapear
+            workers: Número de procesos (1 = secuencial en este proceso)
+            use_cache: Usar la caché persistente (None = settings.MAPPING_V4_RESULT_CACHE)
+
+        Returns:
+            Lista de MatchResult en el mismo orden que inputs
+        """
+        if use_cache is None:
+            from django.conf import settings
+            use_cache = getattr(settings, 'MAPPING_V4_RESULT_CACHE', True)
+
+        unique_inputs: List[LikewizeInput] = list(dict.fromkeys(inputs))
+
+        results: Dict[LikewizeInput, MatchResult] = {}
+        if use_cache:
+            results.update(self._result_cache.get_many(unique_inputs))
+
+        groups: Dict[str, List[LikewizeInput]] = {}
+        for input_data in unique_inputs:
+            if input_data in results:
+                continue
+            engine = self._select_engine(input_data)
+            if engine is None:
+                results[input_data] = self._create_no_engine_error(input_data)
+            else:
+                groups.setdefault(engine.__class__.__name__, []).append(input_data)
+
+        chunks = self._build_chunks(groups, workers)
+
+        if workers <= 1 or len(chunks) <= 1 or not self._can_fork_workers():
+            for engine_name, chunk in chunks:
+                results.update(zip(chunk, _map_chunk_with(self, engine_name, chunk)))
+        else:
+            # Índice caliente antes de crear el pool: con fork los workers lo heredan
+            CatalogIndex.current()
+            from django.db import connections
+            connections.close_all()
+
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(chunks)),
+                mp_context=_pool_context(),
+                initializer=_init_worker,
+            ) as pool:
+                futures = [
+                    (chunk, pool.submit(_map_chunk, engine_name, chunk))
+                    for engine_name, chunk in chunks
+                ]
+                for chunk, future in futures:
+                    results.update(zip(chunk, future.result()))
+
+        if use_cache:
+            engine_by_input = {
+                input_data: engine_name
+                for engine_name, chunk in chunks
+                for input_data in chunk
+            }
+            self._result_cache.store_many(
+                {input_data: results[input_data] for input_data in engine_by_input},
+                engines=engine_by_input,
+            )
+
+        ordered: List[MatchResult] = []
+        seen = set()
+        for input_data in inputs:
+            result = results[input_data]
+            if input_data in seen:
+                result = copy.copy(result)
+            seen.add(input_data)
+            ordered.append(result)
+        return ordered
+
+    def _build_chunks(
+        self,
+        groups: Dict[str, List[LikewizeInput]],
+        workers: int
+    ) -> List[Tuple[str, List[LikewizeInput]]]:
+        """
+        Divide cada grupo de engine en trozos para repartir entre workers.
+
+        Args:
+            groups: Inputs únicos agrupados por nombre de engine
+            workers: Número de procesos disponibles
+
+        Returns:
+            Lista de (nombre_engine, trozo_de_inputs)
+        """
+        total = sum(len(group) for group in groups.values())
+        if not total:
+            return []
+        chunk_size = max(1, min(
+            self.BATCH_CHUNK_SIZE,
+            math.ceil(total / max(1, workers)),
+        ))
+
+        chunks = []
+        for engine_name, group in groups.items():
+            for start in range(0, len(group), chunk_size):
+                chunks.append((engine_name, group[start:start + chunk_size]))
+        return chunks
+
+    def _can_fork_workers(self) -> bool:
+        """
+        No se pueden cerrar las conexiones dentro de una transacción abierta.
+
+        Returns:
+            True si es seguro crear el pool de procesos
+        """
+        from django.db import connections
+        return not any(
+            conn.in_atomic_block for conn in connections.all(initialized_only=True)
+        )
+
+    def _get_engine_by_name(self, engine_name: str) -> Optional[IMappingEngine]:
+        """Retorna el engine registrado con ese nombre de clase."""
+        for engine in self._engines:
+            if engine.__class__.__name__ == engine_name:
+                return engine
+        return None
+
     def _select_engine(self, input_data: LikewizeInput) -> IMappingEngine:
         """
         Selecciona el engine apropiado para el input dado.
@@ -151,6 +318,27 @@ class DeviceMapperService(IDeviceMapper):
             context=context
         )
 
+    def _create_exception_error(self, input_data: LikewizeInput, exc: Exception) -> MatchResult:
+        """
+        Crea un MatchResult de error cuando el engine lanza una excepción.
+
+        Args:
+            input_data: Input que provocó la excepción
+            exc: Excepción lanzada por el engine
+
+        Returns:
+            MatchResult con status ERROR
+        """
+        context = MappingContext(input_data=input_data)
+        context.error(f"Excepción en el engine: {exc!r}")
+
+        return MatchResult(
+            status=MatchStatus.ERROR,
+            error_message=f"Error mapeando {input_data.model_name}: {exc}",
+            error_code="ENGINE_EXCEPTION",
+            context=context
+        )
+
     def get_registered_engines(self) -> List[str]:
         """
         Retorna los nombres de los engines registrados.
@@ -170,3 +358,52 @@ class DeviceMapperService(IDeviceMapper):
             Lista de tipos (ej: ["iPhone", "iPad", "MacBook", "Pixel", "Samsung"])
         """
         return ["iPhone", "iPad", "MacBook", "Pixel", "Samsung"]
+
+
+# ===========================
+# Workers de map_many()
+# ===========================
+
+_worker_service: Optional[DeviceMapperService] = None
+
+
+def _pool_context():
+    """fork cuando está disponible (los workers heredan el índice caliente)."""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+
+
+def _init_worker():
+    """Inicializa Django y el servicio en cada proceso worker."""
+    global _worker_service
+    from django.apps import apps
+    if not apps.ready:
+        import django
+        django.setup()
+    _worker_service = DeviceMapperService()
+    CatalogIndex.current()
+
+
+def _map_chunk(engine_name: str, chunk: List[LikewizeInput]) -> List[MatchResult]:
+    """Punto de entrada del worker: mapea un trozo con el engine indicado."""
+    return _map_chunk_with(_worker_service, engine_name, chunk)
+
+
+def _map_chunk_with(
+    service: DeviceMapperService,
+    engine_name: str,
+    chunk: List[LikewizeInput]
+) -> List[MatchResult]:
+    engine = service._get_engine_by_name(engine_name)
+    results = []
+    for input_data in chunk:
+        if engine is None:
+            results.append(service._create_no_engine_error(input_data))
+            continue
+        try:
+            results.append(engine.map(input_data))
+        except Exception as e:
+            # Un input problemático no debe tumbar el lote entero
+            logger.exception("Error mapeando %r con %s", input_data.model_name, engine_name)
+            results.append(service._create_exception_error(input_data, e))
+    return results
@@ -0,0 +1,342 @@
+"""
+Caché persistente de resultados del mapeo v4.
+
+Las mismas filas de Likewize (mismo M_Model, Capacity, ModelName) llegan en
+cada actualización semanal. Este módulo guarda el MatchResult de cada input
+en la tabla MappingResultCache para servirlo sin volver a ejecutar
+extractor → KB → matchers → reglas.
+
+Clave:
+- signature: sha256 del LikewizeInput normalizado (solo los campos que
+  influyen en el mapeo).
+- catalog_version: RESULT_CACHE_VERSION + huella del CatalogIndex. Cualquier
+  cambio en Modelo/Capacidad cambia la huella y deja obsoletas todas las
+  entradas anteriores. get_many() recarga el índice desde la BD antes de
+  calcularla (CatalogIndex.current(revalidar=True)), así que también se
+  detectan los update()/bulk_create que no disparan señales; el lote se
+  mapea después con ese mismo snapshot.
+
+Invalidación explícita (ResultCache.invalidate()):
+- CorregirMapeoLikewizeView borra la entrada del item corregido y todas
+  las que apuntaban a la capacidad incorrecta.
+
+Uso:
+    cache = ResultCache()
+    hits = cache.get_many(inputs)          # {input: MatchResult}
+    cache.store_many(nuevos_resultados)    # {input: MatchResult}
+"""
+
+import hashlib
+import json
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from productos.mapping.core.catalog_index import CatalogIndex
+from productos.mapping.core.types import (
+    DeviceType,
+    ExtractedFeatures,
+    LikewizeInput,
+    MappingContext,
+    MatchCandidate,
+    MatchResult,
+    MatchStatus,
+    MatchStrategy,
+)
+
+logger = logging.getLogger(__name__)
+
+# Incrementar al cambiar extractores, KB o reglas: invalida toda la caché
+RESULT_CACHE_VERSION = "1"
+
+# Solo se cachean resultados deterministas (los ERROR pueden ser transitorios)
+CACHEABLE_STATUSES = (MatchStatus.SUCCESS, MatchStatus.NO_MATCH, MatchStatus.AMBIGUOUS)
+
+_LOOKUP_BATCH_SIZE = 1000
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _normalize(value: Any) -> str:
+    return _WHITESPACE_RE.sub(' ', str(value or '')).strip()
+
+
+def input_signature(input_data: LikewizeInput) -> str:
+    """
+    Firma estable de un LikewizeInput.
+
+    Solo incluye los campos que usan los engines (nombre, código de modelo,
+    capacidad y marca); el precio no influye en el mapeo.
+
+    Args:
+        input_data: Input de Likewize
+
+    Returns:
+        Hash sha256 en hexadecimal
+    """
+    payload = json.dumps([
+        _normalize(input_data.model_name),
+        _normalize(input_data.m_model),
+        _normalize(input_data.capacity),
+        _normalize(input_data.brand_name),
+    ], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def catalog_version(revalidar: bool = False) -> str:
+    """
+    Versión de catálogo con la que se guardan/validan las entradas.
+
+    Args:
+        revalidar: Recargar el CatalogIndex desde la BD antes de calcularla
+    """
+    return f"{RESULT_CACHE_VERSION}:{CatalogIndex.current(revalidar=revalidar).fingerprint[:48]}"
+
+
+def serialize_result(result: MatchResult) -> Dict[str, Any]:
+    """
+    Convierte un MatchResult en un dict JSON.
+
+    Se conservan features, candidatos y la metadata del contexto que usa el
+    adaptador v3 (model_ids_found, capacity_missing_for_model...). Los logs
+    del contexto no se guardan.
+
+    Args:
+        result: Resultado a serializar
+
+    Returns:
+        Dict serializable
+    """
+    features = None
+    if result.features is not None:
+        features = dict(vars(result.features))
+        features['device_type'] = (
+            result.features.device_type.value if result.features.device_type else None
+        )
+        features['extraction_notes'] = list(result.features.extraction_notes)
+
+    metadata = {}
+    if result.context is not None:
+        for key, value in result.context.metadata.items():
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError):
+                continue
+            metadata[key] = value
+
+    return {
+        'status': result.status.value,
+        'matched_capacidad_id': result.matched_capacidad_id,
+        'matched_modelo_id': result.matched_modelo_id,
+        'matched_modelo_descripcion': result.matched_modelo_descripcion,
+        'matched_capacidad_tamanio': result.matched_capacidad_tamanio,
+        'match_score': result.match_score,
+        'match_strategy': result.match_strategy.value if result.match_strategy else None,
+        'features': features,
+        'candidates': [
+            {
+                'capacidad_id': c.capacidad_id,
+                'modelo_id': c.modelo_id,
+                'modelo_descripcion': c.modelo_descripcion,
+                'capacidad_tamanio': c.capacidad_tamanio,
+                'modelo_anio': c.modelo_anio,
+                'match_score': c.match_score,
+                'match_strategy': c.match_strategy.value if c.match_strategy else None,
+            }
+            for c in result.all_candidates
+        ],
+        'metadata': metadata,
+        'error_message': result.error_message,
+        'error_code': result.error_code,
+    }
+
+
+def deserialize_result(data: Dict[str, Any], input_data: LikewizeInput) -> MatchResult:
+    """
+    Reconstruye un MatchResult desde serialize_result().
+
+    Args:
+        data: Dict guardado en la caché
+        input_data: Input original (para el nuevo MappingContext)
+
+    Returns:
+        MatchResult equivalente, con context.metadata['result_cache_hit'] = True
+    """
+    features = None
+    if data.get('features') is not None:
+        raw = dict(data['features'])
+        device_type = raw.pop('device_type', None)
+        features = ExtractedFeatures(
+            device_type=DeviceType(device_type) if device_type else None,
+            **raw
+        )
+
+    context = MappingContext(input_data=input_data)
+    context.start_timer()
+    context.metadata.update(data.get('metadata') or {})
+    context.set_metadata('result_cache_hit', True)
+    context.info("Resultado servido desde la caché de mapeo")
+    context.stop_timer()
+
+    strategy = data.get('match_strategy')
+    return MatchResult(
+        status=MatchStatus(data['status']),
+        matched_capacidad_id=data.get('matched_capacidad_id'),
+        matched_modelo_id=data.get('matched_modelo_id'),
+        matched_modelo_descripcion=data.get('matched_modelo_descripcion'),
+        matched_capacidad_tamanio=data.get('matched_capacidad_tamanio'),
+        match_score=data.get('match_score') or 0.0,
+        match_strategy=MatchStrategy(strategy) if strategy else None,
+        features=features,
+        all_candidates=[
+            MatchCandidate(
+                capacidad_id=c['capacidad_id'],
+                modelo_id=c['modelo_id'],
+                modelo_descripcion=c['modelo_descripcion'],
+                capacidad_tamanio=c['capacidad_tamanio'],
+                modelo_anio=c.get('modelo_anio'),
+                match_score=c.get('match_score') or 0.0,
+                match_strategy=(
+                    MatchStrategy(c['match_strategy']) if c.get('match_strategy') else None
+                ),
+            )
+            for c in data.get('candidates') or []
+        ],
+        context=context,
+        error_message=data.get('error_message'),
+        error_code=data.get('error_code'),
+    )
+
+
+class ResultCache:
+    """
+    Acceso por lotes a la tabla productos_mapping_result_cache.
+
+    Los errores de BD se registran y se tratan como fallo de caché: el
+    mapeo nunca debe romperse por la caché.
+    """
+
+    def get_many(self, inputs: Iterable[LikewizeInput]) -> Dict[LikewizeInput, MatchResult]:
+        """
+        Busca resultados vigentes para los inputs dados.
+
+        Args:
+            inputs: Inputs únicos
+
+        Returns:
+            Dict input → MatchResult solo para los aciertos
+        """
+        from productos.models import MappingResultCache as CacheEntry
+
+        by_signature: Dict[str, List[LikewizeInput]] = {}
+        for input_data in inputs:
+            by_signature.setdefault(input_signature(input_data), []).append(input_data)
+        if not by_signature:
+            return {}
+
+        hits: Dict[LikewizeInput, MatchResult] = {}
+        try:
+            # Savepoint: un fallo de la caché no rompe la transacción del llamador
+            with transaction.atomic():
+                version = catalog_version(revalidar=True)
+                signatures = list(by_signature)
+                found = []
+                for start in range(0, len(signatures), _LOOKUP_BATCH_SIZE):
+                    batch = signatures[start:start + _LOOKUP_BATCH_SIZE]
+                    found.extend(
+                        CacheEntry.objects
+                        .filter(signature__in=batch, catalog_version=version)
+                        .values_list('signature', 'result')
+                    )
+                for signature, data in found:
+                    for input_data in by_signature[signature]:
+                        hits[input_data] = deserialize_result(data, input_data)
+
+                found_signatures = [signature for signature, _ in found]
+                for start in range(0, len(found_signatures), _LOOKUP_BATCH_SIZE):
+                    CacheEntry.objects.filter(
+                        signature__in=found_signatures[start:start + _LOOKUP_BATCH_SIZE]
+                    ).update(hits=F('hits') + 1, last_hit_at=timezone.now())
+        except Exception as e:
+            logger.warning("Caché de mapeo no disponible (lectura): %s", e)
+            return {}
+        return hits
+
+    def store_many(
+        self,
+        results: Dict[LikewizeInput, MatchResult],
+        engines: Optional[Dict[LikewizeInput, str]] = None
+    ):
+        """
+        Guarda (o sustituye) los resultados cacheables y purga los obsoletos.
+
+        Args:
+            results: Dict input → MatchResult recién calculado
+            engines: Nombre del engine usado por input (informativo)
+        """
+        from productos.models import MappingResultCache as CacheEntry
+
+        engines = engines or {}
+        try:
+            with transaction.atomic():
+                version = catalog_version()
+                entries = {}
+                for input_data, result in results.items():
+                    if result.status not in CACHEABLE_STATUSES:
+                        continue
+                    signature = input_signature(input_data)
+                    entries[signature] = CacheEntry(
+                        signature=signature,
+                        catalog_version=version,
+                        engine=engines.get(input_data, ''),
+                        status=result.status.value,
+                        matched_capacidad_id=result.matched_capacidad_id,
+                        result=serialize_result(result),
+                    )
+                if not entries:
+                    return
+
+                CacheEntry.objects.exclude(catalog_version=version).delete()
+                CacheEntry.objects.bulk_create(
+                    list(entries.values()),
+                    batch_size=_LOOKUP_BATCH_SIZE,
+                    update_conflicts=True,
+                    unique_fields=['signature'],
+                    update_fields=[
+                        'catalog_version', 'engine', 'status',
+                        'matched_capacidad_id', 'result', 'created_at',
+                    ],
+                )
+        except Exception as e:
+            logger.warning("Caché de mapeo no disponible (escritura): %s", e)
+
+    def invalidate(
+        self,
+        signatures: Iterable[str] = (),
+        capacidad_ids: Iterable[int] = ()
+    ) -> int:
+        """
+        Borra entradas por firma y/o por capacidad mapeada.
+
+        Args:
+            signatures: Firmas a invalidar
+            capacidad_ids: Capacidades cuyos mapeos dejan de ser fiables
+
+        Returns:
+            Número de entradas borradas
+        """
+        from django.db.models import Q
+        from productos.models import MappingResultCache as CacheEntry
+
+        signatures = [s for s in signatures if s]
+        capacidad_ids = [c for c in capacidad_ids if c]
+        if not signatures and not capacidad_ids:
+            return 0
+
+        deleted, _ = CacheEntry.objects.filter(
+            Q(signature__in=signatures) | Q(matched_capacidad_id__in=capacidad_ids)
+        ).delete()
+        return deleted
@@ -18,6 +18,23 @@ from productos.mapping.core.types import (
     DeviceType,
     MatchStrategy,
 )
+from productos.mapping.core.catalog_index import CatalogIndex
+
+
+# ===========================
+# Fixtures de infraestructura
+# ===========================
+
+@pytest.fixture(autouse=True)
+def fresh_catalog_index():
+    """
+    Invalida el índice del catálogo antes de cada test.
+
+    El rollback de la transacción de un test anterior no dispara señales,
+    así que el snapshot en memoria podría contener modelos ya borrados.
+    """
+    CatalogIndex.invalidate()
+    yield
 
 
 # ===========================
@@ -0,0 +1,126 @@
+"""
+Tests para CatalogIndex.
+
+El índice en memoria del catálogo sustituye las queries por item de los
+matchers: se carga una vez, se reutiliza entre llamadas a map() y se
+invalida cuando cambian Modelo/Capacidad.
+"""
+
+import pytest
+
+from productos.models.modelos import Modelo, Capacidad
+from productos.mapping.core.catalog_index import CatalogIndex, parse_storage_gb
+from productos.mapping.core.types import LikewizeInput, MatchStatus
+from productos.mapping.services.device_mapper_service import DeviceMapperService
+
+
+@pytest.mark.django_db
+class TestCatalogIndex:
+    """Tests del índice del catálogo."""
+
+    @pytest.fixture
+    def mac_mini_m2(self):
+        """Mac mini M2 con A-number compartido."""
+        modelo = Modelo.objects.create(
+            descripcion="Mac mini (2023) A2816 M2",
+            tipo="Mac mini",
+            marca="Apple",
+            año=2023,
+            procesador="M2",
+        )
+        Capacidad.objects.create(modelo=modelo, tamaño="256 GB", activo=True)
+        Capacidad.objects.create(modelo=modelo, tamaño="1 TB", activo=True)
+        Capacidad.objects.create(modelo=modelo, tamaño="2 TB", activo=False)
+        return modelo
+
+    @pytest.fixture
+    def ipad_pro_129(self):
+        """iPad Pro 12,9 pulgadas."""
+        return Modelo.objects.create(
+            descripcion="iPad Pro 12,9 pulgadas Wi-Fi (6.ª generación)",
+            tipo="iPad",
+            marca="Apple",
+            año=2022,
+            procesador="M2",
+        )
+
+    @pytest.fixture
+    def iphone_13_pro_128gb(self):
+        """Capacidad iPhone 13 Pro 128GB."""
+        modelo = Modelo.objects.create(
+            descripcion="iPhone 13 Pro",
+            tipo="iPhone",
+            marca="Apple",
+            año=2021,
+            procesador="A15 Bionic",
+        )
+        return Capacidad.objects.create(modelo=modelo, tamaño="128 GB", activo=True)
+
+    def test_parse_storage_gb(self):
+        """Normaliza capacidades a GB."""
+        assert parse_storage_gb("128 GB") == 128
+        assert parse_storage_gb("1TB") == 1024
+        assert parse_storage_gb("sin capacidad") == 0
+
+    def test_inverted_indexes(self, mac_mini_m2, ipad_pro_129):
+        """Los índices invertidos devuelven los modelos esperados."""
+        index = CatalogIndex.current()
+
+        assert [m.id for m in index.modelos_por_tipo("mac MINI")] == [mac_mini_m2.id]
+        assert [m.id for m in index.modelos_por_anio(2022)] == [ipad_pro_129.id]
+        assert [m.id for m in index.modelos_por_a_number("a2816")] == [mac_mini_m2.id]
+        assert {m.id for m in index.modelos_por_chip("M2")} == {mac_mini_m2.id, ipad_pro_129.id}
+        assert [m.id for m in index.modelos_por_pantalla(12.9)] == [ipad_pro_129.id]
+
+    def test_only_active_capacities(self, mac_mini_m2):
+        """Solo se indexan capacidades activas, con storage normalizado."""
+        index = CatalogIndex.current()
+
+        capacidades = index.capacidades_activas(mac_mini_m2.id)
+        assert sorted(c.storage_gb for c in capacidades) == [256, 1024]
+        assert [c.modelo_id for c in index.capacidades_por_storage(1024)] == [mac_mini_m2.id]
+        assert index.capacidades_por_storage(2048) == []
+
+    def test_index_is_reused_between_calls(self, iphone_13_pro_128gb):
+        """Dos accesos sin cambios en el catálogo devuelven el mismo snapshot."""
+        assert CatalogIndex.current() is CatalogIndex.current()
+
+    def test_index_invalidated_on_catalog_change(self, iphone_13_pro_128gb):
+        """Crear una capacidad invalida el snapshot."""
+        first = CatalogIndex.current()
+
+        nueva = Capacidad.objects.create(
+            modelo=iphone_13_pro_128gb.modelo, tamaño="256 GB", activo=True
+        )
+
+        second = CatalogIndex.current()
+        assert second is not first
+        assert nueva.id in {c.id for c in second.capacidades_activas(nueva.modelo_id)}
+
+    def test_index_caduca_sin_senales(self, iphone_13_pro_128gb, settings):
+        """Un update() masivo no dispara señales: lo recoge la recarga por antigüedad."""
+        first = CatalogIndex.current()
+        Capacidad.objects.filter(pk=iphone_13_pro_128gb.pk).update(activo=False)
+        assert CatalogIndex.current() is first
+
+        settings.CATALOG_INDEX_MAX_AGE = 0.000001
+        second = CatalogIndex.current()
+        assert second is not first
+        assert second.capacidades_activas(iphone_13_pro_128gb.modelo_id) == []
+
+        # Sin cambios de contenido se conserva el snapshot
+        assert CatalogIndex.current() is second
+
+    def test_map_does_not_query_catalog_once_warm(
+        self, iphone_13_pro_128gb, django_assert_num_queries
+    ):
+        """Con el índice caliente, map() no consulta Modelo/Capacidad."""
+        service = DeviceMapperService()
+        input_data = LikewizeInput(model_name="iPhone 13 Pro 128GB")
+        CatalogIndex.current()
+
+        with django_assert_num_queries(0):
+            result = service.map(input_data)
+
+        assert result.status == MatchStatus.SUCCESS
+        assert result.matched_capacidad_id == iphone_13_pro_128gb.id
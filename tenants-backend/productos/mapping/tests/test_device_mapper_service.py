@@ -166,6 +166,95 @@ class TestDeviceMapperService:
         assert result.status == MatchStatus.SUCCESS
         assert result.context.input_data.device_price == Decimal("450.00")
 
+    # ===========================
+    # Tests de mapeo en lote
+    # ===========================
+
+    def test_map_many_preserves_input_order(
+        self,
+        service,
+        iphone_13_pro_128gb
+    ):
+        """map_many devuelve los resultados en el orden de entrada."""
+        inputs = [
+            LikewizeInput(model_name="iPhone 13 Pro 128GB"),
+            LikewizeInput(model_name="Nokia 3310"),
+            LikewizeInput(model_name="iPhone 13 Pro 512GB"),
+        ]
+
+        results = service.map_many(inputs)
+
+        assert [r.status for r in results] == [
+            MatchStatus.SUCCESS,
+            MatchStatus.ERROR,
+            MatchStatus.NO_MATCH,
+        ]
+        assert results[0].matched_capacidad_id == iphone_13_pro_128gb.id
+
+    def test_map_many_dedupes_identical_inputs(
+        self,
+        service,
+        iphone_13_pro_128gb,
+        monkeypatch
+    ):
+        """Inputs idénticos se mapean una sola vez, cada uno con su resultado."""
+        engine = service._get_engine_by_name("iPhoneEngine")
+        calls = []
+        original_map = engine.map
+        monkeypatch.setattr(engine, "map", lambda data: calls.append(data) or original_map(data))
+
+        input_data = LikewizeInput(model_name="iPhone 13 Pro 128GB")
+        results = service.map_many([input_data, input_data, input_data])
+
+        assert len(calls) == 1
+        assert len(results) == 3
+        assert results[0] is not results[1]
+        assert all(r.matched_capacidad_id == iphone_13_pro_128gb.id for r in results)
+        assert all(r.context.get_elapsed_time() is not None for r in results)
+
+    def test_map_many_aisla_excepciones_por_input(
+        self,
+        service,
+        iphone_13_pro_128gb,
+        monkeypatch
+    ):
+        """Una excepción del engine afecta solo a su input."""
+        engine = service._get_engine_by_name("iPhoneEngine")
+        original_map = engine.map
+
+        def map_fallido(data):
+            if "512GB" in data.model_name:
+                raise ValueError("fila corrupta")
+            return original_map(data)
+
+        monkeypatch.setattr(engine, "map", map_fallido)
+        results = service.map_many([
+            LikewizeInput(model_name="iPhone 13 Pro 512GB"),
+            LikewizeInput(model_name="iPhone 13 Pro 128GB"),
+        ])
+
+        assert results[0].status == MatchStatus.ERROR
+        assert results[0].error_code == "ENGINE_EXCEPTION"
+        assert "fila corrupta" in results[0].error_message
+        assert results[1].matched_capacidad_id == iphone_13_pro_128gb.id
+
+    def test_map_many_runs_sequentially_inside_transaction(self, service):
+        """Dentro de una transacción no se crea el pool de procesos."""
+        assert service._can_fork_workers() is False
+
+    def test_build_chunks_groups_by_engine(self, service):
+        """Los trozos no mezclan engines y respetan el número de workers."""
+        groups = {
+            "iPhoneEngine": [LikewizeInput(model_name=f"iPhone {n} 128GB") for n in range(10)],
+            "iPadEngine": [LikewizeInput(model_name="iPad Pro 11 128GB")],
+        }
+
+        chunks = service._build_chunks(groups, workers=4)
+
+        assert {name for name, _ in chunks} == {"iPhoneEngine", "iPadEngine"}
+        assert sum(len(chunk) for _, chunk in chunks) == 11
+        assert max(len(chunk) for _, chunk in chunks) == 3
+
     # ===========================
     # Tests de casos sin match
     # ===========================
@@ -0,0 +1,127 @@
+"""
+Tests para la caché persistente de resultados del mapeo v4.
+
+map_many() sirve desde MappingResultCache los inputs ya mapeados con la
+versión actual del catálogo, sin seleccionar engine ni ejecutar matchers.
+"""
+
+import pytest
+
+from productos.models import MappingResultCache
+from productos.models.modelos import Modelo, Capacidad
+from productos.mapping.adapters.v3_compatibility import map_devices_v4
+from productos.mapping.core.types import LikewizeInput, MatchStatus
+from productos.mapping.services.device_mapper_service import DeviceMapperService
+from productos.mapping.services.result_cache import ResultCache, input_signature
+
+
+@pytest.mark.django_db
+class TestResultCache:
+    """Tests de la caché de resultados."""
+
+    @pytest.fixture
+    def service(self):
+        return DeviceMapperService()
+
+    @pytest.fixture
+    def iphone_13_pro_128gb(self):
+        """Capacidad iPhone 13 Pro 128GB."""
+        modelo = Modelo.objects.create(
+            descripcion="iPhone 13 Pro",
+            tipo="iPhone",
+            marca="Apple",
+            año=2021,
+            procesador="A15 Bionic",
+        )
+        return Capacidad.objects.create(modelo=modelo, tamaño="128 GB", activo=True)
+
+    def _count_engine_calls(self, service, monkeypatch):
+        calls = []
+        for engine in service._engines:
+            original = engine.map
+
+            def counting(input_data, _original=original):
+                calls.append(input_data.model_name)
+                return _original(input_data)
+
+            monkeypatch.setattr(engine, "map", counting)
+        return calls
+
+    def test_signature_normalizes_whitespace_and_ignores_price(self):
+        """Espacios extra y precio no cambian la firma; la capacidad sí."""
+        base = input_signature(LikewizeInput(model_name="iPhone 13 Pro", capacity="128GB"))
+
+        assert base == input_signature(
+            LikewizeInput(model_name="  iPhone 13   Pro ", capacity="128GB", device_price=450)
+        )
+        assert base != input_signature(LikewizeInput(model_name="iPhone 13 Pro", capacity="256GB"))
+
+    def test_second_batch_is_served_from_cache(
+        self, service, iphone_13_pro_128gb, monkeypatch
+    ):
+        """El segundo lote con los mismos inputs no ejecuta ningún engine."""
+        calls = self._count_engine_calls(service, monkeypatch)
+        inputs = [LikewizeInput(model_name="iPhone 13 Pro 128GB")]
+
+        first = service.map_many(inputs, use_cache=True)
+        second = service.map_many(inputs, use_cache=True)
+
+        assert len(calls) == 1
+        assert MappingResultCache.objects.get().hits == 1
+        assert not first[0].context.metadata.get("result_cache_hit")
+        assert second[0].context.metadata["result_cache_hit"] is True
+        assert second[0].status == MatchStatus.SUCCESS
+        assert second[0].matched_capacidad_id == iphone_13_pro_128gb.id
+        assert second[0].match_strategy == first[0].match_strategy
+        assert second[0].features.to_dict() == first[0].features.to_dict()
+        assert len(second[0].all_candidates) == len(first[0].all_candidates)
+
+    def test_catalog_change_invalidates_entries(
+        self, service, iphone_13_pro_128gb, monkeypatch
+    ):
+        """Un cambio en Capacidad cambia la versión de catálogo: se vuelve a mapear."""
+        calls = self._count_engine_calls(service, monkeypatch)
+        inputs = [LikewizeInput(model_name="iPhone 13 Pro 128GB")]
+
+        service.map_many(inputs, use_cache=True)
+        Capacidad.objects.create(modelo=iphone_13_pro_128gb.modelo, tamaño="256 GB", activo=True)
+        service.map_many(inputs, use_cache=True)
+
+        assert len(calls) == 2
+        assert MappingResultCache.objects.count() == 1
+
+    def test_bulk_update_invalidates_entries(
+        self, service, iphone_13_pro_128gb, monkeypatch
+    ):
+        """Un update() masivo (sin señales) también deja obsoletas las entradas."""
+        calls = self._count_engine_calls(service, monkeypatch)
+        inputs = [LikewizeInput(model_name="iPhone 13 Pro 128GB")]
+
+        service.map_many(inputs, use_cache=True)
+        Capacidad.objects.filter(pk=iphone_13_pro_128gb.pk).update(activo=False)
+        results = service.map_many(inputs, use_cache=True)
+
+        assert len(calls) == 2
+        assert results[0].matched_capacidad_id != iphone_13_pro_128gb.id
+
+    def test_invalidate_by_capacidad(self, service, iphone_13_pro_128gb):
+        """invalidate() borra las entradas que apuntaban a la capacidad corregida."""
+        service.map_many([LikewizeInput(model_name="iPhone 13 Pro 128GB")], use_cache=True)
+
+        deleted = ResultCache().invalidate(capacidad_ids=[iphone_13_pro_128gb.id])
+
+        assert deleted == 1
+        assert not MappingResultCache.objects.exists()
+
+    def test_adapter_reports_cache_hits(self, iphone_13_pro_128gb, settings):
+        """El formato v3 expone cache_hit y la firma para guardarla en staging."""
+        settings.MAPPING_V4_RESULT_CACHE = True
+        items = [{"FullName": "iPhone 13 Pro 128GB"}]
+
+        first = map_devices_v4(items)
+        second = map_devices_v4(items)
+
+        assert first[0]["cache_hit"] is False
+        assert second[0]["cache_hit"] is True
+        assert second[0]["capacidad_id"] == iphone_13_pro_128gb.id
+        assert second[0]["cache_signature"] == first[0]["cache_signature"]
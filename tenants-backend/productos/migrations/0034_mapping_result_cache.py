@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0033_dispositivopersonalizado_pp_a_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MappingResultCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signature', models.CharField(max_length=64, unique=True)),
+                ('catalog_version', models.CharField(db_index=True, max_length=64)),
+                ('engine', models.CharField(blank=True, default='', max_length=50)),
+                ('status', models.CharField(max_length=20)),
+                ('matched_capacidad_id', models.IntegerField(blank=True, db_index=True, null=True)),
+                ('result', models.JSONField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_hit_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'productos_mapping_result_cache',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def poblar_precios_vigentes(apps, schema_editor):
+    """Carga inicial de PrecioVigente desde las tablas versionadas."""
+    PrecioVigente = apps.get_model('productos', 'PrecioVigente')
+    fuentes = (
+        (apps.get_model('productos', 'PrecioRecompra'), 'capacidad_id'),
+        (apps.get_model('productos', 'PrecioDispositivoPersonalizado'), 'dispositivo_personalizado_id'),
+    )
+    now = timezone.now()
+    for Source, fk in fuentes:
+        filas = {}
+        qs = (Source.objects
+              .filter(valid_from__lte=now)
+              .filter(Q(valid_to__isnull=True) | Q(valid_to__gt=now))
+              .order_by('-valid_from')
+              .values(fk, 'canal', 'tenant_schema', 'precio_neto', 'fuente', 'valid_from', 'valid_to'))
+        for row in qs.iterator():
+            filas.setdefault((row[fk], row['canal'], row['tenant_schema'] or ''), row)
+        PrecioVigente.objects.bulk_create(
+            [
+                PrecioVigente(
+                    **{fk: ref_id},
+                    canal=canal,
+                    tenant_schema=tenant,
+                    precio_neto=row['precio_neto'],
+                    fuente=row['fuente'] or '',
+                    valid_from=row['valid_from'],
+                    valid_to=row['valid_to'],
+                )
+                for (ref_id, canal, tenant), row in filas.items()
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0034_mapping_result_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecioVigente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('canal', models.CharField(choices=[('B2B', 'B2B (recompra)'), ('B2C', 'B2C (recompra)')], max_length=3)),
+                ('tenant_schema', models.CharField(blank=True, default='', max_length=64)),
+                ('precio_neto', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('fuente', models.CharField(blank=True, default='', max_length=50)),
+                ('valid_from', models.DateTimeField()),
+                ('valid_to', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('capacidad', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='precios_vigentes', to='productos.capacidad')),
+                ('dispositivo_personalizado', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='precios_vigentes', to='productos.dispositivopersonalizado')),
+            ],
+            options={
+                'db_table': 'productos_precio_vigente',
+                'indexes': [models.Index(fields=['canal', 'tenant_schema'], name='productos_p_canal_01558f_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('capacidad__isnull', False)), fields=('capacidad', 'canal', 'tenant_schema'), name='uniq_precio_vigente_capacidad'), models.UniqueConstraint(condition=models.Q(('dispositivo_personalizado__isnull', False)), fields=('dispositivo_personalizado', 'canal', 'tenant_schema'), name='uniq_precio_vigente_personalizado')],
+            },
+        ),
+        migrations.RunPython(poblar_precios_vigentes, reverse_code=migrations.RunPython.noop),
+    ]
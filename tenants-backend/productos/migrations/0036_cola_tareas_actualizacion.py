@@ -0,0 +1,62 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0035_precio_vigente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tareaactualizacionlikewize',
+            name='cancelar_solicitado',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='tareaactualizacionlikewize',
+            name='comando',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='tareaactualizacionlikewize',
+            name='etapa',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='tareaactualizacionlikewize',
+            name='fuente',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='tareaactualizacionlikewize',
+            name='heartbeat_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tareaactualizacionlikewize',
+            name='intentos',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tareaactualizacionlikewize',
+            name='parametros',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='tareaactualizacionlikewize',
+            name='worker',
+            field=models.CharField(blank=True, default='', max_length=120),
+        ),
+        migrations.AlterField(
+            model_name='tareaactualizacionlikewize',
+            name='estado',
+            field=models.CharField(choices=[('PENDING', 'PENDING'), ('RUNNING', 'RUNNING'), ('SUCCESS', 'SUCCESS'), ('ERROR', 'ERROR'), ('CANCELLED', 'CANCELLED')], default='PENDING', max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='tareaactualizacionlikewize',
+            index=models.Index(fields=['estado', 'fuente'], name='idx_tarea_estado_fuente'),
+        ),
+    ]
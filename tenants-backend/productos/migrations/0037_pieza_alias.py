@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:16
+
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def alias_desde_nombres(apps, schema_editor):
+    """Cada PiezaTipo existente queda registrada con su nombre normalizado."""
+    PiezaTipo = apps.get_model('productos', 'PiezaTipo')
+    PiezaAlias = apps.get_model('productos', 'PiezaAlias')
+    alias = {}
+    for pieza_id, nombre in PiezaTipo.objects.order_by('id').values_list('id', 'nombre'):
+        texto = unicodedata.normalize('NFKD', nombre or '').encode('ascii', 'ignore').decode()
+        texto = ' '.join(texto.lower().split())
+        if texto:
+            alias.setdefault(texto, pieza_id)
+    PiezaAlias.objects.bulk_create(
+        [PiezaAlias(alias=texto, pieza_tipo_id=pieza_id) for texto, pieza_id in alias.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0036_cola_tareas_actualizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PiezaAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=64, unique=True)),
+                ('pieza_tipo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alias', to='productos.piezatipo')),
+            ],
+            options={
+                'db_table': 'productos_pieza_alias',
+            },
+        ),
+        migrations.RunPython(alias_desde_nombres, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CANALES = ('B2B', 'B2C')
+
+
+def _tramos(filas):
+    """Copia congelada de tramos_precio.construir_tramos (ver el servicio)."""
+    por_canal = {canal: [] for canal in CANALES}
+    cortes = set()
+    for f in filas:
+        if f['canal'] not in por_canal:
+            continue
+        por_canal[f['canal']].append(f)
+        cortes.add(f['valid_from'])
+        if f['valid_to'] is not None:
+            cortes.add(f['valid_to'])
+    for lista in por_canal.values():
+        lista.sort(key=lambda f: (f['valid_from'], f['id']), reverse=True)
+
+    cortes = sorted(cortes)
+    tramos = []
+    anteriores = None
+    for k, desde in enumerate(cortes):
+        ganadores = tuple(
+            next((f for f in por_canal[canal]
+                  if f['valid_from'] <= desde and (f['valid_to'] is None or f['valid_to'] > desde)), None)
+            for canal in CANALES
+        )
+        hasta = cortes[k + 1] if k + 1 < len(cortes) else None
+        if not any(ganadores):
+            anteriores = None
+            continue
+        if anteriores == ganadores:
+            tramos[-1]['hasta'] = hasta
+            continue
+        tramo = {'desde': desde, 'hasta': hasta}
+        for canal, f in zip(CANALES, ganadores):
+            prefijo = canal.lower()
+            tramo[f'{prefijo}_precio'] = f['precio_neto'] if f else None
+            tramo[f'{prefijo}_valid_from'] = f['valid_from'] if f else None
+            tramo[f'{prefijo}_valid_to'] = f['valid_to'] if f else None
+            tramo[f'{prefijo}_fuente'] = f['fuente'] if f else None
+        tramos.append(tramo)
+        anteriores = ganadores
+    return tramos
+
+
+def poblar_tramos(apps, schema_editor):
+    """Carga inicial de la rejilla desde todo el histórico de PrecioRecompra."""
+    PrecioRecompra = apps.get_model('productos', 'PrecioRecompra')
+    TramoPrecioCapacidad = apps.get_model('productos', 'TramoPrecioCapacidad')
+    por_capacidad = {}
+    campos = ('id', 'capacidad_id', 'canal', 'precio_neto', 'valid_from', 'valid_to', 'fuente')
+    for row in PrecioRecompra.objects.values(*campos).iterator(chunk_size=1000):
+        por_capacidad.setdefault(row['capacidad_id'], []).append(row)
+    TramoPrecioCapacidad.objects.bulk_create(
+        [
+            TramoPrecioCapacidad(capacidad_id=capacidad_id, **tramo)
+            for capacidad_id, filas in por_capacidad.items()
+            for tramo in _tramos(filas)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0037_pieza_alias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TramoPrecioCapacidad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('desde', models.DateTimeField()),
+                ('hasta', models.DateTimeField(blank=True, null=True)),
+                ('b2b_precio', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('b2b_valid_from', models.DateTimeField(blank=True, null=True)),
+                ('b2b_valid_to', models.DateTimeField(blank=True, null=True)),
+                ('b2b_fuente', models.CharField(blank=True, max_length=50, null=True)),
+                ('b2c_precio', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('b2c_valid_from', models.DateTimeField(blank=True, null=True)),
+                ('b2c_valid_to', models.DateTimeField(blank=True, null=True)),
+                ('b2c_fuente', models.CharField(blank=True, max_length=50, null=True)),
+                ('capacidad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tramos_precio', to='productos.capacidad')),
+            ],
+            options={
+                'db_table': 'productos_tramo_precio_capacidad',
+                'constraints': [models.UniqueConstraint(fields=('capacidad', 'desde'), name='uniq_tramo_precio_capacidad')],
+            },
+        ),
+        migrations.RunPython(poblar_tramos, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+from django.db import DatabaseError, migrations, transaction
+
+# Copia congelada de productos.services.busqueda_modelos (INDICE, TEXTO_SQL):
+# la migración no debe cambiar si el servicio evoluciona.
+INDICE = 'modelo_busqueda_trgm'
+TEXTO_SQL = "lower(descripcion || ' ' || tipo || ' ' || likewize_modelo || ' ' || pantalla || ' ' || procesador)"
+
+
+def crear(apps, schema_editor):
+    conexion = schema_editor.connection
+    with conexion.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            # Sin pg_trgm en el servidor no se crea nada y la búsqueda usa icontains
+            return
+    try:
+        with transaction.atomic(using=conexion.alias), conexion.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {INDICE} ON productos_modelo USING gin (({TEXTO_SQL}) gin_trgm_ops)'
+            )
+    except DatabaseError:
+        # Sin permisos para CREATE EXTENSION: `manage.py busqueda_modelos --crear-indice` más tarde
+        pass
+
+
+def borrar(apps, schema_editor):
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDICE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0038_tramo_precio_capacidad'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear, borrar),
+    ]
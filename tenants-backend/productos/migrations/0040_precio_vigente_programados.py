@@ -0,0 +1,59 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:56
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def copiar_programados(apps, schema_editor):
+    """Añade al almacén las versiones con valid_from futuro (antes no se guardaban)."""
+    PrecioVigente = apps.get_model('productos', 'PrecioVigente')
+    now = timezone.now()
+    for modelo, fk in (('PrecioRecompra', 'capacidad'), ('PrecioDispositivoPersonalizado', 'dispositivo_personalizado')):
+        Source = apps.get_model('productos', modelo)
+        filas = {}
+        for row in (Source.objects.filter(valid_from__gt=now).order_by('-id')
+                    .values(f'{fk}_id', 'canal', 'tenant_schema', 'precio_neto', 'fuente', 'valid_from', 'valid_to')):
+            key = (row[f'{fk}_id'], row['canal'], row['tenant_schema'] or '', row['valid_from'])
+            filas.setdefault(key, row)
+        PrecioVigente.objects.bulk_create(
+            [
+                PrecioVigente(
+                    **{f'{fk}_id': ref_id},
+                    canal=canal,
+                    tenant_schema=tenant,
+                    precio_neto=row['precio_neto'],
+                    fuente=row['fuente'] or '',
+                    valid_from=valid_from,
+                    valid_to=row['valid_to'],
+                )
+                for (ref_id, canal, tenant, valid_from), row in filas.items()
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0039_modelo_busqueda_trgm'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='preciovigente',
+            name='uniq_precio_vigente_capacidad',
+        ),
+        migrations.RemoveConstraint(
+            model_name='preciovigente',
+            name='uniq_precio_vigente_personalizado',
+        ),
+        migrations.AddConstraint(
+            model_name='preciovigente',
+            constraint=models.UniqueConstraint(condition=models.Q(('capacidad__isnull', False)), fields=('capacidad', 'canal', 'tenant_schema', 'valid_from'), name='uniq_precio_vigente_capacidad'),
+        ),
+        migrations.AddConstraint(
+            model_name='preciovigente',
+            constraint=models.UniqueConstraint(condition=models.Q(('dispositivo_personalizado__isnull', False)), fields=('dispositivo_personalizado', 'canal', 'tenant_schema', 'valid_from'), name='uniq_precio_vigente_personalizado'),
+        ),
+        migrations.RunPython(copiar_programados, migrations.RunPython.noop),
+    ]
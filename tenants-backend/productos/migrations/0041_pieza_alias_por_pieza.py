@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-17 09:40
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def alias_compartidos(apps, schema_editor):
+    """Alias de las PiezaTipo que 0037 omitió porque otra pieza normalizaba igual."""
+    PiezaTipo = apps.get_model('productos', 'PiezaTipo')
+    PiezaAlias = apps.get_model('productos', 'PiezaAlias')
+    existentes = set(PiezaAlias.objects.values_list('alias', 'pieza_tipo_id'))
+    nuevos = []
+    for pieza_id, nombre in PiezaTipo.objects.order_by('id').values_list('id', 'nombre'):
+        texto = unicodedata.normalize('NFKD', nombre or '').encode('ascii', 'ignore').decode()
+        texto = ' '.join(texto.lower().split())
+        if texto and (texto, pieza_id) not in existentes:
+            existentes.add((texto, pieza_id))
+            nuevos.append(PiezaAlias(alias=texto, pieza_tipo_id=pieza_id))
+    PiezaAlias.objects.bulk_create(nuevos, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0040_precio_vigente_programados'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='piezaalias',
+            name='alias',
+            field=models.CharField(db_index=True, max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='piezaalias',
+            constraint=models.UniqueConstraint(fields=('alias', 'pieza_tipo'), name='uniq_pieza_alias'),
+        ),
+        migrations.RunPython(alias_compartidos, reverse_code=migrations.RunPython.noop),
+    ]
@@ -1,7 +1,7 @@
-from .precios import CanalChoices,PrecioRecompra,PrecioDispositivoPersonalizado,PiezaTipo,ManoObraTipo,CostoPieza
+from .precios import CanalChoices,PrecioRecompra,PrecioDispositivoPersonalizado,PrecioVigente,TramoPrecioCapacidad,PiezaTipo,PiezaAlias,ManoObraTipo,CostoPieza
 from .modelos import (Modelo, Capacidad, DispositivoPersonalizado)
 from .actualizarpreciosfuturos import TareaActualizacionLikewize,LikewizeItemStaging,LikewizeCazadorTarea
-from .device_mapping import DeviceMapping, MappingFeedback, MappingMetrics
+from .device_mapping import DeviceMapping, MappingFeedback, MappingMetrics, MappingResultCache
 from .device_mapping_v2 import (
     DeviceMappingV2,
     AppleDeviceKnowledgeBase,
@@ -20,7 +20,10 @@ __all__ = [
    "CanalChoices",
    "PrecioRecompra",
    "PrecioDispositivoPersonalizado",
+   "PrecioVigente",
+   "TramoPrecioCapacidad",
    "PiezaTipo",
+   "PiezaAlias",
    "ManoObraTipo",
    "CostoPieza",
    "Modelo",
@@ -32,6 +35,7 @@ __all__ = [
    "DeviceMapping",
    "MappingFeedback",
    "MappingMetrics",
+   "MappingResultCache",
    "DeviceMappingV2",
    "AppleDeviceKnowledgeBase",
    "MappingAuditLog",
@@ -9,6 +9,7 @@ class TareaActualizacionLikewize(models.Model):
         ("RUNNING", "RUNNING"),
         ("SUCCESS", "SUCCESS"),
         ("ERROR",   "ERROR"),
+        ("CANCELLED", "CANCELLED"),
     ]
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     estado = models.CharField(max_length=16, choices=ESTADOS, default="PENDING")
@@ -25,12 +26,37 @@ class TareaActualizacionLikewize(models.Model):
     meta = models.JSONField(default=dict, blank=True)
     logs = models.JSONField(default=list, blank=True)  # Lista de objetos {timestamp, level, message}
 
+    # Cola de ejecución (productos.services.cola_tareas / procesar_tareas_actualizacion)
+    comando = models.CharField(max_length=64, blank=True, default="")     # management command a ejecutar
+    parametros = models.JSONField(default=dict, blank=True)                # kwargs para call_command
+    fuente = models.CharField(max_length=32, blank=True, default="")      # likewize / swappie / backmarket
+    worker = models.CharField(max_length=120, blank=True, default="")     # worker que la ejecuta
+    heartbeat_en = models.DateTimeField(null=True, blank=True)
+    cancelar_solicitado = models.BooleanField(default=False)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    etapa = models.CharField(max_length=32, blank=True, default="")       # última etapa completada (reanudación)
+
     class Meta:
         db_table = "precios_tarea_actualizacion_likewize"
+        indexes = [
+            models.Index(fields=["estado", "fuente"], name="idx_tarea_estado_fuente"),
+        ]
+
+    # Campos que solo escribe el worker de la cola; los comandos hacen save()
+    # completos con su copia de la tarea y no deben pisar latidos ni cancelaciones.
+    CAMPOS_WORKER = ("worker", "heartbeat_en", "cancelar_solicitado", "intentos")
 
     def __str__(self):
         return f"{self.id} [{self.estado}]"
 
+    def save(self, *args, **kwargs):
+        if kwargs.get("update_fields") is None and not self._state.adding and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.CAMPOS_WORKER
+            ]
+        super().save(*args, **kwargs)
+
     def add_log(self, message: str, level: str = 'INFO'):
         """Añade un log con timestamp a la lista de logs"""
         if not isinstance(self.logs, list):
@@ -41,6 +67,9 @@ class TareaActualizacionLikewize(models.Model):
             'message': message
         })
         self.save(update_fields=['logs'])
+        if self.log_path:
+            from productos.services.log_tareas import TaskLog
+            TaskLog(self.log_path).append(message, level)
     
 class LikewizeItemStaging(models.Model):
     """
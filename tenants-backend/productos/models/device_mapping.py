@@ -184,4 +184,31 @@ class MappingMetrics(models.Model):
         """Calcula el porcentaje de mapeo exitoso."""
         if self.total_processed == 0:
             return Decimal("0.00")
-        return Decimal(self.successfully_mapped / self.total_processed * 100).quantize(Decimal("0.01"))
\ No newline at end of file
+        return Decimal(self.successfully_mapped / self.total_processed * 100).quantize(Decimal("0.01"))
+
+class MappingResultCache(models.Model):
+    """
+    Caché persistente de resultados del mapeo v4.
+
+    Clave: firma estable del LikewizeInput normalizado. Cada entrada guarda
+    la versión del catálogo con la que se calculó; si Modelo/Capacidad
+    cambian, la versión deja de coincidir y la entrada se ignora.
+    """
+
+    signature = models.CharField(max_length=64, unique=True)   # sha256 del input normalizado
+    catalog_version = models.CharField(max_length=64, db_index=True)
+    engine = models.CharField(max_length=50, blank=True, default="")
+    status = models.CharField(max_length=20)
+    matched_capacidad_id = models.IntegerField(null=True, blank=True, db_index=True)
+    result = models.JSONField()                                  # MatchResult serializado
+
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "productos_mapping_result_cache"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.signature[:12]} [{self.status}] -> {self.matched_capacidad_id}"
@@ -146,6 +146,90 @@ class PrecioDispositivoPersonalizado(models.Model):
         return f'{disp} | {self.canal} | €{self.precio_neto} | {self.valid_from.strftime("%Y-%m-%d")}..{self.valid_to.strftime("%Y-%m-%d") if self.valid_to else "∞"}'
 
 
+class PrecioVigente(models.Model):
+    """
+    Precios vigentes y programados desnormalizados (una fila por clave y
+    valid_from) de PrecioRecompra y PrecioDispositivoPersonalizado.
+
+    Se mantiene desde productos/services/precios_vigentes.py (señales y
+    aplicación en bloque). tenant_schema='' es el precio global; la elección
+    por fecha y el override de tenant → global se resuelven en una sola query.
+    """
+    capacidad = models.ForeignKey(
+        'productos.Capacidad', null=True, blank=True,
+        on_delete=models.CASCADE, related_name='precios_vigentes'
+    )
+    dispositivo_personalizado = models.ForeignKey(
+        'productos.DispositivoPersonalizado', null=True, blank=True,
+        on_delete=models.CASCADE, related_name='precios_vigentes'
+    )
+    canal = models.CharField(max_length=3, choices=CanalChoices.choices)
+    tenant_schema = models.CharField(max_length=64, blank=True, default='')  # '' = global
+    precio_neto = models.DecimalField(max_digits=12, decimal_places=2)
+    fuente = models.CharField(max_length=50, blank=True, default='')
+    valid_from = models.DateTimeField()
+    valid_to = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'productos_precio_vigente'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['capacidad', 'canal', 'tenant_schema', 'valid_from'],
+                condition=models.Q(capacidad__isnull=False),
+                name='uniq_precio_vigente_capacidad'
+            ),
+            models.UniqueConstraint(
+                fields=['dispositivo_personalizado', 'canal', 'tenant_schema', 'valid_from'],
+                condition=models.Q(dispositivo_personalizado__isnull=False),
+                name='uniq_precio_vigente_personalizado'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['canal', 'tenant_schema']),
+        ]
+
+    def __str__(self):
+        ref = f'cap={self.capacidad_id}' if self.capacidad_id else f'pers={self.dispositivo_personalizado_id}'
+        return f'{ref} {self.canal} {self.tenant_schema or "global"} {self.precio_neto}'
+
+
+class TramoPrecioCapacidad(models.Model):
+    """
+    Rejilla materializada de precios B2B/B2C por capacidad para el admin.
+
+    Cada fila es un tramo [desde, hasta) en el que la versión vigente de
+    PrecioRecompra de cada canal no cambia; los tramos de una capacidad no se
+    solapan, así que para cualquier fecha hay como mucho una fila.
+    Se mantiene desde productos.services.tramos_precio.
+    """
+    capacidad = models.ForeignKey(
+        'productos.Capacidad',
+        on_delete=models.CASCADE,
+        related_name='tramos_precio'
+    )
+    desde = models.DateTimeField()
+    hasta = models.DateTimeField(null=True, blank=True)  # NULL = sin fin
+
+    b2b_precio = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    b2b_valid_from = models.DateTimeField(null=True, blank=True)
+    b2b_valid_to = models.DateTimeField(null=True, blank=True)
+    b2b_fuente = models.CharField(max_length=50, null=True, blank=True)
+    b2c_precio = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    b2c_valid_from = models.DateTimeField(null=True, blank=True)
+    b2c_valid_to = models.DateTimeField(null=True, blank=True)
+    b2c_fuente = models.CharField(max_length=50, null=True, blank=True)
+
+    class Meta:
+        db_table = 'productos_tramo_precio_capacidad'
+        constraints = [
+            models.UniqueConstraint(fields=['capacidad', 'desde'], name='uniq_tramo_precio_capacidad'),
+        ]
+
+    def __str__(self):
+        return f'cap={self.capacidad_id} {self.desde}..{self.hasta or "∞"} B2B={self.b2b_precio} B2C={self.b2c_precio}'
+
+
 class PiezaTipo(models.Model):
     """
     Catálogo de tipos de pieza: pantalla, batería, cámara trasera, chasis/tapa, etc.
@@ -158,6 +242,27 @@ class PiezaTipo(models.Model):
         return self.nombre
 
 
+class PiezaAlias(models.Model):
+    """
+    Nombres con los que se busca un tipo de pieza, normalizados (minúsculas,
+    sin acentos). El nombre de cada PiezaTipo se da de alta solo; aquí se
+    añaden los alternativos ('lcd' → Pantalla, 'tapa trasera' → Chasis...).
+    Un alias puede nombrar varias piezas (dos PiezaTipo que normalizan igual):
+    la búsqueda devuelve todas, como el icontains sobre el nombre.
+    """
+    alias = models.CharField(max_length=64, db_index=True)
+    pieza_tipo = models.ForeignKey(PiezaTipo, on_delete=models.CASCADE, related_name='alias')
+
+    class Meta:
+        db_table = 'productos_pieza_alias'
+        constraints = [
+            models.UniqueConstraint(fields=['alias', 'pieza_tipo'], name='uniq_pieza_alias'),
+        ]
+
+    def __str__(self):
+        return f'{self.alias} → {self.pieza_tipo_id}'
+
+
 class ManoObraTipo(models.Model):
     """
     Tipos de MO: MO1, MO2... con tarifa por minuto (o por hora si prefieres).
@@ -0,0 +1,6 @@
+from django.urls import re_path
+from .consumers import TareaProgresoConsumer
+
+websocket_urlpatterns = [
+    re_path(r"ws/tareas/(?P<tarea_id>[0-9a-f-]{36})/$", TareaProgresoConsumer.as_asgi()),
+]
@@ -0,0 +1,158 @@
+# productos/services/aplicar_precios.py
+"""
+Aplicación en bloque de cambios de precio (Likewize / B2C Swappie / Backmarket).
+
+Los diffs de actualizador.py devuelven una lista de cambios
+{id, capacidad_id, kind: INSERT|UPDATE|DELETE, despues, ...}. Aquí se aplican
+por conjuntos en lugar de fila a fila:
+
+- 1 SELECT de los precios vigentes de todas las capacidades afectadas
+- 1 UPDATE que cierra (valid_to=now) las versiones sustituidas
+- 1 bulk_create con las versiones nuevas
+- 1 UPDATE que cierra los vigentes de las bajas
+- sincronización de PrecioVigente para las capacidades afectadas
+
+El número de queries no depende del número de cambios.
+"""
+from decimal import Decimal
+from functools import lru_cache
+from typing import Dict, Iterable, List
+
+from django.db import transaction
+from django.utils import timezone
+
+from productos.models.precios import PrecioRecompra
+from productos.services.precios_vigentes import sincronizar_precios_vigentes
+
+BULK_BATCH_SIZE = 1000
+
+
+@lru_cache(maxsize=None)
+def _field_names(model) -> frozenset:
+    return frozenset(getattr(f, "name", None) for f in model._meta.get_fields())
+
+
+def _scope(model, canal: str):
+    """Precios oficiales del canal (tenant_schema NULL) si el modelo tiene esos campos."""
+    fields = _field_names(model)
+    qs = model.objects.all()
+    if "canal" in fields:
+        qs = qs.filter(canal=canal)
+    if "tenant_schema" in fields:
+        qs = qs.filter(tenant_schema__isnull=True)
+    return qs
+
+
+def aplicar_cambios_precio(
+    PrecioModel,
+    changes: Iterable[dict],
+    canal: str,
+    fuente: str,
+) -> Dict[str, int]:
+    """
+    Aplica INSERT/UPDATE/DELETE de un diff de precios en bloque.
+
+    Con versionado (valid_from/valid_to) se cierra el vigente de cada
+    capacidad cuyo precio cambia y se crea la nueva versión; si el vigente ya
+    tiene ese precio no se escribe nada. El vigente se busca por
+    (capacidad, canal, tenant_schema NULL), que es la clave del constraint
+    uniq_precio_recompra_vigente_simple. Las bajas solo cierran vigentes de la
+    misma fuente.
+
+    Sin versionado se actualiza la fila existente de la capacidad o se crea.
+
+    Args:
+        PrecioModel: Modelo de precios (settings.PRECIOS_B2B_MODEL)
+        changes: Cambios seleccionados del diff
+        canal: Canal a escribir ("B2B", "B2C")
+        fuente: Fuente a escribir ("Likewize", "Swappie", "Backmarket")
+
+    Returns:
+        Contadores por tipo: {"INSERT": n, "UPDATE": n, "DELETE": n}
+    """
+    fields = _field_names(PrecioModel)
+    has_versioning = "valid_from" in fields and "valid_to" in fields
+    applied = {"INSERT": 0, "UPDATE": 0, "DELETE": 0}
+
+    nuevos: Dict[int, Decimal] = {}
+    bajas: List[int] = []
+    for ch in changes:
+        cap_id = int(ch["capacidad_id"])
+        if ch["kind"] in {"INSERT", "UPDATE"}:
+            nuevos[cap_id] = Decimal(str(ch["despues"]))
+            applied[ch["kind"]] += 1
+        elif ch["kind"] == "DELETE":
+            bajas.append(cap_id)
+
+    extra = {}
+    if "canal" in fields:
+        extra["canal"] = canal
+    if "fuente" in fields:
+        extra["fuente"] = fuente
+    if "tenant_schema" in fields:
+        extra["tenant_schema"] = None
+
+    now = timezone.now()
+    with transaction.atomic():
+        if has_versioning:
+            scope = _scope(PrecioModel, canal)
+
+            vigentes: Dict[int, Decimal] = {}
+            if nuevos:
+                rows = (
+                    scope.filter(capacidad_id__in=list(nuevos), valid_to__isnull=True)
+                    .order_by("capacidad_id", "-valid_from")
+                    .values_list("capacidad_id", "precio_neto")
+                )
+                for cap_id, precio in rows:
+                    vigentes.setdefault(cap_id, Decimal(precio))
+
+            cambiados = [cap_id for cap_id, precio in nuevos.items() if vigentes.get(cap_id) != precio]
+            if cambiados:
+                scope.filter(capacidad_id__in=cambiados, valid_to__isnull=True).update(valid_to=now)
+                PrecioModel.objects.bulk_create(
+                    [
+                        PrecioModel(capacidad_id=cap_id, precio_neto=nuevos[cap_id], valid_from=now, **extra)
+                        for cap_id in cambiados
+                    ],
+                    batch_size=BULK_BATCH_SIZE,
+                )
+
+            if bajas:
+                bajas_qs = scope.filter(capacidad_id__in=bajas, valid_to__isnull=True)
+                if "fuente" in fields:
+                    bajas_qs = bajas_qs.filter(fuente=fuente)
+                # Borrado lógico; el constraint garantiza un vigente por capacidad
+                applied["DELETE"] = bajas_qs.update(valid_to=now)
+        else:
+            if nuevos:
+                existentes = {}
+                for obj in PrecioModel.objects.filter(capacidad_id__in=list(nuevos)):
+                    existentes.setdefault(obj.capacidad_id, obj)
+                for cap_id, obj in existentes.items():
+                    obj.precio_neto = nuevos[cap_id]
+                    for name, value in extra.items():
+                        setattr(obj, name, value)
+                if existentes:
+                    PrecioModel.objects.bulk_update(
+                        list(existentes.values()),
+                        ["precio_neto", *extra],
+                        batch_size=BULK_BATCH_SIZE,
+                    )
+                PrecioModel.objects.bulk_create(
+                    [
+                        PrecioModel(capacidad_id=cap_id, precio_neto=precio, **extra)
+                        for cap_id, precio in nuevos.items()
+                        if cap_id not in existentes
+                    ],
+                    batch_size=BULK_BATCH_SIZE,
+                )
+            if bajas:
+                PrecioModel.objects.filter(capacidad_id__in=bajas).delete()
+                applied["DELETE"] = len(bajas)
+
+        # update()/bulk_create no disparan señales: sincronizar el almacén de vigentes
+        if PrecioModel is PrecioRecompra and (nuevos or bajas):
+            sincronizar_precios_vigentes(capacidad_ids=[*nuevos, *bajas])
+
+    return applied
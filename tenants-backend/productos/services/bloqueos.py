@@ -0,0 +1,37 @@
+# productos/services/bloqueos.py
+"""
+Advisory locks de Postgres por id para las tablas materializadas de precios.
+
+PrecioVigente y la rejilla de tramos se recalculan borrando las filas de una
+capacidad y volviéndolas a crear. Dos transacciones que recalculan la misma
+capacidad a la vez chocarían con las restricciones únicas; bloquear(espacio,
+ids) las serializa hasta el final de la transacción (pg_advisory_xact_lock
+con clave doble: espacio de nombres, id).
+"""
+from typing import Iterable, List
+
+from django.db import connection
+
+# Espacios de nombres (primera clave del lock)
+CAPACIDAD = 0x7A71_0002
+DISPOSITIVO_PERSONALIZADO = 0x7A71_0003
+
+
+def bloquear(espacio: int, ids: Iterable[int]) -> List[int]:
+    """
+    Toma el lock de transacción de cada id; debe llamarse dentro de un atomic.
+
+    Los ids se bloquean en orden ascendente para que dos transacciones con
+    conjuntos solapados no se interbloqueen.
+
+    Returns:
+        Los ids bloqueados, ordenados y sin repetidos
+    """
+    ids = sorted({int(i) for i in ids if i})
+    if ids:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(%s, i) FROM unnest(%s::integer[]) AS i",
+                [espacio, ids],
+            )
+    return ids
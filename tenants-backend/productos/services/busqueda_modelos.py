@@ -0,0 +1,200 @@
+# productos/services/busqueda_modelos.py
+"""
+Búsqueda de modelos del catálogo (autocompletado del admin, ModeloSearchView).
+
+Antes cada pulsación hacía un OR de cinco icontains (descripcion, tipo,
+likewize_modelo, pantalla, procesador), es decir, un recorrido secuencial de
+productos_modelo, y si el filtro exacto de tipo/marca no encontraba nada se
+repetía la query entera sin él.
+
+Con pg_trgm:
+- Índice GIN de trigramas (modelo_busqueda_trgm, migración 0039) sobre
+  TEXTO_SQL, la concatenación en minúsculas de los cinco campos
+- Coinciden las filas que contienen el texto (LIKE, usa el índice) o que se
+  le parecen palabra a palabra (operador <%, tolera erratas: "iphnoe")
+- Orden por relevancia: contener el texto y luego word_similarity
+- El filtro de tipo/marca ordena primero en la misma query; si ninguna fila
+  lo cumple se devuelven las demás (antes, una segunda query)
+
+Sin pg_trgm (la extensión no está disponible en el servidor) se usa el OR
+de icontains con el mismo contrato. `manage.py busqueda_modelos` crea el
+índice si falta y mide la latencia con consultas concurrentes.
+"""
+import logging
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import BooleanField, Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+INDICE = "modelo_busqueda_trgm"
+TEXTO_SQL = (
+    "lower(descripcion || ' ' || tipo || ' ' || likewize_modelo || ' ' || pantalla || ' ' || procesador)"
+)
+CAMPOS = ("descripcion", "tipo", "likewize_modelo", "pantalla", "procesador")
+
+_trigram: Optional[bool] = None
+
+
+def _umbral() -> float:
+    return getattr(settings, "MODELO_BUSQUEDA_UMBRAL", 0.4)
+
+
+def trigram_disponible() -> bool:
+    """pg_trgm instalado en la base de datos (se comprueba una vez por proceso)."""
+    global _trigram
+    if _trigram is None:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                _trigram = cursor.fetchone() is not None
+        except DatabaseError:
+            _trigram = False
+    return _trigram
+
+
+def crear_indice(conexion=None) -> bool:
+    """
+    Crea pg_trgm y el índice de búsqueda si se puede.
+
+    Args:
+        conexion: Conexión a usar (la de la migración); por defecto la de Django
+
+    Returns:
+        True si el índice existe al terminar
+    """
+    global _trigram
+    conexion = conexion or connection
+    try:
+        with transaction.atomic(using=conexion.alias), conexion.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+            if cursor.fetchone() is None:
+                logger.warning("pg_trgm no está disponible; la búsqueda de modelos usará icontains")
+                return False
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {INDICE} ON productos_modelo USING gin (({TEXTO_SQL}) gin_trgm_ops)"
+            )
+    except DatabaseError as e:
+        logger.warning("No se pudo crear el índice de búsqueda de modelos: %s", e)
+        return False
+    _trigram = True
+    return True
+
+
+@contextmanager
+def umbral_local():
+    """
+    Transacción con pg_trgm.word_similarity_threshold = MODELO_BUSQUEDA_UMBRAL.
+
+    SET LOCAL se deshace al terminar la transacción, así que el umbral no se
+    queda en la sesión de una conexión reutilizada (CONN_MAX_AGE/pgbouncer).
+    """
+    with transaction.atomic():
+        if trigram_disponible():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", [str(_umbral())])
+        yield
+
+
+def _escapar_like(texto: str) -> str:
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def filtrar(qs, query: str):
+    """
+    Filtra y ordena por relevancia un queryset de Modelo.
+
+    El operador <% usa el umbral de la transacción: evalúa el queryset dentro
+    de umbral_local().
+
+    Returns:
+        Queryset anotado con _rank (sin trigramas, 0) y ordenado
+    """
+    texto = " ".join(query.lower().split())
+    if not trigram_disponible():
+        cond = Q()
+        for campo in CAMPOS:
+            cond |= Q(**{f"{campo}__icontains": query})
+        return qs.filter(cond).annotate(_rank=Value(0.0, output_field=FloatField()))
+
+    like = f"%{_escapar_like(texto)}%"
+    # Mismo TEXTO_SQL que el índice para que el planificador lo use
+    coincide = RawSQL(f"({TEXTO_SQL}) LIKE %s OR %s <%% ({TEXTO_SQL})", (like, texto), output_field=BooleanField())
+    rank = RawSQL(
+        f"CASE WHEN ({TEXTO_SQL}) LIKE %s THEN 1 ELSE 0 END + word_similarity(%s, {TEXTO_SQL})",
+        (like, texto), output_field=FloatField(),
+    )
+    return qs.filter(coincide).annotate(_rank=rank)
+
+
+def buscar(query: str, tipo: str = "", marca: str = "", limite: int = 25, qs=None) -> List:
+    """
+    Modelos que coinciden con `query`, los más relevantes primero.
+
+    Args:
+        query: Texto buscado
+        tipo, marca: Filtros exactos (sin distinguir mayúsculas); si ningún
+            modelo los cumple se ignoran
+        limite: Máximo de resultados
+        qs: Queryset base (por defecto todos los modelos)
+
+    Returns:
+        Lista de Modelo
+    """
+    from productos.models.modelos import Modelo
+
+    qs = filtrar(qs if qs is not None else Modelo.objects.all(), query)
+    filtros = {}
+    if tipo:
+        filtros["tipo__iexact"] = tipo
+    if marca:
+        filtros["marca__iexact"] = marca
+    if not filtros:
+        with umbral_local():
+            return list(qs.order_by("-_rank", "marca", "descripcion")[:limite])
+
+    qs = qs.annotate(_filtro=Case(When(Q(**filtros), then=Value(True)), default=Value(False), output_field=BooleanField()))
+    with umbral_local():
+        filas = list(qs.order_by("-_filtro", "-_rank", "marca", "descripcion")[:limite])
+    if filas and filas[0]._filtro:
+        filas = [m for m in filas if m._filtro]
+    return filas
+
+
+def benchmark(consultas: List[str], hilos: int = 8, repeticiones: int = 5) -> dict:
+    """
+    Latencia de buscar() con `hilos` peticiones concurrentes.
+
+    Returns:
+        {"modo", "consultas", "p50_ms", "p95_ms", "max_ms", "objetivo_p95_ms", "cumple"}
+    """
+    def medir(query):
+        try:
+            inicio = time.perf_counter()
+            buscar(query)
+            return (time.perf_counter() - inicio) * 1000
+        finally:
+            connection.close()
+
+    trabajo = [q for q in consultas for _ in range(repeticiones)]
+    with ThreadPoolExecutor(max_workers=hilos) as executor:
+        tiempos = sorted(executor.map(medir, trabajo))
+    p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+    objetivo = getattr(settings, "MODELO_BUSQUEDA_P95_MS", 50)
+    return {
+        "modo": "trigram" if trigram_disponible() else "icontains",
+        "consultas": len(tiempos),
+        "p50_ms": round(statistics.median(tiempos), 1),
+        "p95_ms": round(p95, 1),
+        "max_ms": round(tiempos[-1], 1),
+        "objetivo_p95_ms": objetivo,
+        "cumple": p95 <= objetivo,
+    }
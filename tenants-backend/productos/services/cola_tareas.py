@@ -0,0 +1,282 @@
+# productos/services/cola_tareas.py
+"""
+Cola de tareas de actualización de precios (Likewize / Swappie / Backmarket).
+
+Las vistas Lanzar* solo encolan: crean la TareaActualizacionLikewize en
+PENDING con el comando y sus parámetros. Los workers
+(manage.py procesar_tareas_actualizacion) la reclaman y ejecutan el comando
+en un proceso hijo, fuera de los workers web.
+
+- Reclamación: bajo un advisory lock de Postgres, para que dos workers no
+  superen el límite de concurrencia por fuente
+  (settings.TAREAS_ACTUALIZACION_CONCURRENCIA)
+- Heartbeat: el worker actualiza heartbeat_en mientras el hijo vive; las
+  tareas RUNNING sin latido en TAREAS_ACTUALIZACION_HEARTBEAT_TIMEOUT
+  segundos vuelven a PENDING (o pasan a ERROR tras agotar intentos)
+- Cancelación: PENDING → CANCELLED directamente; RUNNING marca
+  cancelar_solicitado y el worker termina el proceso hijo
+- Reanudación: el comando guarda en `etapa` la última etapa completada y al
+  reintentarse continúa desde ahí
+"""
+import logging
+import multiprocessing
+import signal
+import time
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from productos.models import TareaActualizacionLikewize
+from productos.services.log_tareas import publicar_progreso
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_FINALES = {"SUCCESS", "ERROR", "CANCELLED"}
+
+# Clave del advisory lock que serializa las reclamaciones
+_LOCK_RECLAMAR = 0x7A71_0001
+
+
+def _limites() -> Dict[str, int]:
+    return getattr(settings, "TAREAS_ACTUALIZACION_CONCURRENCIA", {}) or {}
+
+
+def encolar(comando: str, fuente: str, parametros: Optional[dict] = None, meta: Optional[dict] = None) -> TareaActualizacionLikewize:
+    """
+    Crea una tarea PENDING para que la ejecute un worker.
+
+    Args:
+        comando: Management command (p.ej. "actualizar_likewize_v3")
+        fuente: Fuente de precios, para el límite de concurrencia
+        parametros: kwargs para call_command (sin `tarea`)
+        meta: Metadatos de la tarea (modo, marcas...)
+
+    Returns:
+        La tarea creada
+    """
+    tarea = TareaActualizacionLikewize.objects.create(
+        comando=comando,
+        fuente=fuente,
+        parametros=parametros or {},
+        meta=meta or {},
+        subestado="En cola",
+    )
+    tarea.add_log("🕒 Tarea en cola, esperando a un worker...", "INFO")
+    return tarea
+
+
+def reclamar(worker: str) -> Optional[TareaActualizacionLikewize]:
+    """
+    Reclama la tarea PENDING más antigua cuya fuente tenga hueco.
+
+    Args:
+        worker: Identificador del worker (host:pid)
+
+    Returns:
+        La tarea ya en RUNNING, o None si no hay nada ejecutable
+    """
+    limites = _limites()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [_LOCK_RECLAMAR])
+
+        ocupadas = dict(
+            TareaActualizacionLikewize.objects
+            .filter(estado="RUNNING").exclude(comando="")
+            .values_list("fuente").annotate(n=Count("id"))
+        )
+        llenas = [f for f, n in ocupadas.items() if f in limites and n >= limites[f]]
+
+        tarea = (
+            TareaActualizacionLikewize.objects
+            .select_for_update(skip_locked=True)
+            .filter(estado="PENDING", cancelar_solicitado=False)
+            .exclude(comando="")
+            .exclude(fuente__in=llenas)
+            .order_by("creado_en")
+            .first()
+        )
+        if tarea is None:
+            return None
+
+        now = timezone.now()
+        tarea.estado = "RUNNING"
+        tarea.worker = worker
+        tarea.heartbeat_en = now
+        tarea.iniciado_en = tarea.iniciado_en or now
+        tarea.intentos += 1
+        tarea.subestado = f"Reanudando desde '{tarea.etapa}'" if tarea.etapa else "Iniciando"
+        tarea.save(update_fields=["estado", "worker", "heartbeat_en", "iniciado_en", "intentos", "subestado"])
+    return tarea
+
+
+def latido(tarea_id, worker: str) -> bool:
+    """
+    Actualiza el heartbeat de una tarea en ejecución.
+
+    Returns:
+        True si se ha solicitado cancelarla
+    """
+    TareaActualizacionLikewize.objects.filter(pk=tarea_id, worker=worker, estado="RUNNING").update(
+        heartbeat_en=timezone.now()
+    )
+    return TareaActualizacionLikewize.objects.filter(pk=tarea_id, cancelar_solicitado=True).exists()
+
+
+def marcar_atascadas(timeout: Optional[int] = None, max_intentos: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Recupera las tareas RUNNING cuyo worker dejó de dar señales.
+
+    Las que aún tienen intentos vuelven a PENDING (se reanudarán desde su
+    etapa); el resto pasa a ERROR.
+
+    Returns:
+        (reencoladas, fallidas)
+    """
+    timeout = timeout or settings.TAREAS_ACTUALIZACION_HEARTBEAT_TIMEOUT
+    max_intentos = max_intentos or settings.TAREAS_ACTUALIZACION_MAX_INTENTOS
+    limite = timezone.now() - timedelta(seconds=timeout)
+    atascadas = (
+        TareaActualizacionLikewize.objects
+        .filter(estado="RUNNING", heartbeat_en__lt=limite)
+        .exclude(comando="")
+    )
+    reencoladas = fallidas = 0
+    for tarea in atascadas:
+        if tarea.cancelar_solicitado:
+            _finalizar(tarea, "CANCELLED", "Cancelada (worker sin heartbeat)")
+        elif tarea.intentos < max_intentos:
+            tarea.estado = "PENDING"
+            tarea.worker = ""
+            tarea.subestado = "En cola (worker sin heartbeat)"
+            tarea.save(update_fields=["estado", "worker", "subestado"])
+            tarea.add_log(f"⚠️ Worker sin heartbeat; se reintentará desde '{tarea.etapa or 'inicio'}'", "WARNING")
+            reencoladas += 1
+        else:
+            tarea.error_message = f"Worker sin heartbeat tras {tarea.intentos} intentos"
+            _finalizar(tarea, "ERROR", "Atascada")
+            fallidas += 1
+    return reencoladas, fallidas
+
+
+def cancelar(tarea: TareaActualizacionLikewize) -> TareaActualizacionLikewize:
+    """
+    Cancela una tarea: si está en cola se cancela ya, si está en ejecución se
+    avisa al worker para que termine el proceso.
+    """
+    if tarea.estado in ESTADOS_FINALES:
+        return tarea
+    updated = TareaActualizacionLikewize.objects.filter(pk=tarea.pk, estado="PENDING").update(
+        estado="CANCELLED", cancelar_solicitado=True, finalizado_en=timezone.now(), subestado="Cancelada"
+    )
+    if not updated:
+        TareaActualizacionLikewize.objects.filter(pk=tarea.pk).update(cancelar_solicitado=True)
+    tarea.refresh_from_db()
+    tarea.add_log("🛑 Cancelación solicitada", "WARNING")
+    return tarea
+
+
+def _finalizar(tarea: TareaActualizacionLikewize, estado: str, subestado: str) -> None:
+    tarea.estado = estado
+    tarea.subestado = subestado
+    tarea.finalizado_en = timezone.now()
+    tarea.save(update_fields=["estado", "subestado", "finalizado_en", "error_message"])
+    publicar_progreso(tarea)
+
+
+def _ejecutar_comando(comando: str, tarea_id: str, parametros: dict) -> None:
+    # El hijo hereda el manejador de SIGTERM del worker; _terminar() espera que muera
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    call_command(comando, tarea=tarea_id, **parametros)
+
+
+def _terminar(proc) -> None:
+    proc.terminate()
+    proc.join(10)
+    if proc.is_alive():
+        proc.kill()
+        proc.join()
+
+
+def ejecutar(tarea: TareaActualizacionLikewize, worker: str, intervalo: Optional[float] = None) -> str:
+    """
+    Ejecuta el comando de la tarea en un proceso hijo con heartbeat.
+
+    Args:
+        tarea: Tarea reclamada con reclamar()
+        worker: Identificador del worker
+        intervalo: Segundos entre latidos
+
+    Returns:
+        Estado final de la tarea
+    """
+    intervalo = intervalo or settings.TAREAS_ACTUALIZACION_HEARTBEAT_INTERVAL
+    ctx = multiprocessing.get_context("fork")
+    # El hijo abre sus propias conexiones; no debe heredar las del worker
+    connections.close_all()
+    # No daemon: los comandos crean sus propios pools de procesos
+    # (map_many con MAPPING_V4_WORKERS) y un proceso daemon no puede tener
+    # hijos. El worker se encarga de terminarlo si sale antes.
+    proc = ctx.Process(
+        target=_ejecutar_comando,
+        args=(tarea.comando, str(tarea.id), tarea.parametros or {}),
+        name=f"tarea-{tarea.id}",
+        daemon=False,
+    )
+    proc.start()
+    logger.info("Tarea %s (%s) en proceso %s", tarea.id, tarea.comando, proc.pid)
+
+    cancelada = False
+    try:
+        while proc.is_alive():
+            proc.join(intervalo)
+            if proc.is_alive() and latido(tarea.id, worker):
+                cancelada = True
+                _terminar(proc)
+    finally:
+        if proc.is_alive():
+            # El worker sale (Ctrl+C, pm2 stop, excepción) con el hijo vivo;
+            # la tarea se recupera luego como atascada
+            logger.warning("Terminando tarea %s (proceso %s) al salir el worker", tarea.id, proc.pid)
+            _terminar(proc)
+
+    tarea.refresh_from_db()
+    if cancelada:
+        _finalizar(tarea, "CANCELLED", "Cancelada")
+        tarea.add_log("🛑 Tarea cancelada", "WARNING")
+    elif tarea.estado not in ESTADOS_FINALES:
+        # El comando terminó sin cerrar la tarea (excepción o proceso muerto)
+        tarea.error_message = tarea.error_message or f"El proceso terminó con código {proc.exitcode}"
+        _finalizar(tarea, "ERROR", "Error")
+    return tarea.estado
+
+
+def procesar(worker: str, once: bool = False, poll: float = 5.0) -> int:
+    """
+    Bucle del worker: recupera atascadas, reclama y ejecuta tareas.
+
+    Args:
+        worker: Identificador del worker
+        once: Salir cuando no quede nada ejecutable
+        poll: Espera entre sondeos de la cola vacía
+
+    Returns:
+        Número de tareas ejecutadas
+    """
+    ejecutadas = 0
+    while True:
+        marcar_atascadas()
+        tarea = reclamar(worker)
+        if tarea is None:
+            if once:
+                return ejecutadas
+            time.sleep(poll)
+            continue
+        estado = ejecutar(tarea, worker)
+        ejecutadas += 1
+        logger.info("Tarea %s terminada: %s", tarea.id, estado)
@@ -0,0 +1,239 @@
+"""
+Costes de reparación vigentes (CostoPieza) resueltos en memoria.
+
+Cada valoración pedía tres costes (batería, pantalla, chasis) y cada uno era
+una query con un OR de `pieza_tipo__nombre__icontains`, sin índice posible.
+Aquí:
+
+- Los nombres de pieza se resuelven a ids de PiezaTipo UNA vez por versión,
+  buscando en la tabla de alias normalizados (PiezaAlias)
+- Las filas de coste no caducadas de un modelo (coste, tarifa de MO, horas,
+  MO fija) se cargan con una query por el índice de modelo y se guardan en
+  un LRU en memoria (COSTES_PIEZA_CACHE_MODELOS modelos)
+- La vigencia (valid_from/valid_to) se evalúa en cada consulta, así que una
+  versión programada entra sola a su hora
+
+Invalidación:
+- Señales post_save/post_delete de CostoPieza, ManoObraTipo, PiezaTipo y
+  PiezaAlias (productos.signals) llaman a invalidar().
+- La versión se publica en la cache de Django (Redis, compartida por los
+  workers de uvicorn y los comandos): cada proceso ve el cambio en su
+  siguiente acceso. Con una cache local (LocMemCache) solo lo vería el
+  proceso que guarda.
+- Además, cada proceso descarta su caché cuando tiene más de
+  COSTES_PIEZA_MAX_AGE segundos: recoge los update()/bulk_create sin
+  señales y los cambios publicados mientras Redis no respondía.
+"""
+import logging
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+COSTES_VERSION_CACHE_KEY = "productos:costes_pieza:version"
+
+# Nombres de pieza (subcadenas de alias) de cada coste de reparación
+PIEZAS = {
+    "pr_bateria": ['bater', 'battery'],
+    "pr_pantalla": ['pant', 'screen', 'display'],
+    "pr_chasis": ['chasis', 'tapa', 'back', 'carcasa', 'housing', 'glass'],
+}
+
+_lock = threading.Lock()
+_local_version = 0
+_estado = {"version": None, "cargado": 0.0, "alias": None, "piezas": {}, "modelos": OrderedDict()}
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sin acentos y con los espacios colapsados."""
+    texto = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode()
+    return ' '.join(texto.lower().split())
+
+
+def invalidar():
+    """
+    Descarta alias y costes cacheados (local y en la cache compartida).
+
+    Se llama desde las señales y puede llamarse manualmente tras operaciones
+    masivas (bulk_create, update()).
+    """
+    global _local_version
+    _local_version += 1
+    try:
+        cache.set(COSTES_VERSION_CACHE_KEY, f"{time.time_ns()}", None)
+    except Exception as e:  # La cache no debe romper el guardado de costes
+        logger.warning("No se pudo publicar la versión de costes de pieza: %s", e)
+
+
+def _version():
+    try:
+        shared = cache.get(COSTES_VERSION_CACHE_KEY)
+    except Exception:
+        shared = None
+    return (_local_version, shared)
+
+
+def _obsoleto(estado, version) -> bool:
+    max_age = getattr(settings, "COSTES_PIEZA_MAX_AGE", 300)
+    return estado["version"] != version or (max_age and time.monotonic() - estado["cargado"] > max_age)
+
+
+def _vigente() -> dict:
+    global _estado
+    version = _version()
+    estado = _estado
+    if _obsoleto(estado, version):
+        with _lock:
+            if _obsoleto(_estado, version):
+                _estado = {"version": version, "cargado": time.monotonic(), "alias": None, "piezas": {},
+                           "modelos": OrderedDict()}
+            estado = _estado
+    return estado
+
+
+# ---------------------------------------------------------------------------
+# Alias
+# ---------------------------------------------------------------------------
+
+def _piezas_ids(estado, nombres) -> frozenset:
+    clave = tuple(nombres)
+    ids = estado["piezas"].get(clave)
+    if ids is None:
+        if estado["alias"] is None:
+            from productos.models.precios import PiezaAlias
+            estado["alias"] = list(PiezaAlias.objects.values_list('alias', 'pieza_tipo_id'))
+        buscados = [normalizar(nm) for nm in nombres]
+        ids = frozenset(pid for alias, pid in estado["alias"] if any(nm in alias for nm in buscados))
+        estado["piezas"][clave] = ids
+    return ids
+
+
+def piezas_ids(nombres: Iterable[str]) -> frozenset:
+    """Ids de PiezaTipo con algún alias que contiene alguno de `nombres`."""
+    return _piezas_ids(_vigente(), tuple(nombres))
+
+
+def registrar_alias(pieza) -> None:
+    """
+    Da de alta el nombre normalizado de un PiezaTipo como alias suyo.
+
+    Si otra pieza ya tiene ese alias, ambas lo comparten (la búsqueda
+    devuelve las dos) y se avisa en el log: suele ser un duplicado.
+    """
+    from productos.models.precios import PiezaAlias
+
+    alias = normalizar(pieza.nombre)
+    if not alias:
+        return
+    _, creado = PiezaAlias.objects.get_or_create(alias=alias, pieza_tipo=pieza)
+    if creado:
+        otras = list(PiezaAlias.objects.filter(alias=alias).exclude(pieza_tipo=pieza)
+                     .values_list('pieza_tipo_id', flat=True))
+        if otras:
+            logger.warning("El alias de pieza '%s' de PiezaTipo %s ya lo usa(n) %s; se buscarán todas",
+                           alias, pieza.pk, otras)
+
+
+# ---------------------------------------------------------------------------
+# Filas de coste
+# ---------------------------------------------------------------------------
+
+def _cargar(estado, modelo_ids) -> None:
+    from productos.models.precios import CostoPieza
+
+    faltan = {int(m) for m in modelo_ids if m} - estado["modelos"].keys()
+    if not faltan:
+        return
+    filas = {m: [] for m in faltan}
+    rows = (CostoPieza.objects
+            .filter(modelo_id__in=faltan)
+            .filter(Q(valid_to__isnull=True) | Q(valid_to__gt=timezone.now()))
+            .values_list('modelo_id', 'pieza_tipo_id', 'capacidad_id', 'valid_from', 'valid_to', 'id',
+                         'coste_neto', 'mano_obra_tipo__coste_por_hora', 'horas', 'mano_obra_fija_neta'))
+    for modelo_id, pieza_id, capacidad_id, desde, hasta, fila_id, coste, tarifa_h, horas, mo_fija in rows:
+        # Coste neto + MO (horas*tarifa + fija)
+        total = Decimal(coste or 0) + Decimal(tarifa_h or 0) * Decimal(horas or 0) + Decimal(mo_fija or 0)
+        filas[modelo_id].append((desde, fila_id, pieza_id, capacidad_id, hasta, total))
+    limite = getattr(settings, "COSTES_PIEZA_CACHE_MODELOS", 2000)
+    with _lock:
+        modelos = estado["modelos"]
+        for modelo_id, lista in filas.items():
+            # Más reciente primero, como el order_by('-valid_from', '-id') de las queries
+            modelos[modelo_id] = sorted(lista, reverse=True)
+        while len(modelos) > limite:
+            modelos.popitem(last=False)
+
+
+def _filas(estado, modelo_id) -> list:
+    with _lock:
+        filas = estado["modelos"].get(modelo_id)
+        if filas is not None:
+            estado["modelos"].move_to_end(modelo_id)
+            return filas
+    _cargar(estado, [modelo_id])
+    return estado["modelos"].get(modelo_id, [])
+
+
+def _elegir(filas, piezas, capacidad_id, ahora) -> Optional[Decimal]:
+    # La versión de la capacidad exacta gana sobre la del modelo (capacidad NULL)
+    del_modelo = None
+    for desde, _, pieza_id, cap_id, hasta, total in filas:
+        if pieza_id not in piezas or desde > ahora or (hasta is not None and hasta <= ahora):
+            continue
+        if capacidad_id is not None and cap_id == capacidad_id:
+            return total
+        if cap_id is None and del_modelo is None:
+            del_modelo = total
+    return del_modelo
+
+
+def coste_pieza(modelo_id: int, capacidad_id: Optional[int], nombres: Iterable[str]) -> Optional[Decimal]:
+    """
+    Coste neto + MO de la pieza vigente más específica.
+
+    Args:
+        modelo_id: Modelo
+        capacidad_id: Capacidad (tiene prioridad sobre la fila del modelo)
+        nombres: Nombres de pieza, p.ej. PIEZAS["pr_bateria"]
+
+    Returns:
+        Decimal, o None si no hay coste vigente
+    """
+    estado = _vigente()
+    piezas = _piezas_ids(estado, tuple(nombres))
+    if not piezas or not modelo_id:
+        return None
+    return _elegir(_filas(estado, int(modelo_id)), piezas, capacidad_id, timezone.now())
+
+
+def costes_reparacion(pares: Iterable) -> Dict[tuple, Dict[str, int]]:
+    """
+    Costes de batería, pantalla y chasis de varios (modelo_id, capacidad_id);
+    los modelos que no estén en memoria se cargan con una sola query.
+
+    Returns:
+        {(modelo_id, capacidad_id): {"pr_bateria", "pr_pantalla", "pr_chasis"}}
+        en euros enteros (0 si no hay coste)
+    """
+    pares = set(pares)
+    estado = _vigente()
+    _cargar(estado, {m for m, _ in pares})
+    grupos = {campo: _piezas_ids(estado, tuple(nombres)) for campo, nombres in PIEZAS.items()}
+    ahora = timezone.now()
+    costes = {}
+    for modelo_id, capacidad_id in pares:
+        filas = _filas(estado, int(modelo_id))
+        costes[(modelo_id, capacidad_id)] = {
+            campo: int(_elegir(filas, piezas, capacidad_id, ahora) or 0)
+            for campo, piezas in grupos.items()
+        }
+    return costes
@@ -0,0 +1,545 @@
+# productos/services/diff_precios.py
+"""
+Diff S (staging de la tarea) vs E (precios oficiales vigentes) para
+Likewize / B2C Swappie / Backmarket.
+
+Ambos lados se cargan como columnas (una query cada uno, precios en
+céntimos calculados en SQL) y los conjuntos INSERT / UPDATE / DELETE salen
+de un merge outer de pandas sobre capacidad_id; los deltas, los ids de
+cambio y el GB de las capacidades se calculan por columnas, sin bucles
+por fila ni queries por baja.
+
+El resultado se cachea por tarea con una huella de staging y de los
+vigentes del canal: las vistas Diff paginan sobre él y Aplicar lo
+reutiliza; si cambia el staging (remapeo) o los vigentes (se aplicó algo),
+la huella no coincide y se recalcula.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BigIntegerField, Count, F, Max, Q, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from productos.likewize_config import get_apple_presets, get_extra_presets
+from productos.models import LikewizeItemStaging
+from productos.models.precios import PrecioRecompra, PrecioVigente
+from productos.services.aplicar_precios import _field_names, _scope
+
+# Canal y tipo de los precios oficiales contra los que compara cada fuente
+FUENTES = {
+    "likewize": {"canal": "B2B", "tipo": None},
+    "swappie": {"canal": "B2C", "tipo": "iPhone"},   # Swappie solo iPhone
+    "backmarket": {"canal": "B2C", "tipo": "iPhone"},
+}
+
+KINDS = ("INSERT", "UPDATE", "DELETE")
+DIFF_CACHE_TIMEOUT = 60 * 60
+MAX_PAGE_SIZE = 1000
+
+GB_REGEX = r"(\d+(?:[.,]\d+)?)\s*(TB|GB)\b"
+
+
+def _centimos(campo: str):
+    return Cast(F(campo) * 100, output_field=BigIntegerField())
+
+
+def _cap_fields() -> Tuple[str, str, str]:
+    return (
+        getattr(settings, "CAPACIDAD_REL_MODEL_FIELD", "modelo"),
+        getattr(settings, "REL_MODELO_NAME_FIELD", "descripcion"),
+        getattr(settings, "CAPACIDAD_GB_FIELD", "tamaño"),
+    )
+
+
+def _frame(rows: Iterable, columns: List[str]) -> pd.DataFrame:
+    return pd.DataFrame.from_records(list(rows), columns=columns)
+
+
+def _modelo_precios():
+    PrecioModel = settings.PRECIOS_B2B_MODEL
+    return apps.get_model(PrecioModel) if isinstance(PrecioModel, str) else PrecioModel
+
+
+def gb_desde_texto(textos: pd.Series) -> pd.Series:
+    """"512GB", "1 TB", "1,5TB"... → GB enteros (Int64, <NA> si no hay capacidad)."""
+    m = textos.fillna("").astype(str).str.extract(GB_REGEX, flags=re.I)
+    val = pd.to_numeric(m[0].str.replace(",", ".", regex=False), errors="coerce")
+    val = val.where(m[1].str.upper() != "TB", val * 1024)
+    return val.round().astype("Int64")
+
+
+def formato_centimos(centimos: pd.Series) -> pd.Series:
+    """Céntimos → "1234.50", igual que str() de un DecimalField con 2 decimales."""
+    c = centimos.astype("int64")
+    a = c.abs()
+    signo = pd.Series(np.where(c < 0, "-", ""), index=c.index)
+    return signo + (a // 100).astype(str) + "." + (a % 100).astype(str).str.zfill(2)
+
+
+def vigentes_oficiales(PrecioModel, canal: str, tipo: Optional[str] = None) -> pd.DataFrame:
+    """
+    Precios oficiales vigentes del canal: columnas capacidad_id, antes_cent.
+
+    Con PrecioRecompra lee del almacén PrecioVigente (global, tenant_schema='');
+    con otro modelo de precios toma la versión más reciente de cada capacidad.
+    """
+    rel_field, _, _ = _cap_fields()
+    columnas = ["capacidad_id", "antes_cent"]
+    if PrecioModel is PrecioRecompra:
+        now = timezone.now()
+        qs = (PrecioVigente.objects
+              .filter(canal=canal, tenant_schema="", capacidad_id__isnull=False, valid_from__lte=now)
+              .filter(Q(valid_to__isnull=True) | Q(valid_to__gt=now)))
+        if tipo:
+            qs = qs.filter(**{f"capacidad__{rel_field}__tipo": tipo})
+        qs = qs.order_by("capacidad_id", "-valid_from")
+        E = _frame(qs.annotate(antes_cent=_centimos("precio_neto")).values_list(*columnas), columnas)
+        # el almacén también guarda las versiones programadas y caducadas
+        E = E.drop_duplicates("capacidad_id", keep="first")
+        return E.astype({"capacidad_id": "int64", "antes_cent": "float64"})
+
+    fields = _field_names(PrecioModel)
+    qs = _scope(PrecioModel, canal).filter(capacidad_id__isnull=False)
+    if "valid_to" in fields:
+        qs = qs.filter(Q(valid_to__isnull=True) | Q(valid_to__gt=timezone.now()))
+    if tipo:
+        qs = qs.filter(**{f"capacidad__{rel_field}__tipo": tipo})
+    order_field = "valid_from" if "valid_from" in fields else ("updated_at" if "updated_at" in fields else None)
+    qs = qs.order_by("capacidad_id", f"-{order_field}") if order_field else qs.order_by("capacidad_id")
+    E = _frame(qs.annotate(antes_cent=_centimos("precio_neto")).values_list(*columnas), columnas)
+    # ya ordenados para que la primera de cada capacidad sea la más reciente
+    E = E.drop_duplicates("capacidad_id", keep="first")
+    return E.astype({"capacidad_id": "int64", "antes_cent": "float64"})
+
+
+def info_capacidades(ids: Iterable[int], marcas: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Tipo, marca, descripción y GB de las capacidades, indexado por capacidad_id.
+
+    Args:
+        ids: Capacidades a consultar
+        marcas: Si se indica, solo capacidades de esas marcas
+    """
+    rel_field, rel_name, gb_field = _cap_fields()
+    origen = {
+        "id": "capacidad_id",
+        gb_field: "cap_text",
+        f"{rel_field}__{rel_name}": "modelo_descripcion",
+        f"{rel_field}__tipo": "tipo",
+        f"{rel_field}__marca": "marca",
+        f"{rel_field}__likewize_modelo": "likewize_modelo",
+    }
+    ids = [int(i) for i in ids]
+    rows = []
+    if ids:
+        CapacidadModel = apps.get_model(settings.CAPACIDAD_MODEL)
+        qs = CapacidadModel.objects.filter(id__in=ids)
+        if marcas:
+            qs = qs.filter(**{f"{rel_field}__marca__in": list(marcas)})
+        rows = qs.values_list(*origen)
+    info = _frame(rows, list(origen.values()))
+    for col in ("cap_text", "modelo_descripcion", "likewize_modelo"):
+        info[col] = info[col].fillna("")
+    for col in ("tipo", "marca"):
+        info[col] = info[col].fillna("").replace("", "-")
+    info["modelo_norm"] = info["modelo_descripcion"].replace("", "-")
+    info["almacenamiento_gb"] = gb_desde_texto(info["cap_text"])
+    return info.astype({"capacidad_id": "int64"}).set_index("capacidad_id")
+
+
+def filtros_likewize(tarea) -> Tuple[set, set]:
+    """
+    Marcas de la tarea y códigos excluidos por los presets (exclude_m_models).
+
+    Returns:
+        (marcas, codigos_excluidos) — códigos en mayúsculas
+    """
+    meta = getattr(tarea, "meta", {}) or {}
+    marcas = {
+        (b or "").strip()
+        for b in LikewizeItemStaging.objects.filter(tarea=tarea).values_list("marca", flat=True).distinct()
+        if (b or "").strip()
+    }
+    if not marcas:
+        marcas = {
+            b.strip() for b in (meta.get("brands") or [])
+            if isinstance(b, str) and b.strip()
+        }
+    marcas_lower = {b.lower() for b in marcas}
+
+    meta_mode = (meta.get("mode") or "apple").lower()
+    meta_brands = {
+        b.strip() for b in (meta.get("brands") or [])
+        if isinstance(b, str) and b.strip()
+    } or marcas
+    if meta_mode not in {"apple", "others"} and any(b != "apple" for b in marcas_lower):
+        meta_mode = "others"
+    if meta_mode == "apple" and any(b not in {"apple", ""} for b in marcas_lower):
+        meta_mode = "others"
+    presets = get_extra_presets() if meta_mode == "others" else get_apple_presets()
+    excluidos = {
+        (code or "").strip().upper()
+        for preset in presets
+        if (not meta_brands or (preset.get("marca") or "").strip() in meta_brands)
+        for code in (preset.get("exclude_m_models") or [])
+        if (code or "").strip()
+    }
+    return marcas, excluidos
+
+
+def _registros(df: pd.DataFrame, columnas: List[str]) -> List[Dict]:
+    """DataFrame → lista de dicts JSON-serializables (NaN/<NA> → None)."""
+    if df.empty:
+        return []
+    df = df[columnas].astype(object)
+    return df.where(df.notna(), None).to_dict("records")
+
+
+def _strip(serie: pd.Series) -> pd.Series:
+    return serie.fillna("").astype(str).str.strip()
+
+
+def _primero_no_vacio(*series: pd.Series) -> pd.Series:
+    out = series[-1].fillna("")
+    for s in reversed(series[:-1]):
+        s = s.fillna("")
+        out = s.where(s != "", out)
+    return out
+
+
+def _rescatar_no_mapeados(tarea, bajas: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bajas que siguen en staging aunque sin mapear (misma tipo + modelo_norm y,
+    si la capacidad tiene GB, mismo almacenamiento): son UPDATE, no DELETE.
+
+    Devuelve las bajas con las columnas despues_cent / modelo_raw_s /
+    modelo_norm_s del ítem de staging (primero por id) o NaN.
+    """
+    columnas = ["id", "tipo", "modelo_norm", "almacenamiento_gb", "despues_cent", "modelo_raw"]
+    sin_mapear = _frame(
+        LikewizeItemStaging.objects
+        .filter(tarea=tarea, capacidad_id__isnull=True)
+        .annotate(despues_cent=_centimos("precio_b2b"))
+        .order_by("id")
+        .values_list(*columnas),
+        columnas,
+    ).rename(columns={"modelo_raw": "modelo_raw_s", "modelo_norm": "modelo_norm_s"})
+    sin_mapear = sin_mapear.astype({"almacenamiento_gb": "Int64", "despues_cent": "float64"})
+
+    bajas = bajas.assign(_tipo=_strip(bajas["tipo"]), _modelo=_strip(bajas["modelo_norm"]))
+    con_gb = bajas["almacenamiento_gb"].fillna(0) != 0
+
+    por_gb = sin_mapear.drop_duplicates(["tipo", "modelo_norm_s", "almacenamiento_gb"])
+    a = bajas[con_gb].merge(
+        por_gb[["tipo", "modelo_norm_s", "almacenamiento_gb", "despues_cent", "modelo_raw_s"]],
+        how="left",
+        left_on=["_tipo", "_modelo", "almacenamiento_gb"],
+        right_on=["tipo", "modelo_norm_s", "almacenamiento_gb"],
+        suffixes=("", "_s"),
+    )
+    por_modelo = sin_mapear.drop_duplicates(["tipo", "modelo_norm_s"])
+    b = bajas[~con_gb].merge(
+        por_modelo[["tipo", "modelo_norm_s", "despues_cent", "modelo_raw_s"]],
+        how="left",
+        left_on=["_tipo", "_modelo"],
+        right_on=["tipo", "modelo_norm_s"],
+        suffixes=("", "_s"),
+    )
+    return pd.concat([a, b], ignore_index=True).drop(columns=["_tipo", "_modelo", "tipo_s"], errors="ignore")
+
+
+def calcular_diff(tarea, fuente: str) -> Dict:
+    """
+    Calcula el diff completo de una tarea.
+
+    Args:
+        tarea: TareaActualizacionLikewize en SUCCESS
+        fuente: "likewize", "swappie" o "backmarket"
+
+    Returns:
+        {"summary", "changes", "no_mapeados"} (+ "faltan_swappie" en Swappie)
+    """
+    conf = FUENTES[fuente]
+    likewize = fuente == "likewize"
+    marcas, excluidos = filtros_likewize(tarea) if likewize else (set(), set())
+    marcas_lower = {b.lower() for b in marcas}
+
+    # 1) STAGING (solo los mapeados a capacidad_id)
+    columnas = ["id", "capacidad_id", "despues_cent", "tipo", "modelo_norm", "modelo_raw",
+                "almacenamiento_gb", "marca", "likewize_model_code"]
+    S = _frame(
+        LikewizeItemStaging.objects
+        .filter(tarea=tarea, capacidad_id__isnull=False)
+        .annotate(despues_cent=_centimos("precio_b2b"))
+        .values_list(*columnas),
+        columnas,
+    )
+    if excluidos:
+        S = S[~_strip(S["likewize_model_code"]).str.upper().isin(excluidos)]
+    # si hubiese duplicados gana el último ítem; normalmente 1:1
+    S = S.sort_values("id").drop_duplicates("capacidad_id", keep="last").drop(columns="id")
+    S = S.astype({"capacidad_id": "int64", "despues_cent": "float64", "almacenamiento_gb": "Int64"})
+
+    # 2) OFICIAL (PrecioB2B/PrecioRecompra según settings)
+    E = vigentes_oficiales(_modelo_precios(), conf["canal"], tipo=conf["tipo"])
+
+    m = S.merge(E, on="capacidad_id", how="outer", indicator=True)
+    altas = m[m["_merge"] == "left_only"].copy()
+    cambios = m[(m["_merge"] == "both") & (m["despues_cent"] != m["antes_cent"])].copy()
+    bajas = m[m["_merge"] == "right_only"][["capacidad_id", "antes_cent"]].copy()
+
+    # 3) Info de capacidad: en Likewize también para altas/updates (marca y nombre normalizado)
+    ids_info = bajas["capacidad_id"]
+    if likewize:
+        ids_info = pd.concat([ids_info, altas["capacidad_id"], cambios["capacidad_id"]])
+    info = info_capacidades(ids_info.unique(), marcas=marcas if likewize else None)
+
+    for df in (altas, cambios):
+        if likewize:
+            df["marca"] = df["capacidad_id"].map(info["marca"]).fillna(df["marca"])
+            df["nombre_likewize_original"] = _primero_no_vacio(_strip(df["modelo_raw"]), df["modelo_norm"])
+            df["nombre_normalizado"] = _primero_no_vacio(df["capacidad_id"].map(info["modelo_descripcion"]), df["modelo_norm"])
+
+    bajas = bajas.join(info, on="capacidad_id")
+    if likewize:
+        if marcas_lower:
+            bajas = bajas[bajas["marca"].notna() & _strip(bajas["marca"]).str.lower().isin(marcas_lower)]
+        if excluidos:
+            codigo = _strip(bajas["likewize_modelo"]).str.upper()
+            sufijo = codigo.str.split().str[-1].fillna("")
+            bajas = bajas[~(codigo.isin(excluidos) | sufijo.isin(excluidos))]
+
+        # Bajas que están en staging sin mapear → UPDATE
+        bajas = _rescatar_no_mapeados(tarea, bajas)
+        rescatadas = bajas[bajas["despues_cent"].notna() & (bajas["despues_cent"] != bajas["antes_cent"])].copy()
+        bajas = bajas[bajas["despues_cent"].isna()].copy()
+        rescatadas["nombre_likewize_original"] = _primero_no_vacio(_strip(rescatadas["modelo_raw_s"]), rescatadas["modelo_norm_s"])
+        rescatadas["nombre_normalizado"] = _primero_no_vacio(rescatadas["modelo_descripcion"], rescatadas["modelo_norm"])
+        bajas["nombre_likewize_original"] = _primero_no_vacio(bajas["likewize_modelo"], bajas["modelo_norm"], pd.Series("-", index=bajas.index))
+        bajas["nombre_normalizado"] = _primero_no_vacio(bajas["modelo_descripcion"], bajas["modelo_norm"], pd.Series("-", index=bajas.index))
+        cambios = pd.concat([cambios, rescatadas], ignore_index=True)
+    for col in ("tipo", "marca", "modelo_norm"):
+        bajas[col] = bajas[col].fillna("-")
+
+    # 4) ids, antes/después y deltas por columnas
+    altas = altas.sort_values("capacidad_id")
+    cambios = cambios.sort_values("capacidad_id")
+    bajas = bajas.sort_values("capacidad_id")
+    for df in (altas, cambios, bajas):
+        df["capacidad_id"] = df["capacidad_id"].astype("int64")
+        df["_k"] = df["capacidad_id"].astype(str)
+        df["antes"] = formato_centimos(df["antes_cent"]) if df is not altas else None
+        df["despues"] = formato_centimos(df["despues_cent"]) if df is not bajas else None
+    altas["id"] = "I|" + altas["_k"] + "|" + altas["despues"]
+    altas["delta"] = None
+    altas["kind"] = "INSERT"
+    cambios["id"] = "U|" + cambios["_k"] + "|" + cambios["antes"] + "|" + cambios["despues"]
+    cambios["delta"] = (cambios["despues_cent"].astype("int64") - cambios["antes_cent"].astype("int64")) / 100
+    cambios["kind"] = "UPDATE"
+    bajas["id"] = "D|" + bajas["_k"] + "|" + bajas["antes"]
+    bajas["delta"] = None
+    bajas["kind"] = "DELETE"
+
+    columnas = ["id", "capacidad_id", "antes", "despues", "delta", "kind",
+                "tipo", "modelo_norm", "almacenamiento_gb", "marca"]
+    if likewize:
+        columnas += ["nombre_likewize_original", "nombre_normalizado"]
+    changes = _registros(altas, columnas) + _registros(cambios, columnas) + _registros(bajas, columnas)
+
+    # No mapeados (para que se vean en la UI)
+    columnas_nm = ["id", "tipo", "modelo_norm", "almacenamiento_gb", "precio_b2b", "marca"]
+    if likewize:
+        columnas_nm.append("likewize_model_code")
+    no_mapeados = list(
+        LikewizeItemStaging.objects
+        .filter(tarea=tarea, capacidad_id__isnull=True)
+        .values(*columnas_nm)
+    )
+    if excluidos:
+        no_mapeados = [r for r in no_mapeados if (r.get("likewize_model_code") or "").strip().upper() not in excluidos]
+
+    n_altas, n_cambios, n_bajas = len(altas), len(cambios), len(bajas)
+    diff = {
+        "summary": {
+            "inserts": n_altas, "updates": n_cambios, "deletes": n_bajas,
+            "no_mapeados": len(no_mapeados),
+            "total": n_altas + n_cambios + n_bajas,
+        },
+        "changes": changes,
+        "no_mapeados": no_mapeados,
+    }
+    if fuente == "swappie":
+        bajas["precio_actual"] = bajas["antes"]
+        diff["faltan_swappie"] = _registros(
+            bajas, ["capacidad_id", "tipo", "modelo_norm", "almacenamiento_gb", "cap_text", "precio_actual"]
+        )
+    return diff
+
+
+# ------------------------------------------------------------------
+# Clasificación post-staging de actualizar_likewize (A1/A2/A2*/B/C)
+# ------------------------------------------------------------------
+
+CLAVE_DISPOSITIVO = ["a_number", "pulgadas", "any"]
+CLAVE_CAPACIDAD = CLAVE_DISPOSITIVO + ["almacenamiento_gb"]
+
+_GPU_PALABRAS = {
+    "sixty": 60, "seventy-six": 76, "seventy six": 76,
+    "thirty-two": 32, "thirty two": 32, "twenty-four": 24, "twenty four": 24,
+}
+
+
+def _entero(serie: pd.Series) -> pd.Series:
+    return pd.to_numeric(serie.str.replace(",", ".", regex=False), errors="coerce").round().astype("Int64")
+
+
+def claves_capacidades(E: pd.DataFrame) -> pd.DataFrame:
+    """
+    A-number, pulgadas, año, GB, CPU y cores de GPU de las capacidades E,
+    con las mismas reglas que extraer_a_number / extraer_pulgadas /
+    extraer_storage_gb / extraer_gpu_cores pero por columnas.
+
+    Args:
+        E: columnas cap_id, descripcion, pantalla, any, tamaño, procesador
+    """
+    descr = E["descripcion"].fillna("").astype(str)
+    a_num = descr.str.extract(r"\bA(\d{4})\b", flags=re.I)[0]
+    pulgadas = _entero(E["pantalla"].fillna("").astype(str).str.extract(r"(\d{1,2})")[0])
+    for patron in (
+        r"\b(\d{1,2}(?:[.,]\d)?)\s*(?:''|\"|″|inch(?:es)?|pulgadas)\b",
+        r"\b(\d{1,2})\s*(?:''|\"|″)\b",
+    ):
+        pulgadas = pulgadas.fillna(_entero(descr.str.extract(patron, flags=re.I)[0]))
+    gpu = _entero(descr.str.extract(r"\b(\d{1,3})\s*Core\s*GPU\b", flags=re.I)[0])
+    gpu_palabras = (
+        descr.str.extract(r"\b([a-z\- ]+)\s*Core\s*GPU\b", flags=re.I)[0]
+        .str.strip().str.lower().str.replace(r"\s+", " ", regex=True)
+        .map(_GPU_PALABRAS)
+    )
+    return pd.DataFrame({
+        "cap_id": E["cap_id"],
+        "a_number": ("A" + a_num).fillna(""),
+        "pulgadas": pulgadas,
+        "any": E["any"].astype("Int64"),
+        "almacenamiento_gb": gb_desde_texto(E["tamaño"]).fillna(0),
+        "cpu": E["procesador"].fillna(""),
+        "gpu_cores": gpu.fillna(gpu_palabras.astype("Int64")),
+    })
+
+
+def clasificar_s_vs_e(S: pd.DataFrame, E: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    Clasifica las diferencias de capacidades S (staging) vs E (BD) por
+    (a_number, pulgadas, año, GB):
+
+    - A1: en E y no en S, falta el dispositivo entero en S
+    - A2: en E y no en S, el dispositivo está pero falta esa capacidad
+    - A2*: misma capacidad con variante (cpu/gpu) distinta
+    - B: en S y no en E, falta la capacidad en BD
+    - C: en S y no en E, falta el dispositivo en BD
+
+    Args:
+        S: columnas de CLAVE_CAPACIDAD (staging)
+        E: salida de claves_capacidades()
+
+    Returns:
+        {bucket: DataFrame con CLAVE_CAPACIDAD (+ cap_id en los de E)}
+    """
+    S = S.assign(almacenamiento_gb=S["almacenamiento_gb"].fillna(0).astype("int64"),
+                 a_number=S["a_number"].fillna(""))
+    E = E.assign(almacenamiento_gb=E["almacenamiento_gb"].astype("int64"))
+    for df in (S, E):
+        for col in ("pulgadas", "any"):
+            df[col] = df[col].astype("Int64")
+
+    s_caps = S[CLAVE_CAPACIDAD].drop_duplicates()
+    e_caps = E.sort_values("cap_id").drop_duplicates(CLAVE_CAPACIDAD)[CLAVE_CAPACIDAD + ["cap_id"]]
+
+    def _solo_izq(izq, der, on):
+        m = izq.merge(der[on].drop_duplicates(), on=on, how="left", indicator=True)
+        return m["_merge"] == "left_only", m.drop(columns="_merge")
+
+    sin_s, bajas = _solo_izq(e_caps, s_caps, CLAVE_CAPACIDAD)
+    bajas = bajas[sin_s]
+    sin_e, altas = _solo_izq(s_caps, e_caps, CLAVE_CAPACIDAD)
+    altas = altas[sin_e]
+
+    dev_fuera_s, bajas = _solo_izq(bajas, s_caps, CLAVE_DISPOSITIVO)
+    dev_fuera_e, altas = _solo_izq(altas, e_caps, CLAVE_DISPOSITIVO)
+    # (dispositivo, GB) de una baja nunca está en S, así que A2* solo
+    # aparecería con claves más finas que CLAVE_CAPACIDAD
+    return {
+        "A1": bajas[dev_fuera_s.values],
+        "A2": bajas[~dev_fuera_s.values],
+        "A2*": bajas.iloc[0:0],
+        "B": altas[~dev_fuera_e.values],
+        "C": altas[dev_fuera_e.values],
+    }
+
+
+def _huella(tarea, fuente: str) -> Tuple:
+    """Agregados baratos que cambian si cambia el staging o los vigentes del canal."""
+    staging = LikewizeItemStaging.objects.filter(tarea=tarea).aggregate(
+        n=Count("id"),
+        mapeados=Count("capacidad_id"),
+        caps=Sum(F("id") * F("capacidad_id")),
+        precios=Sum("precio_b2b"),
+    )
+    vigentes = PrecioVigente.objects.filter(canal=FUENTES[fuente]["canal"], tenant_schema="").aggregate(
+        n=Count("id"), ultimo=Max("id"), actualizado=Max("updated_at"),
+    )
+    return tuple(staging.values()) + tuple(vigentes.values())
+
+
+def diff_tarea(tarea, fuente: str) -> Dict:
+    """
+    Diff de la tarea, cacheado mientras no cambien staging ni vigentes.
+
+    Args:
+        tarea: TareaActualizacionLikewize en SUCCESS
+        fuente: "likewize", "swappie" o "backmarket"
+    """
+    key = f"diff_precios:{tarea.pk}:{fuente}"
+    huella = _huella(tarea, fuente)
+    cached = cache.get(key)
+    if cached and cached["huella"] == huella:
+        return cached["diff"]
+    diff = calcular_diff(tarea, fuente)
+    cache.set(key, {"huella": huella, "diff": diff}, DIFF_CACHE_TIMEOUT)
+    return diff
+
+
+def paginar_diff(diff: Dict, page=None, page_size=None, kind: Optional[str] = None) -> Dict:
+    """
+    Página de `changes` (opcionalmente solo de un kind). El resto de claves
+    (summary, no_mapeados...) se devuelven completas.
+
+    Sin page ni page_size se devuelve el diff entero, como antes.
+    """
+    if page is None and page_size is None and not kind:
+        return diff
+    changes = diff["changes"]
+    if kind:
+        changes = [ch for ch in changes if ch["kind"] == kind.upper()]
+    try:
+        page = max(1, int(page or 1))
+        page_size = max(1, min(MAX_PAGE_SIZE, int(page_size or 100)))
+    except (TypeError, ValueError):
+        page, page_size = 1, 100
+    inicio = (page - 1) * page_size
+    return {
+        **diff,
+        "changes": changes[inicio:inicio + page_size],
+        "pagination": {
+            "page": page,
+            "page_size": page_size,
+            "count": len(changes),
+            "pages": -(-len(changes) // page_size),
+        },
+    }
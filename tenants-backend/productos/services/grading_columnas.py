@@ -0,0 +1,284 @@
+# productos/services/grading_columnas.py
+"""
+Versión por columnas (numpy) del motor de grading de productos.services.grading.
+
+calcular() valora un dispositivo (un dict) con unos Params. Para revalorar
+todo el catálogo o simular Params nuevos eso son millones de llamadas en
+Python puro. Aquí las mismas reglas se aplican sobre arrays:
+
+- columnas(items) codifica una lista de entradas (dicts como los de
+  calcular) en arrays: los estados como enteros pequeños y los booleanos
+  como "es False"
+- calcular_columnas(cols, params) devuelve arrays de oferta, grado, gate,
+  flag de reciclaje, topes y deducciones. `params` puede ser un Params
+  (el mismo para todas las filas) o params_columnas([...]) (uno por fila)
+
+Los estados distinguen clave ausente, None y cadena vacía porque calcular()
+los trata distinto (i.get(k, 'NONE') frente a i.get(k) and ...). Los tests
+de productos/tests/test_grading_columnas.py comprueban con hypothesis que
+el resultado es el de calcular() fila a fila.
+
+`manage.py benchmark_grading --n N` compara las dos versiones.
+"""
+import random
+import time
+from typing import Dict, Iterable, List, Mapping, Union
+
+import numpy as np
+
+from productos.services.grading import Params, calcular, v_suelo_desde_max
+
+# Códigos comunes a todas las columnas de estado
+FALTA, NULO, VACIO, OTRO = 0, 1, 2, 3
+
+ESTADOS = {
+    "display_image_status": ['OK', 'PIX', 'LINES', 'BURN', 'MURA'],
+    "glass_status": ['NONE', 'MICRO', 'VISIBLE', 'DEEP', 'CHIP', 'CRACK'],
+    "housing_status": ['SIN_SIGNOS', 'MINIMOS', 'ALGUNOS', 'DESGASTE_VISIBLE', 'DOBLADO'],
+    "backglass_status": ['AGRIETADO', 'ROTO'],
+}
+BOOLEANOS = ("enciende", "carga", "funcional_basico_ok")
+
+# Mismas bandas que v_suelo_desde_max
+_BANDAS_HASTA = np.array([100, 200, 300, 500, 800])
+_BANDAS_PCT = np.array([0.20, 0.18, 0.15, 0.12, 0.10, 0.08])
+_BANDAS_MIN = np.array([10, 15, 20, 25, 35, 50])
+
+GRADOS = np.array(['A+', 'A', 'B', 'C', 'D', 'R'], dtype=object)
+GATES = np.array(['OK', 'DEFECTUOSO', 'RECICLAJE'], dtype=object)
+
+_CAMPOS_PARAMS = ("V_Aplus", "pp_A", "pp_B", "pp_C", "V_suelo",
+                  "pr_bateria", "pr_pantalla", "pr_chasis", "has_battery", "has_display")
+
+
+def codigo(campo: str, valor: str) -> int:
+    """Código de un estado conocido de `campo`."""
+    return 4 + ESTADOS[campo].index(valor)
+
+
+def _codificar(campo: str, items: List[dict]) -> np.ndarray:
+    vocab = {v: k for k, v in enumerate(ESTADOS[campo], start=4)}
+    out = np.empty(len(items), dtype=np.int8)
+    for n, i in enumerate(items):
+        if campo not in i:
+            out[n] = FALTA
+        else:
+            v = i[campo]
+            out[n] = NULO if v is None else (VACIO if v == '' else vocab.get(v, OTRO))
+    return out
+
+
+def columnas(items: Iterable[dict]) -> Dict[str, np.ndarray]:
+    """
+    Entradas de calcular() como columnas.
+
+    Returns:
+        {estado: int8 (códigos), booleano: bool ("is False"),
+         "battery_health_pct": float64 (NaN si falta o es None)}
+    """
+    items = list(items)
+    cols = {campo: _codificar(campo, items) for campo in ESTADOS}
+    for campo in BOOLEANOS:
+        cols[campo] = np.fromiter((i.get(campo) is False for i in items), dtype=bool, count=len(items))
+    cols["battery_health_pct"] = np.fromiter(
+        (np.nan if i.get("battery_health_pct") is None else i["battery_health_pct"] for i in items),
+        dtype=np.float64, count=len(items),
+    )
+    return cols
+
+
+def params_columnas(params: Iterable[Params]) -> Dict[str, np.ndarray]:
+    """Params de cada fila como columnas (para simular Params distintos por fila)."""
+    params = list(params)
+    return {campo: np.array([getattr(p, campo) for p in params]) for campo in _CAMPOS_PARAMS}
+
+
+def v_suelo_columnas(V_Aplus) -> np.ndarray:
+    """v_suelo_desde_max() sobre un array de V_Aplus."""
+    V = np.asarray(V_Aplus)
+    banda = np.searchsorted(_BANDAS_HASTA, V, side='right')
+    return np.maximum(_BANDAS_MIN[banda], np.round(V * _BANDAS_PCT[banda])).astype(np.int64)
+
+
+def topes_columnas(V_Aplus, ppA, ppB, ppC):
+    """topes() sobre arrays (o escalares que se difunden)."""
+    A = np.round(np.asarray(V_Aplus) * (1 - np.asarray(ppA)))
+    B = np.round(A * (1 - np.asarray(ppB)))
+    C = np.round(B * (1 - np.asarray(ppC)))
+    return A, B, C
+
+
+def _en(col, campo, valores):
+    return np.isin(col, [codigo(campo, v) for v in valores])
+
+
+def _tope(grado, V_Aplus, A, B, C):
+    # grado: 0=A+, 1=A, 2=B, 3=C
+    return np.choose(grado, [V_Aplus, A, B, C])
+
+
+def calcular_columnas(cols: Mapping[str, np.ndarray], params: Union[Params, Mapping[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    calcular() para todas las filas de `cols` a la vez.
+
+    Args:
+        cols: Salida de columnas()
+        params: Params común o columnas de params_columnas()
+
+    Returns:
+        {"oferta", "grado", "gate", "reciclaje", "V_A", "V_B", "V_C",
+         "V_tope", "pr_bat", "pr_pant", "pr_chas"}; grado y gate como
+        arrays de str ('A+'..'D', 'R'; 'OK', 'DEFECTUOSO', 'RECICLAJE')
+    """
+    if isinstance(params, Params):
+        p = {campo: getattr(params, campo) for campo in _CAMPOS_PARAMS}
+    else:
+        p = params
+    n = len(cols["enciende"])
+    V_Aplus = np.broadcast_to(np.asarray(p["V_Aplus"], dtype=np.float64), (n,))
+    V_suelo = np.broadcast_to(np.asarray(p["V_suelo"], dtype=np.float64), (n,))
+    has_b = np.asarray(p["has_battery"], dtype=bool)
+    has_d = np.asarray(p["has_display"], dtype=bool)
+
+    display, glass = cols["display_image_status"], cols["glass_status"]
+    housing, backglass = cols["housing_status"], cols["backglass_status"]
+    no_enciende, no_carga, fallo_func = cols["enciende"], cols["carga"], cols["funcional_basico_ok"]
+
+    # Estados "con valor" (i.get(k) and ...) y los que calcular() completa por defecto
+    display_mal = (display > VACIO) & (display != codigo("display_image_status", "OK"))
+    glass_grave = _en(glass, "glass_status", ('DEEP', 'CHIP', 'CRACK'))
+    doblado = housing == codigo("housing_status", "DOBLADO")
+    glass_def = np.where(glass == FALTA, codigo("glass_status", "NONE"), glass)
+    housing_def = np.where(housing == FALTA, codigo("housing_status", "SIN_SIGNOS"), housing)
+
+    # 1. Reciclaje: ≥3 fallos críticos
+    fallos = (no_enciende.astype(np.int8) + (has_b & no_carga) + (has_d & display_mal)
+              + (has_d & (glass == codigo("glass_status", "CRACK"))) + doblado + fallo_func)
+    reciclaje = fallos >= 3
+
+    # 2. Gates
+    defectuoso = no_enciende | (has_b & no_carga) | (has_d & (display_mal | glass_grave)) | doblado | fallo_func
+
+    A, B, C = topes_columnas(V_Aplus, p["pp_A"], p["pp_B"], p["pp_C"])
+    A, B, C = (np.broadcast_to(x, (n,)) for x in (A, B, C))
+
+    # Grado estético con gate OK
+    g_none = glass_def == codigo("glass_status", "NONE")
+    g_micro = glass_def == codigo("glass_status", "MICRO")
+    g_visible = glass_def == codigo("glass_status", "VISIBLE")
+    h_sin = housing_def == codigo("housing_status", "SIN_SIGNOS")
+    h_min = housing_def == codigo("housing_status", "MINIMOS")
+    h_algunos = housing_def == codigo("housing_status", "ALGUNOS")
+    grado_ok = np.select(
+        [g_none & h_sin, (g_none | g_micro) & (h_sin | h_min), (g_visible | g_micro) & (h_algunos | h_min)],
+        [0, 1, 2], default=3,
+    )
+
+    # Gate DEFECTUOSO: topes por dimensión
+    gp = np.select([g_none, g_micro, g_visible], [0, 1, 2], default=3)
+    gh = np.select([h_sin, h_min, h_algunos], [0, 1, 2], default=3)
+    pantalla_ok = np.where(
+        has_d,
+        (display == codigo("display_image_status", "OK")) & _en(glass, "glass_status", ('NONE', 'MICRO', 'VISIBLE')),
+        True,
+    )
+    tp = np.where(has_d, _tope(gp, V_Aplus, A, B, C), V_Aplus)
+    th = _tope(gh, V_Aplus, A, B, C)
+    d_pant = ~pantalla_ok
+    d_chas = doblado | (backglass == codigo("backglass_status", "AGRIETADO"))
+    mezcla = np.where(
+        ~d_chas & pantalla_ok, np.minimum(th, tp),
+        np.where(~d_chas, th, np.where(pantalla_ok, tp, C)),
+    )
+    tope_d = np.select(
+        [d_pant & ~d_chas & ~fallo_func, d_chas & ~d_pant & ~fallo_func,
+         d_pant & d_chas & ~fallo_func, fallo_func & ~d_pant & ~d_chas],
+        [th, tp, V_Aplus, np.minimum(tp, th)],
+        default=mezcla,
+    )
+    V_tope = np.where(defectuoso, tope_d, _tope(grado_ok, V_Aplus, A, B, C))
+
+    # Deducciones
+    pr_bat = np.where(has_b & (cols["battery_health_pct"] < 85), p["pr_bateria"], 0)
+    pr_pant = np.where(has_d & (display_mal | glass_grave), p["pr_pantalla"], 0)
+    pr_chas = np.where(
+        _en(housing, "housing_status", ('DESGASTE_VISIBLE', 'DOBLADO')) | (backglass > OTRO),
+        p["pr_chasis"], 0,
+    )
+    V1 = V_tope - (pr_bat + pr_pant + pr_chas)
+    V2 = np.where(fallo_func, np.round(V1 * (1 - 0.15)), V1)
+    oferta = np.maximum(np.maximum(np.round(V2), V_suelo), 0)
+
+    grado = np.where(defectuoso, 4, grado_ok)
+    gate = defectuoso.astype(np.int8)
+    cero = np.zeros(n)
+    return {
+        "oferta": np.where(reciclaje, V_suelo, oferta).astype(np.int64),
+        "grado": GRADOS[np.where(reciclaje, 5, grado)],
+        "gate": GATES[np.where(reciclaje, 2, gate)],
+        "reciclaje": reciclaje,
+        "V_A": np.where(reciclaje, cero, A).astype(np.int64),
+        "V_B": np.where(reciclaje, cero, B).astype(np.int64),
+        "V_C": np.where(reciclaje, cero, C).astype(np.int64),
+        "V_tope": np.where(reciclaje, V_suelo, V_tope).astype(np.int64),
+        "pr_bat": np.where(reciclaje, cero, pr_bat).astype(np.int64),
+        "pr_pant": np.where(reciclaje, cero, pr_pant).astype(np.int64),
+        "pr_chas": np.where(reciclaje, cero, pr_chas).astype(np.int64),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+def entradas_aleatorias(n: int, semilla: int = 0) -> List[dict]:
+    """Entradas de valoración variadas (con claves ausentes y None)."""
+    rnd = random.Random(semilla)
+    items = []
+    for _ in range(n):
+        i = {}
+        for campo, valores in ESTADOS.items():
+            if rnd.random() < 0.9:
+                i[campo] = rnd.choice(valores + [None])
+        for campo in BOOLEANOS:
+            if rnd.random() < 0.9:
+                i[campo] = rnd.choice([True, True, True, False, None])
+        if rnd.random() < 0.8:
+            i["battery_health_pct"] = rnd.randint(60, 100)
+        items.append(i)
+    return items
+
+
+def benchmark(n: int = 100_000, semilla: int = 0) -> dict:
+    """
+    Tiempo de valorar n entradas con calcular() fila a fila y con
+    calcular_columnas() (codificación incluida y aparte).
+
+    Returns:
+        {"n", "escalar", "columnas", "codificar", "aceleracion"} (segundos)
+    """
+    V_suelo, regla = v_suelo_desde_max(450)
+    params = Params(V_Aplus=450, pp_A=0.08, pp_B=0.12, pp_C=0.15, V_suelo=V_suelo,
+                    pr_bateria=45, pr_pantalla=120, pr_chasis=60, v_suelo_regla=regla)
+    items = entradas_aleatorias(n, semilla)
+
+    inicio = time.perf_counter()
+    escalar = [calcular(params, i)["oferta"] for i in items]
+    t_escalar = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    cols = columnas(items)
+    t_codificar = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    vector = calcular_columnas(cols, params)["oferta"]
+    t_columnas = time.perf_counter() - inicio
+
+    if not np.array_equal(vector, np.array(escalar)):
+        raise AssertionError("calcular_columnas no coincide con calcular")
+    return {
+        "n": n,
+        "escalar": round(t_escalar, 4),
+        "codificar": round(t_codificar, 4),
+        "columnas": round(t_columnas, 4),
+        "aceleracion": round(t_escalar / max(t_columnas, 1e-9), 1),
+    }
@@ -0,0 +1,181 @@
+# productos/services/likewize_http.py
+"""
+Cliente HTTP compartido para la API de Likewize (Home.aspx/*).
+
+Los comandos actualizar_likewize, actualizar_likewize_optimizado y
+actualizar_likewize_v3 descargan el catálogo con dos endpoints:
+
+- GetList / GetSelectedModels: modelos de una categoría (y marca)
+- GetSelectedCapacitys: variantes por capacidad de un MasterModelId
+
+Con brandId (Google, Samsung...) hay una llamada por MasterModelId, cientos por
+preset. Este cliente las hace sobre una única requests.Session con pool de
+conexiones, concurrencia acotada (ThreadPoolExecutor), reintentos con backoff
+exponencial (429/5xx, respetando Retry-After) y limitación de ritmo por host.
+
+Configuración (settings):
+- LIKEWIZE_BASE_URL: raíz de la API (en tests, un servidor local)
+- LIKEWIZE_HTTP_CONCURRENCY: peticiones simultáneas como máximo
+- LIKEWIZE_HTTP_RATE: peticiones/segundo por host (0 = sin límite)
+- LIKEWIZE_HTTP_RETRIES: reintentos por petición
+"""
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://appleb2bonlineesp.likewize.com"
+DEFAULT_TIMEOUT = 30
+
+
+class RateLimiter:
+    """Espaciado mínimo entre peticiones al mismo host, compartido entre hilos."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next: Dict[str, float] = {}
+
+    def wait(self, host: str) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _parse_list(payload) -> list:
+    """Las respuestas ASP.NET vienen como {"d": [...]} o {"d": "<json>"}."""
+    data = payload
+    if isinstance(data, dict) and "d" in data:
+        data = data["d"]
+    if isinstance(data, str):
+        data = json.loads(data)
+    return data if isinstance(data, list) else []
+
+
+class LikewizeClient:
+    """
+    Cliente de la API de Likewize con pool de conexiones y concurrencia acotada.
+
+    Las peticiones fallidas (tras agotar reintentos) devuelven lista vacía,
+    igual que las funciones originales de actualizar_likewize.
+    """
+
+    def __init__(
+        self,
+        cookies: Optional[Dict[str, str]] = None,
+        *,
+        base_url: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        rate: Optional[float] = None,
+        retries: Optional[int] = None,
+        backoff: float = 0.5,
+        timeout: float = DEFAULT_TIMEOUT,
+    ):
+        self.base_url = (base_url or getattr(settings, "LIKEWIZE_BASE_URL", DEFAULT_BASE_URL)).rstrip("/")
+        self.concurrency = max(1, int(concurrency or getattr(settings, "LIKEWIZE_HTTP_CONCURRENCY", 8)))
+        self.timeout = timeout
+        self.limiter = RateLimiter(getattr(settings, "LIKEWIZE_HTTP_RATE", 0) if rate is None else rate)
+
+        retry = Retry(
+            total=getattr(settings, "LIKEWIZE_HTTP_RETRIES", 3) if retries is None else retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),  # los POST de Likewize son lecturas
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json; charset=UTF-8",
+            "Accept": "application/json, text/javascript, */*; q=0.01",
+            "Origin": self.base_url,
+            "Referer": f"{self.base_url}/",
+            "User-Agent": "Mozilla/5.0",
+            "X-Requested-With": "XMLHttpRequest",
+        })
+        if cookies:
+            self.session.cookies.update(cookies)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _post(self, endpoint: str, payload: dict) -> list:
+        url = f"{self.base_url}/Home.aspx/{endpoint}"
+        self.limiter.wait(urlsplit(url).netloc)
+        try:
+            r = self.session.post(url, data=json.dumps(payload), timeout=self.timeout)
+            if not r.ok:
+                logger.warning("Likewize %s → HTTP %s", endpoint, r.status_code)
+                return []
+            return _parse_list(r.json())
+        except (requests.RequestException, ValueError) as exc:
+            logger.warning("Likewize %s falló: %s", endpoint, exc)
+            return []
+
+    def modelos(self, categoria_id: int, brand_id: Optional[int] = None) -> List[dict]:
+        """Modelos de una categoría (GetSelectedModels si hay brand_id, GetList si no)."""
+        if brand_id:
+            return self._post("GetSelectedModels", {"productId": str(categoria_id), "brandId": str(brand_id)})
+        return self._post("GetList", {"id": categoria_id})
+
+    def capacidades(self, master_model_id) -> List[dict]:
+        """Variantes por capacidad de un MasterModelId."""
+        return self._post("GetSelectedCapacitys", {"masterModelId": str(master_model_id)})
+
+    def capacidades_many(self, master_model_ids: Iterable) -> Dict[str, List[dict]]:
+        """
+        Descarga en paralelo las variantes de varios MasterModelId.
+
+        Args:
+            master_model_ids: Ids (se deduplican y se ignoran los vacíos)
+
+        Returns:
+            {str(master_model_id): [variantes]}
+        """
+        ids = list(dict.fromkeys(str(i).strip() for i in master_model_ids if str(i or "").strip()))
+        if not ids:
+            return {}
+        if self.concurrency == 1 or len(ids) == 1:
+            return {i: self.capacidades(i) for i in ids}
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(ids))) as pool:
+            return dict(zip(ids, pool.map(self.capacidades, ids)))
+
+
+_clients: Dict[tuple, LikewizeClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(cookies: Optional[Dict[str, str]] = None) -> LikewizeClient:
+    """Cliente compartido por juego de cookies (reutiliza la sesión y su pool)."""
+    key = tuple(sorted((cookies or {}).items()))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = LikewizeClient(cookies)
+        return client
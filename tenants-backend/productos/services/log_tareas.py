@@ -0,0 +1,217 @@
+# productos/services/log_tareas.py
+"""
+Log incremental de las tareas de actualización y progreso por WebSocket.
+
+El log de cada tarea sigue siendo su log.txt (enlazado como log_url), pero
+cada evento se indexa en log.txt.idx con un registro de tamaño fijo
+(offset en bytes, timestamp, nivel). El evento N está en N * REGISTRO.size
+del índice, así que "eventos después del offset X" o "últimos n" cuestan lo
+mismo con un log de 5 KB que con uno de 50 MB: nunca se lee el fichero entero.
+
+El progreso (set_progress de los comandos) se publica en el grupo de Channels
+tarea_<id>; en base de datos solo se persiste como mucho cada
+PROGRESO_INTERVALO segundos, para el endpoint de estado.
+"""
+import fcntl
+import logging
+import os
+import struct
+import time
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+# offset del evento en log.txt, timestamp, nivel
+REGISTRO = struct.Struct("<QdB")
+NIVELES = ("DEBUG", "INFO", "SUCCESS", "WARNING", "ERROR")
+
+# Ventana de eventos que sirve after(): un cliente muy atrasado salta al inicio de la ventana
+MAX_EVENTOS = 5000
+# Bloque para leer desde el final los logs antiguos sin índice
+BLOQUE_TAIL = 64 * 1024
+
+PROGRESO_INTERVALO = 2.0
+
+
+def grupo_tarea(tarea_id) -> str:
+    return f"tarea_{tarea_id}"
+
+
+class TaskLog:
+    """
+    Log de una tarea: log.txt (texto) + log.txt.idx (índice de eventos).
+
+    Las escrituras toman un flock sobre el índice para que línea e índice
+    queden consistentes aunque escriban el worker y el comando a la vez.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.idx_path = self.path.with_name(self.path.name + ".idx")
+
+    def append(self, mensaje: str, nivel: str = "INFO") -> int:
+        """
+        Añade un evento al log.
+
+        Returns:
+            Número de secuencia del evento (0, 1, 2...)
+        """
+        ahora = time.time()
+        linea = f"{datetime.fromtimestamp(ahora, dt_timezone.utc).isoformat()} {mensaje}".replace("\n", " ") + "\n"
+        nivel_n = NIVELES.index(nivel) if nivel in NIVELES else NIVELES.index("INFO")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.idx_path, "ab") as idx:
+            fcntl.flock(idx, fcntl.LOCK_EX)
+            try:
+                with open(self.path, "ab") as fh:
+                    offset = fh.seek(0, os.SEEK_END)
+                    fh.write(linea.encode("utf-8"))
+                seq = idx.seek(0, os.SEEK_END) // REGISTRO.size
+                idx.write(REGISTRO.pack(offset, ahora, nivel_n))
+            finally:
+                fcntl.flock(idx, fcntl.LOCK_UN)
+        return seq
+
+    def count(self) -> int:
+        try:
+            return self.idx_path.stat().st_size // REGISTRO.size
+        except FileNotFoundError:
+            return 0
+
+    @property
+    def indexado(self) -> bool:
+        return self.idx_path.exists()
+
+    def _leer(self, desde: int, hasta: int) -> List[Dict]:
+        if hasta <= desde:
+            return []
+        n = hasta - desde
+        with open(self.idx_path, "rb") as idx:
+            idx.seek(desde * REGISTRO.size)
+            # un registro de más: su offset marca dónde acaba el último evento pedido
+            raw = idx.read((n + 1) * REGISTRO.size)
+        registros = [REGISTRO.unpack_from(raw, i * REGISTRO.size) for i in range(len(raw) // REGISTRO.size)]
+        fin = registros[n][0] if len(registros) > n else None
+        registros = registros[:n]
+        if not registros:
+            return []
+
+        base = registros[0][0]
+        with open(self.path, "rb") as fh:
+            fh.seek(base)
+            bloque = fh.read(fin - base if fin is not None else -1)
+
+        eventos = []
+        for i, (offset, ts, nivel) in enumerate(registros):
+            start = offset - base
+            if i + 1 < len(registros):
+                end = registros[i + 1][0] - base
+            else:
+                # último evento: hasta su salto de línea (puede haber escrituras posteriores)
+                end = bloque.find(b"\n", start) + 1 or len(bloque)
+            eventos.append({
+                "seq": desde + i,
+                "ts": datetime.fromtimestamp(ts, dt_timezone.utc).isoformat(),
+                "level": NIVELES[nivel] if nivel < len(NIVELES) else "INFO",
+                "line": bloque[start:end].decode("utf-8", errors="ignore").rstrip("\n"),
+            })
+        return eventos
+
+    def after(self, offset: int, limit: int = 500) -> Tuple[List[Dict], int]:
+        """
+        Eventos con seq >= offset.
+
+        Args:
+            offset: Siguiente seq que el cliente no tiene (el `offset` devuelto antes)
+            limit: Máximo de eventos por respuesta
+
+        Returns:
+            (eventos, nuevo_offset)
+        """
+        total = self.count()
+        desde = max(int(offset), total - MAX_EVENTOS, 0)
+        hasta = min(total, desde + max(1, int(limit)))
+        return self._leer(desde, hasta), hasta
+
+    def tail(self, n: int) -> Tuple[List[Dict], int]:
+        """Últimos n eventos y el offset para seguir con after()."""
+        if not self.indexado:
+            return [{"seq": None, "ts": None, "level": "INFO", "line": ln} for ln in tail_sin_indice(self.path, n)], 0
+        total = self.count()
+        return self._leer(max(0, total - max(0, int(n))), total), total
+
+
+def tail_sin_indice(path, n: int) -> List[str]:
+    """Últimas n líneas de un log antiguo (sin .idx) leyendo bloques desde el final."""
+    try:
+        fh = open(path, "rb")
+    except FileNotFoundError:
+        return []
+    with fh:
+        pos = fh.seek(0, os.SEEK_END)
+        data = b""
+        while pos > 0 and data.count(b"\n") <= n:
+            paso = min(BLOQUE_TAIL, pos)
+            pos -= paso
+            fh.seek(pos)
+            data = fh.read(paso) + data
+    lines = data.decode("utf-8", errors="ignore").splitlines()
+    return lines[-n:] if n > 0 else []
+
+
+class TaskLogHandler(logging.Handler):
+    """Handler de logging que escribe en el TaskLog de la tarea."""
+
+    def __init__(self, task_log: TaskLog):
+        super().__init__()
+        self.task_log = task_log
+
+    def emit(self, record):
+        try:
+            self.task_log.append(record.getMessage(), record.levelname)
+        except Exception:
+            self.handleError(record)
+
+
+def log_de_tarea(tarea) -> Optional[TaskLog]:
+    return TaskLog(tarea.log_path) if tarea.log_path else None
+
+
+def publicar_progreso(tarea) -> None:
+    """Envía el estado de la tarea al grupo tarea_<id> (si hay channel layer)."""
+    try:
+        layer = get_channel_layer()
+        if layer is None:
+            return
+        task_log = log_de_tarea(tarea)
+        async_to_sync(layer.group_send)(grupo_tarea(tarea.id), {
+            "type": "tarea_progreso",
+            "tarea_id": str(tarea.id),
+            "estado": tarea.estado,
+            "progreso": tarea.progreso,
+            "subestado": tarea.subestado,
+            "log_offset": task_log.count() if task_log else 0,
+        })
+    except Exception as exc:  # el progreso nunca debe romper la tarea
+        logger.debug("No se pudo publicar el progreso de %s: %s", tarea.id, exc)
+
+
+def actualizar_progreso(tarea, pct: int, msg: str) -> None:
+    """
+    Progreso de una tarea: se publica siempre por Channels y se persiste
+    como mucho cada PROGRESO_INTERVALO segundos (y siempre al llegar a 100).
+    """
+    tarea.progreso = max(0, min(100, int(pct)))
+    tarea.subestado = msg[:120]
+    publicar_progreso(tarea)
+
+    ahora = time.monotonic()
+    ultimo = getattr(tarea, "_progreso_guardado", None)
+    if ultimo is None or tarea.progreso >= 100 or ahora - ultimo >= PROGRESO_INTERVALO:
+        tarea.save(update_fields=["progreso", "subestado"])
+        tarea._progreso_guardado = ahora
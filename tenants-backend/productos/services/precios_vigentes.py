@@ -0,0 +1,190 @@
+# productos/services/precios_vigentes.py
+"""
+Almacén de precios vigentes (tabla productos_precio_vigente).
+
+PrecioRecompra y PrecioDispositivoPersonalizado son tablas versionadas:
+resolver el precio actual exige filtrar por valid_from/valid_to y aplicar
+el fallback override de tenant → global, dispositivo a dispositivo.
+PrecioVigente guarda, por (capacidad|dispositivo, canal, tenant), las
+versiones no caducadas: la vigente y las programadas a futuro. Las lecturas
+por lote eligen por fecha (la de valid_from más reciente ya en vigor) y
+resuelven el fallback en una query, así que un precio programado entra solo
+a su hora sin esperar a ninguna resincronización.
+
+Sincronización:
+- Señales post_save/post_delete de los modelos de precio (productos.signals)
+- aplicar_cambios_precio() tras sus escrituras en bloque
+- Comando refrescar_precios_vigentes para una reconstrucción completa
+  (tras importaciones masivas; programado en PM2 para purgar las versiones
+  caducadas)
+
+Al sincronizar capacidades se recalculan también sus tramos de la rejilla
+del admin (productos.services.tramos_precio).
+
+Concurrencia: cada sincronización toma el advisory lock de sus capacidades y
+dispositivos (productos.services.bloqueos) antes de borrar y recrear sus
+filas, así que dos escrituras del mismo precio no chocan con la restricción
+única. La reconstrucción completa avanza por lotes de ids, cada uno en su
+propia transacción con los mismos locks, en lugar de rehacer la tabla en una.
+"""
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from productos.models.precios import (
+    PrecioDispositivoPersonalizado,
+    PrecioRecompra,
+    PrecioVigente,
+    TramoPrecioCapacidad,
+)
+from productos.services import bloqueos
+from productos.services.tramos_precio import sincronizar_tramos
+
+BULK_BATCH_SIZE = 1000
+
+# Modelo versionado → campo FK equivalente en PrecioVigente y espacio de locks
+_FUENTES = (
+    (PrecioRecompra, "capacidad", bloqueos.CAPACIDAD),
+    (PrecioDispositivoPersonalizado, "dispositivo_personalizado", bloqueos.DISPOSITIVO_PERSONALIZADO),
+)
+
+
+def _en_vigor(now) -> Q:
+    return Q(valid_from__lte=now) & (Q(valid_to__isnull=True) | Q(valid_to__gt=now))
+
+
+def _sincronizar(Source, fk: str, ids: Iterable[int], now) -> int:
+    # Vigentes y programadas: las caducadas no se copian
+    src = Source.objects.filter(Q(valid_to__isnull=True) | Q(valid_to__gt=now), **{f"{fk}_id__in": ids})
+    filas = {}
+    for row in (src.order_by("-valid_from", "-id")
+                .values(f"{fk}_id", "canal", "tenant_schema", "precio_neto", "fuente", "valid_from", "valid_to")):
+        key = (row[f"{fk}_id"], row["canal"], row["tenant_schema"] or "", row["valid_from"])
+        filas.setdefault(key, row)  # a igual valid_from, la última creada
+
+    PrecioVigente.objects.filter(**{f"{fk}_id__in": ids}).delete()
+    PrecioVigente.objects.bulk_create(
+        [
+            PrecioVigente(
+                **{f"{fk}_id": ref_id},
+                canal=canal,
+                tenant_schema=tenant,
+                precio_neto=row["precio_neto"],
+                fuente=row["fuente"] or "",
+                valid_from=row["valid_from"],
+                valid_to=row["valid_to"],
+            )
+            for (ref_id, canal, tenant, _), row in filas.items()
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
+    return len(filas)
+
+
+def _todos_los_ids(Source, fk: str) -> list:
+    """Ids con versiones en la tabla origen o con filas en el almacén/rejilla."""
+    ids = set(Source.objects.values_list(f"{fk}_id", flat=True).distinct())
+    ids |= set(PrecioVigente.objects.filter(**{f"{fk}__isnull": False})
+               .values_list(f"{fk}_id", flat=True).distinct())
+    if fk == "capacidad":
+        ids |= set(TramoPrecioCapacidad.objects.values_list("capacidad_id", flat=True).distinct())
+    ids.discard(None)
+    return sorted(ids)
+
+
+def sincronizar_precios_vigentes(
+    capacidad_ids: Optional[Iterable[int]] = None,
+    dispositivo_ids: Optional[Iterable[int]] = None,
+    todo: bool = False,
+) -> int:
+    """
+    Recalcula las filas de PrecioVigente desde las tablas versionadas.
+
+    Args:
+        capacidad_ids: Capacidades a recalcular (todos sus canales/tenants)
+        dispositivo_ids: Dispositivos personalizados a recalcular
+        todo: Reconstruir la tabla completa por lotes (ignora los ids)
+
+    Returns:
+        Número de filas vigentes escritas
+    """
+    if todo:
+        total = 0
+        for (Source, fk, _), clave in zip(_FUENTES, ("capacidad_ids", "dispositivo_ids")):
+            ids = _todos_los_ids(Source, fk)
+            for i in range(0, len(ids), BULK_BATCH_SIZE):
+                total += sincronizar_precios_vigentes(**{clave: ids[i:i + BULK_BATCH_SIZE]})
+        return total
+
+    now = timezone.now()
+    total = 0
+    with transaction.atomic():
+        bloqueados = {}
+        for (Source, fk, espacio), ids in zip(_FUENTES, (capacidad_ids, dispositivo_ids)):
+            if ids is None:
+                continue
+            bloqueados[fk] = ids = bloqueos.bloquear(espacio, ids)
+            if ids:
+                total += _sincronizar(Source, fk, ids, now)
+        if "capacidad" in bloqueados:
+            sincronizar_tramos(bloqueados["capacidad"])
+    return total
+
+
+def _resolver(fk: str, ids: Iterable[int], canal: str, tenant_schema: Optional[str]) -> Dict[int, Decimal]:
+    ids = {int(i) for i in ids if i}
+    if not ids:
+        return {}
+    tenants = ["", tenant_schema] if tenant_schema else [""]
+    rows = (PrecioVigente.objects
+            .filter(**{f"{fk}_id__in": ids}, canal=canal, tenant_schema__in=tenants)
+            .filter(_en_vigor(timezone.now()))
+            .order_by("valid_from")
+            .values_list(f"{fk}_id", "tenant_schema", "precio_neto"))
+    en_vigor: Dict[tuple, Decimal] = {}
+    for ref_id, tenant, precio in rows:
+        en_vigor[(ref_id, tenant)] = precio  # la más reciente queda la última
+    precios: Dict[int, Decimal] = {}
+    for (ref_id, tenant), precio in en_vigor.items():
+        # El override del tenant gana sobre el global
+        if tenant or ref_id not in precios:
+            precios[ref_id] = precio
+    return precios
+
+
+def precios_vigentes(
+    capacidad_ids: Iterable[int],
+    canal: str,
+    tenant_schema: Optional[str] = None,
+) -> Dict[int, Decimal]:
+    """
+    Precio vigente por capacidad (override de tenant o global) en una query.
+
+    Args:
+        capacidad_ids: Capacidades a resolver
+        canal: "B2B" o "B2C"
+        tenant_schema: Schema del tenant cuyo override tiene prioridad
+
+    Returns:
+        {capacidad_id: precio_neto}; las capacidades sin precio no aparecen
+    """
+    return _resolver("capacidad", capacidad_ids, canal, tenant_schema)
+
+
+def precio_vigente(capacidad_id: int, canal: str, tenant_schema: Optional[str] = None) -> Optional[Decimal]:
+    """Precio vigente de una capacidad, o None."""
+    if not capacidad_id:
+        return None
+    return precios_vigentes([capacidad_id], canal, tenant_schema).get(int(capacidad_id))
+
+
+def precios_vigentes_personalizados(
+    dispositivo_ids: Iterable[int],
+    canal: str,
+    tenant_schema: Optional[str] = None,
+) -> Dict[int, Decimal]:
+    """Equivalente de precios_vigentes() para dispositivos personalizados."""
+    return _resolver("dispositivo_personalizado", dispositivo_ids, canal, tenant_schema)
@@ -0,0 +1,137 @@
+# productos/services/tramos_precio.py
+"""
+Rejilla de precios del admin de capacidades (tabla productos_tramo_precio_capacidad).
+
+El listado de capacidades mostraba, para una fecha, el precio B2B y B2C
+vigente con su valid_from, valid_to y fuente: ocho subqueries correlacionadas
+sobre PrecioRecompra por cada capacidad, que crecen con el histórico.
+
+La rejilla guarda por capacidad una línea de tiempo de tramos [desde, hasta)
+en los que la versión ganadora de cada canal no cambia (la de valid_from
+más reciente entre las activas, de cualquier tenant, como las subqueries).
+Para cualquier fecha hay como mucho un tramo por capacidad, así que el
+listado se resuelve con un LEFT JOIN (ver annotate_capacidades).
+
+Sincronización: la misma que PrecioVigente. sincronizar_precios_vigentes()
+recalcula también los tramos de las capacidades que toca (señales,
+aplicar_cambios_precio y el comando refrescar_precios_vigentes). Los tramos
+de una capacidad se rehacen bajo su advisory lock (productos.services.bloqueos),
+el mismo que toma PrecioVigente.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import F, FilteredRelation, Q
+
+from productos.services import bloqueos
+
+BULK_BATCH_SIZE = 1000
+CANALES = ("B2B", "B2C")
+CAMPOS_FILA = ("id", "capacidad_id", "canal", "precio_neto", "valid_from", "valid_to", "fuente")
+
+
+def construir_tramos(filas: Iterable[dict]) -> List[dict]:
+    """
+    Línea de tiempo de una capacidad a partir de sus filas de PrecioRecompra.
+
+    Args:
+        filas: Dicts con CAMPOS_FILA (todas las versiones, ambos canales)
+
+    Returns:
+        Tramos ordenados {"desde", "hasta", "b2b_*", "b2c_*"}; no se generan
+        tramos sin precio en ningún canal
+    """
+    por_canal: Dict[str, list] = {canal: [] for canal in CANALES}
+    cortes = set()
+    for f in filas:
+        if f["canal"] not in por_canal:
+            continue
+        por_canal[f["canal"]].append(f)
+        cortes.add(f["valid_from"])
+        if f["valid_to"] is not None:
+            cortes.add(f["valid_to"])
+    for lista in por_canal.values():
+        # La más reciente primero (a igual valid_from, la última creada)
+        lista.sort(key=lambda f: (f["valid_from"], f["id"]), reverse=True)
+
+    cortes = sorted(cortes)
+    tramos: List[dict] = []
+    anteriores = None
+    for k, desde in enumerate(cortes):
+        ganadores = tuple(
+            next((f for f in por_canal[canal]
+                  if f["valid_from"] <= desde and (f["valid_to"] is None or f["valid_to"] > desde)), None)
+            for canal in CANALES
+        )
+        hasta = cortes[k + 1] if k + 1 < len(cortes) else None
+        if not any(ganadores):
+            anteriores = None
+            continue
+        if anteriores == ganadores:
+            # Mismas versiones que el tramo anterior: se alarga
+            tramos[-1]["hasta"] = hasta
+            continue
+        tramo = {"desde": desde, "hasta": hasta}
+        for canal, f in zip(CANALES, ganadores):
+            prefijo = canal.lower()
+            tramo[f"{prefijo}_precio"] = f["precio_neto"] if f else None
+            tramo[f"{prefijo}_valid_from"] = f["valid_from"] if f else None
+            tramo[f"{prefijo}_valid_to"] = f["valid_to"] if f else None
+            tramo[f"{prefijo}_fuente"] = f["fuente"] if f else None
+        tramos.append(tramo)
+        anteriores = ganadores
+    return tramos
+
+
+def sincronizar_tramos(capacidad_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recalcula los tramos de las capacidades indicadas (None = todas, por lotes).
+
+    Returns:
+        Número de tramos escritos
+    """
+    from productos.models.precios import PrecioRecompra, TramoPrecioCapacidad
+
+    if capacidad_ids is None:
+        ids = set(PrecioRecompra.objects.values_list("capacidad_id", flat=True).distinct())
+        ids |= set(TramoPrecioCapacidad.objects.values_list("capacidad_id", flat=True).distinct())
+        ids = sorted(ids)
+        return sum(sincronizar_tramos(ids[i:i + BULK_BATCH_SIZE]) for i in range(0, len(ids), BULK_BATCH_SIZE))
+
+    with transaction.atomic():
+        capacidad_ids = bloqueos.bloquear(bloqueos.CAPACIDAD, capacidad_ids)
+        if not capacidad_ids:
+            return 0
+        por_capacidad: Dict[int, list] = {}
+        for row in (PrecioRecompra.objects.filter(capacidad_id__in=capacidad_ids)
+                    .values(*CAMPOS_FILA).iterator(chunk_size=BULK_BATCH_SIZE)):
+            por_capacidad.setdefault(row["capacidad_id"], []).append(row)
+
+        TramoPrecioCapacidad.objects.filter(capacidad_id__in=capacidad_ids).delete()
+        nuevos = [
+            TramoPrecioCapacidad(capacidad_id=capacidad_id, **tramo)
+            for capacidad_id, filas in por_capacidad.items()
+            for tramo in construir_tramos(filas)
+        ]
+        TramoPrecioCapacidad.objects.bulk_create(nuevos, batch_size=BULK_BATCH_SIZE)
+    return len(nuevos)
+
+
+def anotar_precios(qs, fecha):
+    """
+    Añade a un queryset de Capacidad los precios de la rejilla en `fecha`
+    (_b2b, _b2b_from, _b2b_to, _b2b_src y los equivalentes _b2c) con un
+    único LEFT JOIN.
+    """
+    en_fecha = (Q(tramos_precio__desde__lte=fecha)
+                & (Q(tramos_precio__hasta__isnull=True) | Q(tramos_precio__hasta__gt=fecha)))
+    return qs.annotate(tramo=FilteredRelation("tramos_precio", condition=en_fecha)).annotate(
+        _b2b=F("tramo__b2b_precio"),
+        _b2b_from=F("tramo__b2b_valid_from"),
+        _b2b_to=F("tramo__b2b_valid_to"),
+        _b2b_src=F("tramo__b2b_fuente"),
+        _b2c=F("tramo__b2c_precio"),
+        _b2c_from=F("tramo__b2c_valid_from"),
+        _b2c_to=F("tramo__b2c_valid_to"),
+        _b2c_src=F("tramo__b2c_fuente"),
+    )
@@ -0,0 +1,338 @@
+# productos/services/valoraciones.py
+"""
+Valoración comercial compartida por la vista de un dispositivo
+(ValoracionComercialGenericaView) y la de lote (ValoracionComercialLoteView).
+
+Por cada dispositivo la vista individual resuelve modelo/capacidad, el
+GradingConfig, el precio vigente y tres costes de pieza antes de llamar a
+grading.calcular. valorar_lote() hace lo mismo para N dispositivos con un
+número fijo de queries:
+
+- DispositivoReal, Modelo y Capacidad referenciados: una query por tabla
+- GradingConfig activos: una query
+- Precios vigentes: una query por (canal, tenant) del lote
+- Costes de pieza: los de la caché de costes_pieza (una query para los
+  modelos que no estén en memoria)
+- Params se construye una vez por (tipo, capacidad, canal, tenant) y se
+  reutiliza para todos los dispositivos que comparten esa fila de la matriz
+
+Las rutas construyen Params y la respuesta con params_valoracion() y
+resultado_valoracion(), así que un dispositivo vale lo mismo solo o en lote.
+Los iPhone del lote se valoran como IphoneComercialValoracionView (la vista
+individual de iPhone): penalizaciones fijas, aunque haya GradingConfig.
+"""
+from decimal import Decimal
+import logging
+from typing import Dict, Optional
+
+from django.db.models.functions import Length
+from django.db.utils import DatabaseError, ProgrammingError, OperationalError
+
+from productos.models.grading_config import GradingConfig
+from productos.models.modelos import Capacidad, Modelo
+from productos.services.costes_pieza import costes_reparacion
+from productos.services.grading import Params, calcular, v_suelo_desde_max
+from productos.services.precios_vigentes import precios_vigentes
+
+logger = logging.getLogger(__name__)
+
+# Penalizaciones de IphoneComercialValoracionView, y de los tipos sin GradingConfig
+PP_POR_DEFECTO = (0.08, 0.12, 0.15)
+
+TIPO_IPHONE = 'iPhone'
+
+
+class ErrorValoracion(Exception):
+    """Dispositivo que no se puede valorar; `status` es el HTTP de la vista individual."""
+
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+# ---------------------------------------------------------------------------
+# Resolución de tipo, modelo y capacidad
+# ---------------------------------------------------------------------------
+
+def tipo_desde_referencias(datos: dict, dispositivo=None, modelo=None) -> Optional[str]:
+    """
+    Tipo del dispositivo por orden: DispositivoReal (personalizado o modelo),
+    Modelo de modelo_id y, si no, el 'tipo' recibido.
+    """
+    if dispositivo is not None:
+        if dispositivo.dispositivo_personalizado:
+            return dispositivo.dispositivo_personalizado.tipo
+        if dispositivo.modelo:
+            return dispositivo.modelo.tipo
+    if modelo is not None:
+        return modelo.tipo
+    return None
+
+
+def resolver_modelo_capacidad(i: dict, tipo: str, dispositivo=None, capacidad=None) -> str:
+    """
+    Completa i['modelo_id'] e i['capacidad_id'] desde dispositivo_id,
+    capacidad_id o los nombres (modelo_nombre, capacidad_texto).
+
+    Args:
+        i: Datos validados del dispositivo (se modifican)
+        tipo: Tipo resuelto hasta ahora
+        dispositivo: DispositivoReal de i['dispositivo_id'] si ya está cargado
+        capacidad: Capacidad de i['capacidad_id'] si ya está cargada
+
+    Returns:
+        Tipo del dispositivo (actualizado si se resuelve desde el modelo)
+
+    Raises:
+        ErrorValoracion: Si no se puede resolver modelo y capacidad
+    """
+    if i.get('modelo_id') and i.get('capacidad_id'):
+        return tipo
+
+    disp_id = i.get('dispositivo_id')
+    if disp_id:
+        if dispositivo is None:
+            from checkouters.models.dispositivo import DispositivoReal
+            try:
+                dispositivo = DispositivoReal.objects.select_related('modelo', 'capacidad').get(id=disp_id)
+            except DispositivoReal.DoesNotExist:
+                logger.info("[valoraciones] dispositivo_id=%s no encontrado", disp_id)
+            except (DatabaseError, ProgrammingError, OperationalError) as e:
+                logger.warning("[valoraciones] lookup dispositivo_id falló: %s", str(e))
+        if dispositivo is not None:
+            if dispositivo.modelo_id is None:
+                # Dispositivo personalizado: no tiene precio de catálogo
+                raise ErrorValoracion("Dispositivo sin modelo de catálogo")
+            i['modelo_id'] = dispositivo.modelo_id
+            i['capacidad_id'] = dispositivo.capacidad_id
+            tipo = dispositivo.modelo.tipo
+
+    modelo_id = i.get('modelo_id')
+    capacidad_id = i.get('capacidad_id')
+    modelo_nombre = (i.get('modelo_nombre') or '').strip()
+    capacidad_texto = (i.get('capacidad_texto') or '').strip()
+
+    # capacidad_id → modelo_id
+    if capacidad_id and not modelo_id:
+        if capacidad is None:
+            try:
+                capacidad = Capacidad.objects.select_related('modelo').get(id=capacidad_id)
+            except Capacidad.DoesNotExist:
+                raise ErrorValoracion("capacidad_id no válido")
+        modelo_id = capacidad.modelo_id
+        tipo = capacidad.modelo.tipo
+
+    # modelo_nombre → modelo_id (exacto; si no, el icontains más corto)
+    if not modelo_id and modelo_nombre:
+        m = Modelo.objects.filter(descripcion__iexact=modelo_nombre).order_by('id').first()
+        if m is None:
+            m = (Modelo.objects
+                 .filter(descripcion__icontains=modelo_nombre)
+                 .annotate(desc_len=Length('descripcion'))
+                 .order_by('desc_len', 'id')
+                 .first())
+            if m is None:
+                raise ErrorValoracion("No se encontró modelo por nombre")
+        modelo_id = m.id
+        tipo = m.tipo
+
+    # capacidad_texto → capacidad_id
+    if not capacidad_id and capacidad_texto and modelo_id:
+        txt = capacidad_texto.lower().replace('gb', '').replace('tb', '').strip()
+        base = Capacidad.objects.filter(modelo_id=modelo_id)
+        cap = base.filter(tamaño__iexact=capacidad_texto).order_by('id').first()
+        if cap is None:
+            cqs = (base.filter(tamaño__icontains=capacidad_texto) | base.filter(tamaño__icontains=txt))
+            cap = cqs.annotate(tam_len=Length('tamaño')).order_by('tam_len', 'id').first()
+            if cap is None:
+                raise ErrorValoracion("No se encontró capacidad por texto")
+        capacidad_id = cap.id
+
+    if not modelo_id or not capacidad_id:
+        raise ErrorValoracion("Faltan modelo_id y/o capacidad_id")
+
+    i['modelo_id'] = modelo_id
+    i['capacidad_id'] = capacidad_id
+    return tipo
+
+
+# ---------------------------------------------------------------------------
+# Params y respuesta
+# ---------------------------------------------------------------------------
+
+def params_valoracion(tipo: str, v_aplus, costes: Dict[str, int], grading_config=None) -> Params:
+    """
+    Params de grading para un precio vigente y unos costes de reparación.
+
+    Args:
+        tipo: Tipo de dispositivo
+        v_aplus: Precio vigente (Decimal) de la capacidad/canal
+        costes: {"pr_bateria", "pr_pantalla", "pr_chasis"} en euros enteros
+        grading_config: GradingConfig del tipo o None (valores por defecto)
+    """
+    V_Aplus = int(Decimal(v_aplus).quantize(Decimal('1')))
+    V_suelo, regla = v_suelo_desde_max(V_Aplus)
+    if grading_config:
+        pp_A = float(grading_config.pp_A)
+        pp_B = float(grading_config.pp_B)
+        pp_C = float(grading_config.pp_C)
+        has_battery = grading_config.has_battery
+        has_display = grading_config.has_display
+    else:
+        pp_A, pp_B, pp_C = PP_POR_DEFECTO
+        has_battery = True
+        has_display = True
+    return Params(
+        V_Aplus=V_Aplus,
+        pp_A=pp_A,
+        pp_B=pp_B,
+        pp_C=pp_C,
+        V_suelo=V_suelo,
+        pr_bateria=costes["pr_bateria"],
+        pr_pantalla=costes["pr_pantalla"],
+        pr_chasis=costes["pr_chasis"],
+        v_suelo_regla=regla,
+        has_battery=has_battery,
+        has_display=has_display,
+        tipo_dispositivo=tipo,
+    )
+
+
+def resultado_valoracion(tipo: str, i: dict, canal: str, tenant_schema: Optional[str], params: Params) -> dict:
+    """Respuesta de la valoración comercial (calcular + contexto y params)."""
+    out = calcular(params, i)
+    return {
+        "tipo_dispositivo": tipo,
+        "modelo_id": i['modelo_id'],
+        "capacidad_id": i['capacidad_id'],
+        "canal": canal,
+        "tenant": tenant_schema,
+        **out,
+        "params": {
+            "V_suelo": params.V_suelo,
+            "pp_A": params.pp_A,
+            "pp_B": params.pp_B,
+            "pp_C": params.pp_C,
+            "pr_bateria": params.pr_bateria,
+            "pr_pantalla": params.pr_pantalla,
+            "pr_chasis": params.pr_chasis,
+            "v_suelo_regla": params.v_suelo_regla,
+        },
+    }
+
+
+def canal_y_tenant(i: dict, active_schema: Optional[str]):
+    """(canal, tenant_schema): los del payload o, si faltan, los del schema activo."""
+    tenant_schema = i.get('tenant') or (active_schema if active_schema and active_schema != 'public' else None)
+    canal = i.get('canal') or ('B2B' if tenant_schema else 'B2C')
+    return canal, tenant_schema
+
+
+# ---------------------------------------------------------------------------
+# Lote
+# ---------------------------------------------------------------------------
+
+def _por_id(modelo, ids, **related):
+    ids = {int(x) for x in ids if x}
+    if not ids:
+        return {}
+    qs = modelo.objects.filter(id__in=ids)
+    if related.get("select_related"):
+        qs = qs.select_related(*related["select_related"])
+    return {obj.id: obj for obj in qs}
+
+
+def valorar_lote(items: list, active_schema: Optional[str], serializer_para_tipo) -> list:
+    """
+    Valoración comercial de varios dispositivos.
+
+    Args:
+        items: Payloads como los de la vista individual (uno por dispositivo)
+        active_schema: Schema de la conexión (fallback de canal/tenant)
+        serializer_para_tipo: Función tipo → serializer de entrada
+
+    Returns:
+        Lista en el mismo orden: el resultado de la vista individual o
+        {"detail", "status"} si ese dispositivo no se puede valorar
+    """
+    from checkouters.models.dispositivo import DispositivoReal
+
+    # 1) Referencias del lote en una query por tabla
+    dispositivos = {}
+    disp_ids = [d.get('dispositivo_id') for d in items if isinstance(d, dict)]
+    try:
+        dispositivos = _por_id(DispositivoReal, disp_ids,
+                               select_related=('modelo', 'capacidad', 'dispositivo_personalizado'))
+    except (DatabaseError, ProgrammingError, OperationalError) as e:
+        logger.warning("[valoraciones] lote: lookup dispositivo_id falló: %s", str(e))
+    modelos = _por_id(Modelo, [d.get('modelo_id') for d in items if isinstance(d, dict)])
+    capacidades = _por_id(Capacidad, [d.get('capacidad_id') for d in items if isinstance(d, dict)],
+                          select_related=('modelo',))
+    configs = {g.tipo_dispositivo: g for g in GradingConfig.objects.filter(activo=True)}
+
+    # 2) Validación y resolución de cada dispositivo
+    resultados = [None] * len(items)
+    pendientes = []
+    for k, datos in enumerate(items):
+        if not isinstance(datos, dict):
+            resultados[k] = {"detail": "Cada dispositivo debe ser un objeto", "status": 400}
+            continue
+        try:
+            disp = dispositivos.get(_entero(datos.get('dispositivo_id')))
+            tipo = (tipo_desde_referencias(datos, disp, modelos.get(_entero(datos.get('modelo_id'))))
+                    or datos.get('tipo'))
+            if not tipo:
+                raise ErrorValoracion(
+                    "No se pudo determinar el tipo de dispositivo. Proporciona 'tipo', 'modelo_id' o 'dispositivo_id'."
+                )
+            ser = serializer_para_tipo(tipo)(data=datos)
+            if not ser.is_valid():
+                raise ErrorValoracion(ser.errors)
+            i = ser.validated_data
+            tipo = resolver_modelo_capacidad(i, tipo, disp, capacidades.get(i.get('capacidad_id')))
+        except ErrorValoracion as e:
+            resultados[k] = {"detail": e.detail, "status": e.status}
+            continue
+        canal, tenant_schema = canal_y_tenant(i, active_schema)
+        pendientes.append((k, tipo, i, canal, tenant_schema))
+
+    # 3) Precios por (canal, tenant) y costes en bloque
+    grupos: Dict[tuple, set] = {}
+    for _, _, i, canal, tenant_schema in pendientes:
+        grupos.setdefault((canal, tenant_schema), set()).add(i['capacidad_id'])
+    precios = {
+        grupo: precios_vigentes(cap_ids, *grupo)
+        for grupo, cap_ids in grupos.items()
+    }
+    costes = costes_reparacion((i['modelo_id'], i['capacidad_id']) for _, _, i, _, _ in pendientes)
+
+    # 4) Matriz de Params por (tipo, capacidad, canal, tenant) y cálculo
+    matriz: Dict[tuple, Params] = {}
+    for k, tipo, i, canal, tenant_schema in pendientes:
+        v_aplus = precios[(canal, tenant_schema)].get(int(i['capacidad_id']))
+        if v_aplus is None:
+            resultados[k] = {"detail": "No hay precio vigente para esa capacidad/canal.", "status": 404}
+            continue
+        clave = (tipo, i['capacidad_id'], canal, tenant_schema)
+        params = matriz.get(clave)
+        if params is None:
+            # iPhone: el cálculo de IphoneComercialValoracionView (sin GradingConfig)
+            config = None if tipo == TIPO_IPHONE else configs.get(tipo)
+            params = matriz[clave] = params_valoracion(
+                tipo, v_aplus, costes[(i['modelo_id'], i['capacidad_id'])], config
+            )
+        resultados[k] = resultado_valoracion(tipo, i, canal, tenant_schema, params)
+
+    logger.info(
+        "[valoraciones] lote: %s dispositivos, %s filas de matriz, %s errores",
+        len(items), len(matriz), sum(1 for r in resultados if "status" in r),
+    )
+    return resultados
+
+
+def _entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from productos.mapping.core.catalog_index import CatalogIndex
+from productos.services import costes_pieza
+from productos.services.precios_vigentes import sincronizar_precios_vigentes
+from .models.modelos import Modelo, Capacidad
+from .models.precios import (
+    CostoPieza,
+    ManoObraTipo,
+    PiezaAlias,
+    PiezaTipo,
+    PrecioDispositivoPersonalizado,
+    PrecioRecompra,
+)
+
+
+@receiver(post_save, sender=Modelo)
+@receiver(post_delete, sender=Modelo)
+@receiver(post_save, sender=Capacidad)
+@receiver(post_delete, sender=Capacidad)
+def invalidar_indice_catalogo(sender, instance, **kwargs):
+    # El índice en memoria del mapeo v4 se reconstruye en el siguiente acceso
+    CatalogIndex.invalidate()
+
+
+@receiver(post_save, sender=PrecioRecompra)
+@receiver(post_delete, sender=PrecioRecompra)
+def sincronizar_precio_vigente_capacidad(sender, instance, **kwargs):
+    sincronizar_precios_vigentes(capacidad_ids=[instance.capacidad_id])
+
+
+@receiver(post_save, sender=PrecioDispositivoPersonalizado)
+@receiver(post_delete, sender=PrecioDispositivoPersonalizado)
+def sincronizar_precio_vigente_personalizado(sender, instance, **kwargs):
+    sincronizar_precios_vigentes(dispositivo_ids=[instance.dispositivo_personalizado_id])
+
+
+@receiver(post_save, sender=PiezaTipo)
+def registrar_alias_pieza(sender, instance, **kwargs):
+    costes_pieza.registrar_alias(instance)
+
+
+@receiver(post_save, sender=CostoPieza)
+@receiver(post_delete, sender=CostoPieza)
+@receiver(post_save, sender=ManoObraTipo)
+@receiver(post_delete, sender=ManoObraTipo)
+@receiver(post_save, sender=PiezaTipo)
+@receiver(post_delete, sender=PiezaTipo)
+@receiver(post_save, sender=PiezaAlias)
+@receiver(post_delete, sender=PiezaAlias)
+def invalidar_costes_pieza(sender, instance, **kwargs):
+    # Otra vez al confirmar: un proceso que recargue antes del commit vería lo anterior
+    costes_pieza.invalidar()
+    transaction.on_commit(costes_pieza.invalidar)
@@ -0,0 +1,107 @@
+import pytest
+from decimal import Decimal
+from django.utils import timezone
+
+
+@pytest.fixture
+def capacidades():
+    from productos.models import Modelo, Capacidad
+
+    modelo = Modelo.objects.create(descripcion="iPhone 13", tipo="iPhone", marca="Apple", año=2021)
+    return [
+        Capacidad.objects.create(modelo=modelo, tamaño=f"{gb} GB", activo=True)
+        for gb in (128, 256, 512)
+    ]
+
+
+def _vigente(cap, canal="B2B"):
+    from productos.models import PrecioRecompra
+
+    return PrecioRecompra.objects.get(capacidad=cap, canal=canal, tenant_schema__isnull=True, valid_to__isnull=True)
+
+
+@pytest.mark.django_db
+def test_aplicar_cambios_insert_update_delete(capacidades):
+    """Inserta, versiona y cierra precios devolviendo contadores por tipo"""
+    from productos.models import PrecioRecompra
+    from productos.services.aplicar_precios import aplicar_cambios_precio
+
+    c128, c256, c512 = capacidades
+    antes = timezone.now() - timezone.timedelta(days=7)
+    PrecioRecompra.objects.create(capacidad=c256, canal="B2B", fuente="Likewize", precio_neto=Decimal("300.00"), valid_from=antes)
+    PrecioRecompra.objects.create(capacidad=c512, canal="B2B", fuente="Likewize", precio_neto=Decimal("400.00"), valid_from=antes)
+
+    applied = aplicar_cambios_precio(
+        PrecioRecompra,
+        [
+            {"capacidad_id": c128.id, "kind": "INSERT", "despues": "250.00"},
+            {"capacidad_id": c256.id, "kind": "UPDATE", "despues": "320.00"},
+            {"capacidad_id": c512.id, "kind": "DELETE", "despues": None},
+        ],
+        canal="B2B",
+        fuente="Likewize",
+    )
+
+    assert applied == {"INSERT": 1, "UPDATE": 1, "DELETE": 1}
+    assert _vigente(c128).precio_neto == Decimal("250.00")
+    assert _vigente(c256).precio_neto == Decimal("320.00")
+    assert PrecioRecompra.objects.filter(capacidad=c256).count() == 2
+    assert not PrecioRecompra.objects.filter(capacidad=c512, valid_to__isnull=True).exists()
+
+
+@pytest.mark.django_db
+def test_aplicar_cambios_mismo_precio_no_crea_version(capacidades):
+    """Si el vigente ya tiene el precio nuevo no se escribe nada"""
+    from productos.models import PrecioRecompra
+    from productos.services.aplicar_precios import aplicar_cambios_precio
+
+    cap = capacidades[0]
+    PrecioRecompra.objects.create(capacidad=cap, canal="B2B", fuente="manual", precio_neto=Decimal("250.00"), valid_from=timezone.now())
+
+    applied = aplicar_cambios_precio(
+        PrecioRecompra,
+        [{"capacidad_id": cap.id, "kind": "UPDATE", "despues": "250.00"}],
+        canal="B2B",
+        fuente="Likewize",
+    )
+
+    assert applied["UPDATE"] == 1
+    assert PrecioRecompra.objects.filter(capacidad=cap).count() == 1
+
+
+@pytest.mark.django_db
+def test_aplicar_cambios_queries_constantes(capacidades):
+    """El número de queries no crece con el número de cambios"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from productos.models import Modelo, Capacidad, PrecioRecompra
+    from productos.services.aplicar_precios import aplicar_cambios_precio
+
+    modelo = Modelo.objects.create(descripcion="iPhone 14", tipo="iPhone", marca="Apple", año=2022)
+    caps = Capacidad.objects.bulk_create([
+        Capacidad(modelo=modelo, tamaño=f"{i} GB", activo=True) for i in range(1, 201)
+    ])
+    antes = timezone.now() - timezone.timedelta(days=1)
+    PrecioRecompra.objects.bulk_create([
+        PrecioRecompra(capacidad=c, canal="B2B", fuente="Likewize", precio_neto=Decimal("100.00"), valid_from=antes)
+        for c in caps[:100]
+    ])
+    changes = (
+        [{"capacidad_id": c.id, "kind": "UPDATE", "despues": "110.00"} for c in caps[:100]]
+        + [{"capacidad_id": c.id, "kind": "INSERT", "despues": "90.00"} for c in caps[100:]]
+    )
+
+    with CaptureQueriesContext(connection) as ctx:
+        applied = aplicar_cambios_precio(PrecioRecompra, changes, canal="B2B", fuente="Likewize")
+
+    # django-tenants antepone un SET search_path a cada query; los savepoints no cuentan
+    sql = [
+        q["sql"] for q in ctx.captured_queries
+        if not q["sql"].startswith(("SET search_path", "SAVEPOINT", "RELEASE SAVEPOINT"))
+    ]
+    # select vigentes, update, insert + sincronización de PrecioVigente y de la
+    # rejilla de tramos del admin (advisory lock, select, delete, insert cada una)
+    assert len(sql) <= 11
+
+    assert applied == {"INSERT": 100, "UPDATE": 100, "DELETE": 0}
+    assert PrecioRecompra.objects.filter(valid_to__isnull=True, precio_neto=Decimal("110.00")).count() == 100
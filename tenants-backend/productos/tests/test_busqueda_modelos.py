@@ -0,0 +1,62 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+
+@pytest.fixture
+def catalogo():
+    from productos.models import Modelo
+
+    for descripcion, tipo, marca in (
+        ("iPhone 13 Pro", "iPhone", "Apple"),
+        ("iPhone 13", "iPhone", "Apple"),
+        ("iPad Air 13", "iPad", "Apple"),
+        ("Galaxy S23", "SmartPhone", "Samsung"),
+    ):
+        Modelo.objects.create(descripcion=descripcion, tipo=tipo, marca=marca, año=2022)
+
+
+@pytest.mark.django_db
+def test_vista_filtros_con_fallback_en_una_query(catalogo):
+    """tipo/marca restringen si alguien los cumple; si no, se ignoran, sin repetir la búsqueda"""
+    from productos.views.admincapacidades import ModeloSearchView
+
+    admin = get_user_model().objects.create_user(email="a@test.com", password="x", is_staff=True)
+    factory = APIRequestFactory()
+
+    def get(**params):
+        request = factory.get("/admin/modelos/search/", params)
+        force_authenticate(request, user=admin)
+        with CaptureQueriesContext(connection) as ctx:
+            data = ModeloSearchView.as_view()(request).data
+        return {m["descripcion"] for m in data}, len(ctx.captured_queries)
+
+    assert get(q="x")[0] == set()
+
+    nombres, _ = get(q="13", tipo="ipad")
+    assert nombres == {"iPad Air 13"}
+
+    nombres, queries_con_fallback = get(q="13", tipo="Mac")
+    assert nombres == {"iPhone 13 Pro", "iPhone 13", "iPad Air 13"}
+    _, queries_sin_filtros = get(q="13")
+    assert queries_con_fallback == queries_sin_filtros
+
+    nombres, _ = get(q="13", limit=1)
+    assert len(nombres) == 1
+
+
+@pytest.mark.django_db
+def test_trigramas_toleran_erratas_y_ordenan(catalogo):
+    from productos.services import busqueda_modelos
+
+    if not busqueda_modelos.trigram_disponible():
+        pytest.skip("pg_trgm no disponible en la base de datos de tests")
+
+    nombres = [m.descripcion for m in busqueda_modelos.buscar("iphnoe 13 pro")]
+    assert nombres[0] == "iPhone 13 Pro"
+    assert "Galaxy S23" not in nombres
+
+    # Contener el texto puntúa por encima de parecerse
+    assert busqueda_modelos.buscar("galaxy")[0].descripcion == "Galaxy S23"
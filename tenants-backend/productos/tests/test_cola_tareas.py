@@ -0,0 +1,162 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from django.utils import timezone
+
+
+@pytest.fixture
+def limites(settings):
+    settings.TAREAS_ACTUALIZACION_CONCURRENCIA = {"likewize": 1, "swappie": 1, "backmarket": 1}
+    settings.TAREAS_ACTUALIZACION_HEARTBEAT_TIMEOUT = 60
+    settings.TAREAS_ACTUALIZACION_MAX_INTENTOS = 2
+
+
+@pytest.mark.django_db
+def test_reclamar_respeta_limite_por_fuente(limites):
+    """Con el límite de una fuente ocupado se reclaman tareas de otras fuentes"""
+    from productos.services.cola_tareas import encolar, reclamar
+
+    lw1 = encolar("actualizar_likewize_v3", "likewize", {"mode": "apple"})
+    lw2 = encolar("actualizar_likewize_v3", "likewize", {"mode": "others"})
+    sw = encolar("actualizar_swappie_b2c", "swappie", {"country": "ES"})
+
+    assert reclamar("w1").id == lw1.id
+    assert reclamar("w2").id == sw.id
+    assert reclamar("w3") is None
+
+    lw1.refresh_from_db()
+    lw2.refresh_from_db()
+    assert (lw1.estado, lw1.worker, lw1.intentos) == ("RUNNING", "w1", 1)
+    assert lw2.estado == "PENDING"
+
+
+@pytest.mark.django_db
+def test_atascadas_se_reencolan_y_luego_fallan(limites):
+    """Sin heartbeat vuelven a PENDING hasta agotar intentos; después ERROR"""
+    from productos.models import TareaActualizacionLikewize
+    from productos.services.cola_tareas import encolar, marcar_atascadas, reclamar
+
+    tarea = encolar("actualizar_backmarket_b2c", "backmarket")
+    viejo = timezone.now() - timezone.timedelta(minutes=5)
+
+    for intento, esperado in ((1, (1, 0)), (2, (0, 1))):
+        assert reclamar("w1").id == tarea.id
+        TareaActualizacionLikewize.objects.filter(pk=tarea.pk).update(heartbeat_en=viejo, etapa="descarga")
+        assert marcar_atascadas() == esperado
+
+    tarea.refresh_from_db()
+    assert tarea.estado == "ERROR"
+    assert tarea.intentos == 2
+
+
+@pytest.mark.django_db
+def test_cancelar_en_cola_y_en_ejecucion(limites):
+    """PENDING se cancela al momento; RUNNING queda marcada aunque el comando haga save()"""
+    from productos.services.cola_tareas import cancelar, encolar, latido, reclamar
+
+    en_cola = encolar("actualizar_swappie_b2c", "swappie")
+    assert cancelar(en_cola).estado == "CANCELLED"
+    assert reclamar("w1") is None
+
+    en_marcha = encolar("actualizar_likewize_v3", "likewize")
+    copia_del_comando = reclamar("w1")
+    cancelar(en_marcha)
+
+    # El comando guarda su copia completa de la tarea (cancelar_solicitado=False)
+    copia_del_comando.progreso = 50
+    copia_del_comando.save()
+
+    assert latido(en_marcha.id, "w1") is True
+
+
+def _comando_lento(comando, tarea_id, parametros):
+    time.sleep(30)
+
+
+def _comando_que_falla(comando, tarea_id, parametros):
+    raise SystemExit(3)
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("target, estado", [(_comando_lento, "CANCELLED"), (_comando_que_falla, "ERROR")])
+def test_ejecutar_en_proceso_hijo(limites, monkeypatch, target, estado):
+    """El worker termina el hijo al cancelar y marca ERROR si el comando no cierra la tarea"""
+    from productos.services import cola_tareas
+
+    monkeypatch.setattr(cola_tareas, "_ejecutar_comando", target)
+    tarea = cola_tareas.encolar("actualizar_likewize_v3", "likewize")
+    tarea = cola_tareas.reclamar("w1")
+    if estado == "CANCELLED":
+        cola_tareas.cancelar(tarea)
+
+    t0 = time.monotonic()
+    assert cola_tareas.ejecutar(tarea, "w1", intervalo=0.1) == estado
+    assert time.monotonic() - t0 < 15
+
+
+def _comando_con_pool(comando, tarea_id, parametros):
+    # Como actualizar_likewize_v3 → map_many() con varios workers
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("fork")) as pool:
+        assert list(pool.map(abs, [-1, -2])) == [1, 2]
+    raise SystemExit(0)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_el_comando_puede_crear_procesos(limites, monkeypatch):
+    """El hijo no es daemon: el comando puede abrir su propio pool de procesos"""
+    from productos.services import cola_tareas
+
+    monkeypatch.setattr(cola_tareas, "_ejecutar_comando", _comando_con_pool)
+    cola_tareas.encolar("actualizar_likewize_v3", "likewize")
+    tarea = cola_tareas.reclamar("w1")
+
+    assert cola_tareas.ejecutar(tarea, "w1", intervalo=0.1) == "ERROR"
+    tarea.refresh_from_db()
+    assert tarea.error_message.endswith("código 0")
+
+
+@pytest.mark.django_db
+def test_remapear_se_encola_y_usa_los_workers_de_mapeo(settings, monkeypatch):
+    """La vista encola el remapeo; el comando mapea con MAPPING_V4_WORKERS y deja las stats en la tarea"""
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from productos.management.commands import remapear_likewize
+    from productos.models import LikewizeItemStaging, TareaActualizacionLikewize
+    from productos.services.cola_tareas import reclamar
+    from productos.views.actualizador import RemapearTareaLikewizeView
+
+    settings.MAPPING_V4_WORKERS = 3
+    origen = TareaActualizacionLikewize.objects.create(estado="SUCCESS")
+    for nombre in ("iPhone 13 128GB", "Desconocido", ""):
+        LikewizeItemStaging.objects.create(tarea=origen, tipo="iPhone", modelo_norm=nombre, modelo_raw=nombre)
+
+    admin = get_user_model().objects.create_user(email="remap@test.com", password="x", is_staff=True)
+    request = APIRequestFactory().post(f"/precios/likewize/tareas/{origen.id}/remapear/", {}, format="json")
+    force_authenticate(request, user=admin)
+    respuesta = RemapearTareaLikewizeView.as_view()(request, tarea_id=origen.id)
+    assert respuesta.status_code == 202
+    assert not LikewizeItemStaging.objects.filter(tarea=origen, capacidad_id__isnull=False).exists()
+
+    tarea = reclamar("w1")
+    assert (str(tarea.id), tarea.comando, tarea.fuente) == (respuesta.data["tarea_id"], "remapear_likewize", "remapeo")
+
+    llamadas = []
+
+    def map_devices(items, system, workers):
+        llamadas.append(workers)
+        return [{"success": True, "capacidad_id": 7, "confidence": 0.9, "strategy": "test"}
+                if i["FullName"].startswith("iPhone") else {"success": False, "confidence": 0}
+                for i in items]
+
+    monkeypatch.setattr(remapear_likewize, "map_devices", map_devices)
+    call_command(tarea.comando, tarea=str(tarea.id), **tarea.parametros)
+
+    tarea.refresh_from_db()
+    assert llamadas == [3]
+    assert tarea.estado == "SUCCESS"
+    assert tarea.meta["stats"] == {
+        "total": 3, "mapped": 1, "unmapped": 2, "processed": 1, "failed": 2, "system": "v4",
+    }
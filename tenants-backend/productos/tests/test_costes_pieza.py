@@ -0,0 +1,103 @@
+import pytest
+from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+
+@pytest.fixture
+def costes():
+    from productos.models import Modelo, Capacidad
+    from productos.models.precios import CostoPieza, ManoObraTipo, PiezaTipo
+
+    antes = timezone.now() - timezone.timedelta(days=1)
+    modelo = Modelo.objects.create(descripcion="iPhone Costes", tipo="iPhone", marca="Apple", año=2022)
+    cap = Capacidad.objects.create(modelo=modelo, tamaño="256 GB", activo=True)
+    mo = ManoObraTipo.objects.create(nombre="MO-costes", coste_por_hora=Decimal("40"))
+    bateria = PiezaTipo.objects.create(nombre="Batería")
+    lcd = PiezaTipo.objects.create(nombre="LCD")
+    CostoPieza.objects.create(modelo=modelo, pieza_tipo=bateria, coste_neto=Decimal("30"), mano_obra_tipo=mo,
+                              horas=Decimal("0.5"), mano_obra_fija_neta=Decimal("5"), valid_from=antes)
+    CostoPieza.objects.create(modelo=modelo, pieza_tipo=lcd, coste_neto=Decimal("80"), mano_obra_tipo=mo,
+                              horas=Decimal("1"), valid_from=antes)
+    return modelo, cap, mo, bateria, lcd
+
+
+@pytest.mark.django_db
+def test_alias_resuelve_piezas(costes):
+    """El nombre normalizado se registra solo; los alias añadidos amplían la búsqueda"""
+    from productos.models.precios import PiezaAlias
+    from productos.services.costes_pieza import PIEZAS, coste_pieza, piezas_ids
+
+    modelo, cap, _, bateria, lcd = costes
+    assert PiezaAlias.objects.get(pieza_tipo=bateria).alias == "bateria"
+    assert piezas_ids(PIEZAS["pr_bateria"]) == {bateria.id}
+
+    # 'LCD' no contiene ningún nombre de pantalla hasta que se le da un alias
+    assert coste_pieza(modelo.id, cap.id, PIEZAS["pr_pantalla"]) is None
+    PiezaAlias.objects.create(alias="pantalla lcd", pieza_tipo=lcd)
+    assert coste_pieza(modelo.id, cap.id, PIEZAS["pr_pantalla"]) == Decimal("120")
+
+
+@pytest.mark.django_db
+def test_cache_e_invalidacion(costes):
+    """Las consultas repetidas no van a BD; cambios de coste o tarifa se ven al momento"""
+    from productos.models.precios import CostoPieza
+    from productos.services.costes_pieza import PIEZAS, coste_pieza, costes_reparacion
+
+    modelo, cap, mo, bateria, _ = costes
+    assert coste_pieza(modelo.id, cap.id, PIEZAS["pr_bateria"]) == Decimal("55")
+    with CaptureQueriesContext(connection) as ctx:
+        assert costes_reparacion([(modelo.id, cap.id)])[(modelo.id, cap.id)]["pr_bateria"] == 55
+    assert len(ctx.captured_queries) == 0
+
+    mo.coste_por_hora = Decimal("60")
+    mo.save()
+    assert coste_pieza(modelo.id, cap.id, PIEZAS["pr_bateria"]) == Decimal("65")
+
+    # La versión de la capacidad gana; una versión futura no cuenta todavía
+    ahora = timezone.now()
+    CostoPieza.objects.create(modelo=modelo, capacidad=cap, pieza_tipo=bateria, coste_neto=Decimal("50"),
+                              mano_obra_tipo=mo, valid_from=ahora - timezone.timedelta(hours=1))
+    CostoPieza.objects.create(modelo=modelo, pieza_tipo=bateria, coste_neto=Decimal("99"),
+                              mano_obra_tipo=mo, valid_from=ahora + timezone.timedelta(days=1))
+    assert coste_pieza(modelo.id, cap.id, PIEZAS["pr_bateria"]) == Decimal("50")
+    assert coste_pieza(modelo.id, None, PIEZAS["pr_bateria"]) == Decimal("65")
+
+
+@pytest.mark.django_db
+def test_cache_caduca_sin_senales(costes, settings):
+    """Un update() masivo no dispara señales: lo recoge la recarga por antigüedad"""
+    from productos.models.precios import CostoPieza
+    from productos.services.costes_pieza import PIEZAS, coste_pieza
+
+    modelo, cap, _, bateria, _ = costes
+    assert coste_pieza(modelo.id, cap.id, PIEZAS["pr_bateria"]) == Decimal("55")
+    CostoPieza.objects.filter(pieza_tipo=bateria).update(coste_neto=Decimal("10"))
+    assert coste_pieza(modelo.id, cap.id, PIEZAS["pr_bateria"]) == Decimal("55")
+
+    settings.COSTES_PIEZA_MAX_AGE = 0.000001
+    assert coste_pieza(modelo.id, cap.id, PIEZAS["pr_bateria"]) == Decimal("35")
+
+
+@pytest.mark.django_db
+def test_piezas_con_el_mismo_nombre_normalizado(costes, caplog):
+    """Dos PiezaTipo que normalizan igual comparten el alias: se avisa y ninguna se queda sin coste"""
+    import logging
+    from productos.models import Modelo
+    from productos.models.precios import CostoPieza, PiezaAlias, PiezaTipo
+    from productos.services.costes_pieza import PIEZAS, costes_reparacion, piezas_ids
+
+    modelo, cap, mo, bateria, _ = costes
+    with caplog.at_level(logging.WARNING, logger="productos.services.costes_pieza"):
+        duplicada = PiezaTipo.objects.create(nombre="BATERIA")
+    assert "bateria" in caplog.text
+
+    assert set(PiezaAlias.objects.filter(alias="bateria").values_list("pieza_tipo_id", flat=True)) == {bateria.id, duplicada.id}
+    assert piezas_ids(PIEZAS["pr_bateria"]) == {bateria.id, duplicada.id}
+
+    # Un modelo cuyo coste de batería solo está en la pieza duplicada
+    otro = Modelo.objects.create(descripcion="iPhone Duplicada", tipo="iPhone", marca="Apple", año=2022)
+    CostoPieza.objects.create(modelo=otro, pieza_tipo=duplicada, coste_neto=Decimal("25"), mano_obra_tipo=mo,
+                              valid_from=timezone.now() - timezone.timedelta(days=1))
+    assert costes_reparacion([(otro.id, None)])[(otro.id, None)]["pr_bateria"] == 25
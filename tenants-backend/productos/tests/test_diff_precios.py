@@ -0,0 +1,128 @@
+import pandas as pd
+import pytest
+from decimal import Decimal
+from django.utils import timezone
+
+
+@pytest.fixture
+def escenario():
+    """
+    iPhone 13: 128 sin cambio, 256 sube, 512 en staging sin mapear, 1 TB nueva.
+    iPhone 12 128 GB tiene precio y ya no viene en staging.
+    """
+    from productos.models import Capacidad, LikewizeItemStaging, Modelo, PrecioRecompra, TareaActualizacionLikewize
+
+    m13 = Modelo.objects.create(descripcion="iPhone 13", tipo="iPhone", marca="Apple", año=2021)
+    m12 = Modelo.objects.create(descripcion="iPhone 12", tipo="iPhone", marca="Apple", año=2020)
+    caps = {gb: Capacidad.objects.create(modelo=m13, tamaño=f"{gb} GB", activo=True) for gb in (128, 256, 512)}
+    caps[1024] = Capacidad.objects.create(modelo=m13, tamaño="1 TB", activo=True)
+    caps["12"] = Capacidad.objects.create(modelo=m12, tamaño="128 GB", activo=True)
+
+    antes = timezone.now() - timezone.timedelta(days=1)
+    for key, precio in ((128, "300.00"), (256, "350.00"), (512, "400.00"), ("12", "150.00")):
+        PrecioRecompra.objects.create(
+            capacidad=caps[key], canal="B2B", fuente="Likewize", precio_neto=Decimal(precio), valid_from=antes,
+        )
+
+    tarea = TareaActualizacionLikewize.objects.create(estado="SUCCESS", meta={"mode": "apple"})
+    for gb, cap, precio in ((128, caps[128], "300.00"), (256, caps[256], "365.50"), (512, None, "390.00"), (1024, caps[1024], "500.00")):
+        LikewizeItemStaging.objects.create(
+            tarea=tarea, tipo="iPhone", marca="Apple", modelo_norm="iPhone 13",
+            modelo_raw=f"APPLE IPHONE 13 {gb}GB", almacenamiento_gb=gb,
+            precio_b2b=Decimal(precio), capacidad_id=cap.id if cap else None,
+        )
+    return tarea, caps
+
+
+@pytest.mark.django_db
+def test_diff_likewize_conjuntos_y_rescate(escenario):
+    """INSERT/UPDATE/DELETE por merge; la baja que está en staging sin mapear es UPDATE"""
+    from productos.services.diff_precios import calcular_diff
+
+    tarea, caps = escenario
+    diff = calcular_diff(tarea, "likewize")
+
+    assert diff["summary"] == {"inserts": 1, "updates": 2, "deletes": 1, "no_mapeados": 1, "total": 4}
+    por_cap = {ch["capacidad_id"]: ch for ch in diff["changes"]}
+    assert por_cap[caps[1024].id]["id"] == f"I|{caps[1024].id}|500.00"
+    assert por_cap[caps[1024].id]["almacenamiento_gb"] == 1024
+
+    upd = por_cap[caps[256].id]
+    assert (upd["id"], upd["antes"], upd["despues"], upd["delta"]) == (
+        f"U|{caps[256].id}|350.00|365.50", "350.00", "365.50", 15.5,
+    )
+    rescatada = por_cap[caps[512].id]
+    assert rescatada["kind"] == "UPDATE"
+    assert rescatada["nombre_likewize_original"] == "APPLE IPHONE 13 512GB"
+    assert rescatada["delta"] == -10.0
+
+    baja = por_cap[caps["12"].id]
+    assert (baja["kind"], baja["antes"], baja["modelo_norm"], baja["almacenamiento_gb"]) == ("DELETE", "150.00", "iPhone 12", 128)
+    assert caps[128].id not in por_cap
+
+
+@pytest.mark.django_db
+def test_diff_cacheado_hasta_que_cambian_los_vigentes(escenario):
+    """La segunda lectura solo cuesta la huella; Aplicar invalida por huella"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from productos.models import PrecioRecompra
+    from productos.services.aplicar_precios import aplicar_cambios_precio
+    from productos.services.diff_precios import diff_tarea
+
+    tarea, caps = escenario
+    primero = diff_tarea(tarea, "likewize")
+
+    with CaptureQueriesContext(connection) as ctx:
+        assert diff_tarea(tarea, "likewize") == primero
+    assert len([q for q in ctx.captured_queries if "search_path" not in q["sql"]]) == 2
+
+    aplicar_cambios_precio(PrecioRecompra, primero["changes"], canal="B2B", fuente="Likewize")
+    assert diff_tarea(tarea, "likewize")["summary"]["total"] == 0
+
+
+def test_paginar_diff():
+    """Las páginas cortan changes; summary y el resto se devuelven enteros"""
+    from productos.services.diff_precios import paginar_diff
+
+    diff = {
+        "summary": {"total": 5},
+        "changes": [{"id": str(i), "kind": "UPDATE" if i % 2 else "INSERT"} for i in range(5)],
+        "no_mapeados": [],
+    }
+    assert paginar_diff(diff) is diff
+
+    pagina = paginar_diff(diff, page="2", page_size="2")
+    assert [ch["id"] for ch in pagina["changes"]] == ["2", "3"]
+    assert pagina["pagination"] == {"page": 2, "page_size": 2, "count": 5, "pages": 3}
+    assert pagina["summary"] == {"total": 5}
+
+    solo_updates = paginar_diff(diff, kind="update")
+    assert [ch["id"] for ch in solo_updates["changes"]] == ["1", "3"]
+
+
+def test_clasificar_s_vs_e():
+    """A1/A2/B/C con las claves extraídas de las descripciones de E"""
+    from productos.services.diff_precios import claves_capacidades, clasificar_s_vs_e
+
+    E = claves_capacidades(pd.DataFrame([
+        {"cap_id": 1, "descripcion": "MacBook Pro 14 inch A2442 M1 Pro 16 Core GPU", "pantalla": "", "any": 2021, "tamaño": "512 GB", "procesador": "M1 Pro"},
+        {"cap_id": 2, "descripcion": "MacBook Pro 14 inch A2442 M1 Pro 16 Core GPU", "pantalla": "", "any": 2021, "tamaño": "1 TB", "procesador": "M1 Pro"},
+        {"cap_id": 3, "descripcion": "iMac A1419", "pantalla": "27 pulgadas", "any": 2017, "tamaño": "1TB", "procesador": "Core i5 3.8"},
+    ]))
+    assert E.loc[0, "a_number"] == "A2442"
+    assert E.loc[0, "pulgadas"] == 14 and E.loc[2, "pulgadas"] == 27
+    assert E.loc[1, "almacenamiento_gb"] == 1024
+    assert E.loc[0, "gpu_cores"] == 16
+
+    S = pd.DataFrame([
+        {"a_number": "A2442", "pulgadas": 14, "any": 2021, "almacenamiento_gb": 512},
+        {"a_number": "A2442", "pulgadas": 14, "any": 2021, "almacenamiento_gb": 2048},
+        {"a_number": "A2485", "pulgadas": 16, "any": 2021, "almacenamiento_gb": 512},
+    ])
+    buckets = clasificar_s_vs_e(S, E)
+    assert buckets["A1"]["cap_id"].tolist() == [3]
+    assert buckets["A2"]["cap_id"].tolist() == [2]
+    assert buckets["A2*"].empty
+    assert buckets["B"]["almacenamiento_gb"].tolist() == [2048]
+    assert buckets["C"]["a_number"].tolist() == ["A2485"]
@@ -0,0 +1,88 @@
+import numpy as np
+from hypothesis import given, settings, strategies as st
+
+from productos.services.grading import Params, calcular, topes, v_suelo_desde_max
+from productos.services.grading_columnas import (
+    BOOLEANOS,
+    ESTADOS,
+    calcular_columnas,
+    columnas,
+    params_columnas,
+    topes_columnas,
+    v_suelo_columnas,
+)
+
+
+def _estado(valores):
+    # Conocidos, None, vacío y desconocidos: calcular() trata cada uno distinto
+    return st.one_of(st.sampled_from(valores), st.none(), st.just(''), st.text(max_size=3))
+
+
+entradas = st.fixed_dictionaries(
+    {},
+    optional={
+        **{campo: _estado(valores) for campo, valores in ESTADOS.items()},
+        **{campo: st.sampled_from([True, False, None]) for campo in BOOLEANOS},
+        "battery_health_pct": st.one_of(st.none(), st.integers(0, 100)),
+    },
+)
+
+
+@st.composite
+def params(draw):
+    V_Aplus = draw(st.integers(0, 3000))
+    V_suelo, regla = v_suelo_desde_max(V_Aplus)
+    pp = st.floats(0, 0.6, allow_nan=False)
+    coste = st.integers(0, 400)
+    return Params(
+        V_Aplus=V_Aplus, pp_A=draw(pp), pp_B=draw(pp), pp_C=draw(pp), V_suelo=V_suelo,
+        pr_bateria=draw(coste), pr_pantalla=draw(coste), pr_chasis=draw(coste), v_suelo_regla=regla,
+        has_battery=draw(st.booleans()), has_display=draw(st.booleans()),
+    )
+
+
+def _fila(res, k):
+    return {
+        "oferta": int(res["oferta"][k]),
+        "gate": res["gate"][k],
+        "grado_estetico": res["grado"][k],
+        "V_A": int(res["V_A"][k]), "V_B": int(res["V_B"][k]), "V_C": int(res["V_C"][k]),
+        "V_tope": int(res["V_tope"][k]),
+        "deducciones": (int(res["pr_bat"][k]), int(res["pr_pant"][k]), int(res["pr_chas"][k])),
+    }
+
+
+def _escalar(p, i):
+    out = calcular(p, i)
+    d = out["deducciones"]
+    return {
+        **{k: out[k] for k in ("oferta", "gate", "grado_estetico", "V_A", "V_B", "V_C", "V_tope")},
+        "deducciones": (d["pr_bat"], d["pr_pant"], d["pr_chas"]),
+    }
+
+
+@given(p=params(), items=st.lists(entradas, min_size=1, max_size=30))
+@settings(deadline=None, max_examples=300)
+def test_columnas_igual_que_calcular(p, items):
+    """Mismos Params para todas las filas"""
+    res = calcular_columnas(columnas(items), p)
+    for k, i in enumerate(items):
+        assert _fila(res, k) == _escalar(p, i)
+        assert res["reciclaje"][k] == (res["grado"][k] == "R")
+
+
+@given(filas=st.lists(st.tuples(params(), entradas), min_size=1, max_size=30))
+@settings(deadline=None, max_examples=200)
+def test_columnas_con_params_por_fila(filas):
+    """Params distintos en cada fila (simulaciones)"""
+    res = calcular_columnas(columnas(i for _, i in filas), params_columnas(p for p, _ in filas))
+    for k, (p, i) in enumerate(filas):
+        assert _fila(res, k) == _escalar(p, i)
+
+
+@given(st.lists(st.integers(0, 10**6), min_size=1, max_size=50), st.floats(0, 0.9), st.floats(0, 0.9), st.floats(0, 0.9))
+@settings(deadline=None)
+def test_suelo_y_topes(valores, ppA, ppB, ppC):
+    assert v_suelo_columnas(valores).tolist() == [v_suelo_desde_max(v)[0] for v in valores]
+    A, B, C = topes_columnas(np.array(valores), ppA, ppB, ppC)
+    assert list(zip(A.tolist(), B.tolist(), C.tolist())) == [topes(v, ppA, ppB, ppC) for v in valores]
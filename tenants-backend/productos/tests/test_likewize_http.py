@@ -0,0 +1,122 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class _StubLikewize(BaseHTTPRequestHandler):
+    """Servidor local que imita Home.aspx/* de Likewize."""
+
+    delay = 0.0
+    fallos = 0  # respuestas 503 antes de contestar bien
+    lock = threading.Lock()
+    en_vuelo = 0
+    max_en_vuelo = 0
+    peticiones = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        cls = type(self)
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with cls.lock:
+            cls.peticiones += 1
+            fallar = cls.fallos > 0
+            if fallar:
+                cls.fallos -= 1
+            cls.en_vuelo += 1
+            cls.max_en_vuelo = max(cls.max_en_vuelo, cls.en_vuelo)
+        try:
+            time.sleep(cls.delay)
+            if fallar:
+                self.send_response(503)
+                self.end_headers()
+                return
+            if self.path.endswith("GetSelectedModels"):
+                data = [{"MasterModelId": str(i)} for i in range(12)]
+            elif self.path.endswith("GetSelectedCapacitys"):
+                mid = body["masterModelId"]
+                # ASP.NET a veces devuelve "d" como string JSON
+                data = json.dumps([{"PhoneModelId": f"{mid}-{gb}", "Capacity": f"{gb}GB"} for gb in (128, 256)])
+            else:
+                data = []
+            payload = json.dumps({"d": data}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        finally:
+            with cls.lock:
+                cls.en_vuelo -= 1
+
+
+@pytest.fixture
+def stub():
+    handler = type("Handler", (_StubLikewize,), {"lock": threading.Lock()})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield handler, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_capacidades_many_en_paralelo_acotado(stub):
+    """Las variantes se descargan con como mucho `concurrency` peticiones a la vez"""
+    from productos.services.likewize_http import LikewizeClient
+
+    handler, url = stub
+    handler.delay = 0.2
+    with LikewizeClient(base_url=url, concurrency=4, rate=0, retries=0) as client:
+        modelos = client.modelos(1, brand_id=2)
+        t0 = time.monotonic()
+        capacidades = client.capacidades_many(m["MasterModelId"] for m in modelos)
+        elapsed = time.monotonic() - t0
+
+    assert len(capacidades) == 12
+    assert capacidades["3"] == [
+        {"PhoneModelId": "3-128", "Capacity": "128GB"},
+        {"PhoneModelId": "3-256", "Capacity": "256GB"},
+    ]
+    assert handler.max_en_vuelo == 4
+    # 12 peticiones de 0.2s con 4 en paralelo ≈ 0.6s (en serie serían 2.4s)
+    assert elapsed < 1.5
+
+
+def test_reintenta_errores_5xx(stub):
+    """Un 503 transitorio se reintenta con backoff en vez de devolver vacío"""
+    from productos.services.likewize_http import LikewizeClient
+
+    handler, url = stub
+    handler.fallos = 2
+    with LikewizeClient(base_url=url, concurrency=1, rate=0, retries=3, backoff=0.01) as client:
+        assert len(client.capacidades("7")) == 2
+    assert handler.peticiones == 3
+
+
+def test_sin_reintentos_devuelve_lista_vacia(stub):
+    """Agotados los reintentos se devuelve [] como las funciones originales"""
+    from productos.services.likewize_http import LikewizeClient
+
+    handler, url = stub
+    handler.fallos = 5
+    with LikewizeClient(base_url=url, concurrency=1, rate=0, retries=1, backoff=0.01) as client:
+        assert client.capacidades("7") == []
+
+
+def test_rate_limiter_espacia_por_host():
+    """El limitador reparte turnos separados 1/rate por host, no entre hosts distintos"""
+    from productos.services.likewize_http import RateLimiter
+
+    limiter = RateLimiter(rate=20)
+    t0 = time.monotonic()
+    for _ in range(5):
+        limiter.wait("a")
+    limiter.wait("b")
+    elapsed = time.monotonic() - t0
+
+    assert 0.18 <= elapsed < 0.5
@@ -0,0 +1,129 @@
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from productos.services.log_tareas import (
+    TaskLog,
+    actualizar_progreso,
+    grupo_tarea,
+    tail_sin_indice,
+)
+
+
+def test_after_devuelve_solo_eventos_nuevos(tmp_path):
+    """after(offset) devuelve los eventos desde offset y el offset siguiente"""
+    log = TaskLog(tmp_path / "log.txt")
+    for i in range(5):
+        log.append(f"evento {i}", "WARNING" if i == 3 else "INFO")
+
+    eventos, offset = log.after(0, limit=2)
+    assert [e["seq"] for e in eventos] == [0, 1]
+    assert offset == 2
+
+    log.append("evento 5")
+    eventos, offset = log.after(offset)
+    assert [e["line"].split(" ", 1)[1] for e in eventos] == ["evento 2", "evento 3", "evento 4", "evento 5"]
+    assert eventos[1]["level"] == "WARNING"
+    assert offset == 6
+    assert log.after(offset) == ([], 6)
+
+
+def test_tail_lee_solo_lo_necesario(tmp_path, monkeypatch):
+    """tail(n) lee n eventos aunque el log sea grande"""
+    log = TaskLog(tmp_path / "log.txt")
+    for i in range(2000):
+        log.append(f"linea {i} " + "x" * 200)
+
+    leidos = []
+    real_open = open
+
+    class Contador:
+        def __init__(self, fh):
+            self.fh = fh
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self.fh.close()
+
+        def seek(self, *args):
+            return self.fh.seek(*args)
+
+        def read(self, size=-1):
+            data = self.fh.read(size)
+            leidos.append(len(data))
+            return data
+
+    monkeypatch.setattr("builtins.open", lambda *a, **kw: Contador(real_open(*a, **kw)))
+    eventos, offset = log.tail(3)
+    monkeypatch.undo()
+
+    assert offset == 2000
+    assert [e["line"].split(" ")[2] for e in eventos] == ["1997", "1998", "1999"]
+    assert sum(leidos) < 1000
+
+
+def test_tail_sin_indice_para_logs_antiguos(tmp_path):
+    """Los log.txt previos (sin .idx) se leen desde el final"""
+    path = tmp_path / "log.txt"
+    path.write_text("".join(f"linea {i}\n" for i in range(10000)), encoding="utf-8")
+
+    assert tail_sin_indice(path, 2) == ["linea 9998", "linea 9999"]
+    eventos, offset = TaskLog(path).tail(2)
+    assert [e["line"] for e in eventos] == ["linea 9998", "linea 9999"]
+    assert offset == 0
+
+
+@pytest.mark.django_db
+def test_progreso_se_publica_y_se_persiste_espaciado(settings):
+    """Cada paso se publica por Channels; la BD solo se escribe cada PROGRESO_INTERVALO"""
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+    from productos.models import TareaActualizacionLikewize
+
+    settings.CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+    tarea = TareaActualizacionLikewize.objects.create()
+    layer = get_channel_layer()
+    canal = async_to_sync(layer.new_channel)()
+    async_to_sync(layer.group_add)(grupo_tarea(tarea.id), canal)
+
+    for pct in (10, 20, 30):
+        actualizar_progreso(tarea, pct, f"paso {pct}")
+
+    mensajes = [async_to_sync(layer.receive)(canal) for _ in range(3)]
+    assert [m["progreso"] for m in mensajes] == [10, 20, 30]
+    tarea.refresh_from_db()
+    assert (tarea.progreso, tarea.subestado) == (10, "paso 10")
+
+    actualizar_progreso(tarea, 100, "fin")
+    tarea.refresh_from_db()
+    assert tarea.progreso == 100
+
+
+@pytest.mark.django_db
+def test_vista_log_incremental(tmp_path):
+    """El endpoint devuelve offset y, con ?after=, solo lo nuevo"""
+    from productos.models import TareaActualizacionLikewize
+    from productos.views.actualizador import LogTailLikewizeView
+
+    tarea = TareaActualizacionLikewize.objects.create(log_path=str(tmp_path / "log.txt"))
+    for i in range(3):
+        tarea.add_log(f"mensaje {i}")
+
+    admin = get_user_model().objects.create_user(email="a@test.com", password="x", is_staff=True)
+    factory = APIRequestFactory()
+
+    def get(**params):
+        request = factory.get("/log/", params)
+        force_authenticate(request, user=admin)
+        return LogTailLikewizeView.as_view()(request, tarea_id=tarea.id).data
+
+    data = get(n=2)
+    assert data["offset"] == 3
+    assert [ln.split(" ", 1)[1] for ln in data["lines"]] == ["mensaje 1", "mensaje 2"]
+
+    tarea.add_log("mensaje 3", "ERROR")
+    data = get(after=data["offset"])
+    assert [e["level"] for e in data["events"]] == ["ERROR"]
+    assert data["offset"] == 4
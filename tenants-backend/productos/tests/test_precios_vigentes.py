@@ -0,0 +1,181 @@
+import pytest
+from decimal import Decimal
+from django.utils import timezone
+
+
+@pytest.fixture
+def capacidades():
+    from productos.models import Modelo, Capacidad
+
+    modelo = Modelo.objects.create(descripcion="iPhone 13", tipo="iPhone", marca="Apple", año=2021)
+    return [
+        Capacidad.objects.create(modelo=modelo, tamaño=f"{gb} GB", activo=True)
+        for gb in (128, 256, 512)
+    ]
+
+
+@pytest.mark.django_db
+def test_senal_sincroniza_vigente(capacidades):
+    """Crear y cerrar versiones de PrecioRecompra actualiza PrecioVigente"""
+    from productos.models import PrecioRecompra, PrecioVigente
+    from productos.services.precios_vigentes import precio_vigente
+
+    cap = capacidades[0]
+    p = PrecioRecompra.objects.create(
+        capacidad=cap, canal="B2B", fuente="manual", precio_neto=Decimal("250.00"),
+        valid_from=timezone.now() - timezone.timedelta(days=1),
+    )
+    assert precio_vigente(cap.id, "B2B") == Decimal("250.00")
+
+    p.valid_to = timezone.now()
+    p.save()
+    assert precio_vigente(cap.id, "B2B") is None
+    assert not PrecioVigente.objects.filter(capacidad=cap).exists()
+
+
+@pytest.mark.django_db
+def test_override_tenant_gana_sobre_global(capacidades):
+    """El precio del tenant tiene prioridad; sin override se usa el global"""
+    from productos.models import PrecioRecompra
+    from productos.services.precios_vigentes import precio_vigente
+
+    cap = capacidades[0]
+    antes = timezone.now() - timezone.timedelta(days=1)
+    PrecioRecompra.objects.create(capacidad=cap, canal="B2B", fuente="manual", precio_neto=Decimal("250.00"), valid_from=antes)
+    PrecioRecompra.objects.create(
+        capacidad=cap, canal="B2B", fuente="manual", precio_neto=Decimal("270.00"),
+        valid_from=antes, tenant_schema="acme",
+    )
+
+    assert precio_vigente(cap.id, "B2B", "acme") == Decimal("270.00")
+    assert precio_vigente(cap.id, "B2B", "otro") == Decimal("250.00")
+    assert precio_vigente(cap.id, "B2B") == Decimal("250.00")
+    assert precio_vigente(cap.id, "B2C", "acme") is None
+
+
+@pytest.mark.django_db
+def test_lectura_por_lote_una_query(capacidades):
+    """precios_vigentes() resuelve todas las capacidades en una sola query"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from productos.models import PrecioRecompra
+    from productos.services.precios_vigentes import precios_vigentes
+
+    antes = timezone.now() - timezone.timedelta(days=1)
+    for i, cap in enumerate(capacidades):
+        PrecioRecompra.objects.create(
+            capacidad=cap, canal="B2C", fuente="manual", precio_neto=Decimal(100 + i), valid_from=antes,
+        )
+
+    with CaptureQueriesContext(connection) as ctx:
+        precios = precios_vigentes([c.id for c in capacidades], "B2C", "acme")
+
+    # django-tenants antepone un SET search_path a cada query
+    sql = [q["sql"] for q in ctx.captured_queries if not q["sql"].startswith("SET search_path")]
+    assert len(sql) == 1
+    assert precios == {c.id: Decimal(100 + i) for i, c in enumerate(capacidades)}
+
+
+@pytest.mark.django_db
+def test_aplicar_cambios_sincroniza_vigentes(capacidades):
+    """Las escrituras en bloque (sin señales) también actualizan el almacén"""
+    from productos.models import PrecioRecompra
+    from productos.services.aplicar_precios import aplicar_cambios_precio
+    from productos.services.precios_vigentes import precios_vigentes
+
+    c128, c256, c512 = capacidades
+    antes = timezone.now() - timezone.timedelta(days=7)
+    PrecioRecompra.objects.create(capacidad=c256, canal="B2B", fuente="Likewize", precio_neto=Decimal("300.00"), valid_from=antes)
+    PrecioRecompra.objects.create(capacidad=c512, canal="B2B", fuente="Likewize", precio_neto=Decimal("400.00"), valid_from=antes)
+
+    aplicar_cambios_precio(
+        PrecioRecompra,
+        [
+            {"capacidad_id": c128.id, "kind": "INSERT", "despues": "250.00"},
+            {"capacidad_id": c256.id, "kind": "UPDATE", "despues": "320.00"},
+            {"capacidad_id": c512.id, "kind": "DELETE", "despues": None},
+        ],
+        canal="B2B",
+        fuente="Likewize",
+    )
+
+    assert precios_vigentes([c.id for c in capacidades], "B2B") == {
+        c128.id: Decimal("250.00"),
+        c256.id: Decimal("320.00"),
+    }
+
+
+@pytest.mark.django_db
+def test_precio_programado_entra_solo_a_su_hora(capacidades, monkeypatch):
+    """Un cambio con effective_at futuro se aplica sin resincronizar el almacén"""
+    from productos.models.utils import set_precio_recompra
+    from productos.services.precios_vigentes import precio_vigente
+
+    cap = capacidades[0]
+    ahora = timezone.now()
+    set_precio_recompra(capacidad_id=cap.id, canal="B2B", precio_neto=Decimal("250.00"),
+                        effective_at=ahora - timezone.timedelta(days=1))
+    set_precio_recompra(capacidad_id=cap.id, canal="B2B", precio_neto=Decimal("230.00"),
+                        effective_at=ahora + timezone.timedelta(hours=1))
+    assert precio_vigente(cap.id, "B2B") == Decimal("250.00")
+
+    monkeypatch.setattr(timezone, "now", lambda: ahora + timezone.timedelta(hours=2))
+    assert precio_vigente(cap.id, "B2B") == Decimal("230.00")
+
+
+@pytest.mark.django_db(transaction=True)
+def test_sincronizar_misma_capacidad_se_serializa(capacidades):
+    """Una segunda sincronización de la capacidad espera al commit de la primera y no choca"""
+    import threading
+    from django.db import connection, transaction
+    from productos.models import PrecioRecompra, PrecioVigente
+    from productos.services.precios_vigentes import sincronizar_precios_vigentes
+
+    cap = capacidades[0]
+    antes = timezone.now() - timezone.timedelta(days=1)
+    errores, terminada = [], threading.Event()
+
+    def segunda():
+        try:
+            sincronizar_precios_vigentes(capacidad_ids=[cap.id])
+        except Exception as e:
+            errores.append(e)
+        finally:
+            connection.close()
+            terminada.set()
+
+    with transaction.atomic():
+        PrecioRecompra.objects.create(capacidad=cap, canal="B2B", fuente="manual", precio_neto=Decimal("250.00"), valid_from=antes)
+        hilo = threading.Thread(target=segunda)
+        hilo.start()
+        assert not terminada.wait(0.5)
+    hilo.join(10)
+
+    assert terminada.is_set() and errores == []
+    assert list(PrecioVigente.objects.filter(capacidad=cap).values_list("precio_neto", flat=True)) == [Decimal("250.00")]
+
+
+@pytest.mark.django_db
+def test_reconstruccion_completa_por_lotes(capacidades, monkeypatch):
+    """todo=True recorre las capacidades por lotes y purga las versiones caducadas"""
+    from productos.models import PrecioRecompra, PrecioVigente
+    from productos.services import precios_vigentes as pv
+
+    monkeypatch.setattr(pv, "BULK_BATCH_SIZE", 2)
+    ahora = timezone.now()
+    for i, cap in enumerate(capacidades):
+        PrecioRecompra.objects.create(
+            capacidad=cap, canal="B2C", fuente="manual", precio_neto=Decimal(100 + i),
+            valid_from=ahora - timezone.timedelta(days=2),
+        )
+    caducado = PrecioRecompra.objects.create(
+        capacidad=capacidades[0], canal="B2B", fuente="manual", precio_neto=Decimal("90.00"),
+        valid_from=ahora - timezone.timedelta(days=2), valid_to=ahora + timezone.timedelta(days=1),
+    )
+    PrecioRecompra.objects.filter(pk=caducado.pk).update(valid_to=ahora - timezone.timedelta(days=1))
+
+    assert pv.sincronizar_precios_vigentes(todo=True) == 3
+    assert not PrecioVigente.objects.filter(canal="B2B").exists()
+    assert pv.precios_vigentes([c.id for c in capacidades], "B2C") == {
+        c.id: Decimal(100 + i) for i, c in enumerate(capacidades)
+    }
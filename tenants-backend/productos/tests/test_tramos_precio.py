@@ -0,0 +1,118 @@
+import pytest
+from decimal import Decimal
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+CAMPOS = ("_b2b", "_b2b_from", "_b2b_to", "_b2b_src", "_b2c", "_b2c_from", "_b2c_to", "_b2c_src")
+
+
+def _subqueries(qs, fecha):
+    # Implementación anterior de annotate_capacidades, como referencia
+    from productos.models import PrecioRecompra
+
+    base = (PrecioRecompra.objects
+            .filter(capacidad_id=OuterRef("pk"), valid_from__lte=fecha)
+            .filter(Q(valid_to__isnull=True) | Q(valid_to__gt=fecha))
+            .order_by("-valid_from"))
+    anotaciones = {}
+    for canal in ("B2B", "B2C"):
+        c = base.filter(canal=canal)
+        pref = f"_{canal.lower()}"
+        anotaciones.update({
+            pref: Subquery(c.values("precio_neto")[:1]),
+            f"{pref}_from": Subquery(c.values("valid_from")[:1]),
+            f"{pref}_to": Subquery(c.values("valid_to")[:1]),
+            f"{pref}_src": Subquery(c.values("fuente")[:1]),
+        })
+    return qs.annotate(**anotaciones)
+
+
+@pytest.fixture
+def historico():
+    from productos.models import Modelo, Capacidad, PrecioRecompra
+    from productos.models.utils import set_precio_recompra
+
+    ahora = timezone.now()
+    d = lambda dias: ahora + timezone.timedelta(days=dias)  # noqa: E731
+    modelo = Modelo.objects.create(descripcion="iPhone Rejilla", tipo="iPhone", marca="Apple", año=2020)
+    c1, c2, c3 = (Capacidad.objects.create(modelo=modelo, tamaño=f"{gb} GB", activo=True) for gb in (64, 128, 256))
+
+    # c1: cambios encadenados B2B, uno programado a futuro y B2C con hueco
+    for dias, precio in ((-30, "200"), (-10, "210"), (5, "190")):
+        set_precio_recompra(capacidad_id=c1.id, canal="B2B", precio_neto=Decimal(precio), effective_at=d(dias), fuente="likewize")
+    PrecioRecompra.objects.create(capacidad=c1, canal="B2C", precio_neto=Decimal("300"), valid_from=d(-20), valid_to=d(-15), fuente="swappie")
+    PrecioRecompra.objects.create(capacidad=c1, canal="B2C", precio_neto=Decimal("310"), valid_from=d(-5), fuente="backmarket")
+    # c2: override de tenant solapado con el global
+    PrecioRecompra.objects.create(capacidad=c2, canal="B2B", precio_neto=Decimal("150"), valid_from=d(-40))
+    PrecioRecompra.objects.create(capacidad=c2, canal="B2B", precio_neto=Decimal("160"), valid_from=d(-12), tenant_schema="acme")
+    # c3: sin precios
+    return [d(dias) for dias in (-50, -40, -30, -25, -20, -17, -15, -12, -10, -5, 0, 5, 6, 60)]
+
+
+@pytest.mark.django_db
+def test_rejilla_igual_que_subqueries(historico):
+    """Para cualquier fecha, la rejilla da lo mismo que las subqueries correlacionadas"""
+    from productos.models import Capacidad, TramoPrecioCapacidad
+    from productos.views.admincapacidades import annotate_capacidades
+
+    qs = Capacidad.objects.filter(modelo__descripcion="iPhone Rejilla").order_by("id")
+    assert TramoPrecioCapacidad.objects.filter(capacidad__in=qs).exists()
+    for fecha in historico:
+        nuevo = list(annotate_capacidades(qs, fecha).values_list(*CAMPOS))
+        assert nuevo == list(_subqueries(qs, fecha).values_list(*CAMPOS)), fecha
+
+    # Un solo JOIN y ninguna subquery
+    sql = str(annotate_capacidades(qs, historico[0]).query).upper()
+    assert sql.count("SELECT") == 1 and "LEFT OUTER JOIN" in sql
+
+
+@pytest.mark.django_db
+def test_rejilla_se_mantiene_al_escribir(historico):
+    """Borrar o escribir en bloque precios rehace los tramos de la capacidad"""
+    from productos.models import Capacidad, PrecioRecompra, TramoPrecioCapacidad
+    from productos.services.precios_vigentes import sincronizar_precios_vigentes
+    from productos.views.admincapacidades import annotate_capacidades
+
+    cap = Capacidad.objects.get(modelo__descripcion="iPhone Rejilla", tamaño="128 GB")
+    PrecioRecompra.objects.filter(capacidad=cap, tenant_schema="acme").delete()
+    assert annotate_capacidades(Capacidad.objects.filter(pk=cap.pk), timezone.now()).get()._b2b == Decimal("150")
+
+    PrecioRecompra.objects.filter(capacidad=cap).update(precio_neto=Decimal("155"))
+    sincronizar_precios_vigentes(capacidad_ids=[cap.id])
+    assert annotate_capacidades(Capacidad.objects.filter(pk=cap.pk), timezone.now()).get()._b2b == Decimal("155")
+
+    PrecioRecompra.objects.filter(capacidad=cap).delete()
+    assert not TramoPrecioCapacidad.objects.filter(capacidad=cap).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_sincronizar_tramos_se_serializa(historico):
+    """Dos recálculos de la misma capacidad no se pisan: el segundo espera al commit del primero"""
+    import threading
+    from django.db import connection, transaction
+    from productos.models import Capacidad, TramoPrecioCapacidad
+    from productos.services.tramos_precio import sincronizar_tramos
+
+    cap = Capacidad.objects.get(modelo__descripcion="iPhone Rejilla", tamaño="64 GB")
+    esperados = TramoPrecioCapacidad.objects.filter(capacidad=cap).count()
+    errores, terminada = [], threading.Event()
+
+    def segundo():
+        try:
+            sincronizar_tramos([cap.id])
+        except Exception as e:
+            errores.append(e)
+        finally:
+            connection.close()
+            terminada.set()
+
+    with transaction.atomic():
+        sincronizar_tramos([cap.id])
+        hilo = threading.Thread(target=segundo)
+        hilo.start()
+        assert not terminada.wait(0.5)
+    hilo.join(10)
+
+    assert terminada.is_set() and errores == []
+    assert TramoPrecioCapacidad.objects.filter(capacidad=cap).count() == esperados
+    assert sincronizar_tramos() == TramoPrecioCapacidad.objects.count()
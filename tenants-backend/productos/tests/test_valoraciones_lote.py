@@ -0,0 +1,161 @@
+import pytest
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+User = get_user_model()
+
+
+@pytest.fixture
+def catalogo():
+    from productos.models import Modelo, Capacidad, PrecioRecompra
+    from productos.models.grading_config import GradingConfig
+    from productos.models.precios import CostoPieza, ManoObraTipo, PiezaTipo
+
+    antes = timezone.now() - timezone.timedelta(days=1)
+    mo = ManoObraTipo.objects.create(nombre="MO1", coste_por_hora=Decimal("30"))
+    bateria = PiezaTipo.objects.create(nombre="Batería")
+    pantalla = PiezaTipo.objects.create(nombre="Pantalla")
+    GradingConfig.objects.update_or_create(
+        tipo_dispositivo="iPad",
+        defaults={"pp_A": Decimal("0.05"), "pp_B": Decimal("0.10"), "pp_C": Decimal("0.20"), "activo": True},
+    )
+    GradingConfig.objects.filter(tipo_dispositivo="iPhone").update(activo=False)
+
+    caps = []
+    for n, tipo in enumerate(("iPhone", "iPad")):
+        modelo = Modelo.objects.create(descripcion=f"{tipo} Lote", tipo=tipo, marca="Apple", año=2021)
+        CostoPieza.objects.create(modelo=modelo, pieza_tipo=bateria, coste_neto=Decimal("40"), mano_obra_tipo=mo,
+                                  horas=Decimal("0.5"), valid_from=antes)
+        for gb in (128, 256):
+            cap = Capacidad.objects.create(modelo=modelo, tamaño=f"{gb} GB", activo=True)
+            PrecioRecompra.objects.create(capacidad=cap, canal="B2C", fuente="manual",
+                                          precio_neto=Decimal(300 + gb + 100 * n), valid_from=antes)
+            caps.append(cap)
+        # Coste específico de la capacidad grande: gana sobre el del modelo
+        CostoPieza.objects.create(modelo=modelo, capacidad=caps[-1], pieza_tipo=pantalla, coste_neto=Decimal("90"),
+                                  mano_obra_tipo=mo, horas=Decimal("1"), valid_from=antes)
+        CostoPieza.objects.create(modelo=modelo, pieza_tipo=pantalla, coste_neto=Decimal("70"), mano_obra_tipo=mo,
+                                  horas=Decimal("1"), valid_from=antes)
+    # Capacidad sin precio vigente
+    caps.append(Capacidad.objects.create(modelo=caps[0].modelo, tamaño="512 GB", activo=True))
+    return caps
+
+
+def _post(vista, usuario, datos, **kwargs):
+    request = APIRequestFactory().post("/", datos, format="json")
+    force_authenticate(request, user=usuario)
+    return vista.as_view()(request, **kwargs)
+
+
+def _payloads(caps):
+    estados = [
+        {"enciende": True, "funcional_basico_ok": True, "battery_health_pct": 95, "housing_status": "SIN_SIGNOS",
+         "display_image_status": "OK", "glass_status": "NONE"},
+        {"enciende": True, "funcional_basico_ok": True, "battery_health_pct": 70, "housing_status": "ALGUNOS",
+         "display_image_status": "OK", "glass_status": "MICRO"},
+        {"enciende": True, "funcional_basico_ok": False, "housing_status": "DESGASTE_VISIBLE",
+         "display_image_status": "LINES", "glass_status": "CRACK"},
+    ]
+    items = [{"modelo_id": cap.modelo_id, "capacidad_id": cap.id, **estado} for cap in caps[:4] for estado in estados]
+    items.append({"tipo": "iPad", "modelo_nombre": "iPad Lote", "capacidad_texto": "256", **estados[1]})
+    items.append({"modelo_id": caps[4].modelo_id, "capacidad_id": caps[4].id, **estados[0]})
+    items.append({"modelo_nombre": "No existe", "capacidad_texto": "128"})
+    return items
+
+
+@pytest.mark.django_db
+def test_lote_igual_que_valoracion_individual(catalogo):
+    """Cada dispositivo del lote vale lo mismo (y falla igual) que por el endpoint individual"""
+    from productos.views.valoraciones_genericas import ValoracionComercialGenericaView, ValoracionComercialLoteView
+
+    usuario = User.objects.create_user(email="lote@valora.com", password="x")
+    items = _payloads(catalogo)
+
+    respuesta = _post(ValoracionComercialLoteView, usuario, {"dispositivos": items})
+    assert respuesta.status_code == 200
+    resultados = respuesta.data["resultados"]
+    assert len(resultados) == len(items) and respuesta.data["errores"] == 2
+
+    for k, item in enumerate(items):
+        individual = _post(ValoracionComercialGenericaView, usuario, item)
+        lote = dict(resultados[k])
+        assert lote.pop("indice") == k
+        if individual.status_code == 200:
+            assert lote == individual.data
+        else:
+            assert (lote["status"], lote["detail"]) == (individual.status_code, individual.data["detail"])
+
+    # La config del tipo y el coste por capacidad llegan a los params
+    ipad = resultados[9]["params"]
+    assert (ipad["pp_A"], ipad["pr_pantalla"]) == (0.05, 120)
+    assert resultados[0]["params"]["pr_pantalla"] == 100
+
+
+@pytest.mark.django_db
+def test_lote_queries_constantes(catalogo):
+    """El número de queries no crece con el tamaño del lote"""
+    from productos.services import costes_pieza
+    from productos.services.valoraciones import valorar_lote
+    from productos.views.valoraciones_genericas import get_serializer_for_tipo
+
+    items = _payloads(catalogo)[:12]
+
+    def contar(lote):
+        costes_pieza.invalidar()
+        with CaptureQueriesContext(connection) as ctx:
+            resultados = valorar_lote(lote, "public", get_serializer_for_tipo)
+        assert all("oferta" in r for r in resultados)
+        return len(ctx.captured_queries)
+
+    assert contar(items * 10) == contar(items)
+
+
+@pytest.mark.django_db
+def test_lote_con_dispositivo_personalizado(catalogo, create_tenant):
+    """Un dispositivo_id sin modelo de catálogo falla solo en su posición"""
+    from django_tenants.utils import schema_context
+    from checkouters.models import Cliente, DispositivoReal, Oportunidad
+    from productos.models import DispositivoPersonalizado
+    from productos.services.valoraciones import valorar_lote
+    from productos.views.valoraciones_genericas import get_serializer_for_tipo
+
+    usuario = User.objects.create_user(email="custom@valora.com", password="x")
+    tenant = create_tenant(usuario, "valoracustom")
+    personalizado = DispositivoPersonalizado.objects.create(marca="Samsung", modelo="Galaxy S21", tipo="movil")
+    items = _payloads(catalogo)[:1]
+
+    with schema_context(tenant.schema_name):
+        cliente = Cliente.objects.create(razon_social="ACME", tipo_cliente="empresa", canal="b2b")
+        opp = Oportunidad.objects.create(cliente=cliente, usuario=usuario)
+        dr = DispositivoReal.objects.create(oportunidad=opp, dispositivo_personalizado=personalizado)
+        estado = {k: v for k, v in items[0].items() if k not in ("modelo_id", "capacidad_id")}
+        resultados = valorar_lote(items + [{"dispositivo_id": dr.id, **estado}], "public", get_serializer_for_tipo)
+
+    assert resultados[0] == valorar_lote(items, "public", get_serializer_for_tipo)[0]
+    assert "oferta" in resultados[0]
+    assert resultados[1]["detail"] == "Dispositivo sin modelo de catálogo"
+
+
+@pytest.mark.django_db
+def test_lote_iphone_igual_que_vista_iphone(catalogo):
+    """Los iPhone del lote valen lo mismo que en IphoneComercialValoracionView, aunque haya GradingConfig"""
+    from productos.models.grading_config import GradingConfig
+    from productos.views.valoraciones import IphoneComercialValoracionView
+    from productos.views.valoraciones_genericas import ValoracionComercialLoteView
+
+    GradingConfig.objects.filter(tipo_dispositivo="iPhone").update(
+        pp_A=Decimal("0.30"), pp_B=Decimal("0.40"), pp_C=Decimal("0.50"), activo=True,
+    )
+    usuario = User.objects.create_user(email="iphone@valora.com", password="x")
+    items = _payloads(catalogo)[:6]  # las dos capacidades del iPhone en sus tres estados
+
+    resultados = _post(ValoracionComercialLoteView, usuario, {"dispositivos": items}).data["resultados"]
+    for item, lote in zip(items, resultados):
+        individual = _post(IphoneComercialValoracionView, usuario, item)
+        assert individual.status_code == 200
+        assert {k: lote[k] for k in individual.data} == individual.data
+        assert lote["params"]["pp_A"] == 0.08
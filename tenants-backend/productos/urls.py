@@ -20,11 +20,11 @@ from .views.costespiezas import (
     CostosPiezaSetView,
     CostosPiezaDeleteView,
 )
-from productos.views import (LanzarActualizacionLikewizeView, EstadoTareaLikewizeView,
+from productos.views import (LanzarActualizacionLikewizeView, EstadoTareaLikewizeView, CancelarTareaLikewizeView,
   DiffLikewizeView, AplicarCambiosLikewizeView,LogTailLikewizeView,IphoneComercialValoracionView,
   IphoneAuditoriaValoracionView,
   LikewizeCazadorResultadoView,ListarTareasLikewizeView,UltimaTareaLikewizeView,CrearDesdeNoMapeadoLikewizeView,MapearItemLikewizeView,RemapearTareaLikewizeView,LanzarActualizacionB2CView,DiffB2CView,AplicarCambiosB2CView,UltimaTareaB2CView,LanzarActualizacionBackmarketView,DiffBackmarketView,AplicarCambiosBackmarketView,UltimaTareaBackmarketView,LikewizePresetsView,
-  ValoracionComercialGenericaView, ValoracionAuditoriaGenericaView,
+  ValoracionComercialGenericaView, ValoracionAuditoriaGenericaView, ValoracionComercialLoteView,
   ValidarMapeoLikewizeView, CorregirMapeoLikewizeView, ValidationItemsLikewizeView
 )
 from .views.autoaprendizaje_v3 import (
@@ -85,6 +85,7 @@ urlpatterns = [
     path("precios/likewize/tareas/", ListarTareasLikewizeView.as_view()),
     path("precios/likewize/ultima/", UltimaTareaLikewizeView.as_view()),
     path("precios/likewize/tareas/<uuid:tarea_id>/", EstadoTareaLikewizeView.as_view()),
+    path("precios/likewize/tareas/<uuid:tarea_id>/cancelar/", CancelarTareaLikewizeView.as_view()),
     path("precios/likewize/tareas/<uuid:tarea_id>/diff/", DiffLikewizeView.as_view()),
     path("precios/likewize/tareas/<uuid:tarea_id>/aplicar/", AplicarCambiosLikewizeView.as_view()),
     path("precios/likewize/tareas/<uuid:tarea_id>/log/", LogTailLikewizeView.as_view()),
@@ -98,6 +99,7 @@ urlpatterns = [
     path("precios/b2c/actualizar/", LanzarActualizacionB2CView.as_view()),
     path("precios/b2c/ultima/", UltimaTareaB2CView.as_view()),
     path("precios/b2c/tareas/<uuid:tarea_id>/", EstadoTareaLikewizeView.as_view()),
+    path("precios/b2c/tareas/<uuid:tarea_id>/cancelar/", CancelarTareaLikewizeView.as_view()),
     path("precios/b2c/tareas/<uuid:tarea_id>/diff/", DiffB2CView.as_view()),
     path("precios/b2c/tareas/<uuid:tarea_id>/aplicar/", AplicarCambiosB2CView.as_view()),
     path("precios/b2c/tareas/<uuid:tarea_id>/log/", LogTailLikewizeView.as_view()),
@@ -106,6 +108,7 @@ urlpatterns = [
     path("precios/backmarket/actualizar/", LanzarActualizacionBackmarketView.as_view()),
     path("precios/backmarket/ultima/", UltimaTareaBackmarketView.as_view()),
     path("precios/backmarket/tareas/<uuid:tarea_id>/", EstadoTareaLikewizeView.as_view()),
+    path("precios/backmarket/tareas/<uuid:tarea_id>/cancelar/", CancelarTareaLikewizeView.as_view()),
     path("precios/backmarket/tareas/<uuid:tarea_id>/diff/", DiffBackmarketView.as_view()),
     path("precios/backmarket/tareas/<uuid:tarea_id>/aplicar/", AplicarCambiosBackmarketView.as_view()),
     path("precios/backmarket/tareas/<uuid:tarea_id>/log/", LogTailLikewizeView.as_view()),
@@ -114,6 +117,7 @@ urlpatterns = [
     path('valoraciones/iphone/auditoria/', IphoneAuditoriaValoracionView.as_view(), name='iphone-valoracion-auditoria'),
 
     # === Endpoints genéricos de valoración (todos los dispositivos) ===
+    path('valoraciones/comercial/lote/', ValoracionComercialLoteView.as_view(), name='valoracion-comercial-lote'),
     path('valoraciones/<str:tipo>/comercial/', ValoracionComercialGenericaView.as_view(), name='valoracion-comercial-generica'),
     path('valoraciones/<str:tipo>/auditoria/', ValoracionAuditoriaGenericaView.as_view(), name='valoracion-auditoria-generica'),
     # También soportar endpoint sin tipo (se determina desde el payload)
@@ -12,6 +12,7 @@ from .tiposreparacion import PiezaTipoViewSet,ManoObraTipoViewSet
 from .actualizador import (
     LanzarActualizacionLikewizeView,
     EstadoTareaLikewizeView,
+    CancelarTareaLikewizeView,
     DiffLikewizeView,
     AplicarCambiosLikewizeView,
     LogTailLikewizeView,
@@ -35,7 +36,7 @@ from .actualizador import (
     ValidationItemsLikewizeView,
 )
 from .valoraciones import IphoneComercialValoracionView, IphoneAuditoriaValoracionView
-from .valoraciones_genericas import ValoracionComercialGenericaView, ValoracionAuditoriaGenericaView
+from .valoraciones_genericas import ValoracionComercialGenericaView, ValoracionAuditoriaGenericaView, ValoracionComercialLoteView
 from .dispositivo_personalizado import DispositivoPersonalizadoViewSet
 
 __all__ = [
@@ -77,6 +78,7 @@ __all__ = [
    "AplicarCambiosB2CView",
    "ValoracionComercialGenericaView",
    "ValoracionAuditoriaGenericaView",
+   "ValoracionComercialLoteView",
    "ValidarMapeoLikewizeView",
    "CorregirMapeoLikewizeView",
    "ValidationItemsLikewizeView",
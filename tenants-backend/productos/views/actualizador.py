@@ -1,7 +1,7 @@
 from decimal import Decimal
+from functools import lru_cache
 import re
 import os
-from threading import Thread
 
 from django.apps import apps
 from django.conf import settings
@@ -10,7 +10,6 @@ from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.core.exceptions import ImproperlyConfigured
-from django.core.management import call_command
 
 from rest_framework import permissions, status
 from rest_framework.response import Response
@@ -20,6 +19,11 @@ from ..models import TareaActualizacionLikewize, LikewizeItemStaging,LikewizeCaz
 from ..likewize_config import get_apple_presets, get_extra_presets, list_unique_brands
 from ..serializers import TareaLikewizeSerializer,LikewizeCazadorResultadoSerializer
 from ..services.feedback_system_v3 import FeedbackSystem
+from ..services.cola_tareas import cancelar, encolar
+from ..services.log_tareas import log_de_tarea
+from ..services.aplicar_precios import aplicar_cambios_precio
+from ..services.diff_precios import diff_tarea, paginar_diff
+from ..mapping.services.result_cache import ResultCache
 
 
 # ============== Capacidades estándar por tipo de dispositivo ==============
@@ -68,6 +72,7 @@ def _resolve_model_from_setting(value, setting_name: str):
     return value
 
 
+@lru_cache(maxsize=None)
 def _has_field(model, name: str) -> bool:
     return any(getattr(f, "name", None) == name for f in model._meta.get_fields())
 
@@ -98,18 +103,6 @@ def _apply_common_filters(qs):
 
     return qs
 
-def _apply_common_filters_channel(qs, channel: str):
-    M = qs.model
-    if _has_field(M, "tenant_schema"):
-        qs = qs.filter(tenant_schema__isnull=True)
-    if _has_field(M, "canal"):
-        qs = qs.filter(canal=channel)
-    if _has_field(M, "valid_to"):
-        now = timezone.now()
-        qs = qs.filter(Q(valid_to__isnull=True) | Q(valid_to__gt=now))
-    return qs
-
-
 def _format_storage_label(gb_value):
     if gb_value is None:
         return ""
@@ -152,8 +145,40 @@ def _coerce_int_or_none(value):
             return None
 
 
-def _key_cap(cap_id: int) -> str:
-    return str(cap_id)
+def _diff_paginado(request, tarea_id, fuente: str):
+    t = get_object_or_404(TareaActualizacionLikewize, pk=tarea_id)
+    if t.estado != "SUCCESS":
+        return Response({"detail": "La tarea aún no está lista."}, status=409)
+    qp = request.query_params
+    return Response(paginar_diff(
+        diff_tarea(t, fuente),
+        page=qp.get("page"),
+        page_size=qp.get("page_size"),
+        kind=qp.get("kind"),
+    ))
+
+
+def _aplicar_cambios_diff(request, tarea_id, fuente: str, canal: str, fuente_precio: str):
+    """
+    Aplica en bloque los cambios con id en request.data["ids"] sobre el diff
+    de la tarea (el mismo que ha visto la UI, reutilizado de la caché).
+    """
+    ids = set(request.data.get("ids") or [])
+    if not ids:
+        return Response({"detail": "No hay ids a aplicar."}, status=400)
+
+    t = get_object_or_404(TareaActualizacionLikewize, pk=tarea_id)
+    if t.estado != "SUCCESS":
+        return Response({"detail": "Tarea no lista."}, status=409)
+
+    PrecioModel = _resolve_model_from_setting(getattr(settings, "PRECIOS_B2B_MODEL", None), "PRECIOS_B2B_MODEL")
+    applied = aplicar_cambios_precio(
+        PrecioModel,
+        [ch for ch in diff_tarea(t, fuente)["changes"] if ch["id"] in ids],
+        canal=canal,
+        fuente=fuente_precio,
+    )
+    return Response({"applied": applied}, status=200)
 
 
 # ============== API views ==============
@@ -240,37 +265,37 @@ class LanzarActualizacionLikewizeView(APIView):
                 "disponibles": available,
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        tarea = TareaActualizacionLikewize.objects.create(
+        tarea = encolar(
+            "actualizar_likewize_v3",
+            "likewize",
+            parametros={
+                "mode": mode,
+                "brands": canonical_brands,
+                "mapping_system": mapping_system,
+            },
             meta={
                 "mode": mode,
                 "brands": canonical_brands,
                 "mapping_system": mapping_system,
-            }
+            },
         )
+        return Response({"tarea_id": str(tarea.id)}, status=status.HTTP_202_ACCEPTED)
 
-        # Log inicial para confirmar que la tarea se creó
-        tarea.add_log("🚀 Tarea creada, iniciando actualización...", "INFO")
 
-        def _runner():
-            try:
-                # ejecuta el management command en este mismo proceso/venv
-                call_command(
-                    'actualizar_likewize_v3',
-                    tarea=str(tarea.id),
-                    mode=mode,
-                    brands=canonical_brands,
-                    mapping_system=mapping_system  # Pasar sistema de mapeo
-                )
-            except Exception as e:
-                tarea.add_log(f"❌ Error ejecutando comando: {str(e)}", "ERROR")
-                tarea.estado = "ERROR"
-                tarea.error_message = str(e)
-                tarea.finalizado_en = timezone.now()
-                tarea.save()
-                raise
-
-        Thread(target=_runner, daemon=True).start()
-        return Response({"tarea_id": str(tarea.id)}, status=status.HTTP_202_ACCEPTED)
+class CancelarTareaLikewizeView(APIView):
+    """
+    Cancela una tarea de actualización (en cola o en ejecución).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, tarea_id):
+        t = get_object_or_404(TareaActualizacionLikewize, pk=tarea_id)
+        t = cancelar(t)
+        return Response({
+            "tarea_id": str(t.id),
+            "estado": t.estado,
+            "cancelar_solicitado": t.cancelar_solicitado,
+        }, status=status.HTTP_202_ACCEPTED)
 
 
 class EstadoTareaLikewizeView(APIView):
@@ -291,391 +316,50 @@ class EstadoTareaLikewizeView(APIView):
 
 
 class DiffLikewizeView(APIView):
+    """
+    Diff staging vs precios vigentes. Con ?page=&page_size= (y opcionalmente
+    ?kind=INSERT|UPDATE|DELETE) devuelve solo esa página de `changes`.
+    """
     permission_classes = [permissions.IsAdminUser]
 
     def get(self, request, tarea_id):
-        t = get_object_or_404(TareaActualizacionLikewize, pk=tarea_id)
-        if t.estado != "SUCCESS":
-            return Response({"detail": "La tarea aún no está lista."}, status=409)
-
-        allowed_brands = {
-            (b or "").strip()
-            for b in LikewizeItemStaging.objects
-            .filter(tarea=t)
-            .values_list("marca", flat=True)
-            if (b or "").strip()
-        }
-        if not allowed_brands:
-            meta = getattr(t, "meta", {}) or {}
-            meta_brands = meta.get("brands") if isinstance(meta, dict) else None
-            if meta_brands:
-                allowed_brands = {
-                    (b or "").strip()
-                    for b in meta_brands
-                    if isinstance(b, str) and (b or "").strip()
-                }
-        allowed_brands = {b for b in allowed_brands if b}
-        allowed_brands_lower = {b.lower() for b in allowed_brands}
-
-        meta = getattr(t, "meta", {}) or {}
-        meta_mode = (meta.get("mode") or "apple").lower()
-        meta_brands = {
-            (item or "").strip()
-            for item in (meta.get("brands") or [])
-            if isinstance(item, str) and (item or "").strip()
-        }
-        if not meta_brands and allowed_brands:
-            meta_brands = allowed_brands
-        if meta_mode not in {"apple", "others"} and any(b.lower() != "apple" for b in allowed_brands_lower):
-            meta_mode = "others"
-        if meta_mode == "apple" and any(b.lower() not in {"apple", ""} for b in allowed_brands_lower):
-            meta_mode = "others"
-        preset_source = get_extra_presets() if meta_mode == "others" else get_apple_presets()
-        excluded_codes = {
-            (code or "").strip().upper()
-            for preset in preset_source
-            if (not meta_brands or (preset.get("marca") or "").strip() in meta_brands)
-            for code in (preset.get("exclude_m_models") or [])
-            if (code or "").strip()
-        }
-
-        # 1) STAGING (solo los mapeados a capacidad_id)
-        S_qs = (
-            LikewizeItemStaging.objects
-            .filter(tarea=t, capacidad_id__isnull=False)
-            .values(
-                "capacidad_id",
-                "precio_b2b",
-                "tipo",
-                "modelo_norm",
-                "modelo_raw",
-                "almacenamiento_gb",
-                "marca",
-                "likewize_model_code",
-            )
-        )
-        S = {}
-        for s in S_qs:
-            code = (s.get("likewize_model_code") or "").strip().upper()
-            if excluded_codes and code in excluded_codes:
-                continue
-            k = _key_cap(s["capacidad_id"])
-            S[k] = s  # si hubiese duplicados, se pisa; normalmente 1:1
-
-        cap_info_map: dict[int, dict[str, object]] = {}
-        CapacidadModel = None
-        rel_field = getattr(settings, "CAPACIDAD_REL_MODEL_FIELD", "modelo")
-        rel_name = getattr(settings, "REL_MODELO_NAME_FIELD", "descripcion")
-        gb_field = getattr(settings, "CAPACIDAD_GB_FIELD", "tamaño")
-
-        try:
-            CapacidadModel = apps.get_model(settings.CAPACIDAD_MODEL)
-        except Exception:
-            CapacidadModel = None
-
-        def _gb_from_text(txt: str) -> int | None:
-            if not txt:
-                return None
-            m = re.search(r"(\d+(?:[.,]\d+)?)\s*(TB|GB)\b", txt, flags=re.I)
-            if not m:
-                return None
-            try:
-                val = float(m.group(1).replace(",", "."))
-            except Exception:
-                return None
-            unit = m.group(2).upper()
-            return int(round(val * 1024)) if unit == "TB" else int(round(val))
-
-        def ensure_cap_info(ids):
-            if not CapacidadModel or not ids:
-                return
-            missing = [int(cid) for cid in ids if cid and cid not in cap_info_map]
-            if not missing:
-                return
-            qs_cap = (
-                CapacidadModel.objects
-                .filter(id__in=missing)
-                .select_related(rel_field)
-                .only(
-                    "id",
-                    gb_field,
-                    f"{rel_field}__{rel_name}",
-                    f"{rel_field}__tipo",
-                    f"{rel_field}__marca",
-                    f"{rel_field}__likewize_modelo",
-                )
-            )
-            if allowed_brands:
-                qs_cap = qs_cap.filter(**{f"{rel_field}__marca__in": list(allowed_brands)})
-            for cap in qs_cap:
-                modelo = getattr(cap, rel_field, None)
-                modelo_desc = (getattr(modelo, rel_name, "") if modelo else "") or ""
-                cap_info_map[cap.id] = {
-                    "tipo": (getattr(modelo, "tipo", "-") or "-") if modelo else "-",
-                    "marca": (getattr(modelo, "marca", "-") or "-") if modelo else "-",
-                    "modelo_norm": modelo_desc or "-",
-                    "modelo_descripcion": modelo_desc,
-                    "almacenamiento_gb": _gb_from_text(getattr(cap, gb_field, "") or ""),
-                    "cap_text": getattr(cap, gb_field, "") or "",
-                    "likewize_modelo": (getattr(modelo, "likewize_modelo", "") or "") if modelo else "",
-                }
-
-        # 2) OFICIAL (PrecioB2B/PrecioRecompra según settings)
-        PrecioB2B = _resolve_model_from_setting(getattr(settings, "PRECIOS_B2B_MODEL", None), "PRECIOS_B2B_MODEL")
-        base = _apply_common_filters(PrecioB2B.objects.all())
-
-        # Dedup por capacidad_id, cogiendo el más reciente si hay campo temporal
-        order_field = "valid_from" if _has_field(PrecioB2B, "valid_from") else (
-            "updated_at" if _has_field(PrecioB2B, "updated_at") else None
-        )
-        iter_qs = base.filter(capacidad_id__isnull=False)
-        if order_field:
-            iter_qs = iter_qs.order_by("capacidad_id", f"-{order_field}")
-        else:
-            iter_qs = iter_qs.order_by("capacidad_id")
-
-        E = {}
-        for e in iter_qs.values("capacidad_id", "precio_neto", "updated_at"):
-            k = _key_cap(e["capacidad_id"])
-            if k not in E:
-                E[k] = e  # ya están ordenados para que el primero sea el más reciente si procede
-
-        inserts, updates, deletes = [], [], []
-
-        # Altas/Updates
-        for k, s in S.items():
-            cap_id = int(k)
-            precio_nuevo = Decimal(str(s["precio_b2b"]))
-            ensure_cap_info({cap_id})
-            info = cap_info_map.get(cap_id) or {}
-            if k not in E:
-                inserts.append({
-                    "id": f"I|{k}|{precio_nuevo}",
-                    "capacidad_id": cap_id,
-                    "antes": None,
-                    "despues": str(precio_nuevo),
-                    "delta": None,
-                    "kind": "INSERT",
-                    "tipo": s["tipo"],
-                    "modelo_norm": s["modelo_norm"],
-                    "almacenamiento_gb": s["almacenamiento_gb"],
-                    "marca": info.get("marca") or s.get("marca"),
-                    "nombre_likewize_original": (s.get("modelo_raw") or "").strip() or s.get("modelo_norm") or "",
-                    "nombre_normalizado": (info.get("modelo_descripcion") or s.get("modelo_norm") or ""),
-                })
-            else:
-                precio_viejo = Decimal(str(E[k]["precio_neto"]))
-                if precio_viejo != precio_nuevo:
-                    updates.append({
-                        "id": f"U|{k}|{precio_viejo}|{precio_nuevo}",
-                        "capacidad_id": cap_id,
-                        "antes": str(precio_viejo),
-                        "despues": str(precio_nuevo),
-                        "delta": float(precio_nuevo - precio_viejo),
-                        "kind": "UPDATE",
-                        "tipo": s["tipo"],
-                        "modelo_norm": s["modelo_norm"],
-                        "almacenamiento_gb": s["almacenamiento_gb"],
-                        "marca": info.get("marca") or s.get("marca"),
-                        "nombre_likewize_original": (s.get("modelo_raw") or "").strip() or s.get("modelo_norm") or "",
-                        "nombre_normalizado": (info.get("modelo_descripcion") or s.get("modelo_norm") or ""),
-                    })
-
-        # Bajas (enriquece con info de capacidad/modelo si está disponible)
-        delete_ids = [int(k) for k in E.keys() if k not in S]
-        ensure_cap_info(delete_ids)
-
-        for k, e in E.items():
-            if k not in S:
-                cap_id = int(k)
-                info = cap_info_map.get(cap_id)
-                if allowed_brands_lower and info is None:
-                    continue
-                marca_info = (info.get("marca") if info else "-")
-                marca_clean = (marca_info or "").strip()
-                if allowed_brands_lower and (not marca_clean or marca_clean.lower() not in allowed_brands_lower):
-                    continue
-                likewize_code_model = (info or {}).get("likewize_modelo", "").strip().upper()
-                likewize_code_suffix = likewize_code_model.split()[-1] if likewize_code_model else ""
-                if excluded_codes and (
-                    (likewize_code_model and likewize_code_model in excluded_codes) or
-                    (likewize_code_suffix and likewize_code_suffix in excluded_codes)
-                ):
-                    continue
-
-                # Buscar si existe en staging sin mapear (capacidad_id es null)
-                staging_query = LikewizeItemStaging.objects.filter(
-                    tarea=t,
-                    capacidad_id__isnull=True,
-                    tipo=info.get("tipo", "").strip(),
-                    modelo_norm=info.get("modelo_norm", "").strip()
-                )
-
-                # Filtrar por almacenamiento si está disponible
-                almacenamiento = info.get("almacenamiento_gb")
-                if almacenamiento:
-                    staging_query = staging_query.filter(almacenamiento_gb=almacenamiento)
-
-                staging_item = staging_query.first()
-
-                if staging_item:
-                    # Es un UPDATE, no un DELETE - existe en staging pero sin mapear
-                    precio_nuevo = Decimal(str(staging_item.precio_b2b))
-                    precio_viejo = Decimal(str(e["precio_neto"]))
-                    updates.append({
-                        "id": f"U|{k}|{precio_viejo}|{precio_nuevo}",
-                        "capacidad_id": cap_id,
-                        "antes": str(precio_viejo),
-                        "despues": str(precio_nuevo),
-                        "delta": float(precio_nuevo - precio_viejo),
-                        "kind": "UPDATE",
-                        "tipo": (info or {}).get("tipo", "-"),
-                        "modelo_norm": (info or {}).get("modelo_norm", "-"),
-                        "almacenamiento_gb": (info or {}).get("almacenamiento_gb"),
-                        "marca": marca_info or "-",
-                        "nombre_likewize_original": (staging_item.modelo_raw or "").strip() or staging_item.modelo_norm or "",
-                        "nombre_normalizado": (info or {}).get("modelo_descripcion") or (info or {}).get("modelo_norm", "-"),
-                    })
-                else:
-                    # Es realmente un DELETE - no existe en staging
-                    deletes.append({
-                        "id": f"D|{k}|{e['precio_neto']}",
-                        "capacidad_id": cap_id,
-                        "antes": str(e["precio_neto"]),
-                        "despues": None,
-                        "delta": None,
-                        "kind": "DELETE",
-                        "tipo": (info or {}).get("tipo", "-"),
-                        "marca": marca_info or "-",
-                        "modelo_norm": (info or {}).get("modelo_norm", "-"),
-                        "almacenamiento_gb": (info or {}).get("almacenamiento_gb"),
-                        "nombre_likewize_original": (info or {}).get("likewize_modelo", "") or (info or {}).get("modelo_norm", "-"),
-                        "nombre_normalizado": (info or {}).get("modelo_descripcion") or (info or {}).get("modelo_norm", "-"),
-                    })
-
-        # No mapeados (para que los veas en UI)
-        no_mapeados = list(
-            LikewizeItemStaging.objects
-            .filter(tarea=t, capacidad_id__isnull=True)
-            .values("id", "tipo", "modelo_norm", "almacenamiento_gb", "precio_b2b", "marca", "likewize_model_code")
-        )
-
-        if excluded_codes:
-            no_mapeados = [row for row in no_mapeados if (row.get("likewize_model_code") or "").strip().upper() not in excluded_codes]
-
-        return Response({
-            "summary": {
-                "inserts": len(inserts), "updates": len(updates), "deletes": len(deletes),
-                "no_mapeados": len(no_mapeados),
-                "total": len(inserts) + len(updates) + len(deletes)
-            },
-            "changes": inserts + updates + deletes,
-            "no_mapeados": no_mapeados,
-        })
+        return _diff_paginado(request, tarea_id, "likewize")
 
 
 class AplicarCambiosLikewizeView(APIView):
     permission_classes = [permissions.IsAdminUser]
 
-    @transaction.atomic
     def post(self, request, tarea_id):
-        ids = set(request.data.get("ids") or [])
-        if not ids:
-            return Response({"detail": "No hay ids a aplicar."}, status=400)
-
-        # Recalcular diff como fuente de verdad
-        resp = DiffLikewizeView().get(request, tarea_id).data
-        if "changes" not in resp:
-            return Response({"detail": "Tarea no lista."}, status=409)
-
-        PrecioB2B = _resolve_model_from_setting(getattr(settings, "PRECIOS_B2B_MODEL", None), "PRECIOS_B2B_MODEL")
-        applied = {"INSERT": 0, "UPDATE": 0, "DELETE": 0}
-
-        # Para setear tenant_schema=None si existe
-        set_tenant_null = _has_field(PrecioB2B, "tenant_schema")
-
-        for ch in resp["changes"]:
-            if ch["id"] not in ids:
-                continue
-            cap_id = ch["capacidad_id"]
-
-            has_versioning = _has_field(PrecioB2B, "valid_from") and _has_field(PrecioB2B, "valid_to")
-            now = timezone.now()
-
-            # Base queryset por clave
-            qs = PrecioB2B.objects.filter(capacidad_id=cap_id)
-            if _has_field(PrecioB2B, "canal"):
-                qs = qs.filter(canal="B2B")
-            if _has_field(PrecioB2B, "fuente"):
-                qs = qs.filter(fuente="Likewize")
-            if set_tenant_null:
-                qs = qs.filter(tenant_schema__isnull=True)
-
-            if ch["kind"] in {"INSERT", "UPDATE"}:
-                nuevo_precio = Decimal(ch["despues"])
-                if has_versioning:
-                    vigente = qs.filter(valid_to__isnull=True).order_by("-valid_from").first()
-                    if vigente and Decimal(vigente.precio_neto) == nuevo_precio:
-                        # Nada que hacer; ya vigente con ese precio
-                        pass
-                    else:
-                        # Cerrar vigente si existe
-                        if vigente:
-                            vigente.valid_to = now
-                            vigente.save(update_fields=["valid_to"])
-                        # Crear nuevo vigente
-                        create_kwargs = {
-                            "capacidad_id": cap_id,
-                            "precio_neto": nuevo_precio,
-                            "valid_from": now,
-                        }
-                        if _has_field(PrecioB2B, "canal"):
-                            create_kwargs["canal"] = "B2B"
-                        if _has_field(PrecioB2B, "fuente"):
-                            create_kwargs["fuente"] = "Likewize"
-                        if set_tenant_null:
-                            create_kwargs["tenant_schema"] = None
-                        PrecioB2B.objects.create(**create_kwargs)
-                else:
-                    # Modelo sin versionado: update_or_create plano
-                    defaults = {"precio_neto": nuevo_precio}
-                    if _has_field(PrecioB2B, "canal"):
-                        defaults["canal"] = "B2B"
-                    if _has_field(PrecioB2B, "fuente"):
-                        defaults["fuente"] = "Likewize"
-                    if set_tenant_null:
-                        defaults["tenant_schema"] = None
-                    PrecioB2B.objects.update_or_create(
-                        capacidad_id=cap_id,
-                        defaults=defaults
-                    )
-                applied[ch["kind"]] += 1
-
-            elif ch["kind"] == "DELETE":
-                if has_versioning:
-                    # Cierra el vigente de Likewize en B2B si existe
-                    updated = qs.filter(valid_to__isnull=True).update(valid_to=now)
-                    # Como borrado lógico por versionado, cuenta como DELETE si había alguno
-                    if updated:
-                        applied["DELETE"] += 1
-                else:
-                    PrecioB2B.objects.filter(capacidad_id=cap_id).delete()
-                    applied["DELETE"] += 1
-
-        return Response({"applied": applied}, status=200)
+        return _aplicar_cambios_diff(request, tarea_id, "likewize", canal="B2B", fuente_precio="Likewize")
 
 
 class LogTailLikewizeView(APIView):
+    """
+    GET .../tareas/<uuid>/log/?n=80          últimos n eventos
+    GET .../tareas/<uuid>/log/?after=<offset> solo los eventos nuevos desde `offset`
+
+    Lee por el índice del log (log_tareas.TaskLog): el coste no depende del
+    tamaño del fichero. El `offset` de la respuesta se pasa como `after` en
+    la siguiente petición.
+    """
     permission_classes = [permissions.IsAdminUser]
 
     def get(self, request, tarea_id):
         n = int(request.query_params.get("n", 80))
+        after = request.query_params.get("after")
         t = get_object_or_404(TareaActualizacionLikewize, pk=tarea_id)
-        lines = []
-        if t.log_path and os.path.exists(t.log_path):
-            with open(t.log_path, "r", encoding="utf-8", errors="ignore") as f:
-                lines = f.readlines()[-n:]
-        return Response({"lines": [ln.rstrip("\n") for ln in lines]})
+        task_log = log_de_tarea(t)
+        if not task_log:
+            return Response({"lines": [], "events": [], "offset": 0})
+        if after is not None and task_log.indexado:
+            events, offset = task_log.after(int(after), limit=int(request.query_params.get("limit", 500)))
+        else:
+            events, offset = task_log.tail(n)
+        return Response({
+            "lines": [e["line"] for e in events],
+            "events": events,
+            "offset": offset,
+        })
 
 class LikewizeCazadorResultadoView(APIView):
     """
@@ -699,10 +383,11 @@ class ListarTareasLikewizeView(APIView):
     def get(self, request):
         limit = int(request.query_params.get('limit', 20))
 
-        # Solo tareas SUCCESS
+        # Solo tareas SUCCESS (las de remapeo no tienen staging propio)
         tareas = (
             TareaActualizacionLikewize.objects
             .filter(estado="SUCCESS")
+            .exclude(fuente="remapeo")
             .order_by("-finalizado_en", "-iniciado_en", "-creado_en")
             .distinct()[:limit]
         )
@@ -738,8 +423,11 @@ class UltimaTareaLikewizeView(APIView):
     permission_classes = [permissions.IsAdminUser]
 
     def get(self, request):
+        # Las tareas de remapeo no tienen staging propio
+        tareas = TareaActualizacionLikewize.objects.exclude(fuente="remapeo")
+
         # Intenta primero la última tarea SUCCESS con algún mapeado
-        with_mapped = (TareaActualizacionLikewize.objects
+        with_mapped = (tareas
                         .filter(estado="SUCCESS", staging__capacidad_id__isnull=False)
                         .order_by("-finalizado_en", "-iniciado_en", "-creado_en")
                         .distinct())
@@ -747,14 +435,14 @@ class UltimaTareaLikewizeView(APIView):
 
         # Si no hay, intenta la última SUCCESS aunque no tenga mapeados
         if not t:
-            t = (TareaActualizacionLikewize.objects
+            t = (tareas
                     .filter(estado="SUCCESS")
                     .order_by("-finalizado_en", "-iniciado_en", "-creado_en")
                     .first())
 
         # Si sigue sin haber, coge la última en general
         if not t:
-            t = (TareaActualizacionLikewize.objects
+            t = (tareas
                     .order_by("-finalizado_en", "-iniciado_en", "-creado_en")
                     .first())
         if not t:
@@ -1334,109 +1022,49 @@ class RemapearTareaLikewizeView(APIView):
     Usa el sistema de mapeo v4 mejorado (iPhone, iPad, Mac con CPU/GPU cores).
     Los dispositivos que no encuentren match quedarán sin mapear para "No Encontrados".
 
+    El remapeo se encola (comando remapear_likewize) y lo ejecuta el worker de
+    la cola con MAPPING_V4_WORKERS procesos; responde 202 con la tarea de
+    remapeo, cuyo meta["stats"] tiene el resultado al terminar.
+
     Query params:
     - system: 'v4' (default), 'v3', 'auto' - Sistema de mapeo a usar
     """
     permission_classes = [permissions.IsAdminUser]
 
     def post(self, request, tarea_id):
-        from productos.mapping import map_device
-
         tarea = get_object_or_404(TareaActualizacionLikewize, pk=tarea_id)
 
         # Permitir especificar el sistema de mapeo
         mapping_system = request.data.get('system', 'v4')
 
-        unmapped_items = LikewizeItemStaging.objects.filter(tarea=tarea, capacidad_id__isnull=True)
-        total_unmapped = unmapped_items.count()
+        staging = LikewizeItemStaging.objects.filter(tarea=tarea)
+        total_unmapped = staging.filter(capacidad_id__isnull=True).count()
 
         if total_unmapped == 0:
             return Response({
                 "success": True,
                 "message": "Tarea ya completamente mapeada",
                 "stats": {
-                    "total": LikewizeItemStaging.objects.filter(tarea=tarea).count(),
-                    "mapped": LikewizeItemStaging.objects.filter(tarea=tarea, capacidad_id__isnull=False).count(),
+                    "total": staging.count(),
+                    "mapped": staging.filter(capacidad_id__isnull=False).count(),
                     "unmapped": 0,
                     "processed": 0,
                     "failed": 0
                 }
             })
 
-        mapped_count = 0
-        failed_count = 0
-
-        for item in unmapped_items:
-            try:
-                # Preparar datos para v4
-                full_name = item.modelo_raw or item.modelo_norm or ""
-                if not full_name:
-                    failed_count += 1
-                    continue
-
-                # Usar sistema de mapeo v4
-                result = map_device(
-                    {'FullName': full_name},
-                    system=mapping_system
-                )
-
-                if result.get('success') and result.get('capacidad_id'):
-                    # Actualizar staging con el mapeo exitoso
-                    item.capacidad_id = result['capacidad_id']
-
-                    # Guardar metadatos del mapeo v4
-                    item.mapping_metadata = {
-                        'confidence_score': result.get('confidence', 0) * 100,  # 0-100
-                        'mapping_algorithm': result.get('strategy', 'unknown'),
-                        'needs_review': result.get('confidence', 0) < 0.85,
-                        'is_mapped': True
-                    }
-
-                    item.save(update_fields=['capacidad_id', 'mapping_metadata'])
-                    mapped_count += 1
-                else:
-                    # No encontró match, pero puede haber sugerencia de crear capacidad
-                    # Guardar metadata incluso si no hubo match exitoso
-                    metadata = {
-                        'confidence_score': result.get('confidence', 0) * 100 if result.get('confidence') else None,
-                        'mapping_algorithm': result.get('strategy'),
-                        'needs_review': True,
-                        'is_mapped': False,
-                        'needs_capacity_creation': result.get('needs_capacity_creation', False)
-                    }
-
-                    # Incluir información adicional si v4 sugiere crear capacidad
-                    if result.get('suggested_capacity'):
-                        metadata['suggested_capacity'] = result['suggested_capacity']
-                    if result.get('v3_skipped'):
-                        metadata['v3_skipped'] = result['v3_skipped']
-                        metadata['v3_skip_reason'] = result.get('v3_skip_reason')
-
-                    item.mapping_metadata = metadata
-                    item.save(update_fields=['mapping_metadata'])
-
-                    failed_count += 1
-
-            except Exception as e:
-                # Error en el mapeo, dejar sin mapear
-                failed_count += 1
-                continue
-
-        final_mapped = LikewizeItemStaging.objects.filter(tarea=tarea, capacidad_id__isnull=False).count()
-        final_unmapped = LikewizeItemStaging.objects.filter(tarea=tarea, capacidad_id__isnull=True).count()
-
+        remapeo = encolar(
+            "remapear_likewize",
+            "remapeo",
+            parametros={"origen": str(tarea.id), "system": mapping_system},
+            meta={"origen": str(tarea.id), "system": mapping_system},
+        )
         return Response({
-            "success": final_unmapped == 0,
-            "message": f"Remapeo v4 completado: {mapped_count} dispositivos procesados",
-            "stats": {
-                "total": LikewizeItemStaging.objects.filter(tarea=tarea).count(),
-                "mapped": final_mapped,
-                "unmapped": final_unmapped,
-                "processed": mapped_count,
-                "failed": failed_count,
-                "system": mapping_system
-            }
-        }, status=200)
+            "tarea_id": str(remapeo.id),
+            "origen": str(tarea.id),
+            "message": f"Remapeo {mapping_system} en cola: {total_unmapped} dispositivos sin mapear",
+            "unmapped": total_unmapped,
+        }, status=status.HTTP_202_ACCEPTED)
 
 
 class LanzarActualizacionB2CView(APIView):
@@ -1450,250 +1078,30 @@ class LanzarActualizacionB2CView(APIView):
         delay = float(request.data.get("delay") or request.query_params.get("delay") or 0.8)
         jitter = float(request.data.get("jitter") or request.query_params.get("jitter") or 0.4)
 
-        tarea = TareaActualizacionLikewize.objects.create()
-
-        def _runner():
-            call_command("actualizar_swappie_b2c", tarea=str(tarea.id), country=country, delay=delay, jitter=jitter)
-
-        Thread(target=_runner, daemon=True).start()
+        tarea = encolar(
+            "actualizar_swappie_b2c",
+            "swappie",
+            parametros={"country": country, "delay": delay, "jitter": jitter},
+        )
         return Response({"tarea_id": str(tarea.id), "country": country}, status=status.HTTP_202_ACCEPTED)
 
 
 class DiffB2CView(APIView):
+    """
+    Diff staging vs precios vigentes. Con ?page=&page_size= (y opcionalmente
+    ?kind=INSERT|UPDATE|DELETE) devuelve solo esa página de `changes`.
+    """
     permission_classes = [permissions.IsAdminUser]
 
     def get(self, request, tarea_id):
-        t = get_object_or_404(TareaActualizacionLikewize, pk=tarea_id)
-        if t.estado != "SUCCESS":
-            return Response({"detail": "La tarea aún no está lista."}, status=409)
-
-        # 1) STAGING (solo mapeados a capacidad_id) — reutiliza LikewizeItemStaging
-        S_qs = (LikewizeItemStaging.objects
-                .filter(tarea=t, capacidad_id__isnull=False)
-                .values("capacidad_id", "precio_b2b", "tipo", "modelo_norm", "almacenamiento_gb", "marca"))
-        S = {}
-        for s in S_qs:
-            k = _key_cap(s["capacidad_id"])
-            S[k] = s
-
-        # 2) OFICIAL (PrecioRecompra canal B2C)
-        PrecioModel = _resolve_model_from_setting(getattr(settings, "PRECIOS_B2B_MODEL", None), "PRECIOS_B2B_MODEL")
-        base = _apply_common_filters_channel(PrecioModel.objects.all(), "B2C")
-        # Limita el universo E a iPhone únicamente (Swappie solo iPhone)
-        rel_field = getattr(settings, "CAPACIDAD_REL_MODEL_FIELD", "modelo")
-        try:
-            base = base.filter(**{f"capacidad__{rel_field}__tipo": "iPhone"})
-        except Exception:
-            pass
-
-        order_field = "valid_from" if _has_field(PrecioModel, "valid_from") else (
-            "updated_at" if _has_field(PrecioModel, "updated_at") else None
-        )
-        iter_qs = base.filter(capacidad_id__isnull=False)
-        if order_field:
-            iter_qs = iter_qs.order_by("capacidad_id", f"-{order_field}")
-        else:
-            iter_qs = iter_qs.order_by("capacidad_id")
-
-        E = {}
-        for e in iter_qs.values("capacidad_id", "precio_neto"):
-            k = _key_cap(e["capacidad_id"])
-            if k not in E:
-                E[k] = e
-
-        inserts, updates, deletes = [], [], []
-
-        for k, s in S.items():
-            cap_id = int(k)
-            precio_nuevo = Decimal(str(s["precio_b2b"]))
-            if k not in E:
-                inserts.append({
-                    "id": f"I|{k}|{precio_nuevo}",
-                    "capacidad_id": cap_id,
-                    "antes": None,
-                    "despues": str(precio_nuevo),
-                    "delta": None,
-                    "kind": "INSERT",
-                    "tipo": s["tipo"],
-                    "modelo_norm": s["modelo_norm"],
-                    "almacenamiento_gb": s["almacenamiento_gb"],
-                    "marca": s.get("marca"),
-                })
-            else:
-                precio_viejo = Decimal(str(E[k]["precio_neto"]))
-                if precio_viejo != precio_nuevo:
-                    updates.append({
-                        "id": f"U|{k}|{precio_viejo}|{precio_nuevo}",
-                        "capacidad_id": cap_id,
-                        "antes": str(precio_viejo),
-                        "despues": str(precio_nuevo),
-                        "delta": float(precio_nuevo - precio_viejo),
-                        "kind": "UPDATE",
-                        "tipo": s["tipo"],
-                        "modelo_norm": s["modelo_norm"],
-                        "almacenamiento_gb": s["almacenamiento_gb"],
-                        "marca": s.get("marca"),
-                    })
-
-        # Bajas con detalle de capacidad/modelo
-        delete_ids = [int(k) for k in E.keys() if k not in S]
-        cap_info_map = {}
-        if delete_ids:
-            CapacidadModel = apps.get_model(settings.CAPACIDAD_MODEL)
-            rel_field = getattr(settings, "CAPACIDAD_REL_MODEL_FIELD", "modelo")
-            rel_name = getattr(settings, "REL_MODELO_NAME_FIELD", "descripcion")
-            gb_field = getattr(settings, "CAPACIDAD_GB_FIELD", "tamaño")
-            qs_cap = (CapacidadModel.objects
-                      .filter(id__in=delete_ids)
-                      .select_related(rel_field)
-                      .only("id", gb_field, f"{rel_field}__{rel_name}", f"{rel_field}__tipo", f"{rel_field}__marca"))
-
-            def _gb_from_text(txt: str) -> int | None:
-                if not txt:
-                    return None
-                m = re.search(r"(\d+(?:[.,]\d+)?)\s*(TB|GB)\b", txt, flags=re.I)
-                if not m:
-                    return None
-                try:
-                    val = float(m.group(1).replace(",", "."))
-                except Exception:
-                    return None
-                unit = m.group(2).upper()
-                return int(round(val * 1024)) if unit == "TB" else int(round(val))
-
-            for cap in qs_cap:
-                modelo = getattr(cap, rel_field)
-                cap_info_map[cap.id] = {
-                    "tipo": getattr(modelo, "tipo", "-") or "-",
-                    "marca": getattr(modelo, "marca", "-") or "-",
-                    "modelo_norm": getattr(modelo, rel_name, "-") or "-",
-                    "almacenamiento_gb": _gb_from_text(getattr(cap, gb_field, "") or ""),
-                    "cap_text": getattr(cap, gb_field, "") or "",
-                }
-
-        faltan_swappie = []
-        for k, e in E.items():
-            if k not in S:
-                cap_id = int(k)
-                info = cap_info_map.get(cap_id, {})
-                row = {
-                    "id": f"D|{k}|{e['precio_neto']}",
-                    "capacidad_id": cap_id,
-                    "antes": str(e["precio_neto"]),
-                    "despues": None,
-                    "delta": None,
-                    "kind": "DELETE",
-                    "tipo": info.get("tipo", "-"),
-                    "marca": info.get("marca", "-"),
-                    "modelo_norm": info.get("modelo_norm", "-"),
-                    "almacenamiento_gb": info.get("almacenamiento_gb"),
-                }
-                deletes.append(row)
-                # También expón como 'faltan en Swappie'
-                faltan_swappie.append({
-                    "capacidad_id": cap_id,
-                    "tipo": info.get("tipo", "-"),
-                    "modelo_norm": info.get("modelo_norm", "-"),
-                    "almacenamiento_gb": info.get("almacenamiento_gb"),
-                    "cap_text": info.get("cap_text", ""),
-                    "precio_actual": str(e.get("precio_neto")),
-                })
-
-        no_mapeados = list(
-            LikewizeItemStaging.objects
-            .filter(tarea=t, capacidad_id__isnull=True)
-            .values("id", "tipo", "modelo_norm", "almacenamiento_gb", "precio_b2b", "marca")
-        )
-
-        return Response({
-            "summary": {
-                "inserts": len(inserts), "updates": len(updates), "deletes": len(deletes),
-                "no_mapeados": len(no_mapeados),
-                "total": len(inserts) + len(updates) + len(deletes)
-            },
-            "changes": inserts + updates + deletes,
-            "no_mapeados": no_mapeados,
-            "faltan_swappie": faltan_swappie,
-        })
+        return _diff_paginado(request, tarea_id, "swappie")
 
 
 class AplicarCambiosB2CView(APIView):
     permission_classes = [permissions.IsAdminUser]
 
-    @transaction.atomic
     def post(self, request, tarea_id):
-        ids = set(request.data.get("ids") or [])
-        if not ids:
-            return Response({"detail": "No hay ids a aplicar."}, status=400)
-
-        # Recalcular diff como fuente de verdad
-        resp = DiffB2CView().get(request, tarea_id).data
-        if "changes" not in resp:
-            return Response({"detail": "Tarea no lista."}, status=409)
-
-        PrecioModel = _resolve_model_from_setting(getattr(settings, "PRECIOS_B2B_MODEL", None), "PRECIOS_B2B_MODEL")
-        applied = {"INSERT": 0, "UPDATE": 0, "DELETE": 0}
-
-        set_tenant_null = _has_field(PrecioModel, "tenant_schema")
-        has_versioning = _has_field(PrecioModel, "valid_from") and _has_field(PrecioModel, "valid_to")
-        now = timezone.now()
-
-        for ch in resp["changes"]:
-            if ch["id"] not in ids:
-                continue
-            cap_id = ch["capacidad_id"]
-
-            qs = PrecioModel.objects.filter(capacidad_id=cap_id)
-            if _has_field(PrecioModel, "canal"):
-                qs = qs.filter(canal="B2C")
-            if _has_field(PrecioModel, "fuente"):
-                qs = qs.filter(fuente="Swappie")
-            if set_tenant_null:
-                qs = qs.filter(tenant_schema__isnull=True)
-
-            if ch["kind"] in {"INSERT", "UPDATE"}:
-                nuevo_precio = Decimal(ch["despues"])
-                if has_versioning:
-                    vigente = qs.filter(valid_to__isnull=True).order_by("-valid_from").first()
-                    if vigente and Decimal(vigente.precio_neto) == nuevo_precio:
-                        pass
-                    else:
-                        if vigente:
-                            vigente.valid_to = now
-                            vigente.save(update_fields=["valid_to"])
-                        create_kwargs = {
-                            "capacidad_id": cap_id,
-                            "precio_neto": nuevo_precio,
-                            "valid_from": now,
-                        }
-                        if _has_field(PrecioModel, "canal"):
-                            create_kwargs["canal"] = "B2C"
-                        if _has_field(PrecioModel, "fuente"):
-                            create_kwargs["fuente"] = "Swappie"
-                        if set_tenant_null:
-                            create_kwargs["tenant_schema"] = None
-                        PrecioModel.objects.create(**create_kwargs)
-                else:
-                    defaults = {"precio_neto": nuevo_precio}
-                    if _has_field(PrecioModel, "canal"):
-                        defaults["canal"] = "B2C"
-                    if _has_field(PrecioModel, "fuente"):
-                        defaults["fuente"] = "Swappie"
-                    if set_tenant_null:
-                        defaults["tenant_schema"] = None
-                    PrecioModel.objects.update_or_create(capacidad_id=cap_id, defaults=defaults)
-                applied[ch["kind"]] += 1
-
-            elif ch["kind"] == "DELETE":
-                if has_versioning:
-                    updated = qs.filter(valid_to__isnull=True).update(valid_to=now)
-                    if updated:
-                        applied["DELETE"] += 1
-                else:
-                    PrecioModel.objects.filter(capacidad_id=cap_id).delete()
-                    applied["DELETE"] += 1
-
-        return Response({"applied": applied}, status=200)
+        return _aplicar_cambios_diff(request, tarea_id, "swappie", canal="B2C", fuente_precio="Swappie")
 
 
 class UltimaTareaB2CView(APIView):
@@ -1909,234 +1317,30 @@ class LanzarActualizacionBackmarketView(APIView):
         delay = float(request.data.get("delay") or request.query_params.get("delay") or 0.8)
         jitter = float(request.data.get("jitter") or request.query_params.get("jitter") or 0.4)
 
-        tarea = TareaActualizacionLikewize.objects.create()
-
-        def _runner():
-            call_command("actualizar_backmarket_b2c", tarea=str(tarea.id), delay=delay, jitter=jitter)
-
-        Thread(target=_runner, daemon=True).start()
+        tarea = encolar(
+            "actualizar_backmarket_b2c",
+            "backmarket",
+            parametros={"delay": delay, "jitter": jitter},
+        )
         return Response({"tarea_id": str(tarea.id)}, status=status.HTTP_202_ACCEPTED)
 
 
 class DiffBackmarketView(APIView):
+    """
+    Diff staging vs precios vigentes. Con ?page=&page_size= (y opcionalmente
+    ?kind=INSERT|UPDATE|DELETE) devuelve solo esa página de `changes`.
+    """
     permission_classes = [permissions.IsAdminUser]
 
     def get(self, request, tarea_id):
-        t = get_object_or_404(TareaActualizacionLikewize, pk=tarea_id)
-        if t.estado != "SUCCESS":
-            return Response({"detail": "La tarea aún no está lista."}, status=409)
-
-        # Staging iPhone
-        S_qs = (LikewizeItemStaging.objects
-                .filter(tarea=t, capacidad_id__isnull=False)
-                .values("capacidad_id", "precio_b2b", "tipo", "modelo_norm", "almacenamiento_gb", "marca"))
-        S = {}
-        for s in S_qs:
-            S[_key_cap(s["capacidad_id"])] = s
-
-        PrecioModel = _resolve_model_from_setting(getattr(settings, "PRECIOS_B2B_MODEL", None), "PRECIOS_B2B_MODEL")
-        base = _apply_common_filters_channel(PrecioModel.objects.all(), "B2C")
-        # Limita a iPhone
-        rel_field = getattr(settings, "CAPACIDAD_REL_MODEL_FIELD", "modelo")
-        try:
-            base = base.filter(**{f"capacidad__{rel_field}__tipo": "iPhone"})
-        except Exception:
-            pass
-
-        order_field = "valid_from" if _has_field(PrecioModel, "valid_from") else (
-            "updated_at" if _has_field(PrecioModel, "updated_at") else None
-        )
-        iter_qs = base.filter(capacidad_id__isnull=False)
-        if order_field:
-            iter_qs = iter_qs.order_by("capacidad_id", f"-{order_field}")
-        else:
-            iter_qs = iter_qs.order_by("capacidad_id")
-
-        E = {}
-        for e in iter_qs.values("capacidad_id", "precio_neto"):
-            k = _key_cap(e["capacidad_id"])
-            if k not in E:
-                E[k] = e
-
-        inserts, updates, deletes = [], [], []
-
-        for k, s in S.items():
-            cap_id = int(k)
-            precio_nuevo = Decimal(str(s["precio_b2b"]))
-            if k not in E:
-                inserts.append({
-                    "id": f"I|{k}|{precio_nuevo}",
-                    "capacidad_id": cap_id,
-                    "antes": None,
-                    "despues": str(precio_nuevo),
-                    "delta": None,
-                    "kind": "INSERT",
-                    "tipo": s["tipo"],
-                    "modelo_norm": s["modelo_norm"],
-                    "almacenamiento_gb": s["almacenamiento_gb"],
-                    "marca": s.get("marca"),
-                })
-            else:
-                precio_viejo = Decimal(str(E[k]["precio_neto"]))
-                if precio_viejo != precio_nuevo:
-                    updates.append({
-                        "id": f"U|{k}|{precio_viejo}|{precio_nuevo}",
-                        "capacidad_id": cap_id,
-                        "antes": str(precio_viejo),
-                        "despues": str(precio_nuevo),
-                        "delta": float(precio_nuevo - precio_viejo),
-                        "kind": "UPDATE",
-                        "tipo": s["tipo"],
-                        "modelo_norm": s["modelo_norm"],
-                        "almacenamiento_gb": s["almacenamiento_gb"],
-                        "marca": s.get("marca"),
-                    })
-
-        # Bajas enriquecidas
-        delete_ids = [int(k) for k in E.keys() if k not in S]
-        cap_info_map = {}
-        if delete_ids:
-            CapacidadModel = apps.get_model(settings.CAPACIDAD_MODEL)
-            rel_field = getattr(settings, "CAPACIDAD_REL_MODEL_FIELD", "modelo")
-            rel_name = getattr(settings, "REL_MODELO_NAME_FIELD", "descripcion")
-            gb_field = getattr(settings, "CAPACIDAD_GB_FIELD", "tamaño")
-            qs_cap = (CapacidadModel.objects
-                      .filter(id__in=delete_ids)
-                      .select_related(rel_field)
-                      .only("id", gb_field, f"{rel_field}__{rel_name}", f"{rel_field}__tipo", f"{rel_field}__marca"))
-
-            def _gb_from_text(txt: str) -> int | None:
-                if not txt:
-                    return None
-                m = re.search(r"(\d+(?:[.,]\d+)?)\s*(TB|GB)\b", txt, flags=re.I)
-                if not m:
-                    return None
-                try:
-                    val = float(m.group(1).replace(",", "."))
-                except Exception:
-                    return None
-                unit = m.group(2).upper()
-                return int(round(val * 1024)) if unit == "TB" else int(round(val))
-
-            for cap in qs_cap:
-                modelo = getattr(cap, rel_field)
-                cap_info_map[cap.id] = {
-                    "tipo": getattr(modelo, "tipo", "-") or "-",
-                    "marca": getattr(modelo, "marca", "-") or "-",
-                    "modelo_norm": getattr(modelo, rel_name, "-") or "-",
-                    "almacenamiento_gb": _gb_from_text(getattr(cap, gb_field, "") or ""),
-                }
-
-        for k, e in E.items():
-            if k not in S:
-                cap_id = int(k)
-                info = cap_info_map.get(cap_id, {})
-                deletes.append({
-                    "id": f"D|{k}|{e['precio_neto']}",
-                    "capacidad_id": cap_id,
-                    "antes": str(e["precio_neto"]),
-                    "despues": None,
-                    "delta": None,
-                    "kind": "DELETE",
-                    "tipo": info.get("tipo", "-"),
-                    "marca": info.get("marca", "-"),
-                    "modelo_norm": info.get("modelo_norm", "-"),
-                    "almacenamiento_gb": info.get("almacenamiento_gb"),
-                })
-
-        no_mapeados = list(
-            LikewizeItemStaging.objects
-            .filter(tarea=t, capacidad_id__isnull=True)
-            .values("id", "tipo", "modelo_norm", "almacenamiento_gb", "precio_b2b", "marca")
-        )
-
-        return Response({
-            "summary": {
-                "inserts": len(inserts), "updates": len(updates), "deletes": len(deletes),
-                "no_mapeados": len(no_mapeados),
-                "total": len(inserts) + len(updates) + len(deletes)
-            },
-            "changes": inserts + updates + deletes,
-            "no_mapeados": no_mapeados,
-        })
+        return _diff_paginado(request, tarea_id, "backmarket")
 
 
 class AplicarCambiosBackmarketView(APIView):
     permission_classes = [permissions.IsAdminUser]
 
-    @transaction.atomic
     def post(self, request, tarea_id):
-        ids = set(request.data.get("ids") or [])
-        if not ids:
-            return Response({"detail": "No hay ids a aplicar."}, status=400)
-
-        resp = DiffBackmarketView().get(request, tarea_id).data
-        if "changes" not in resp:
-            return Response({"detail": "Tarea no lista."}, status=409)
-
-        PrecioModel = _resolve_model_from_setting(getattr(settings, "PRECIOS_B2B_MODEL", None), "PRECIOS_B2B_MODEL")
-        applied = {"INSERT": 0, "UPDATE": 0, "DELETE": 0}
-
-        set_tenant_null = _has_field(PrecioModel, "tenant_schema")
-        has_versioning = _has_field(PrecioModel, "valid_from") and _has_field(PrecioModel, "valid_to")
-        now = timezone.now()
-
-        for ch in resp["changes"]:
-            if ch["id"] not in ids:
-                continue
-            cap_id = ch["capacidad_id"]
-
-            qs = PrecioModel.objects.filter(capacidad_id=cap_id)
-            if _has_field(PrecioModel, "canal"):
-                qs = qs.filter(canal="B2C")
-            if _has_field(PrecioModel, "fuente"):
-                qs = qs.filter(fuente="Backmarket")
-            if set_tenant_null:
-                qs = qs.filter(tenant_schema__isnull=True)
-
-            if ch["kind"] in {"INSERT", "UPDATE"}:
-                nuevo_precio = Decimal(ch["despues"])
-                if has_versioning:
-                    vigente = qs.filter(valid_to__isnull=True).order_by("-valid_from").first()
-                    if vigente and Decimal(vigente.precio_neto) == nuevo_precio:
-                        pass
-                    else:
-                        if vigente:
-                            vigente.valid_to = now
-                            vigente.save(update_fields=["valid_to"])
-                        create_kwargs = {
-                            "capacidad_id": cap_id,
-                            "precio_neto": nuevo_precio,
-                            "valid_from": now,
-                        }
-                        if _has_field(PrecioModel, "canal"):
-                            create_kwargs["canal"] = "B2C"
-                        if _has_field(PrecioModel, "fuente"):
-                            create_kwargs["fuente"] = "Backmarket"
-                        if set_tenant_null:
-                            create_kwargs["tenant_schema"] = None
-                        PrecioModel.objects.create(**create_kwargs)
-                else:
-                    defaults = {"precio_neto": nuevo_precio}
-                    if _has_field(PrecioModel, "canal"):
-                        defaults["canal"] = "B2C"
-                    if _has_field(PrecioModel, "fuente"):
-                        defaults["fuente"] = "Backmarket"
-                    if set_tenant_null:
-                        defaults["tenant_schema"] = None
-                    PrecioModel.objects.update_or_create(capacidad_id=cap_id, defaults=defaults)
-                applied[ch["kind"]] += 1
-
-            elif ch["kind"] == "DELETE":
-                if has_versioning:
-                    updated = qs.filter(valid_to__isnull=True).update(valid_to=now)
-                    if updated:
-                        applied["DELETE"] += 1
-                else:
-                    PrecioModel.objects.filter(capacidad_id=cap_id).delete()
-                    applied["DELETE"] += 1
-
-        return Response({"applied": applied}, status=200)
+        return _aplicar_cambios_diff(request, tarea_id, "backmarket", canal="B2C", fuente_precio="Backmarket")
 
 
 class UltimaTareaBackmarketView(APIView):
@@ -2334,6 +1538,13 @@ class CorregirMapeoLikewizeView(APIView):
         staging_item.capacidad_id = new_capacidad_id
         staging_item.save(update_fields=['capacidad_id'])
 
+        # Invalidar la caché de resultados v4: este item y todo lo que apuntaba a la capacidad errónea
+        metadata = staging_item.mapping_metadata or {}
+        ResultCache().invalidate(
+            signatures=[metadata.get('cache_signature')],
+            capacidad_ids=[old_capacidad_id],
+        )
+
         # 🧠 Registrar corrección en el sistema de aprendizaje
         try:
             # Reconstruir dict de Likewize desde staging_item
@@ -1,7 +1,7 @@
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
-from django.db.models import Q, OuterRef, Subquery
+from django.db.models import Q
 from rest_framework import generics, status
 from rest_framework.decorators import api_view
 from rest_framework.pagination import PageNumberPagination
@@ -10,8 +10,9 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from productos.models.modelos import Modelo, Capacidad
-from productos.models.precios import PrecioRecompra
 from productos.models.utils import set_precio_recompra, get_precio_vigente
+from productos.services import busqueda_modelos
+from productos.services.tramos_precio import anotar_precios
 from productos.serializers import (
     CapacidadAdminListSerializer,
     CapacidadAdminUpsertSerializer,
@@ -42,42 +43,17 @@ class ModeloSearchView(APIView):
         if len(query) < 2:
             return Response([], status=status.HTTP_200_OK)
 
-        base_qs = Modelo.objects.all()
         tipo = (request.query_params.get("tipo") or "").strip()
         marca = (request.query_params.get("marca") or "").strip()
 
-        filtros = {}  # exact filters
-        if tipo:
-            filtros["tipo__iexact"] = tipo
-        if marca:
-            filtros["marca__iexact"] = marca
-
-        qs = base_qs.filter(**filtros) if filtros else base_qs
-        qs = qs.filter(
-            Q(descripcion__icontains=query)
-            | Q(tipo__icontains=query)  # Permite buscar por tipo (ej: "iMac", "iPhone")
-            | Q(likewize_modelo__icontains=query)
-            | Q(pantalla__icontains=query)
-            | Q(procesador__icontains=query)
-        )
-
-        if filtros and not qs.exists():
-            # Fallback: si los filtros exactos no encuentran nada, buscar sin filtros
-            qs = base_qs.filter(
-                Q(descripcion__icontains=query)
-                | Q(tipo__icontains=query)  # Permite buscar por tipo (ej: "iMac", "iPhone")
-                | Q(likewize_modelo__icontains=query)
-                | Q(pantalla__icontains=query)
-                | Q(procesador__icontains=query)
-            )
-
         limit = request.query_params.get("limit")
         try:
             limit_val = max(1, min(int(limit or 25), 100))
         except (TypeError, ValueError):
             limit_val = 25
 
-        resultados = qs.order_by("marca", "descripcion")[:limit_val]
+        # Ranking por trigramas y fallback de tipo/marca en una sola query
+        resultados = busqueda_modelos.buscar(query, tipo=tipo, marca=marca, limite=limit_val)
         data = ModeloMiniSerializer(resultados, many=True).data
         return Response(data, status=status.HTTP_200_OK)
 
@@ -144,28 +120,8 @@ class AdminPageNumberPagination(PageNumberPagination):
 
 
 def annotate_capacidades(qs, fecha):
-    """Añade anotaciones con precios vigentes B2B/B2C."""
-
-    vigente_base = (
-        PrecioRecompra.objects
-        .filter(capacidad_id=OuterRef("pk"), valid_from__lte=fecha)
-        .filter(Q(valid_to__isnull=True) | Q(valid_to__gt=fecha))
-        .order_by("-valid_from")
-    )
-
-    b2b_qs = vigente_base.filter(canal="B2B")
-    b2c_qs = vigente_base.filter(canal="B2C")
-
-    return qs.annotate(
-        _b2b=Subquery(b2b_qs.values("precio_neto")[:1]),
-        _b2b_from=Subquery(b2b_qs.values("valid_from")[:1]),
-        _b2b_to=Subquery(b2b_qs.values("valid_to")[:1]),
-        _b2b_src=Subquery(b2b_qs.values("fuente")[:1]),
-        _b2c=Subquery(b2c_qs.values("precio_neto")[:1]),
-        _b2c_from=Subquery(b2c_qs.values("valid_from")[:1]),
-        _b2c_to=Subquery(b2c_qs.values("valid_to")[:1]),
-        _b2c_src=Subquery(b2c_qs.values("fuente")[:1]),
-    )
+    """Añade anotaciones con precios vigentes B2B/B2C (rejilla de tramos, un JOIN)."""
+    return anotar_precios(qs, fecha)
 
 
 class CapacidadAdminMixin:
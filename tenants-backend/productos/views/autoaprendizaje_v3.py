@@ -1268,6 +1268,7 @@ class AplicarCambiosV3View(APIView):
                     ).values('id', 'capacidad_id', 'precio_neto')
                 }
 
+                actualizadas = []
                 for item in staging_items:
                         cap_id = item['capacidad_id']
                         precio_nuevo = item['precio_b2b']
@@ -1298,6 +1299,7 @@ class AplicarCambiosV3View(APIView):
                                         updated_at=timezone.now()
                                     )
                                     stats['actualizaciones_aplicadas'] += 1
+                                    actualizadas.append(cap_id)
 
                         except Exception as e:
                             stats['errores'].append({
@@ -1306,6 +1308,11 @@ class AplicarCambiosV3View(APIView):
                                 'confidence': confidence
                             })
 
+                # update() no dispara señales: sincronizar vigentes y rejilla del admin
+                if actualizadas:
+                    from productos.services.precios_vigentes import sincronizar_precios_vigentes
+                    sincronizar_precios_vigentes(capacidad_ids=actualizadas)
+
                 # Aplicar eliminaciones si se solicitó
                 if aplicar_eliminaciones:
                     # Obtener capacidades que ya no están en staging
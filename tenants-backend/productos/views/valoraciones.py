@@ -1,8 +1,6 @@
 from decimal import Decimal
 import logging
 from django.db import connection
-from django.utils import timezone
-from django.db.models import Q
 from django.db.models.functions import Length
 from django.db.utils import DatabaseError, ProgrammingError, OperationalError
 from rest_framework.views import APIView
@@ -12,9 +10,11 @@ from rest_framework import status
 
 from productos.models.modelos import Capacidad, Modelo  # Modelo/Capacidad
 from checkouters.models.dispositivo import DispositivoReal
-from productos.models.precios import PrecioRecompra, CostoPieza  # precios + costes
 from productos.serializers.valoraciones import ComercialIphoneInputSerializer
+from productos.services.costes_pieza import PIEZAS, coste_pieza
 from productos.services.grading import Params, calcular, v_suelo_desde_max
+from productos.services.precios_vigentes import precio_vigente
+from productos.services.valoraciones import TIPO_IPHONE, params_valoracion
 
 logger = logging.getLogger(__name__)
 
@@ -24,72 +24,29 @@ def vigente_precio_recompra(capacidad_id: int, canal: str, tenant_schema: str |
     """
     Devuelve precio vigente (Decimal) para capacidad+canal, preferencia por tenant_schema si existe;
     si no hay override de tenant, cae al global (tenant_schema NULL).
+    Lee del almacén PrecioVigente (una query, resolución de tenant incluida).
     """
-    now = timezone.now()
-    base = (PrecioRecompra.objects
-            .filter(capacidad_id=capacidad_id, canal=canal, valid_from__lte=now)
-            .filter(Q(valid_to__isnull=True) | Q(valid_to__gt=now)))
-    if tenant_schema:
-        rows = list(base.filter(tenant_schema=tenant_schema).order_by('-valid_from')[:1])
-        if not rows:
-            rows = list(base.filter(tenant_schema__isnull=True).order_by('-valid_from')[:1])
-    else:
-        rows = list(base.filter(tenant_schema__isnull=True).order_by('-valid_from')[:1])
-    if rows:
-        row = rows[0]
-        try:
-            logger.info(
-                "[valoraciones] vigente_precio_recompra: capacidad_id=%s canal=%s tenant=%s -> precio_neto=%s valid_from=%s valid_to=%s tenant_schema=%s",
-                capacidad_id, canal, tenant_schema, getattr(row, 'precio_neto', None), getattr(row, 'valid_from', None), getattr(row, 'valid_to', None), getattr(row, 'tenant_schema', None)
-            )
-        except Exception:
-            pass
-        return row.precio_neto
+    precio = precio_vigente(capacidad_id, canal, tenant_schema)
     logger.info(
-        "[valoraciones] vigente_precio_recompra: SIN PRECIO capacidad_id=%s canal=%s tenant=%s",
-        capacidad_id, canal, tenant_schema
+        "[valoraciones] vigente_precio_recompra: capacidad_id=%s canal=%s tenant=%s -> precio_neto=%s",
+        capacidad_id, canal, tenant_schema, precio
     )
-    return None
+    return precio
 
 def vigente_coste_pieza(modelo_id: int, capacidad_id: int | None, pieza_names_icase: list[str]) -> Decimal:
     """
     Suma coste neto + MO (horas*tarifa + fija) para la pieza más específica vigente.
-    Busca por nombre de pieza (icontains) en PiezaTipo.nombre.
+    Resuelve los nombres de pieza por la tabla de alias (PiezaAlias) y lee las
+    filas de la caché en memoria de costes_pieza.
     Si hay versión por capacidad, prioriza esa; si no, usa NULL (por modelo).
     """
-    now = timezone.now()
-    qs = (CostoPieza.objects
-          .filter(modelo_id=modelo_id, valid_from__lte=now)
-          .filter(Q(valid_to__isnull=True) | Q(valid_to__gt=now))
-          .select_related('mano_obra_tipo','pieza_tipo'))
-    # filtra por nombre de pieza
-    q_or = Q()
-    for nm in pieza_names_icase:
-        q_or |= Q(pieza_tipo__nombre__icontains=nm)
-    qs = qs.filter(q_or).order_by('-valid_from')
-
-    # preferencia por capacidad exacta
-    filas = list(qs.filter(capacidad_id=capacidad_id)[:1]) or list(qs.filter(capacidad__isnull=True)[:1])
-    if not filas:
+    total = coste_pieza(modelo_id, capacidad_id, pieza_names_icase)
+    if total is None:
         logger.info(
             "[valoraciones] vigente_coste_pieza: SIN COSTE modelo_id=%s capacidad_id=%s piezas=%s",
             modelo_id, capacidad_id, pieza_names_icase
         )
         return Decimal('0')
-
-    row = filas[0]
-    coste = Decimal(row.coste_neto or 0)
-    tarifa_h = Decimal(row.mano_obra_tipo.coste_por_hora)
-    horas = Decimal(row.horas or 0)
-    mo_fija = Decimal(row.mano_obra_fija_neta or 0)
-    total = coste + (tarifa_h * horas) + mo_fija
-    try:
-        logger.info(
-            "[valoraciones] vigente_coste_pieza: modelo_id=%s capacidad_id=%s piezas=%s -> coste_neto=%s tarifa_h=%s horas=%s mo_fija=%s total=%s pieza_tipo=%s",
-            modelo_id, capacidad_id, pieza_names_icase, coste, tarifa_h, horas, mo_fija, total, getattr(row.pieza_tipo, 'nombre', None)
-        )
-    except Exception:
-        pass
     return total
 
 class IphoneComercialValoracionView(APIView):
@@ -182,23 +139,14 @@ class IphoneComercialValoracionView(APIView):
         if v_aplus is None:
             return Response({"detail": "No hay precio vigente para esa capacidad/canal."}, status=status.HTTP_404_NOT_FOUND)
 
-        V_Aplus = int(Decimal(v_aplus).quantize(Decimal('1')))  # entero €
-
         # 2) Costes de reparación vigentes por modelo/capacidad (desde tu DB)
-        pr_bateria  = int(vigente_coste_pieza(i['modelo_id'], i['capacidad_id'], ['bater', 'battery']))
-        pr_pantalla = int(vigente_coste_pieza(i['modelo_id'], i['capacidad_id'], ['pant', 'screen', 'display']))
-        pr_chasis   = int(vigente_coste_pieza(i['modelo_id'], i['capacidad_id'], ['chasis','tapa','back','carcasa','housing','glass']))
-
-        # 3) Suelo dinámico
-        V_suelo, regla = v_suelo_desde_max(V_Aplus)
+        costes = {
+            campo: int(vigente_coste_pieza(i['modelo_id'], i['capacidad_id'], nombres))
+            for campo, nombres in PIEZAS.items()
+        }
 
-        params = Params(
-            V_Aplus=V_Aplus,
-            pp_A=0.08, pp_B=0.12, pp_C=0.15,
-            V_suelo=V_suelo,
-            pr_bateria=pr_bateria, pr_pantalla=pr_pantalla, pr_chasis=pr_chasis,
-            v_suelo_regla=regla
-        )
+        # 3) Suelo dinámico y penalizaciones fijas (las mismas que usa valorar_lote para iPhone)
+        params = params_valoracion(TIPO_IPHONE, v_aplus, costes)
 
         try:
             logger.info(
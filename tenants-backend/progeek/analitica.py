@@ -0,0 +1,629 @@
+"""
+Analítica global en el schema public, alimentada por captura de cambios.
+
+Tablas de hechos (progeek/models/analitica.py), etiquetadas por tenant_slug
+(= schema del tenant):
+- HechoOportunidad: una fila por oportunidad con valor/valor_auditado/dispositivos
+- HechoDispositivo: DispositivoReal con el estado y la fecha de su oportunidad
+- HechoTransicion: HistorialOportunidad (cambios de estado)
+
+Alimentación:
+- checkouters.signals: cada save/delete de Oportunidad, DispositivoReal o
+  HistorialOportunidad apunta su oportunidad en el lote de la transacción; al
+  confirmarla, el lote se guarda con un solo INSERT en CapturaPendiente (la
+  captura no corre en el camino de escritura)
+- Comando sync_analitica (programado en PM2): recaptura las pendientes y lo
+  nuevo desde el high-water mark (oportunidades e historial con id mayor que
+  la marca del tenant), o todo con --completo (p.ej. tras update() masivos o
+  al desplegar)
+
+La captura es idempotente: relee el estado actual de las oportunidades en el
+schema del tenant y hace upsert (bulk_create con update_conflicts) de sus
+hechos. Los dashboards globales consultan estas tablas con una query por
+bloque en lugar de recorrer los schemas de todos los tenants.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Count, Exists, Max, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+from django_tenants.utils import get_public_schema_name
+
+from django_test_app.lote_transaccion import agregar_al_lote
+
+from .models import CapturaPendiente, HechoDispositivo, HechoOportunidad, HechoTransicion, MarcaSincronizacion
+
+logger = logging.getLogger(__name__)
+
+BULK_BATCH_SIZE = 1000
+
+CAMPOS_OPORTUNIDAD = [
+    "tienda_id", "tienda_nombre", "usuario_id", "estado", "fecha_creacion", "fecha_inicio_pago",
+    "primera_recepcion", "valor", "valor_auditado", "dispositivos", "sincronizado_en",
+]
+CAMPOS_DISPOSITIVO = [
+    "oportunidad_id", "estado", "fecha_creacion", "modelo_id", "modelo_nombre", "precio_final", "auditado",
+]
+
+
+# ---------------------------------------------------------------------------
+# Captura (se ejecuta dentro del schema del tenant)
+# ---------------------------------------------------------------------------
+def capturar_oportunidades(tenant_slug: str, ids: Iterable[int]) -> int:
+    """
+    Recaptura los hechos de las oportunidades indicadas desde el schema actual.
+
+    Las oportunidades que ya no existen se borran de las tablas de hechos.
+
+    Returns:
+        Número de oportunidades escritas
+    """
+    from checkouters.models import DispositivoReal, HistorialOportunidad, Oportunidad
+
+    ids = {i for i in ids if i}
+    if not ids:
+        return 0
+
+    opps = {
+        o["id"]: o
+        for o in Oportunidad.objects.filter(id__in=ids).values(
+            "id", "tienda_id", "tienda__nombre", "usuario_id", "estado", "fecha_creacion", "fecha_inicio_pago",
+        )
+    }
+    drs = list(
+        DispositivoReal.objects.filter(oportunidad_id__in=opps)
+        .values("id", "oportunidad_id", "modelo_id", "modelo__descripcion", "precio_final", "auditado", "fecha_recepcion")
+        .order_by("id")
+    )
+    historial = list(
+        HistorialOportunidad.objects.filter(oportunidad_id__in=opps)
+        .values("id", "oportunidad_id", "estado_anterior", "estado_nuevo", "fecha")
+    )
+
+    acc = defaultdict(lambda: {"valor": Decimal("0"), "valor_auditado": Decimal("0"), "dispositivos": 0, "primera_recepcion": None})
+    for dr in drs:
+        a = acc[dr["oportunidad_id"]]
+        precio = dr["precio_final"] or Decimal("0")
+        a["valor"] += precio
+        if dr["auditado"]:
+            a["valor_auditado"] += precio
+        a["dispositivos"] += 1
+        if dr["fecha_recepcion"] and (a["primera_recepcion"] is None or dr["fecha_recepcion"] < a["primera_recepcion"]):
+            a["primera_recepcion"] = dr["fecha_recepcion"]
+
+    hechos_opp = [
+        HechoOportunidad(
+            tenant_slug=tenant_slug, oportunidad_id=o["id"], tienda_id=o["tienda_id"],
+            tienda_nombre=o["tienda__nombre"] or "", usuario_id=o["usuario_id"], estado=o["estado"],
+            fecha_creacion=o["fecha_creacion"], fecha_inicio_pago=o["fecha_inicio_pago"], **acc[o["id"]],
+        )
+        for o in opps.values()
+    ]
+    hechos_dr = [
+        HechoDispositivo(
+            tenant_slug=tenant_slug, dispositivo_id=dr["id"], oportunidad_id=dr["oportunidad_id"],
+            estado=opps[dr["oportunidad_id"]]["estado"], fecha_creacion=opps[dr["oportunidad_id"]]["fecha_creacion"],
+            modelo_id=dr["modelo_id"], modelo_nombre=dr["modelo__descripcion"] or "",
+            precio_final=dr["precio_final"], auditado=bool(dr["auditado"]),
+        )
+        for dr in drs
+    ]
+    hechos_hist = [
+        HechoTransicion(
+            tenant_slug=tenant_slug, historial_id=h["id"], oportunidad_id=h["oportunidad_id"],
+            estado_anterior=h["estado_anterior"], estado_nuevo=h["estado_nuevo"], fecha=h["fecha"],
+        )
+        for h in historial
+    ]
+
+    borradas = ids - set(opps)
+    with transaction.atomic():
+        if borradas:
+            HechoOportunidad.objects.filter(tenant_slug=tenant_slug, oportunidad_id__in=borradas).delete()
+            HechoTransicion.objects.filter(tenant_slug=tenant_slug, oportunidad_id__in=borradas).delete()
+        (HechoDispositivo.objects
+         .filter(tenant_slug=tenant_slug, oportunidad_id__in=ids)
+         .exclude(dispositivo_id__in=[dr["id"] for dr in drs])
+         .delete())
+        HechoOportunidad.objects.bulk_create(
+            hechos_opp, batch_size=BULK_BATCH_SIZE, update_conflicts=True,
+            unique_fields=["tenant_slug", "oportunidad_id"], update_fields=CAMPOS_OPORTUNIDAD,
+        )
+        HechoDispositivo.objects.bulk_create(
+            hechos_dr, batch_size=BULK_BATCH_SIZE, update_conflicts=True,
+            unique_fields=["tenant_slug", "dispositivo_id"], update_fields=CAMPOS_DISPOSITIVO,
+        )
+        # El historial es de solo inserción
+        HechoTransicion.objects.bulk_create(hechos_hist, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+    return len(hechos_opp)
+
+
+def programar_captura(*oportunidad_ids) -> None:
+    """
+    Marca oportunidades del schema actual como pendientes de captura al
+    confirmar la transacción en curso (inmediatamente si no hay transacción).
+
+    Todas las señales de la misma transacción comparten un lote y un único
+    callback de on_commit.
+    """
+    schema = connection.schema_name
+    ids = {i for i in oportunidad_ids if i}
+    if not ids or schema == get_public_schema_name():
+        return
+    agregar_al_lote("analitica", lambda pendientes: pendientes[schema].update(ids), _guardar_pendientes,
+                    vacio=lambda: defaultdict(set))
+
+
+def _guardar_pendientes(pendientes) -> None:
+    filas = [
+        CapturaPendiente(tenant_slug=schema, oportunidad_id=oportunidad_id)
+        for schema, ids in pendientes.items()
+        for oportunidad_id in ids
+    ]
+    try:
+        # Una marca ya existente se renueva: sync_analitica solo borra las
+        # anteriores a su pasada
+        CapturaPendiente.objects.bulk_create(
+            filas, batch_size=BULK_BATCH_SIZE, update_conflicts=True,
+            unique_fields=["tenant_slug", "oportunidad_id"], update_fields=["creada"],
+        )
+    except Exception:
+        # La analítica no debe romper la operación; sync_analitica --completo lo repara
+        logger.exception("Analítica: error marcando %s oportunidades pendientes", len(filas))
+
+
+def sincronizar_tenant(tenant_slug: str, completo: bool = False) -> int:
+    """
+    Sincroniza los hechos de un tenant (hay que estar en su schema).
+
+    - Incremental: oportunidades pendientes (CapturaPendiente), nuevas desde
+      la marca y con historial nuevo desde la marca
+    - Completo: todas las oportunidades; borra los hechos huérfanos
+
+    Returns:
+        Número de oportunidades capturadas
+    """
+    from checkouters.models import HistorialOportunidad, Oportunidad
+
+    marca, _ = MarcaSincronizacion.objects.get_or_create(tenant_slug=tenant_slug)
+    # Las marcas nuevas se leen antes de capturar: lo que entre mientras tanto
+    # se recoge en la siguiente pasada (la captura es idempotente)
+    corte = timezone.now()
+    pendientes = CapturaPendiente.objects.filter(tenant_slug=tenant_slug, creada__lte=corte)
+    maximos = {
+        "opp": Oportunidad.objects.aggregate(m=Max("id"))["m"] or 0,
+        "hist": HistorialOportunidad.objects.aggregate(m=Max("id"))["m"] or 0,
+    }
+
+    if completo:
+        ids = set(Oportunidad.objects.values_list("id", flat=True))
+        ids |= set(HechoOportunidad.objects.filter(tenant_slug=tenant_slug).values_list("oportunidad_id", flat=True))
+    else:
+        ids = set(Oportunidad.objects.filter(id__gt=marca.ultima_oportunidad_id).values_list("id", flat=True))
+        ids |= set(HistorialOportunidad.objects
+                   .filter(id__gt=marca.ultimo_historial_id)
+                   .values_list("oportunidad_id", flat=True))
+    ids |= set(pendientes.values_list("oportunidad_id", flat=True))
+
+    total = 0
+    ids = sorted(ids)
+    for i in range(0, len(ids), BULK_BATCH_SIZE):
+        total += capturar_oportunidades(tenant_slug, ids[i:i + BULK_BATCH_SIZE])
+
+    marca.ultima_oportunidad_id = max(marca.ultima_oportunidad_id, maximos["opp"])
+    marca.ultimo_historial_id = max(marca.ultimo_historial_id, maximos["hist"])
+    marca.sincronizado_en = timezone.now()
+    marca.save()
+    pendientes.delete()
+    return total
+
+
+# ---------------------------------------------------------------------------
+# Consultas globales (schema public)
+# ---------------------------------------------------------------------------
+def q_ambito_global(user) -> Optional[Q]:
+    """
+    Filtro sobre las tablas de hechos con lo que el usuario ve en cada tenant.
+
+    Returns:
+        Q() si ve todo, None si no ve nada, o un OR de (tenant, tiendas, usuario)
+        por cada tenant en el que tiene rol
+    """
+    from checkouters.utils.role_filters import ambito_rol
+
+    gr = getattr(user, "global_role", None) if user and user.is_authenticated else None
+    if not gr:
+        return None
+    if getattr(gr, "es_superadmin", False) or getattr(gr, "es_empleado_interno", False):
+        return Q()
+
+    q = None
+    for tenant_slug in gr.roles.values_list("tenant_slug", flat=True):
+        ambito = ambito_rol(user, tenant_slug)
+        if ambito.ninguno:
+            continue
+        q_tenant = Q(tenant_slug=tenant_slug)
+        if ambito.tienda_ids is not None:
+            q_tenant &= Q(tienda_id__in=ambito.tienda_ids)
+        if ambito.usuario_id is not None:
+            q_tenant &= Q(usuario_id=ambito.usuario_id)
+        q = q_tenant if q is None else q | q_tenant
+    return q
+
+
+_TRUNC = {"dia": TruncDay, "semana": TruncWeek, "mes": TruncMonth}
+
+
+def dashboard_global(fecha_inicio, fecha_fin, granularidad="mes", comparar=False, filtros=None,
+                     ambito: Optional[Q] = None, opciones=None):
+    """
+    Dashboard de manager agregado para todos los tenants desde las tablas de hechos.
+
+    Devuelve lo mismo que DashboardAdminAPIView al fusionar los bloques de
+    DashboardManagerSerializer.collect de cada tenant: bloques_por_tenant()
+    calcula esos bloques con una query agrupada por tenant_slug por bloque
+    (independientemente del número de tenants) y fusionar_bloques() los
+    fusiona con las mismas reglas.
+
+    Args:
+        filtros: {"tienda_id", "usuario_id", "tenant_slug"}
+        ambito: Q de q_ambito_global (None = sin acceso)
+        opciones: Las de collect ({"estados_factura_adelante"}); sin estados,
+            el bloque de negocio de cada tenant queda vacío, como en collect
+    """
+    from django_tenants.utils import get_tenant_model
+
+    granularidad = granularidad if granularidad in _TRUNC else "mes"
+    comisiones = dict(
+        get_tenant_model().objects.exclude(schema_name=get_public_schema_name())
+        .order_by("schema_name").values_list("schema_name", "comision_pct")
+    )
+    if not comisiones:
+        return _dashboard_vacio()
+    bloques, anterior = bloques_por_tenant(
+        fecha_inicio, fecha_fin, granularidad, comparar, filtros or {}, ambito, opciones or {}, comisiones,
+    )
+    return fusionar_bloques(bloques, comisiones, anterior)
+
+
+def _dashboard_vacio():
+    return {
+        "resumen": {"valor_total": Decimal(0), "ticket_medio": Decimal(0), "comision_total": Decimal(0), "comision_media": Decimal(0), "margen_medio": Decimal(0)},
+        "evolucion": [],
+        "comparativa": None,
+        "rankings": {"productos": [], "tiendas_por_valor": [], "usuarios_por_valor": [], "tiendas_por_operaciones": [], "usuarios_por_operaciones": []},
+        "pipeline": {"abiertas": 0, "valor_estimado": 0, "por_estado": []},
+        "operativa": {"recibidas": 0, "completadas": 0, "conversion_pct": None, "tmed_respuesta_h": None, "tmed_recogida_h": None, "tmed_cierre_h": None, "rechazos": {"total": 0, "motivos": []}, "abandono_pct": None},
+    }
+
+
+def bloques_por_tenant(fecha_inicio, fecha_fin, granularidad, comparar, filtros, ambito, opciones, comisiones):
+    """
+    Bloque de collect de cada tenant de `comisiones`, desde las tablas de hechos.
+
+    Returns:
+        ([bloque con "_schema"], valor de negocio del periodo anterior o None)
+    """
+    from checkouters.utils.utilskpis import (
+        ACCEPTED_STATES, CERRADA_ESTADOS, PICKUP_STATES, PIPELINE_ESTADOS,
+        _avg_hours_from_pairs, _campo_nombre_usuario, _clave_periodo, _serie_vacia_desde_hasta,
+    )
+
+    estados_negocio = set(opciones.get("estados_factura_adelante") or [])
+    q_filtro = ambito if ambito is not None else Q(pk__in=[])
+    for campo in ("tenant_slug", "tienda_id", "usuario_id"):
+        if filtros.get(campo):
+            q_filtro &= Q(**{campo: filtros[campo]})
+    opps = HechoOportunidad.objects.filter(q_filtro)
+
+    q_actual = Q(fecha_creacion__range=(fecha_inicio, fecha_fin))
+    # Periodo anterior como comparativa_periodo: mismos días, hasta el día antes del inicio
+    dias = (fecha_fin.date() - fecha_inicio.date()).days + 1
+    fin_anterior = fecha_inicio - timedelta(days=1)
+    q_anterior = Q(fecha_creacion__range=(fin_anterior - timedelta(days=dias - 1), fin_anterior))
+    negocio = opps.filter(estado__in=estados_negocio, dispositivos__gt=0)
+    negocio_actual = negocio.filter(q_actual)
+
+    def _por_tenant(filas):
+        agrupadas = defaultdict(list)
+        for f in filas:
+            agrupadas[f["tenant_slug"]].append(f)
+        return agrupadas
+
+    # 1) Negocio (actual y anterior en la misma query)
+    resumen = {
+        r["tenant_slug"]: r
+        for r in negocio.filter(q_actual | q_anterior if comparar else q_actual)
+        .values("tenant_slug")
+        .annotate(total=Sum("valor", filter=q_actual), ops=Count("id", filter=q_actual),
+                  total_anterior=Sum("valor", filter=q_anterior))
+        .order_by()
+    }
+    anterior = None
+    if comparar:
+        anterior = sum((r["total_anterior"] or Decimal("0") for r in resumen.values()), Decimal("0"))
+
+    # 2) Evolución
+    evolucion = defaultdict(dict)
+    for r in (negocio_actual
+              .values("tenant_slug", periodo=_TRUNC[granularidad]("fecha_creacion"))
+              .annotate(total=Sum("valor"))
+              .order_by()):
+        clave = _clave_periodo(r["periodo"], granularidad)
+        evolucion[r["tenant_slug"]][clave] = evolucion[r["tenant_slug"]].get(clave, Decimal("0")) + (r["total"] or Decimal("0"))
+    serie = _serie_vacia_desde_hasta(fecha_inicio, fecha_fin, granularidad)
+
+    # 3) Rankings (top 10 de cada tenant, como collect)
+    productos = _por_tenant(
+        HechoDispositivo.objects
+        .filter(Exists(negocio_actual.filter(tenant_slug=OuterRef("tenant_slug"), oportunidad_id=OuterRef("oportunidad_id"))))
+        .values("tenant_slug", "modelo_nombre")
+        .annotate(valor=Sum("precio_final"))
+        .order_by()
+    )
+    tiendas = _por_tenant(
+        negocio_actual.values("tenant_slug", "tienda_id", "tienda_nombre")
+        .annotate(valor=Sum("valor"), ops=Count("id")).order_by()
+    )
+    usuarios = _por_tenant(
+        negocio_actual.values("tenant_slug", "usuario_id")
+        .annotate(valor=Sum("valor"), ops=Count("id")).order_by()
+    )
+    nombres = dict(
+        get_user_model().objects
+        .filter(id__in={u["usuario_id"] for filas in usuarios.values() for u in filas if u["usuario_id"]})
+        .values_list("id", _campo_nombre_usuario())
+    )
+
+    def _top(filas, metrica, clave):
+        filas = sorted(filas, key=lambda f: f[metrica] or 0, reverse=True)[:10]
+        return [{**clave(f), metrica: f[metrica] or 0} for f in filas]
+
+    # 4) Pipeline (abiertas, sin filtro de fechas) y recuentos por estado del rango
+    estados = _por_tenant(
+        opps.filter(Q(estado__in=PIPELINE_ESTADOS) | q_actual)
+        .values("tenant_slug", "estado")
+        .annotate(abiertas=Count("id", filter=Q(estado__in=PIPELINE_ESTADOS)),
+                  auditado=Sum("valor_auditado", filter=Q(estado__in=PIPELINE_ESTADOS)),
+                  recibidas=Count("id", filter=q_actual))
+        .order_by()
+    )
+
+    # 5) Tiempos de la operativa desde las transiciones
+    def _primera(estados):
+        return Min("fecha", filter=Q(estado_nuevo__in=list(estados)))
+
+    opp_ref = opps.filter(q_actual, tenant_slug=OuterRef("tenant_slug"), oportunidad_id=OuterRef("oportunidad_id"))
+    hitos = _por_tenant(
+        HechoTransicion.objects.filter(Exists(opp_ref))
+        .values("tenant_slug", "oportunidad_id")
+        .annotate(
+            t_transito=_primera({"En tránsito"}),
+            t_oferta=_primera({"Oferta confirmada", "Nueva oferta enviada"}),
+            t_aceptada=_primera(ACCEPTED_STATES),
+            t_recogida=_primera(PICKUP_STATES),
+            t_pagado=_primera({"Pagado"}),
+            inicio=Subquery(opp_ref.values("fecha_creacion")[:1]),
+            recepcion=Subquery(opp_ref.values("primera_recepcion")[:1]),
+        )
+        .order_by()
+    )
+
+    bloques = []
+    for schema, comision_pct in comisiones.items():
+        # Comisión del tenant como en collect (10% si no tiene)
+        pct = Decimal(str(comision_pct)) / Decimal("100") if comision_pct is not None else Decimal("0.10")
+        neg = resumen.get(schema) or {}
+        valor_total = neg.get("total") or Decimal("0")
+        ticket_medio = valor_total / Decimal(neg.get("ops") or 1)
+
+        pipe = {r["estado"]: r for r in estados.get(schema, []) if r["abiertas"]}
+        por_estado = [
+            {"estado": e, "count": pipe[e]["abiertas"] if e in pipe else 0,
+             "valor": (pipe[e]["auditado"] if e in pipe else None) or Decimal("0")}
+            for e in PIPELINE_ESTADOS
+        ]
+        recuento = {r["estado"]: r["recibidas"] for r in estados.get(schema, [])}
+        recibidas = sum(recuento.values())
+        completadas = sum(recuento.get(e, 0) for e in CERRADA_ESTADOS)
+        h = hitos.get(schema, [])
+
+        bloques.append({
+            "_schema": schema,
+            "resumen": {
+                "valor_total": valor_total,
+                "ticket_medio": ticket_medio,
+                "comision_total": valor_total * pct,
+                "comision_media": ticket_medio * pct,
+                "margen_medio": None,
+            },
+            "evolucion": [{"periodo": k, "valor": evolucion[schema].get(k, Decimal("0"))} for k in serie],
+            "rankings": {
+                "productos": _top(productos.get(schema, []), "valor", lambda f: {"nombre": f["modelo_nombre"] or None}),
+                "tiendas_por_valor": _top(tiendas.get(schema, []), "valor", lambda f: {"tienda_id": f["tienda_id"], "nombre": f["tienda_nombre"] or None}),
+                "usuarios_por_valor": _top(usuarios.get(schema, []), "valor", lambda f: {"usuario_id": f["usuario_id"], "nombre": nombres.get(f["usuario_id"])}),
+                "tiendas_por_operaciones": _top(tiendas.get(schema, []), "ops", lambda f: {"tienda_id": f["tienda_id"], "nombre": f["tienda_nombre"] or None}),
+                "usuarios_por_operaciones": _top(usuarios.get(schema, []), "ops", lambda f: {"usuario_id": f["usuario_id"], "nombre": nombres.get(f["usuario_id"])}),
+            },
+            "pipeline": {
+                "abiertas": sum(p["count"] for p in por_estado),
+                "valor_estimado": sum((p["valor"] for p in por_estado), Decimal("0")),
+                "por_estado": por_estado,
+            },
+            "operativa": {
+                "recibidas": recibidas,
+                "completadas": completadas,
+                "conversion_pct": round(completadas * 100.0 / recibidas, 2) if recibidas else 0.0,
+                "tmed_respuesta_h": _avg_hours_from_pairs([(x["t_transito"], x["t_oferta"]) for x in h]),
+                "tmed_recogida_h": _avg_hours_from_pairs([(x["t_aceptada"], x["t_recogida"] or x["recepcion"]) for x in h]),
+                "tmed_cierre_h": _avg_hours_from_pairs([(x["inicio"], x["t_pagado"]) for x in h]),
+                "rechazos": {"total": recuento.get("Rechazada", 0)},
+                "abandono_pct": round(recuento.get("Cancelado", 0) * 100.0 / recibidas, 2) if recibidas else 0.0,
+            },
+        })
+    return bloques, anterior
+
+
+def fusionar_bloques(bloques, comisiones, anterior=None):
+    """
+    Fusiona los bloques de collect de varios tenants en un solo dashboard.
+
+    Sumas de importes y recuentos, rankings fusionados por nombre, medias de
+    los porcentajes y tiempos de cada tenant y, si el negocio sale a cero,
+    los fallbacks sobre el pipeline y la comisión de cada tenant.
+
+    Args:
+        comisiones: {schema: comision_pct (0-100)}
+        anterior: Valor de negocio del periodo anterior (None = sin comparar)
+    """
+    pct_map = {schema: Decimal(str(pct or 0)) / Decimal("100") for schema, pct in comisiones.items()}
+
+    res_agg = defaultdict(Decimal)
+    evol_map = defaultdict(Decimal)
+    rank_prod = defaultdict(Decimal)
+    rank_tiendas_valor = defaultdict(Decimal)
+    rank_users_valor = defaultdict(Decimal)
+    rank_tiendas_ops = defaultdict(Decimal)
+    rank_users_ops = defaultdict(Decimal)
+    pipe_estado = {}
+    abiertas = Decimal(0)
+    valor_estimado = Decimal(0)
+    total_ops_count = Decimal(0)
+
+    conv_acc = Decimal(0); conv_n = 0
+    t_resp_acc = Decimal(0); t_resp_n = 0
+    t_rec_acc = Decimal(0); t_rec_n = 0
+    t_cie_acc = Decimal(0); t_cie_n = 0
+    aband_acc = Decimal(0); aband_n = 0
+    rech_mot = defaultdict(Decimal)
+    rech_total = Decimal(0)
+    recibidas_sum = Decimal(0)
+    completadas_sum = Decimal(0)
+
+    for b in bloques:
+        for k in ("valor_total", "ticket_medio", "comision_total", "comision_media", "margen_medio"):
+            res_agg[k] += Decimal(str((b.get("resumen") or {}).get(k, 0) or 0))
+
+        for p in b.get("evolucion") or []:
+            periodo = str(p.get("periodo", ""))
+            evol_map[periodo] += Decimal(str(p.get("valor", 0)))
+
+        ranks = b.get("rankings") or {}
+        for r in ranks.get("productos") or []:
+            rank_prod[str(r.get("nombre", ""))] += Decimal(str(r.get("valor", 0)))
+        for r in ranks.get("tiendas_por_valor") or []:
+            rank_tiendas_valor[str(r.get("tienda", r.get("nombre", "")))] += Decimal(str(r.get("valor", 0)))
+        for r in ranks.get("usuarios_por_valor") or []:
+            rank_users_valor[str(r.get("usuario", r.get("nombre", "")))] += Decimal(str(r.get("valor", 0)))
+        for r in ranks.get("tiendas_por_operaciones") or []:
+            rank_tiendas_ops[str(r.get("tienda", r.get("nombre", "")))] += Decimal(str(r.get("ops", 0)))
+        for r in ranks.get("usuarios_por_operaciones") or []:
+            rank_users_ops[str(r.get("usuario", r.get("nombre", "")))] += Decimal(str(r.get("ops", 0)))
+
+        pipe = b.get("pipeline") or {}
+        abiertas += Decimal(str(pipe.get("abiertas", 0)))
+        valor_estimado += Decimal(str(pipe.get("valor_estimado", 0)))
+        for row in pipe.get("por_estado") or []:
+            e = str(row.get("estado", ""))
+            d = pipe_estado.setdefault(e, {"count": Decimal(0), "valor": Decimal(0)})
+            d["count"] += Decimal(str(row.get("count", 0)))
+            d["valor"] += Decimal(str(row.get("valor", 0)))
+            total_ops_count += Decimal(str(row.get("count", 0)))
+
+        op = b.get("operativa") or {}
+        if op.get("recibidas") is not None:
+            recibidas_sum += Decimal(str(op.get("recibidas", 0)))
+        if op.get("completadas") is not None:
+            completadas_sum += Decimal(str(op.get("completadas", 0)))
+        if op.get("conversion_pct") is not None: conv_acc += Decimal(str(op.get("conversion_pct", 0))); conv_n += 1
+        if op.get("tmed_respuesta_h") is not None: t_resp_acc += Decimal(str(op.get("tmed_respuesta_h", 0))); t_resp_n += 1
+        if op.get("tmed_recogida_h") is not None: t_rec_acc += Decimal(str(op.get("tmed_recogida_h", 0))); t_rec_n += 1
+        if op.get("tmed_cierre_h") is not None: t_cie_acc += Decimal(str(op.get("tmed_cierre_h", 0))); t_cie_n += 1
+        if op.get("abandono_pct") is not None: aband_acc += Decimal(str(op.get("abandono_pct", 0))); aband_n += 1
+        rech = (op.get("rechazos") or {})
+        rech_total += Decimal(str(rech.get("total", 0)))
+        for m in rech.get("motivos") or []:
+            rech_mot[str(m.get("motivo", ""))] += Decimal(str(m.get("count", 0)))
+
+    evolucion = [{"periodo": k, "valor": v} for k, v in evol_map.items()]
+    evolucion.sort(key=lambda x: x["periodo"])  # YYYY-MM
+
+    def _top(dct, key_name, val_name, top=10):
+        arr = [{key_name: k, val_name: v} for k, v in dct.items()]
+        arr.sort(key=lambda x: x[val_name], reverse=True)
+        return arr[:top]
+
+    rankings = {
+        "productos": _top(rank_prod, "nombre", "valor"),
+        "tiendas_por_valor": _top(rank_tiendas_valor, "tienda", "valor"),
+        "usuarios_por_valor": _top(rank_users_valor, "usuario", "valor"),
+        "tiendas_por_operaciones": _top(rank_tiendas_ops, "tienda", "ops"),
+        "usuarios_por_operaciones": _top(rank_users_ops, "usuario", "ops"),
+    }
+    pipeline = {"abiertas": abiertas, "valor_estimado": valor_estimado, "por_estado": [{"estado": k, **v} for k, v in pipe_estado.items()]}
+    operativa = {
+        "recibidas": recibidas_sum,
+        "completadas": completadas_sum,
+        "conversion_pct": (conv_acc / conv_n) if conv_n else None,
+        "tmed_respuesta_h": (t_resp_acc / t_resp_n) if t_resp_n else None,
+        "tmed_recogida_h": (t_rec_acc / t_rec_n) if t_rec_n else None,
+        "tmed_cierre_h": (t_cie_acc / t_cie_n) if t_cie_n else None,
+        "rechazos": {"total": rech_total, "motivos": [{"motivo": k, "count": v} for k, v in rech_mot.items()]},
+        "abandono_pct": (aband_acc / aband_n) if aband_n else None,
+    }
+
+    actual = sum((p["valor"] for p in evolucion), Decimal("0"))
+    compar = {"actual": actual, "anterior": anterior, "variacion_pct": None}
+    if anterior:
+        compar["variacion_pct"] = round((actual - anterior) / anterior * Decimal("100"), 2)
+
+    # Fallbacks: si la suma de valor_total es 0, usa el valor estimado del pipeline
+    if res_agg.get("valor_total", Decimal(0)) == 0 and valor_estimado > 0:
+        res_agg["valor_total"] = valor_estimado
+    # Ticket medio: si es 0 y hay operaciones, deriva del valor_total y el recuento total de oportunidades
+    if res_agg.get("ticket_medio", Decimal(0)) == 0 and total_ops_count > 0:
+        res_agg["ticket_medio"] = res_agg["valor_total"] / total_ops_count
+    # Comisión: si está en 0, calcula usando el porcentaje configurado en cada tenant
+    if res_agg.get("comision_total", Decimal(0)) == 0 and res_agg.get("valor_total", Decimal(0)) > 0:
+        total_calc = Decimal(0)
+        for b in bloques:
+            bres = b.get("resumen") or {}
+            pct = pct_map.get(b.get("_schema"), Decimal(0))
+            b_com_tot = Decimal(str(bres.get("comision_total", 0) or 0))
+            b_val_tot = Decimal(str(bres.get("valor_total", 0) or 0))
+            if b_com_tot == 0 and b_val_tot > 0 and pct > 0:
+                total_calc += (b_val_tot * pct)
+            else:
+                total_calc += b_com_tot
+        if total_calc > 0:
+            res_agg["comision_total"] = total_calc
+
+    if res_agg.get("comision_media", Decimal(0)) == 0 and res_agg.get("ticket_medio", Decimal(0)) > 0:
+        # Aproximación: media de comisiones medias por tenant usando su pct cuando falte
+        medias = []
+        for b in bloques:
+            bres = b.get("resumen") or {}
+            pct = pct_map.get(b.get("_schema"), Decimal(0))
+            b_com_med = Decimal(str(bres.get("comision_media", 0) or 0))
+            b_t_med = Decimal(str(bres.get("ticket_medio", 0) or 0))
+            if b_com_med == 0 and b_t_med > 0 and pct > 0:
+                medias.append(b_t_med * pct)
+            elif b_com_med > 0:
+                medias.append(b_com_med)
+        if medias:
+            res_agg["comision_media"] = sum(medias) / Decimal(len(medias))
+
+    return {
+        "resumen": dict(res_agg),
+        "evolucion": evolucion,
+        "comparativa": compar,
+        "rankings": rankings,
+        "pipeline": pipeline,
+        "operativa": operativa,
+    }
@@ -0,0 +1,204 @@
+"""
+Alta de partners clonando un schema plantilla ya migrado.
+
+Crear un Company con auto_create_schema ejecuta todas las migraciones de las
+TENANT_APPS sobre el schema nuevo, y eso crece con cada migración. Aquí se
+mantiene un schema plantilla (TENANT_PLANTILLA_SCHEMA) con todas las
+migraciones aplicadas y se copia con la función SQL clone_schema de
+django-tenants (estructura + datos: contenttypes, permisos y los datos
+semilla que dejen las migraciones o que se carguen en la plantilla).
+
+- La plantilla (y la función clone_schema) solo se ponen al día con
+  `manage.py plantilla_tenant` en cada despliegue, bajo un advisory lock
+  exclusivo
+- El alta clona bajo el mismo lock en modo compartido; si la plantilla falta,
+  le faltan migraciones o se está actualizando, falla en el acto con
+  PlantillaDesactualizada en lugar de migrar dentro de la petición
+- Tras clonar se verifica que el schema nuevo tiene las mismas migraciones
+  que el código
+- `manage.py plantilla_tenant --benchmark` compara clonar frente a migrar
+
+Con TENANT_PROVISION_CLONAR=False se vuelve al alta clásica.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
+from django_tenants.clone import CLONE_SCHEMA_FUNCTION
+from django_tenants.signals import post_schema_sync
+from django_tenants.utils import schema_context, schema_exists
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock de la plantilla: exclusivo mientras se actualiza,
+# compartido mientras se clona
+_LOCK_PLANTILLA = 0x7A71_0004
+
+
+class PlantillaDesactualizada(RuntimeError):
+    """La plantilla no se puede clonar ahora: hay que ejecutar plantilla_tenant."""
+
+
+def schema_plantilla() -> str:
+    return getattr(settings, "TENANT_PLANTILLA_SCHEMA", "plantilla_tenant")
+
+
+def migraciones_pendientes(schema, loader=None) -> list:
+    """
+    Migraciones del código que no constan como aplicadas en el schema.
+
+    Returns:
+        Lista ordenada de (app, nombre); vacía si el schema está al día
+    """
+    loader = loader or MigrationLoader(None, ignore_no_migrations=True)
+    with schema_context(schema):
+        aplicadas = set(MigrationRecorder(connection).applied_migrations())
+    return sorted(set(loader.graph.nodes) - aplicadas)
+
+
+def _migrar(schema, verbosity=0):
+    call_command("migrate_schemas", tenant=True, schema_name=schema, interactive=False, verbosity=verbosity)
+    connection.set_schema_to_public()
+
+
+def actualizar_plantilla(verbosity=0, loader=None) -> list:
+    """
+    Crea la plantilla si no existe, le aplica las migraciones pendientes e
+    instala la función clone_schema. Solo para el comando de despliegue.
+
+    Returns:
+        Migraciones que se han aplicado
+    """
+    plantilla = schema_plantilla()
+    connection.set_schema_to_public()
+    with connection.cursor() as cursor:
+        # Lock de sesión: migrate_schemas hace commit por migración
+        cursor.execute("SELECT pg_advisory_lock(%s)", [_LOCK_PLANTILLA])
+    try:
+        if not schema_exists(plantilla):
+            with connection.cursor() as cursor:
+                cursor.execute(f'CREATE SCHEMA "{plantilla}"')
+        pendientes = migraciones_pendientes(plantilla, loader)
+        if pendientes:
+            logger.info("Plantilla %s: aplicando %s migraciones", plantilla, len(pendientes))
+            _migrar(plantilla, verbosity)
+        db_user = settings.DATABASES["default"].get("USER") or "postgres"
+        with connection.cursor() as cursor:
+            cursor.execute(CLONE_SCHEMA_FUNCTION.format(db_user=db_user))
+    finally:
+        connection.set_schema_to_public()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [_LOCK_PLANTILLA])
+    return pendientes
+
+
+def _comprobar_plantilla(loader) -> None:
+    """
+    Toma el lock compartido de la plantilla hasta el final de la transacción y
+    comprueba que se puede clonar.
+
+    Raises:
+        PlantillaDesactualizada: Se está actualizando, no existe, le faltan
+            migraciones o falta la función clone_schema
+    """
+    plantilla = schema_plantilla()
+    connection.set_schema_to_public()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_xact_lock_shared(%s)", [_LOCK_PLANTILLA])
+        if not cursor.fetchone()[0]:
+            raise PlantillaDesactualizada(f"La plantilla {plantilla} se está actualizando; reintenta en unos minutos")
+        cursor.execute("SELECT 1 FROM pg_proc WHERE proname = 'clone_schema'")
+        funcion = cursor.fetchone() is not None
+    if not funcion or not schema_exists(plantilla):
+        raise PlantillaDesactualizada(f"Falta la plantilla {plantilla}: ejecuta manage.py plantilla_tenant")
+    pendientes = migraciones_pendientes(plantilla, loader)
+    if pendientes:
+        raise PlantillaDesactualizada(
+            f"A la plantilla {plantilla} le faltan {len(pendientes)} migraciones: ejecuta manage.py plantilla_tenant"
+        )
+
+
+def provisionar_schema(schema, loader=None) -> dict:
+    """
+    Crea el schema de un tenant nuevo clonando la plantilla. Llamar tras
+    _comprobar_plantilla() en la misma transacción, que mantiene el lock.
+
+    Returns:
+        {"modo", "segundos"}
+    """
+    inicio = time.monotonic()
+    loader = loader or MigrationLoader(None, ignore_no_migrations=True)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT clone_schema(%s, %s, 'DATA')", [schema_plantilla(), schema])
+
+    # Verificación: mismo estado de migraciones que el código
+    faltan = migraciones_pendientes(schema, loader)
+    connection.set_schema_to_public()
+    if faltan:
+        raise RuntimeError(f"Schema {schema} clonado con migraciones pendientes: {faltan[:5]}")
+    return {"modo": "clonar", "segundos": round(time.monotonic() - inicio, 3)}
+
+
+def crear_company(model, **kwargs):
+    """
+    Crea el Company sin que django-tenants migre el schema y lo provisiona
+    clonando la plantilla (o por migraciones si TENANT_PROVISION_CLONAR=False).
+
+    Args:
+        model: Modelo de tenant (Company)
+        **kwargs: Campos del Company
+
+    Returns:
+        (company, info de provisionar_schema o None)
+
+    Raises:
+        PlantillaDesactualizada: Antes de crear nada, si la plantilla no está lista
+    """
+    if not getattr(settings, "TENANT_PROVISION_CLONAR", True):
+        return model.objects.create(**kwargs), None
+
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    _comprobar_plantilla(loader)
+    company = model(**kwargs)
+    company.auto_create_schema = False
+    company.save()
+    info = provisionar_schema(company.schema_name, loader)
+    # Mismo aviso que envía django-tenants tras crear el schema
+    post_schema_sync.send(sender=model, tenant=company.serializable_fields())
+    logger.info("Partner %s provisionado en %ss", company.schema_name, info["segundos"])
+    return company, info
+
+
+def benchmark(repeticiones=1, verbosity=0) -> dict:
+    """
+    Tiempo de provisionar un schema clonando la plantilla y migrando desde
+    cero. Los schemas de prueba se borran al terminar.
+
+    Returns:
+        {"clonar": [segundos...], "migrar": [segundos...]}
+    """
+    actualizar_plantilla(verbosity)
+    tiempos = {"clonar": [], "migrar": []}
+    for i in range(repeticiones):
+        for modo in tiempos:
+            schema = f"bench_prov_{modo}_{i}"
+            inicio = time.monotonic()
+            try:
+                if modo == "clonar":
+                    with transaction.atomic():
+                        _comprobar_plantilla(MigrationLoader(None, ignore_no_migrations=True))
+                        provisionar_schema(schema)
+                else:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f'CREATE SCHEMA "{schema}"')
+                    _migrar(schema, verbosity)
+                tiempos[modo].append(round(time.monotonic() - inicio, 3))
+            finally:
+                connection.set_schema_to_public()
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE')
+    return tiempos
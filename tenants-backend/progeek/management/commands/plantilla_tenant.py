@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from progeek.aprovisionamiento import actualizar_plantilla, benchmark, migraciones_pendientes, schema_plantilla
+
+
+class Command(BaseCommand):
+    help = (
+        "Pone al día el schema plantilla que se clona al dar de alta partners. "
+        "Ejecutar tras migrate_schemas en cada despliegue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verificar", type=str, default=None,
+                            help="Solo compara las migraciones de este schema con las del código")
+        parser.add_argument("--benchmark", type=int, default=0, metavar="N",
+                            help="Mide N altas clonando frente a migrando (schemas temporales)")
+
+    def handle(self, *args, **opts):
+        verbosity = opts.get("verbosity", 1)
+
+        if opts["verificar"]:
+            faltan = migraciones_pendientes(opts["verificar"])
+            for app, nombre in faltan:
+                self.stdout.write(f"  pendiente: {app}.{nombre}")
+            self.stdout.write(self.style.SUCCESS("Al día") if not faltan else self.style.WARNING(f"{len(faltan)} pendientes"))
+            return
+
+        if opts["benchmark"]:
+            tiempos = benchmark(opts["benchmark"], verbosity=max(verbosity - 1, 0))
+            for modo, valores in tiempos.items():
+                media = sum(valores) / len(valores)
+                self.stdout.write(f"{modo:>7}: media {media:.2f}s  ({', '.join(f'{v:.2f}' for v in valores)})")
+            return
+
+        aplicadas = actualizar_plantilla(verbosity=max(verbosity - 1, 0))
+        self.stdout.write(self.style.SUCCESS(
+            f"Plantilla {schema_plantilla()} al día ({len(aplicadas)} migraciones aplicadas)"
+        ))
@@ -0,0 +1,38 @@
+"""
+Management command para sincronizar las tablas de analítica global (public).
+
+Las señales de checkouters dejan marcadas las oportunidades que cambian
+(CapturaPendiente); este comando las recaptura junto con lo nuevo desde la
+marca de cada tenant, que cubre lo que no pasa por señales (update()
+masivos, altas por SQL). Se lanza desde PM2 cada 5 minutos. Con --completo
+recaptura todas las oportunidades y borra los hechos huérfanos (tras
+desplegar, renombrar tiendas, etc.).
+
+Uso:
+    python manage.py sync_analitica
+    python manage.py sync_analitica --schema=tenant1 --completo
+"""
+from django.core.management.base import BaseCommand
+from django_tenants.utils import get_public_schema_name, get_tenant_model, schema_context
+
+from progeek.analitica import sincronizar_tenant
+
+
+class Command(BaseCommand):
+    help = 'Sincroniza las tablas de analítica global con las oportunidades de cada tenant'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', help='Solo este tenant (por defecto, todos)')
+        parser.add_argument('--completo', action='store_true', help='Recaptura todo en lugar de desde la marca')
+
+    def handle(self, *args, **options):
+        schemas = [options['schema']] if options.get('schema') else list(
+            get_tenant_model().objects
+            .exclude(schema_name=get_public_schema_name())
+            .values_list('schema_name', flat=True)
+        )
+        for schema in schemas:
+            with schema_context(schema):
+                total = sincronizar_tenant(schema, completo=options['completo'])
+            self.stdout.write(f'  {schema}: {total} oportunidades')
+        self.stdout.write(self.style.SUCCESS(f'✅ Analítica sincronizada en {len(schemas)} tenants'))
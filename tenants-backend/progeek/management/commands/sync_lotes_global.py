@@ -1,7 +1,11 @@
 from django.core.management.base import BaseCommand
-from django_tenants.utils import schema_context, get_tenant_model
+from django.db import transaction
+from django_tenants.utils import schema_context, get_public_schema_name, get_tenant_model
 from progeek.models import LoteGlobal
 
+CAMPOS_LOTE = ["nombre_lote", "estado", "fecha_creacion", "fecha_recepcion", "auditado", "precio_estimado"]
+
+
 class Command(BaseCommand):
     help = "Sincroniza lotes globales desde todos los tenants."
 
@@ -9,20 +13,18 @@ class Command(BaseCommand):
         TenantModel = get_tenant_model()
         total_lotes = 0
 
-        # Limpiar tabla global antes de sincronizar
-        LoteGlobal.objects.all().delete()
-
-        for tenant in TenantModel.objects.exclude(schema_name="public"):
-            print(f"→ Procesando tenant: {tenant.slug} ({tenant.schema_name})")
+        # Upsert por tenant: no se vacía la tabla (las Reparacion cuelgan de
+        # LoteGlobal en cascada) y un tenant con error conserva sus filas
+        for tenant in TenantModel.objects.exclude(schema_name=get_public_schema_name()):
+            slug = tenant.schema_name
+            self.stdout.write(f"→ Procesando tenant: {tenant.name} ({slug})")
 
             try:
-                with schema_context(tenant.schema_name):
+                with schema_context(slug):
                     from checkouters.models import Lote
-                    lotes = Lote.objects.all()
-
-                    for lote in lotes:
-                        LoteGlobal.objects.create(
-                            tenant_slug=tenant.slug,
+                    filas = [
+                        LoteGlobal(
+                            tenant_slug=slug,
                             lote_id=lote.id,
                             nombre_lote=lote.nombre or f"Lote {lote.id}",
                             estado=lote.estado,
@@ -31,11 +33,22 @@ class Command(BaseCommand):
                             auditado=getattr(lote, "auditado", False),
                             precio_estimado=getattr(lote, "precio_estimado", None),
                         )
+                        for lote in Lote.objects.all().iterator()
+                    ]
+
+                with transaction.atomic():
+                    LoteGlobal.objects.bulk_create(
+                        filas, batch_size=1000, update_conflicts=True,
+                        unique_fields=["tenant_slug", "lote_id"], update_fields=CAMPOS_LOTE,
+                    )
+                    (LoteGlobal.objects.filter(tenant_slug=slug)
+                     .exclude(lote_id__in=[f.lote_id for f in filas])
+                     .delete())
 
-                    print(f"  ✅ {lotes.count()} lotes sincronizados")
-                    total_lotes += lotes.count()
+                self.stdout.write(f"  ✅ {len(filas)} lotes sincronizados")
+                total_lotes += len(filas)
 
             except Exception as e:
-                print(f"  ⚠ Error en {tenant.slug}: {e}")
+                self.stderr.write(f"  ⚠ Error en {slug}: {e}")
 
-        print(f"✅ Sincronizados {total_lotes} lotes en total.")
+        self.stdout.write(self.style.SUCCESS(f"✅ Sincronizados {total_lotes} lotes en total."))
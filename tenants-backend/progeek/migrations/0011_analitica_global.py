@@ -0,0 +1,88 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:59
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progeek', '0010_migrate_old_roles_to_new_system'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaSincronizacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant_slug', models.CharField(max_length=64, unique=True)),
+                ('ultima_oportunidad_id', models.BigIntegerField(default=0)),
+                ('ultimo_historial_id', models.BigIntegerField(default=0)),
+                ('sincronizado_en', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'analitica_marca',
+            },
+        ),
+        migrations.CreateModel(
+            name='HechoDispositivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant_slug', models.CharField(max_length=64)),
+                ('dispositivo_id', models.BigIntegerField()),
+                ('oportunidad_id', models.BigIntegerField()),
+                ('estado', models.CharField(max_length=50)),
+                ('fecha_creacion', models.DateTimeField()),
+                ('modelo_id', models.BigIntegerField(blank=True, null=True)),
+                ('modelo_nombre', models.CharField(blank=True, default='', max_length=255)),
+                ('precio_final', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('auditado', models.BooleanField(default=False)),
+            ],
+            options={
+                'db_table': 'analitica_dispositivo',
+                'indexes': [models.Index(fields=['tenant_slug', 'oportunidad_id'], name='analitica_disp_oportunidad'), models.Index(fields=['fecha_creacion', 'estado'], name='analitica_disp_fecha_estado')],
+                'constraints': [models.UniqueConstraint(fields=('tenant_slug', 'dispositivo_id'), name='analitica_dispositivo_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HechoOportunidad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant_slug', models.CharField(max_length=64)),
+                ('oportunidad_id', models.BigIntegerField()),
+                ('tienda_id', models.BigIntegerField(blank=True, null=True)),
+                ('tienda_nombre', models.CharField(blank=True, default='', max_length=255)),
+                ('usuario_id', models.BigIntegerField(blank=True, null=True)),
+                ('estado', models.CharField(max_length=50)),
+                ('fecha_creacion', models.DateTimeField()),
+                ('fecha_inicio_pago', models.DateTimeField(blank=True, null=True)),
+                ('primera_recepcion', models.DateTimeField(blank=True, null=True)),
+                ('valor', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('valor_auditado', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('dispositivos', models.PositiveIntegerField(default=0)),
+                ('sincronizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'analitica_oportunidad',
+                'indexes': [models.Index(fields=['fecha_creacion', 'estado'], name='analitica_opp_fecha_estado'), models.Index(fields=['estado'], name='analitica_opp_estado')],
+                'constraints': [models.UniqueConstraint(fields=('tenant_slug', 'oportunidad_id'), name='analitica_oportunidad_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HechoTransicion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant_slug', models.CharField(max_length=64)),
+                ('historial_id', models.BigIntegerField()),
+                ('oportunidad_id', models.BigIntegerField()),
+                ('estado_anterior', models.CharField(blank=True, max_length=50, null=True)),
+                ('estado_nuevo', models.CharField(blank=True, max_length=50, null=True)),
+                ('fecha', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'analitica_transicion',
+                'indexes': [models.Index(fields=['tenant_slug', 'oportunidad_id'], name='analitica_trans_oportunidad')],
+                'constraints': [models.UniqueConstraint(fields=('tenant_slug', 'historial_id'), name='analitica_transicion_uniq')],
+            },
+        ),
+    ]
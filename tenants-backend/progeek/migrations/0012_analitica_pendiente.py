@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progeek', '0011_analitica_global'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CapturaPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant_slug', models.CharField(max_length=64)),
+                ('oportunidad_id', models.BigIntegerField()),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'analitica_pendiente',
+                'constraints': [models.UniqueConstraint(fields=('tenant_slug', 'oportunidad_id'), name='analitica_pendiente_uniq')],
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 from .core_models import (LoteGlobal,Reparacion,DispositivoAuditado,Valoracion,UserGlobalRole,RolPorTenant,
                           PlantillaCorreo,B2CKycIndex,PublicLegalTemplate,PublicLegalVariables,EVENTOS_CORREO,VARIABLES_POR_EVENTO)
+from .analitica import CapturaPendiente, HechoOportunidad, HechoDispositivo, HechoTransicion, MarcaSincronizacion
 
 
 __all__ = [
@@ -14,5 +15,10 @@ __all__ = [
    "PublicLegalTemplate",
    "PublicLegalVariables",
    "EVENTOS_CORREO",
-   "VARIABLES_POR_EVENTO"
+   "VARIABLES_POR_EVENTO",
+   "HechoOportunidad",
+   "HechoDispositivo",
+   "HechoTransicion",
+   "MarcaSincronizacion",
+   "CapturaPendiente",
 ]
\ No newline at end of file
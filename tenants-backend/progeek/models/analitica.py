@@ -0,0 +1,128 @@
+from decimal import Decimal
+from django.db import models
+
+
+class HechoOportunidad(models.Model):
+    """
+    Oportunidad de un tenant copiada al schema public para la analítica global.
+
+    Una fila por (tenant_slug, oportunidad_id) con los importes ya agregados de
+    sus DispositivoReal. Se alimenta desde checkouters.signals y el comando
+    sync_analitica (ver progeek/analitica.py).
+    """
+
+    tenant_slug = models.CharField(max_length=64)
+    oportunidad_id = models.BigIntegerField()
+    tienda_id = models.BigIntegerField(null=True, blank=True)
+    tienda_nombre = models.CharField(max_length=255, blank=True, default="")
+    usuario_id = models.BigIntegerField(null=True, blank=True)
+    estado = models.CharField(max_length=50)
+    fecha_creacion = models.DateTimeField()
+    fecha_inicio_pago = models.DateTimeField(null=True, blank=True)
+    primera_recepcion = models.DateTimeField(null=True, blank=True)
+
+    valor = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0"))
+    valor_auditado = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0"))
+    dispositivos = models.PositiveIntegerField(default=0)
+
+    sincronizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "analitica_oportunidad"
+        constraints = [
+            models.UniqueConstraint(fields=["tenant_slug", "oportunidad_id"], name="analitica_oportunidad_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["fecha_creacion", "estado"], name="analitica_opp_fecha_estado"),
+            models.Index(fields=["estado"], name="analitica_opp_estado"),
+        ]
+
+    def __str__(self):
+        return f"{self.tenant_slug} - Oportunidad {self.oportunidad_id} ({self.estado})"
+
+
+class HechoDispositivo(models.Model):
+    """DispositivoReal de un tenant con el estado y la fecha de su oportunidad."""
+
+    tenant_slug = models.CharField(max_length=64)
+    dispositivo_id = models.BigIntegerField()
+    oportunidad_id = models.BigIntegerField()
+    estado = models.CharField(max_length=50)
+    fecha_creacion = models.DateTimeField()
+    modelo_id = models.BigIntegerField(null=True, blank=True)
+    modelo_nombre = models.CharField(max_length=255, blank=True, default="")
+    precio_final = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    auditado = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = "analitica_dispositivo"
+        constraints = [
+            models.UniqueConstraint(fields=["tenant_slug", "dispositivo_id"], name="analitica_dispositivo_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["tenant_slug", "oportunidad_id"], name="analitica_disp_oportunidad"),
+            models.Index(fields=["fecha_creacion", "estado"], name="analitica_disp_fecha_estado"),
+        ]
+
+    def __str__(self):
+        return f"{self.tenant_slug} - Dispositivo {self.dispositivo_id}"
+
+
+class HechoTransicion(models.Model):
+    """Cambio de estado (HistorialOportunidad) de una oportunidad de un tenant."""
+
+    tenant_slug = models.CharField(max_length=64)
+    historial_id = models.BigIntegerField()
+    oportunidad_id = models.BigIntegerField()
+    estado_anterior = models.CharField(max_length=50, blank=True, null=True)
+    estado_nuevo = models.CharField(max_length=50, blank=True, null=True)
+    fecha = models.DateTimeField()
+
+    class Meta:
+        db_table = "analitica_transicion"
+        constraints = [
+            models.UniqueConstraint(fields=["tenant_slug", "historial_id"], name="analitica_transicion_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["tenant_slug", "oportunidad_id"], name="analitica_trans_oportunidad"),
+        ]
+
+    def __str__(self):
+        return f"{self.tenant_slug} - {self.oportunidad_id}: {self.estado_anterior} → {self.estado_nuevo}"
+
+
+class MarcaSincronizacion(models.Model):
+    """High-water mark del comando sync_analitica por tenant."""
+
+    tenant_slug = models.CharField(max_length=64, unique=True)
+    ultima_oportunidad_id = models.BigIntegerField(default=0)
+    ultimo_historial_id = models.BigIntegerField(default=0)
+    sincronizado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "analitica_marca"
+
+    def __str__(self):
+        return f"{self.tenant_slug} (opp>{self.ultima_oportunidad_id}, hist>{self.ultimo_historial_id})"
+
+
+class CapturaPendiente(models.Model):
+    """
+    Oportunidad de un tenant cuyos hechos hay que recapturar.
+
+    Las señales de checkouters solo la marcan al confirmar la transacción; la
+    captura la hace sync_analitica fuera del camino de escritura.
+    """
+
+    tenant_slug = models.CharField(max_length=64)
+    oportunidad_id = models.BigIntegerField()
+    creada = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "analitica_pendiente"
+        constraints = [
+            models.UniqueConstraint(fields=["tenant_slug", "oportunidad_id"], name="analitica_pendiente_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.tenant_slug} - Oportunidad {self.oportunidad_id} pendiente"
@@ -0,0 +1,183 @@
+"""
+Fan-out de trabajo por tenant para los endpoints globales de administración.
+
+En vez de recorrer los schemas uno a uno, cada tenant se procesa en un hilo
+de un pool acotado (settings.TENANT_FANOUT_WORKERS). Cada hilo usa su propia
+conexión de Django fijada al search_path del tenant con schema_context y la
+cierra al terminar (como CONN_MAX_AGE=0 en las peticiones), así que nunca
+hay más conexiones abiertas que hilos en el pool.
+
+- Timeout por tenant: statement_timeout en la conexión del hilo y, pasado
+  TENANT_FANOUT_TIMEOUT, se cancela la query en curso del tenant y no se le
+  deja lanzar más, así que su hilo vuelve enseguida al pool
+- Resultados parciales: los tenants que fallan o agotan el tiempo se
+  devuelven aparte (errores / timeouts) en lugar de tumbar la respuesta
+- Merge determinista: los resultados se devuelven en el orden de entrada
+  de los schemas, independientemente de qué hilo termine antes
+
+Con TENANT_FANOUT_WORKERS=0 (tests) se ejecuta en serie en el hilo actual.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django_tenants.utils import schema_context
+
+logger = logging.getLogger(__name__)
+
+# Cada cuánto se revisan los tenants en curso que han superado su timeout
+_TICK = 0.05
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+@dataclass
+class ResultadoFanout:
+    """Resultado de ejecutar una función en varios tenants."""
+
+    schemas: List[str]
+    resultados: Dict[str, Any] = field(default_factory=dict)
+    errores: Dict[str, str] = field(default_factory=dict)
+    timeouts: List[str] = field(default_factory=list)
+
+    @property
+    def parcial(self) -> bool:
+        return bool(self.errores or self.timeouts)
+
+    def items(self):
+        """(schema, resultado) de los tenants correctos, en el orden de entrada."""
+        return [(s, self.resultados[s]) for s in self.schemas if s in self.resultados]
+
+    def valores(self) -> list:
+        return [r for _, r in self.items()]
+
+    def cabeceras(self) -> Dict[str, str]:
+        """Cabeceras HTTP para informar de un resultado parcial."""
+        if not self.parcial:
+            return {}
+        return {
+            "X-Tenants-Total": str(len(self.schemas)),
+            "X-Tenants-Error": ",".join(s for s in self.schemas if s in self.errores),
+            "X-Tenants-Timeout": ",".join(s for s in self.schemas if s in self.timeouts),
+        }
+
+
+def _workers() -> int:
+    return int(getattr(settings, "TENANT_FANOUT_WORKERS", 8))
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix="tenant-fanout")
+        return _executor
+
+
+class TenantCancelado(Exception):
+    """El tenant superó su timeout y el fan-out ya no espera su resultado."""
+
+
+class _EnCurso:
+    """Trabajo de un tenant en un hilo del pool: su conexión y si se ha cancelado."""
+
+    def __init__(self):
+        self.inicio = time.monotonic()
+        self.conexion = connections[DEFAULT_DB_ALIAS]  # la del hilo, no el proxy
+        self.cancelado = False
+        self._lock = threading.Lock()
+
+    def cancelar(self):
+        """Marca el tenant como cancelado y corta la query que tenga en curso."""
+        with self._lock:
+            self.cancelado = True
+            if self.conexion.connection is not None:
+                try:
+                    self.conexion.connection.cancel()
+                except Exception as exc:
+                    logger.debug("Fan-out: no se pudo cancelar la query: %s", exc)
+
+    def cerrar(self):
+        with self._lock:
+            self.conexion.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: un tenant cancelado no lanza más queries
+        if self.cancelado:
+            raise TenantCancelado()
+        return execute(sql, params, many, context)
+
+
+def _en_schema(schema: str, fn: Callable[[str], Any], timeout: Optional[float], en_curso: Dict[str, _EnCurso]):
+    tarea = en_curso[schema] = _EnCurso()
+    try:
+        if timeout:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT set_config('statement_timeout', %s, false)", [f"{int(timeout * 1000)}ms"])
+        with connection.execute_wrapper(tarea), schema_context(schema):
+            return fn(schema)
+    finally:
+        tarea.cerrar()
+
+
+def ejecutar_por_tenant(
+    schemas: Iterable[str],
+    fn: Callable[[str], Any],
+    timeout: Optional[float] = None,
+) -> ResultadoFanout:
+    """
+    Ejecuta fn(schema) dentro de schema_context para cada tenant.
+
+    Args:
+        schemas: Schemas a procesar; define el orden del resultado
+        fn: Trabajo por tenant. Debe devolver datos ya materializados
+            (listas, dicts), no querysets
+        timeout: Segundos por tenant (por defecto TENANT_FANOUT_TIMEOUT)
+
+    Returns:
+        ResultadoFanout con resultados, errores y timeouts por schema
+    """
+    schemas = list(dict.fromkeys(schemas))
+    timeout = timeout if timeout is not None else getattr(settings, "TENANT_FANOUT_TIMEOUT", 20)
+    out = ResultadoFanout(schemas=schemas)
+    if not schemas:
+        return out
+
+    if _workers() <= 0:
+        for schema in schemas:
+            try:
+                with schema_context(schema):
+                    out.resultados[schema] = fn(schema)
+            except Exception as exc:
+                logger.warning("Fan-out: error en tenant %s: %s", schema, exc)
+                out.errores[schema] = str(exc)
+        return out
+
+    executor = _get_executor()
+    en_curso: Dict[str, _EnCurso] = {}
+    pendientes = {executor.submit(_en_schema, s, fn, timeout, en_curso): s for s in schemas}
+    while pendientes:
+        hechos, _ = wait(pendientes, timeout=_TICK, return_when=FIRST_COMPLETED)
+        for fut in hechos:
+            schema = pendientes.pop(fut)
+            try:
+                out.resultados[schema] = fut.result()
+            except Exception as exc:
+                logger.warning("Fan-out: error en tenant %s: %s", schema, exc)
+                out.errores[schema] = str(exc)
+        if timeout:
+            ahora = time.monotonic()
+            for fut, schema in list(pendientes.items()):
+                tarea = en_curso.get(schema)
+                if tarea is not None and ahora - tarea.inicio > timeout:
+                    logger.warning("Fan-out: tenant %s sin respuesta en %ss", schema, timeout)
+                    tarea.cancelar()
+                    del pendientes[fut]
+                    out.timeouts.append(schema)
+    return out
@@ -1,3 +1,368 @@
-from django.test import TestCase
+import time
 
-# Create your tests here.
+import pytest
+from django.db import connection
+
+from progeek.tenant_fanout import ejecutar_por_tenant
+
+
+def _search_path(schema):
+    if schema == "roto":
+        raise ValueError("tenant roto")
+    if schema == "lento":
+        time.sleep(1.5)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT current_setting('search_path'), pg_sleep(0.3)")
+        return cursor.fetchone()[0]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_fanout_en_paralelo_con_orden_estable(settings):
+    """Cada tenant corre en su conexión con su search_path; el resultado sigue el orden de entrada"""
+    settings.TENANT_FANOUT_WORKERS = 8
+    schemas = ["t4", "t1", "t3", "t2", "t5"]
+
+    t0 = time.monotonic()
+    out = ejecutar_por_tenant(schemas, _search_path)
+    assert time.monotonic() - t0 < 1.2
+
+    assert [s for s, _ in out.items()] == schemas
+    assert all(path.startswith(schema) for schema, path in out.items())
+    assert not out.parcial and out.cabeceras() == {}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_fanout_resultado_parcial(settings):
+    """Un tenant que falla o no responde a tiempo no tumba al resto"""
+    settings.TENANT_FANOUT_WORKERS = 8
+
+    t0 = time.monotonic()
+    out = ejecutar_por_tenant(["a", "roto", "lento", "b"], _search_path, timeout=0.8)
+    assert time.monotonic() - t0 < 1.4
+
+    assert [s for s, _ in out.items()] == ["a", "b"]
+    assert list(out.errores) == ["roto"]
+    assert out.timeouts == ["lento"]
+    assert out.cabeceras() == {"X-Tenants-Total": "4", "X-Tenants-Error": "roto", "X-Tenants-Timeout": "lento"}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_fanout_statement_timeout(settings):
+    """El timeout por tenant también corta la query en Postgres"""
+    settings.TENANT_FANOUT_WORKERS = 8
+
+    def _query_larga(schema):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_sleep(%s)", [5 if schema == "pesado" else 0])
+
+    t0 = time.monotonic()
+    out = ejecutar_por_tenant(["pesado", "ligero"], _query_larga, timeout=0.5)
+    assert time.monotonic() - t0 < 2
+    assert "pesado" in out.errores or "pesado" in out.timeouts
+    assert "ligero" in out.resultados
+
+
+@pytest.mark.django_db(transaction=True)
+def test_fanout_timeout_libera_el_hilo(settings, monkeypatch):
+    """Un tenant que agota su timeout se cancela y deja su hilo al siguiente"""
+    from concurrent.futures import ThreadPoolExecutor
+    from progeek import tenant_fanout
+
+    settings.TENANT_FANOUT_WORKERS = 1
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(tenant_fanout, "_executor", pool)
+
+    def _muchas_queries(schema):
+        # cada query cabe en statement_timeout, pero en total son 3 s
+        for _ in range(10 if schema == "pesado" else 1):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_sleep(0.3)")
+        return schema
+
+    t0 = time.monotonic()
+    out = ejecutar_por_tenant(["pesado", "ligero"], _muchas_queries, timeout=0.5)
+    assert time.monotonic() - t0 < 1.5
+    assert out.timeouts == ["pesado"]
+    assert out.valores() == ["ligero"]
+    pool.shutdown(wait=True)
+
+
+@pytest.mark.django_db
+def test_fanout_en_serie_sin_hilos():
+    """Con TENANT_FANOUT_WORKERS=0 (tests) se ejecuta en el hilo actual"""
+    out = ejecutar_por_tenant(["x", "roto", "y"], lambda s: connection.schema_name if s != "roto" else 1 / 0)
+    assert out.valores() == ["x", "y"]
+    assert list(out.errores) == ["roto"]
+
+
+# --- Analítica global (progeek/analitica.py) ---
+
+def _hechos(tenant_slug):
+    from progeek.models import HechoDispositivo, HechoOportunidad, HechoTransicion
+
+    return (
+        sorted(HechoOportunidad.objects.filter(tenant_slug=tenant_slug).values_list(
+            "oportunidad_id", "tienda_id", "tienda_nombre", "usuario_id", "estado", "valor", "valor_auditado", "dispositivos")),
+        sorted(HechoDispositivo.objects.filter(tenant_slug=tenant_slug).values_list(
+            "dispositivo_id", "oportunidad_id", "estado", "modelo_nombre", "precio_final", "auditado")),
+        sorted(HechoTransicion.objects.filter(tenant_slug=tenant_slug).values_list("historial_id", "oportunidad_id")),
+    )
+
+
+def _tenant_con_oportunidades(create_tenant, slug, n=3):
+    from decimal import Decimal
+    from django.contrib.auth import get_user_model
+    from django_tenants.utils import schema_context
+    from checkouters.models import Cliente, DispositivoReal, Oportunidad, Tienda
+
+    User = get_user_model()
+    owner = User.objects.create_user(email=f"owner@{slug}.com", password="x")
+    comercial = User.objects.create_user(email=f"c@{slug}.com", password="x", name=f"Comercial {slug}")
+    tenant = create_tenant(owner, slug)
+    with schema_context(tenant.schema_name):
+        cliente = Cliente.objects.create(razon_social="ACME", tipo_cliente="empresa", canal="b2b")
+        tienda = Tienda.objects.create(nombre=f"Tienda {slug}")
+        opps = []
+        for k in range(n):
+            opp = Oportunidad.objects.create(cliente=cliente, usuario=comercial, tienda=tienda, estado="Pagado")
+            for j in range(k + 1):
+                DispositivoReal.objects.create(oportunidad=opp, precio_final=Decimal(100 + j), auditado=bool(j))
+            opps.append(opp)
+    return tenant, opps
+
+
+@pytest.mark.django_db
+def test_analitica_captura_por_senales_y_sync(create_tenant, django_capture_on_commit_callbacks):
+    """Las señales dejan los hechos igual que una sincronización completa"""
+    from decimal import Decimal
+    from django_tenants.utils import schema_context
+    from checkouters.models import DispositivoReal, Oportunidad
+    from progeek.analitica import sincronizar_tenant
+    from progeek.models import CapturaPendiente, HechoOportunidad
+
+    with django_capture_on_commit_callbacks(execute=True):
+        tenant, opps = _tenant_con_oportunidades(create_tenant, "ana")
+    slug = tenant.schema_name
+    # Al confirmar solo se marcan; la captura la hace sync_analitica
+    assert not HechoOportunidad.objects.filter(tenant_slug=slug).exists()
+    assert CapturaPendiente.objects.filter(tenant_slug=slug).count() == 3
+    with schema_context(slug):
+        assert sincronizar_tenant(slug) == 3
+    assert not CapturaPendiente.objects.exists()
+    assert HechoOportunidad.objects.filter(tenant_slug=slug).count() == 3
+    assert HechoOportunidad.objects.get(tenant_slug=slug, oportunidad_id=opps[1].id).valor == Decimal("201")
+
+    with django_capture_on_commit_callbacks(execute=True), schema_context(slug):
+        opps[0].estado = "En revisión"
+        opps[0].save()
+        dr = DispositivoReal.objects.filter(oportunidad=opps[2]).first()
+        dr.oportunidad = opps[1]
+        dr.save()
+        opps[2].refresh_from_db()
+        opps[2].delete()
+    with schema_context(slug):
+        sincronizar_tenant(slug)
+    capturado = _hechos(slug)
+    assert HechoOportunidad.objects.get(tenant_slug=slug, oportunidad_id=opps[0].id).estado == "En revisión"
+    assert not HechoOportunidad.objects.filter(tenant_slug=slug, oportunidad_id=opps[2].id).exists()
+    assert HechoOportunidad.objects.get(tenant_slug=slug, oportunidad_id=opps[1].id).dispositivos == 3
+
+    # update() no dispara señales: la sincronización incremental no lo ve, la completa sí
+    with schema_context(slug):
+        Oportunidad.objects.filter(pk=opps[1].pk).update(estado="Factura recibida")
+        assert sincronizar_tenant(slug, completo=True) == 2
+        assert sincronizar_tenant(slug) == 0
+    assert HechoOportunidad.objects.get(tenant_slug=slug, oportunidad_id=opps[1].id).estado == "Factura recibida"
+
+    with schema_context(slug):
+        Oportunidad.objects.filter(pk=opps[1].pk).update(estado="Pagado")
+        sincronizar_tenant(slug, completo=True)
+    assert _hechos(slug) == capturado
+
+
+@pytest.mark.django_db
+def test_analitica_un_callback_por_transaccion(create_tenant, django_capture_on_commit_callbacks):
+    """Las señales de una transacción comparten un callback; un rollback abre lote nuevo"""
+    from django.db import transaction
+    from django_tenants.utils import schema_context
+    from progeek.models import CapturaPendiente
+
+    with django_capture_on_commit_callbacks(execute=True):
+        tenant, opps = _tenant_con_oportunidades(create_tenant, "lote")
+    slug = tenant.schema_name
+    CapturaPendiente.objects.all().delete()
+
+    def _lotes(callbacks):
+        return [cb for cb in callbacks if getattr(cb, "nombre", None) == "analitica"]
+
+    with django_capture_on_commit_callbacks() as callbacks, schema_context(slug):
+        with pytest.raises(RuntimeError), transaction.atomic():
+            opps[0].save()
+            raise RuntimeError
+        assert _lotes(callbacks) == []
+        for opp in opps[1:]:
+            opp.save()
+            opp.dispositivos_reales.first().save()
+    assert len(_lotes(callbacks)) == 1
+
+    _lotes(callbacks)[0]()
+    assert set(CapturaPendiente.objects.values_list("oportunidad_id", flat=True)) == {o.id for o in opps[1:]}
+
+
+@pytest.mark.django_db
+def test_dashboard_global_no_crece_con_los_tenants(create_tenant, django_capture_on_commit_callbacks):
+    """El dashboard global suma todos los tenants con las mismas queries sea cual sea su número"""
+    from datetime import datetime, time as dtime, timedelta
+    from io import StringIO
+    from django.core.management import call_command
+    from django.db.models import Q
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+    from checkouters.kpimanager.dashboard_manager import FACTURA_ADELANTE_ESTADOS
+    from progeek.analitica import dashboard_global
+
+    opciones = {"estados_factura_adelante": FACTURA_ADELANTE_ESTADOS}
+    hoy = timezone.localdate()
+    rango = (
+        timezone.make_aware(datetime.combine(hoy - timedelta(days=30), dtime.min)),
+        timezone.make_aware(datetime.combine(hoy, dtime.max)),
+    )
+
+    def _dashboard():
+        with CaptureQueriesContext(connection) as ctx:
+            data = dashboard_global(*rango, granularidad="dia", comparar=True, ambito=Q(), opciones=opciones)
+        return data, len([q for q in ctx.captured_queries if "search_path" not in q["sql"]])
+
+    with django_capture_on_commit_callbacks(execute=True):
+        _tenant_con_oportunidades(create_tenant, "uno")
+    call_command("sync_analitica", stdout=StringIO())
+    uno, queries = _dashboard()
+    with django_capture_on_commit_callbacks(execute=True):
+        tenant, _ = _tenant_con_oportunidades(create_tenant, "dos", n=2)
+    call_command("sync_analitica", stdout=StringIO())
+    dos, queries_dos = _dashboard()
+
+    assert queries_dos == queries <= 10
+    assert uno["resumen"]["valor_total"] == 100 + 201 + 303
+    assert dos["resumen"]["valor_total"] == uno["resumen"]["valor_total"] + 100 + 201
+    assert sum(p["valor"] for p in dos["evolucion"]) == dos["resumen"]["valor_total"]
+    assert {r["tienda"] for r in dos["rankings"]["tiendas_por_valor"]} == {"Tienda uno", "Tienda dos"}
+    assert {r["usuario"] for r in dos["rankings"]["usuarios_por_operaciones"]} == {"Comercial uno", "Comercial dos"}
+
+    # Ámbito de un solo tenant
+    solo = dashboard_global(*rango, ambito=Q(tenant_slug=tenant.schema_name), opciones=opciones)
+    assert solo["resumen"]["valor_total"] == 100 + 201
+    assert dashboard_global(*rango, ambito=None, opciones=opciones)["resumen"]["valor_total"] == 0
+
+
+@pytest.mark.django_db
+def test_dashboard_global_igual_a_fusionar_collect(create_tenant, django_capture_on_commit_callbacks):
+    """Mismo resultado que fusionar el collect de cada tenant, con y sin estados de negocio"""
+    from datetime import datetime, time as dtime, timedelta
+    from decimal import Decimal
+    from io import StringIO
+    from django.core.management import call_command
+    from django.db.models import Q
+    from django.utils import timezone
+    from django_tenants.utils import get_tenant_model, schema_context
+    from checkouters.kpimanager.dashboard_manager import FACTURA_ADELANTE_ESTADOS
+    from checkouters.kpimanager.dashboard_manager_serializers import DashboardManagerSerializer
+    from checkouters.models import DispositivoReal, Oportunidad
+    from progeek.analitica import dashboard_global, fusionar_bloques
+
+    with django_capture_on_commit_callbacks(execute=True):
+        uno, opps_uno = _tenant_con_oportunidades(create_tenant, "fus1")
+        dos, opps_dos = _tenant_con_oportunidades(create_tenant, "fus2", n=2)
+        with schema_context(dos.schema_name):
+            # Abierta con un dispositivo auditado: cuenta en el pipeline
+            abierta = Oportunidad.objects.create(
+                cliente=opps_dos[0].cliente, usuario=opps_dos[0].usuario, tienda=opps_dos[0].tienda, estado="En revisión",
+            )
+            DispositivoReal.objects.create(oportunidad=abierta, precio_final=Decimal("50"), auditado=True)
+            opps_dos[1].estado = "Cancelado"
+            opps_dos[1].save()
+    call_command("sync_analitica", stdout=StringIO())
+    comisiones = dict(get_tenant_model().objects.exclude(schema_name="public").values_list("schema_name", "comision_pct"))
+
+    hoy = timezone.localdate()
+    rango = (
+        timezone.make_aware(datetime.combine(hoy - timedelta(days=30), dtime.min)),
+        timezone.make_aware(datetime.combine(hoy, dtime.max)),
+    )
+    for opciones, comparar in (({}, True), ({"estados_factura_adelante": FACTURA_ADELANTE_ESTADOS}, False)):
+        bloques = []
+        for schema in comisiones:
+            with schema_context(schema):
+                bloque = DashboardManagerSerializer.collect(
+                    request=None, fecha_inicio=rango[0], fecha_fin=rango[1], granularidad="semana",
+                    filtros={}, opciones={**opciones, "comparar": comparar},
+                )
+            bloques.append({**bloque, "_schema": schema})
+        esperado = fusionar_bloques(bloques, comisiones, Decimal("0") if comparar else None)
+        data = dashboard_global(*rango, granularidad="semana", comparar=comparar, ambito=Q(), opciones=opciones)
+        assert data == esperado
+
+    # Como la vista (sin estados de negocio): el valor sale del pipeline y no hay rankings
+    assert data["resumen"]["valor_total"] == 100 + 201 + 303 + 100
+    sin_estados = dashboard_global(*rango, comparar=True, ambito=Q(), opciones={})
+    assert sin_estados["resumen"]["valor_total"] == 50
+    assert sin_estados["rankings"]["productos"] == []
+    # Media de la conversión de cada tenant (3 de 3 y 1 de 3), no la global
+    assert sin_estados["operativa"]["conversion_pct"] == (Decimal("100.0") + Decimal("33.33")) / 2
+
+
+# --- Alta de partners por clonado (progeek/aprovisionamiento.py) ---
+
+@pytest.mark.django_db
+def test_alta_de_partner_clonando_la_plantilla(settings):
+    """El schema clonado queda con las mismas migraciones y datos base que uno migrado"""
+    from django.contrib.auth import get_user_model
+    from django.contrib.contenttypes.models import ContentType
+    from django_tenants.utils import schema_context
+    from django_test_app.companies.models import Company
+    from progeek.aprovisionamiento import actualizar_plantilla, crear_company, migraciones_pendientes
+
+    settings.TENANT_PLANTILLA_SCHEMA = "plantilla_test"
+    owner = get_user_model().objects.create_user(email="owner@clon.com", password="x")
+
+    assert actualizar_plantilla()
+    assert actualizar_plantilla() == []
+    primero, info = crear_company(Company, name="Clon 1", schema_name="clon_uno", slug="clon-uno", owner=owner)
+    assert info["modo"] == "clonar"
+    segundo, _ = crear_company(Company, name="Clon 2", schema_name="clon_dos", slug="clon-dos", owner=owner)
+
+    assert migraciones_pendientes("plantilla_test") == migraciones_pendientes(segundo.schema_name) == []
+    with schema_context(segundo.schema_name):
+        from checkouters.models import Cliente
+
+        assert ContentType.objects.filter(app_label="checkouters", model="oportunidad").exists()
+        cliente = Cliente.objects.create(razon_social="ACME", tipo_cliente="empresa", canal="b2b")
+        assert cliente.pk == 1
+    with schema_context(primero.schema_name):
+        assert not Cliente.objects.exists()
+
+
+@pytest.mark.django_db
+def test_alta_con_plantilla_desactualizada_falla_sin_migrar(settings):
+    """Sin plantilla al día el alta falla en el acto: ni migra en la petición ni crea el Company"""
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django_tenants.utils import schema_context, schema_exists
+    from django_test_app.companies.models import Company
+    from progeek.aprovisionamiento import PlantillaDesactualizada, actualizar_plantilla, crear_company
+
+    settings.TENANT_PLANTILLA_SCHEMA = "plantilla_vieja"
+    owner = get_user_model().objects.create_user(email="owner@vieja.com", password="x")
+    kwargs = dict(name="Vieja", schema_name="clon_viejo", slug="clon-viejo", owner=owner)
+
+    with pytest.raises(PlantillaDesactualizada):
+        crear_company(Company, **kwargs)
+    assert not schema_exists("plantilla_vieja")
+
+    actualizar_plantilla()
+    with schema_context("plantilla_vieja"), connection.cursor() as cursor:
+        cursor.execute("DELETE FROM django_migrations WHERE app = 'checkouters'")
+    with pytest.raises(PlantillaDesactualizada, match="plantilla_tenant"):
+        crear_company(Company, **kwargs)
+    assert not Company.objects.filter(schema_name="clon_viejo").exists()
+    assert not schema_exists("clon_viejo")
@@ -25,6 +25,7 @@ from rest_framework import generics, permissions,viewsets,status
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.serializers import ModelSerializer
 from progeek.estados_operaciones import ESTADOS_AGRUPADOS
+from progeek.tenant_fanout import ejecutar_por_tenant
 from django.db.models import Count
 from django.shortcuts import get_object_or_404
 from django_test_app.companies.models import Company, Domain 
@@ -35,13 +36,14 @@ from django.db import transaction
 from django.http import HttpResponse, Http404,FileResponse
 from django.utils.text import slugify
 
-from checkouters.utils.createpdf import generar_pdf_oportunidad
+from checkouters.utils.createpdf import generar_pdf_oportunidad_cacheado
 from django.conf import settings
 from uuid import UUID
 from hashids import Hashids 
 from datetime import datetime, time
 from .serializers import OportunidadPublicaSerializer
 from progeek.plantillas_por_defecto import PLANTILLAS_POR_DEFECTO
+from progeek.aprovisionamiento import PlantillaDesactualizada, crear_company
 from decimal import Decimal, InvalidOperation
 from django.db.models.functions import Cast
 from django.db.models import Q,CharField
@@ -242,7 +244,8 @@ def generar_pdf_contrato(contrato, preview=False):
 # Dashboard Admin (multi-tenant)
 # ==========================
 from checkouters.kpimanager.dashboard_manager_serializers import DashboardManagerSerializer
-from checkouters.utils.utilskpis import parse_bool, parse_date_str, comparativa_periodo
+from checkouters.utils.utilskpis import parse_bool, parse_date_str
+from progeek.analitica import dashboard_global, q_ambito_global
 
 class DashboardAdminAPIView(APIView):
     permission_classes = [IsAuthenticated]
@@ -263,207 +266,34 @@ class DashboardAdminAPIView(APIView):
         fecha_inicio = timezone.make_aware(datetime.combine(fecha_inicio, time.min))
         fecha_fin = timezone.make_aware(datetime.combine(fecha_fin, time.max))
 
-        def _collect():
-            return DashboardManagerSerializer.collect(
-                request=request,
-                fecha_inicio=fecha_inicio,
-                fecha_fin=fecha_fin,
-                granularidad=granularidad,
-                filtros={"tienda_id": tienda_id, "usuario_id": usuario_id},
-                opciones={"comparar": comparar},
-            )
+        filtros = {"tienda_id": tienda_id, "usuario_id": usuario_id}
+        opciones = {"comparar": comparar}
 
         # Forzar un tenant concreto
         if tenant_slug:
             with schema_context(tenant_slug):
-                data = _collect()
+                data = DashboardManagerSerializer.collect(
+                    request=request,
+                    fecha_inicio=fecha_inicio,
+                    fecha_fin=fecha_fin,
+                    granularidad=granularidad,
+                    filtros=filtros,
+                    opciones=opciones,
+                )
             return Response(data, status=200)
 
-        pub = get_public_schema_name() if callable(get_public_schema_name) else "public"
-        TenantModel = get_tenant_model()
-        tenants = list(TenantModel.objects.exclude(schema_name=pub).values_list("schema_name", flat=True))
-        # Mapa schema -> porcentaje de comisión (0-1)
-        pct_map = {
-            t.schema_name: (Decimal(str(t.comision_pct or 0)) / Decimal("100"))
-            for t in TenantModel.objects.exclude(schema_name=pub).only("schema_name", "comision_pct")
-        }
-
-        bloques = []
-        for schema in tenants:
-            try:
-                with schema_context(schema):
-                    data_block = _collect()
-                    # Adjunta el schema para poder aplicar fallback con su porcentaje de comisión
-                    if isinstance(data_block, dict):
-                        data_block["_schema"] = schema
-                    bloques.append(data_block)
-            except Exception:
-                continue
-
-        if not bloques:
-            empty = {
-                "resumen": {"valor_total": Decimal(0), "ticket_medio": Decimal(0), "comision_total": Decimal(0), "comision_media": Decimal(0), "margen_medio": Decimal(0)},
-                "evolucion": [],
-                "comparativa": None,
-                "rankings": {"productos": [], "tiendas_por_valor": [], "usuarios_por_valor": [], "tiendas_por_operaciones": [], "usuarios_por_operaciones": []},
-                "pipeline": {"abiertas": 0, "valor_estimado": 0, "por_estado": []},
-                "operativa": {"recibidas": 0, "completadas": 0, "conversion_pct": None, "tmed_respuesta_h": None, "tmed_recogida_h": None, "tmed_cierre_h": None, "rechazos": {"total": 0, "motivos": []}, "abandono_pct": None},
-            }
-            return Response(empty, status=200)
-
-        # Merge
-        res_agg = defaultdict(Decimal)
-        evol_map = defaultdict(Decimal)
-        rank_prod = defaultdict(Decimal)
-        rank_tiendas_valor = defaultdict(Decimal)
-        rank_users_valor = defaultdict(Decimal)
-        rank_tiendas_ops = defaultdict(Decimal)
-        rank_users_ops = defaultdict(Decimal)
-        pipe_estado = {}
-        abiertas = Decimal(0)
-        valor_estimado = Decimal(0)
-        total_ops_count = Decimal(0)
-
-        conv_acc = Decimal(0); conv_n = 0
-        t_resp_acc = Decimal(0); t_resp_n = 0
-        t_rec_acc = Decimal(0); t_rec_n = 0
-        t_cie_acc = Decimal(0); t_cie_n = 0
-        aband_acc = Decimal(0); aband_n = 0
-        rech_mot = defaultdict(Decimal)
-        rech_total = Decimal(0)
-        recibidas_sum = Decimal(0)
-        completadas_sum = Decimal(0)
-
-        for b in bloques:
-            for k in ("valor_total", "ticket_medio", "comision_total", "comision_media", "margen_medio"):
-                res_agg[k] += Decimal(str((b.get("resumen") or {}).get(k, 0) or 0))
-
-            for p in b.get("evolucion") or []:
-                periodo = str(p.get("periodo", ""))
-                evol_map[periodo] += Decimal(str(p.get("valor", 0)))
-
-            ranks = b.get("rankings") or {}
-            for r in ranks.get("productos") or []:
-                rank_prod[str(r.get("nombre", ""))] += Decimal(str(r.get("valor", 0)))
-            for r in ranks.get("tiendas_por_valor") or []:
-                rank_tiendas_valor[str(r.get("tienda", r.get("nombre", "")))] += Decimal(str(r.get("valor", 0)))
-            for r in ranks.get("usuarios_por_valor") or []:
-                rank_users_valor[str(r.get("usuario", r.get("nombre", "")))] += Decimal(str(r.get("valor", 0)))
-            for r in ranks.get("tiendas_por_operaciones") or []:
-                rank_tiendas_ops[str(r.get("tienda", r.get("nombre", "")))] += Decimal(str(r.get("ops", 0)))
-            for r in ranks.get("usuarios_por_operaciones") or []:
-                rank_users_ops[str(r.get("usuario", r.get("nombre", "")))] += Decimal(str(r.get("ops", 0)))
-
-            pipe = b.get("pipeline") or {}
-            abiertas += Decimal(str(pipe.get("abiertas", 0)))
-            valor_estimado += Decimal(str(pipe.get("valor_estimado", 0)))
-            for row in pipe.get("por_estado") or []:
-                e = str(row.get("estado", ""))
-                d = pipe_estado.setdefault(e, {"count": Decimal(0), "valor": Decimal(0)})
-                d["count"] += Decimal(str(row.get("count", 0)))
-                d["valor"] += Decimal(str(row.get("valor", 0)))
-                total_ops_count += Decimal(str(row.get("count", 0)))
-
-            op = b.get("operativa") or {}
-            if op.get("recibidas") is not None:
-                recibidas_sum += Decimal(str(op.get("recibidas", 0)))
-            if op.get("completadas") is not None:
-                completadas_sum += Decimal(str(op.get("completadas", 0)))
-            if op.get("conversion_pct") is not None: conv_acc += Decimal(str(op.get("conversion_pct", 0))); conv_n += 1
-            if op.get("tmed_respuesta_h") is not None: t_resp_acc += Decimal(str(op.get("tmed_respuesta_h", 0))); t_resp_n += 1
-            if op.get("tmed_recogida_h") is not None: t_rec_acc += Decimal(str(op.get("tmed_recogida_h", 0))); t_rec_n += 1
-            if op.get("tmed_cierre_h") is not None: t_cie_acc += Decimal(str(op.get("tmed_cierre_h", 0))); t_cie_n += 1
-            if op.get("abandono_pct") is not None: aband_acc += Decimal(str(op.get("abandono_pct", 0))); aband_n += 1
-            rech = (op.get("rechazos") or {})
-            rech_total += Decimal(str(rech.get("total", 0)))
-            for m in rech.get("motivos") or []:
-                rech_mot[str(m.get("motivo", ""))] += Decimal(str(m.get("count", 0)))
-
-        evolucion = [{"periodo": k, "valor": v} for k, v in evol_map.items()]
-        evolucion.sort(key=lambda x: x["periodo"])  # YYYY-MM
-
-        def _top(dct, key_name, val_name, top=10):
-            arr = [{key_name: k, val_name: v} for k, v in dct.items()]
-            arr.sort(key=lambda x: x[val_name], reverse=True)
-            return arr[:top]
-
-        rankings = {
-            "productos": _top(rank_prod, "nombre", "valor"),
-            "tiendas_por_valor": _top(rank_tiendas_valor, "tienda", "valor"),
-            "usuarios_por_valor": _top(rank_users_valor, "usuario", "valor"),
-            "tiendas_por_operaciones": _top(rank_tiendas_ops, "tienda", "ops"),
-            "usuarios_por_operaciones": _top(rank_users_ops, "usuario", "ops"),
-        }
-        pipeline = {"abiertas": abiertas, "valor_estimado": valor_estimado, "por_estado": [{"estado": k, **v} for k, v in pipe_estado.items()]}
-        operativa = {
-            "recibidas": recibidas_sum,
-            "completadas": completadas_sum,
-            "conversion_pct": (conv_acc / conv_n) if conv_n else None,
-            "tmed_respuesta_h": (t_resp_acc / t_resp_n) if t_resp_n else None,
-            "tmed_recogida_h": (t_rec_acc / t_rec_n) if t_rec_n else None,
-            "tmed_cierre_h": (t_cie_acc / t_cie_n) if t_cie_n else None,
-            "rechazos": {"total": rech_total, "motivos": [{"motivo": k, "count": v} for k, v in rech_mot.items()]},
-            "abandono_pct": (aband_acc / aband_n) if aband_n else None,
-        }
-
-        compar = comparativa_periodo(evolucion, fecha_inicio, fecha_fin, granularidad, {}, {}, comparar)
-
-        # Fallbacks: si la suma de valor_total es 0, usa el valor estimado del pipeline
-        if res_agg.get("valor_total", Decimal(0)) == 0 and valor_estimado > 0:
-            res_agg["valor_total"] = valor_estimado
-        # Ticket medio: si es 0 y hay operaciones, deriva del valor_total y el recuento total de oportunidades
-        if res_agg.get("ticket_medio", Decimal(0)) == 0 and total_ops_count > 0:
-            try:
-                res_agg["ticket_medio"] = (res_agg["valor_total"] / total_ops_count)
-            except Exception:
-                pass
-        # Comisión: si está en 0, calcula usando el porcentaje configurado en cada tenant
-        if res_agg.get("comision_total", Decimal(0)) == 0 and res_agg.get("valor_total", Decimal(0)) > 0:
-            total_calc = Decimal(0)
-            for b in bloques:
-                try:
-                    bres = (b or {}).get("resumen") or {}
-                    schema = (b or {}).get("_schema")
-                    pct = pct_map.get(schema, Decimal(0))
-                    b_com_tot = Decimal(str(bres.get("comision_total", 0) or 0))
-                    b_val_tot = Decimal(str(bres.get("valor_total", 0) or 0))
-                    if b_com_tot == 0 and b_val_tot > 0 and pct > 0:
-                        total_calc += (b_val_tot * pct)
-                    else:
-                        total_calc += b_com_tot
-                except Exception:
-                    continue
-            if total_calc > 0:
-                res_agg["comision_total"] = total_calc
-
-        if res_agg.get("comision_media", Decimal(0)) == 0 and res_agg.get("ticket_medio", Decimal(0)) > 0:
-            # Aproximación: media de comisiones medias por tenant usando su pct cuando falte
-            medias = []
-            for b in bloques:
-                try:
-                    bres = (b or {}).get("resumen") or {}
-                    schema = (b or {}).get("_schema")
-                    pct = pct_map.get(schema, Decimal(0))
-                    b_com_med = Decimal(str(bres.get("comision_media", 0) or 0))
-                    b_t_med = Decimal(str(bres.get("ticket_medio", 0) or 0))
-                    if b_com_med == 0 and b_t_med > 0 and pct > 0:
-                        medias.append(b_t_med * pct)
-                    elif b_com_med > 0:
-                        medias.append(b_com_med)
-                except Exception:
-                    continue
-            if medias:
-                res_agg["comision_media"] = sum(medias) / Decimal(len(medias))
-
-        out = {
-            "resumen": dict(res_agg),
-            "evolucion": evolucion,
-            "comparativa": compar,
-            "rankings": rankings,
-            "pipeline": pipeline,
-            "operativa": operativa,
-        }
-        return Response(out, status=200)
+        # Todos los tenants: fusión de los mismos bloques, calculados sobre las
+        # tablas de hechos del schema public (progeek/analitica.py)
+        data = dashboard_global(
+            fecha_inicio,
+            fecha_fin,
+            granularidad=granularidad,
+            comparar=comparar,
+            filtros=filtros,
+            ambito=q_ambito_global(request.user),
+            opciones=opciones,
+        )
+        return Response(data, status=200)
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
@@ -582,50 +412,54 @@ class OportunidadesGlobalesView(APIView):
         estados_finalizados = ["pagado", "recibido por el cliente"]  # 👈 define aquí para mantener
         agrupacion_estado = request.query_params.get("estado_agrupado")
         TenantModel = get_tenant_model()
-        resultados = []
-        
-        for tenant in TenantModel.objects.exclude(schema_name="public"):
+        tenants = {t.schema_name: t for t in TenantModel.objects.exclude(schema_name="public").order_by("schema_name")}
+
+        def _oportunidades(schema):
+            tenant = tenants[schema]
             tenant_match = not busqueda or (
                 hasattr(tenant, 'name') and busqueda.lower() in tenant.name.lower())
-            
-            with schema_context(tenant.schema_name):
-                qs = Oportunidad.objects.all()
+            resultados = []
+            qs = Oportunidad.objects.all()
 
-                if agrupacion_estado in ESTADOS_AGRUPADOS:
-                    qs = qs.filter(estado__in=ESTADOS_AGRUPADOS[agrupacion_estado])
+            if agrupacion_estado in ESTADOS_AGRUPADOS:
+                qs = qs.filter(estado__in=ESTADOS_AGRUPADOS[agrupacion_estado])
+            else:
+                estados = request.query_params.getlist("estado")
+                if estados:
+                    qs = qs.filter(estado__in=estados)
                 else:
-                    estados = request.query_params.getlist("estado")
-                    if estados:
-                        qs = qs.filter(estado__in=estados)
-                    else:
-                        estado = request.query_params.get("estado")
-                        if estado:
-                            qs = qs.filter(estado__iexact=estado)
-
-                if busqueda:
-                    qs = qs.filter(
-                        Q(cliente__razon_social__icontains=busqueda) |
-                        Q(nombre__icontains=busqueda) |
-                        Q(tienda__nombre__icontains=busqueda) 
-                       
-                    )
+                    estado = request.query_params.get("estado")
+                    if estado:
+                        qs = qs.filter(estado__iexact=estado)
+
+            if busqueda:
+                qs = qs.filter(
+                    Q(cliente__razon_social__icontains=busqueda) |
+                    Q(nombre__icontains=busqueda) |
+                    Q(tienda__nombre__icontains=busqueda) 
+                   
+                )
 
-                if fecha_inicio:
-                    qs = qs.filter(fecha_creacion__gte=fecha_inicio)
-                if fecha_fin:
-                    qs = qs.filter(fecha_creacion__lte=fecha_fin)
-
-                if finalizadas == "true":
-                    qs = qs.filter(estado__in=estados_finalizados)
-                elif finalizadas == "false":
-                    qs = qs.exclude(estado__in=estados_finalizados)
-                if tenant_match or busqueda:
-                    for o in qs:
-                        data = OportunidadSerializer(o).data
-                        data["tenant"] = tenant.name
-                        data["schema"] = tenant.schema_name
-                        data["tienda"] = o.tienda.nombre if o.tienda else None
-                        resultados.append(data)
+            if fecha_inicio:
+                qs = qs.filter(fecha_creacion__gte=fecha_inicio)
+            if fecha_fin:
+                qs = qs.filter(fecha_creacion__lte=fecha_fin)
+
+            if finalizadas == "true":
+                qs = qs.filter(estado__in=estados_finalizados)
+            elif finalizadas == "false":
+                qs = qs.exclude(estado__in=estados_finalizados)
+            if tenant_match or busqueda:
+                opps = list(OportunidadSerializer.preparar_listado(qs))
+                for o, data in zip(opps, OportunidadSerializer(opps, many=True).data):
+                    data["tenant"] = tenant.name
+                    data["schema"] = tenant.schema_name
+                    data["tienda"] = o.tienda.nombre if o.tienda else None
+                    resultados.append(data)
+            return resultados
+
+        fanout = ejecutar_por_tenant(tenants, _oportunidades)
+        resultados = [o for bloque in fanout.valores() for o in bloque]
 
         total = len(resultados)
         paginated = resultados[offset:offset + limit]
@@ -635,7 +469,7 @@ class OportunidadesGlobalesView(APIView):
             "total": total,
             "limit": limit,
             "offset": offset
-        })
+        }, headers=fanout.cabeceras())
 
 @api_view(["PATCH"])
 @permission_classes([IsAuthenticated])
@@ -721,58 +555,57 @@ def oportunidades_globales_por_estado(request):
         f"busqueda={busqueda!r}, ordering={ordering}"
     )
 
-    resultado = []
+    companies = {c.schema_name: c for c in Company.objects.exclude(schema_name="public").order_by("schema_name")}
 
-    for company in Company.objects.exclude(schema_name="public"):
-        try:
-            with schema_context(company.schema_name):
-                qs = (
-                    Oportunidad.objects.filter(estado__in=estados)
-                    .select_related("cliente", "tienda")
-                    .prefetch_related("dispositivos_oportunidad")
-                )
+    def _oportunidades(schema):
+        company = companies[schema]
+        qs = (
+            Oportunidad.objects.filter(estado__in=estados)
+            .select_related("cliente", "tienda")
+            .prefetch_related("dispositivos_oportunidad")
+        )
 
-                if fi and ff:
-                    qs = qs.filter(fecha_creacion__range=(fi, ff))
-                elif fi:
-                    qs = qs.filter(fecha_creacion__gte=fi)
-                elif ff:
-                    qs = qs.filter(fecha_creacion__lte=ff)
-
-                if busqueda:
-                    # Construir SIEMPRE en 'q' (no machacar 'qs')
-                    q = (
-                        Q(cliente__razon_social__icontains=busqueda)
-                        | Q(nombre__icontains=busqueda)
-                        | Q(tienda__nombre__icontains=busqueda)
-                    )
+        if fi and ff:
+            qs = qs.filter(fecha_creacion__range=(fi, ff))
+        elif fi:
+            qs = qs.filter(fecha_creacion__gte=fi)
+        elif ff:
+            qs = qs.filter(fecha_creacion__lte=ff)
+
+        if busqueda:
+            # Construir SIEMPRE en 'q' (no machacar 'qs')
+            q = (
+                Q(cliente__razon_social__icontains=busqueda)
+                | Q(nombre__icontains=busqueda)
+                | Q(tienda__nombre__icontains=busqueda)
+            )
 
-                    # uuid: castear a texto para icontains
-                    qs = qs.annotate(uuid_str=Cast("uuid", CharField()))
-                    q |= Q(uuid_str__icontains=busqueda)
+            # uuid: castear a texto para icontains
+            qs = qs.annotate(uuid_str=Cast("uuid", CharField()))
+            q |= Q(uuid_str__icontains=busqueda)
 
-                    # hashid: si parece hashid válido, decodifica y filtra por id exacto
-                    try:
-                        decoded = HASHIDS.decode(busqueda)
-                        if decoded:
-                            q |= Q(id=decoded[0])
-                    except Exception:
-                        pass
+            # hashid: si parece hashid válido, decodifica y filtra por id exacto
+            try:
+                decoded = HASHIDS.decode(busqueda)
+                if decoded:
+                    q |= Q(id=decoded[0])
+            except Exception:
+                pass
 
-                    qs = qs.filter(q)
+            qs = qs.filter(q)
 
-                qs = qs.order_by(ordering)
+        qs = qs.order_by(ordering)
 
-                data = OportunidadPublicaSerializer(qs, many=True).data
-                for o in data:
-                    o["tenant"] = company.schema_name
-                    o["partner"] = company.name
-                resultado.extend(data)
+        data = OportunidadPublicaSerializer(qs, many=True).data
+        for o in data:
+            o["tenant"] = company.schema_name
+            o["partner"] = company.name
+        return data
 
-        except Exception as e:
-            logger.exception(f"❌ Error en tenant {company.schema_name}: {e}")
+    fanout = ejecutar_por_tenant(companies, _oportunidades)
+    resultado = [o for bloque in fanout.valores() for o in bloque]
 
-    return Response(resultado)
+    return Response(resultado, headers=fanout.cabeceras())
   
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
@@ -890,38 +723,36 @@ class ResumenGlobalOportunidadesAPIView(APIView):
         resumen = {clave: 0 for clave in ESTADOS_RESUMEN}
         resumen["resto"] = 0
 
+        def _contar(schema):
+            # Verificamos que la tabla exista en el schema
+            tablas = connection.introspection.table_names()
+            if Oportunidad._meta.db_table not in tablas:
+                logger.warning("❌ Tabla Oportunidad no existe en %s", schema)
+                return {}
+
+            conteo = {}
+            estados_ya_contados = []
+            for clave, estados in ESTADOS_RESUMEN.items():
+                conteo[clave] = Oportunidad.objects.filter(estado__in=estados).count()
+                estados_ya_contados.extend(estados)
+
+            conteo["resto"] = Oportunidad.objects.exclude(estado__in=estados_ya_contados).count()
+            return conteo
+
         try:
             TenantModel = get_tenant_model()
             with schema_context("public"):
-                tenants = TenantModel.objects.all()
-
-            for tenant in tenants:
-                try:
-                    with schema_context(tenant.schema_name):
-                        # Verificamos que la tabla exista en el schema
-                        tablas = connection.introspection.table_names()
-                        if Oportunidad._meta.db_table not in tablas:
-                            logger.warning("❌ Tabla Oportunidad no existe en %s", tenant.schema_name)
-                            continue
-
-                        estados_ya_contados = []
-                        for clave, estados in ESTADOS_RESUMEN.items():
-                            count = Oportunidad.objects.filter(estado__in=estados).count()
-                            resumen[clave] += count
-                            estados_ya_contados.extend(estados)
-
-                        restantes = Oportunidad.objects.exclude(estado__in=estados_ya_contados).count()
-                        resumen["resto"] += restantes
-
-                except Exception as e:
-                    logger.error("❌ Error procesando tenant %s: %s", tenant.schema_name, str(e))
-                    continue
-
+                schemas = list(TenantModel.objects.order_by("schema_name").values_list("schema_name", flat=True))
+            fanout = ejecutar_por_tenant(schemas, _contar)
         except Exception as e:
             logger.exception("🔥 Error global en resumen")
             return Response({"detail": f"Error interno: {e}"}, status=500)
 
-        return Response(resumen)
+        for conteo in fanout.valores():
+            for clave, n in conteo.items():
+                resumen[clave] += n
+
+        return Response(resumen, headers=fanout.cabeceras())
 
 
 class UserListAPIView(generics.ListAPIView):
@@ -946,31 +777,28 @@ def listar_tenants(request):
         return Response({"detail": "No autorizado"}, status=403)
 
     TenantModel = get_tenant_model()
-    tenants = TenantModel.objects.exclude(schema_name="public")
+    tenants = list(TenantModel.objects.exclude(schema_name="public").order_by("schema_name"))
 
+    def _num_tiendas(schema):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM checkouters_tienda")
+            return cursor.fetchone()[0]
 
+    fanout = ejecutar_por_tenant([t.schema_name for t in tenants], _num_tiendas)
 
     tenant_data = []
     for tenant in tenants:
-        try:
-            with schema_context(tenant.schema_name):
-                with connection.cursor() as cursor:
-                    cursor.execute("SELECT COUNT(*) FROM checkouters_tienda")
-                    num_tiendas = cursor.fetchone()[0]
-        except Exception as e:
-            num_tiendas = "Error"
-
         tenant_data.append({
             "id": tenant.id,
             "nombre": tenant.name,
             "schema": tenant.schema_name,
             "estado": getattr(tenant, "estado", "activo"),
-            "tiendas": num_tiendas,
+            "tiendas": fanout.resultados.get(tenant.schema_name, "Error"),
             "modo": tenant.management_mode,
             "solo_empresas": getattr(tenant, "solo_empresas", False),
         })
 
-    return Response(tenant_data)
+    return Response(tenant_data, headers=fanout.cabeceras())
 
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 @permission_classes([IsAuthenticated])
@@ -1262,8 +1090,12 @@ class CrearCompanyAPIView(APIView):
             if v is not None and k in model_fields:
                 base_kwargs[k] = v
 
-        # ✅ Crear el tenant
-        company = Company.objects.create(**base_kwargs)
+        # ✅ Crear el tenant (clonando el schema plantilla, ver aprovisionamiento.py)
+        try:
+            company, provision = crear_company(Company, **base_kwargs)
+        except PlantillaDesactualizada as e:
+            transaction.set_rollback(True)  # deshace el owner creado arriba
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
         # ✅ Cambiar el owner del schema al usuario de Django
         from django.db import connection
@@ -1296,6 +1128,7 @@ class CrearCompanyAPIView(APIView):
             "management_mode": getattr(company, "management_mode", None),
             "owner_email": owner.email if owner else request.user.email,
             "detail": "Partner creado correctamente.",
+            "provision_segundos": provision["segundos"] if provision else None,
         }
         return Response(respuesta, status=status.HTTP_201_CREATED)
         
@@ -1403,7 +1236,7 @@ def generar_pdf_oportunidad_global(request, tenant, pk):
             oportunidad = Oportunidad.objects.select_related('cliente')\
                 .prefetch_related('dispositivos').get(uuid=pk)
 
-            pdf_buffer = generar_pdf_oportunidad(oportunidad, tenant=tenant_obj)
+            pdf_buffer = generar_pdf_oportunidad_cacheado(oportunidad, tenant=tenant_obj)
     except Oportunidad.DoesNotExist:
         logger.error(f"❌ Oportunidad con ID {pk} no encontrada en schema '{tenant}'")
         raise Http404("Oportunidad no encontrada")
@@ -1552,7 +1385,7 @@ def busqueda_global(request):
         return Response({})
 
     TenantModel = get_tenant_model()
-    tenants = TenantModel.objects.exclude(schema_name="public")
+    schemas = TenantModel.objects.exclude(schema_name="public").order_by("schema_name").values_list("schema_name", flat=True)
 
     resultados = {
         "oportunidades": [],
@@ -1569,51 +1402,57 @@ def busqueda_global(request):
     except Exception:
         pass
 
-    for tenant in tenants:
-        with schema_context(tenant.schema_name):
-            # Buscar clientes por nombre
-            clientes = Cliente.objects.filter(
-                razon_social__icontains=query
-            ).values("id", "razon_social")
-
-            for c in clientes:
-                resultados["clientes"].append({
-                    "id": c["id"],
-                    "razon_social": c["razon_social"],
-                    "schema": tenant.schema_name
-                })
-
-            # Buscar dispositivos por IMEI o SN
-            dispositivos = DispositivoReal.objects.filter(
-                Q(imei__icontains=query) | Q(numero_serie__icontains=query)
-            ).select_related("modelo").values(
-                "id", "imei", "numero_serie", "modelo__descripcion"
-            )
+    def _buscar(schema):
+        encontrados = {clave: [] for clave in resultados}
+        # Buscar clientes por nombre
+        clientes = Cliente.objects.filter(
+            razon_social__icontains=query
+        ).values("id", "razon_social")
+
+        for c in clientes:
+            encontrados["clientes"].append({
+                "id": c["id"],
+                "razon_social": c["razon_social"],
+                "schema": schema
+            })
+
+        # Buscar dispositivos por IMEI o SN
+        dispositivos = DispositivoReal.objects.filter(
+            Q(imei__icontains=query) | Q(numero_serie__icontains=query)
+        ).select_related("modelo").values(
+            "id", "imei", "numero_serie", "modelo__descripcion"
+        )
 
-            for d in dispositivos:
-                resultados["dispositivos"].append({
-                    "id": d["id"],
-                    "imei": d["imei"],
-                    "numero_serie": d["numero_serie"],
-                    "modelo": d["modelo__descripcion"],
-                    "schema": tenant.schema_name
+        for d in dispositivos:
+            encontrados["dispositivos"].append({
+                "id": d["id"],
+                "imei": d["imei"],
+                "numero_serie": d["numero_serie"],
+                "modelo": d["modelo__descripcion"],
+                "schema": schema
+            })
+
+        # Buscar oportunidad por hashid decodificado
+        if id_oportunidad:
+            try:
+                oportunidad = Oportunidad.objects.get(id=id_oportunidad)
+                encontrados["oportunidades"].append({
+                    "id": oportunidad.id,
+                    "uuid": str(oportunidad.uuid),
+                    "hashid": oportunidad.hashid,
+                    "nombre": oportunidad.nombre,
+                    "schema": schema
                 })
+            except Oportunidad.DoesNotExist:
+                pass
+        return encontrados
 
-            # Buscar oportunidad por hashid decodificado
-            if id_oportunidad:
-                try:
-                    oportunidad = Oportunidad.objects.get(id=id_oportunidad)
-                    resultados["oportunidades"].append({
-                        "id": oportunidad.id,
-                        "uuid": str(oportunidad.uuid),
-                        "hashid": oportunidad.hashid,
-                        "nombre": oportunidad.nombre,
-                        "schema": tenant.schema_name
-                    })
-                except Oportunidad.DoesNotExist:
-                    pass
+    fanout = ejecutar_por_tenant(schemas, _buscar)
+    for encontrados in fanout.valores():
+        for clave, filas in encontrados.items():
+            resultados[clave].extend(filas)
 
-    return Response(resultados)
+    return Response(resultados, headers=fanout.cabeceras())
 
 ESTADOS_PIPELINE = [
     "Pendiente",
@@ -19,7 +19,7 @@ from django.template import engines, Context, TemplateSyntaxError,Engine
 import bleach
 
 # importa tu generador actual (lo parchearemos en B más abajo para insertar condiciones)
-from checkouters.utils.pdf import generar_pdf_contrato  
+from checkouters.utils.pdf import generar_pdf_contrato_preview
 
 
 
@@ -87,7 +87,7 @@ class B2CContratoPdfPreviewByToken(APIView):
             contrato = get_object_or_404(B2CContrato, pk=idx.contrato_id)
 
             # 3) Generar PREVIEW SIEMPRE en memoria
-            content_file, sha = generar_pdf_contrato(contrato, preview=True)
+            content_file, sha = generar_pdf_contrato_preview(contrato)
             content_file.seek(0)
             pdf_bytes = content_file.read()
 
@@ -35,7 +35,7 @@ def md_to_html(text: str) -> str:
 Company = apps.get_model('companies', 'Company')
 from progeek.models import B2CKycIndex           # <- ej. tu modelo del token
 from checkouters.models.legal import B2CContrato  # <- si guardas la PLANTILLA BASE de contrato
-from checkouters.utils.pdf import generar_pdf_contrato
+from checkouters.utils.pdf import generar_pdf_contrato_preview
 
 # Util: carga la PLANTILLA BASE de contrato (Markdown)
 def get_contract_base_template(company) -> str:
@@ -177,7 +177,7 @@ class B2CContratoPdfPreviewByToken(APIView):
             contrato = get_object_or_404(B2CContrato, pk=idx.contrato_id)
 
             # 3) Generar PREVIEW SIEMPRE en memoria
-            content_file, sha = generar_pdf_contrato(contrato, preview=True)
+            content_file, sha = generar_pdf_contrato_preview(contrato)
             content_file.seek(0)
             pdf_bytes = content_file.read()
 
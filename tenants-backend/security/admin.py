@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import LoginHistory
+from .models import CorreoSaliente, LoginHistory
 
 
 @admin.register(LoginHistory)
@@ -49,3 +49,18 @@ class LoginHistoryAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         # Solo superusuarios pueden borrar historial
         return request.user.is_superuser
+
+
+@admin.register(CorreoSaliente)
+class CorreoSalienteAdmin(admin.ModelAdmin):
+    list_display = ['asunto', 'destinatarios', 'estado', 'intentos', 'creado', 'enviado']
+    list_filter = ['estado', 'creado']
+    search_fields = ['asunto', 'destinatarios']
+    readonly_fields = ['mensaje', 'creado', 'enviado', 'ultimo_error']
+    actions = ['reintentar']
+
+    @admin.action(description='Reintentar ahora')
+    def reintentar(self, request, queryset):
+        from django.utils import timezone
+
+        queryset.exclude(estado='enviado').update(estado='pendiente', intentos=0, proximo_intento=timezone.now())
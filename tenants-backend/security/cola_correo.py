@@ -0,0 +1,223 @@
+"""
+Cola de salida de correo.
+
+Con EMAIL_BACKEND = "security.cola_correo.ColaCorreoBackend", send_mail y
+EmailMessage.send solo insertan un CorreoSaliente (una query), así que los
+endpoints (OTP, KYC, alertas de seguridad) responden sin esperar a Graph.
+
+El envío real lo hace CORREO_BACKEND_ENVIO (p.ej. MicrosoftOAuth2EmailBackend):
+- Al confirmar la transacción se despierta un hilo del proceso que vacía la
+  cola (CORREO_COLA_EN_PROCESO)
+- `manage.py procesar_cola_correo` (worker "cola-correo" de PM2) hace lo
+  mismo en bucle y recoge lo que quede (reintentos, reinicios)
+
+Varios workers pueden convivir: cada lote se reserva con SELECT ... FOR
+UPDATE SKIP LOCKED y se envía tras confirmar la reserva. Un envío fallido se
+reintenta con espera exponencial hasta CORREO_MAX_INTENTOS.
+"""
+import base64
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+LOTE = 20
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "CORREO_COLA_HILOS", 2), thread_name_prefix="correo-cola"
+            )
+        return _executor
+
+
+def serializar(message) -> dict:
+    """EmailMessage → dict JSON (adjuntos en base64)."""
+    adjuntos = []
+    for adjunto in message.attachments:
+        if isinstance(adjunto, tuple) and len(adjunto) == 3:
+            nombre, contenido, mimetype = adjunto
+        else:
+            # MIMEBase ya construido
+            nombre, contenido, mimetype = adjunto.get_filename(), adjunto.get_payload(decode=True), adjunto.get_content_type()
+        if isinstance(contenido, str):
+            contenido = contenido.encode()
+        adjuntos.append([nombre, base64.b64encode(contenido).decode(), mimetype])
+    return {
+        "subject": message.subject,
+        "body": message.body,
+        "from_email": message.from_email,
+        "to": list(message.to),
+        "cc": list(message.cc),
+        "bcc": list(message.bcc),
+        "reply_to": list(message.reply_to),
+        "headers": dict(message.extra_headers),
+        "content_subtype": message.content_subtype,
+        "alternatives": [list(a) for a in getattr(message, "alternatives", None) or []],
+        "attachments": adjuntos,
+    }
+
+
+def deserializar(datos) -> EmailMultiAlternatives:
+    message = EmailMultiAlternatives(
+        subject=datos["subject"],
+        body=datos["body"],
+        from_email=datos["from_email"],
+        to=datos["to"],
+        cc=datos["cc"],
+        bcc=datos["bcc"],
+        reply_to=datos["reply_to"],
+        headers=datos["headers"],
+        alternatives=[tuple(a) for a in datos["alternatives"]],
+    )
+    message.content_subtype = datos["content_subtype"]
+    for nombre, contenido, mimetype in datos["attachments"]:
+        message.attach(nombre, base64.b64decode(contenido), mimetype)
+    return message
+
+
+class ColaCorreoBackend(BaseEmailBackend):
+    """Backend de Django que encola los mensajes en lugar de enviarlos."""
+
+    def send_messages(self, email_messages):
+        from .models import CorreoSaliente
+
+        if not email_messages:
+            return 0
+        filas = [
+            CorreoSaliente(
+                mensaje=serializar(m),
+                destinatarios=", ".join(m.recipients())[:2000],
+                asunto=(m.subject or "")[:255],
+            )
+            for m in email_messages
+        ]
+        try:
+            CorreoSaliente.objects.bulk_create(filas)
+        except Exception:
+            logger.exception("Error encolando %s correos", len(filas))
+            if not self.fail_silently:
+                raise
+            return 0
+        if getattr(settings, "CORREO_COLA_EN_PROCESO", True):
+            transaction.on_commit(_despertar)
+        return len(filas)
+
+
+def _despertar():
+    _get_executor().submit(_vaciar_en_hilo)
+
+
+def _vaciar_en_hilo():
+    try:
+        vaciar_cola()
+    except Exception:
+        logger.exception("Error vaciando la cola de correo")
+    finally:
+        connection.close()
+
+
+def vaciar_cola(max_lotes=50) -> int:
+    """Procesa lotes hasta que no quede nada listo. Devuelve los enviados."""
+    total = 0
+    for _ in range(max_lotes):
+        enviados, fallidos = procesar_lote()
+        total += enviados
+        if enviados + fallidos < LOTE:
+            break
+    return total
+
+
+def _espera(intentos) -> timedelta:
+    return timedelta(seconds=min(30 * 2 ** (intentos - 1), 3600))
+
+
+def procesar_lote(limite=LOTE):
+    """
+    Envía un lote de correos pendientes con CORREO_BACKEND_ENVIO.
+
+    Las filas se reservan en una transacción corta (proximo_intento pasa a
+    ahora + CORREO_RESERVA_SEGUNDOS) y se envían ya fuera de ella, sin locks
+    abiertos durante las llamadas HTTP. Si el worker muere a mitad de envío,
+    las filas vuelven a estar listas al vencer la reserva.
+
+    Returns:
+        (enviados, fallidos)
+    """
+    from .models import CorreoSaliente
+
+    max_intentos = getattr(settings, "CORREO_MAX_INTENTOS", 5)
+    reserva = timedelta(seconds=getattr(settings, "CORREO_RESERVA_SEGUNDOS", 600))
+    with transaction.atomic():
+        filas = list(
+            CorreoSaliente.objects.select_for_update(skip_locked=True)
+            .filter(estado="pendiente", proximo_intento__lte=timezone.now())
+            .order_by("id")[:limite]
+        )
+        if not filas:
+            return 0, 0
+        CorreoSaliente.objects.filter(id__in=[f.id for f in filas]).update(proximo_intento=timezone.now() + reserva)
+
+    errores = _enviar([deserializar(f.mensaje) for f in filas])
+
+    ahora = timezone.now()
+    for fila, error in zip(filas, errores):
+        fila.intentos += 1
+        if error is None:
+            fila.estado, fila.enviado, fila.ultimo_error = "enviado", ahora, ""
+        else:
+            fila.ultimo_error = error[:2000]
+            if fila.intentos >= max_intentos:
+                fila.estado = "error"
+                logger.error("Correo %s descartado tras %s intentos: %s", fila.id, fila.intentos, error)
+            else:
+                fila.proximo_intento = ahora + _espera(fila.intentos)
+    CorreoSaliente.objects.bulk_update(filas, ["estado", "enviado", "ultimo_error", "intentos", "proximo_intento"])
+
+    fallidos = sum(1 for e in errores if e is not None)
+    return len(filas) - fallidos, fallidos
+
+
+def _enviar(mensajes):
+    """
+    Envía con el backend real. Devuelve, por mensaje, None o el error.
+
+    Si el backend sabe enviar en lote (send_batch de Graph) lo usa; si no,
+    mensaje a mensaje por una sola conexión.
+    """
+    backend = get_connection(getattr(settings, "CORREO_BACKEND_ENVIO", None), fail_silently=False)
+    if hasattr(backend, "send_batch"):
+        try:
+            return backend.send_batch(mensajes)
+        except Exception as e:
+            return [str(e)] * len(mensajes)
+
+    errores = []
+    try:
+        backend.open()
+    except Exception as e:
+        return [str(e)] * len(mensajes)
+    try:
+        for m in mensajes:
+            try:
+                errores.append(None if backend.send_messages([m]) else "no enviado")
+            except Exception as e:
+                errores.append(str(e))
+    finally:
+        backend.close()
+    return errores
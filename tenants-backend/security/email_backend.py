@@ -23,12 +23,25 @@ Guía para configurar Azure AD:
 10. API permissions > Add permission > Microsoft Graph > Application permissions
 11. Añade: Mail.Send
 12. Grant admin consent
+
+Rendimiento:
+- El token se cachea por proceso (una app MSAL por tenant/cliente) hasta
+  poco antes de su expires_in, en vez de pedir uno en cada send_messages
+- Las peticiones a Graph van por una sesión HTTP compartida (pool de
+  conexiones, timeouts MICROSOFT_GRAPH_TIMEOUT)
+- Varios mensajes en un send_messages se envían con $batch (hasta 20 por
+  petición)
+- MICROSOFT_GRAPH_ENDPOINT permite apuntar a un Graph falso en pruebas
+
+Para no enviar dentro de la petición HTTP, ver cola_correo.py.
 """
 
 import logging
 import msal
 import re
 import requests
+import threading
+import time
 from django.conf import settings
 from django.core.mail.backends.base import BaseEmailBackend
 from django.core.exceptions import ValidationError
@@ -75,6 +88,85 @@ def extract_and_validate_email(email_string):
         raise ValidationError(f"Invalid email address: {email}") from e
 
 
+# Límite de peticiones por $batch de Graph
+GRAPH_BATCH_MAX = 20
+
+_sesion = None
+_tokens = {}
+_lock = threading.Lock()
+
+
+def sesion_graph():
+    """Sesión HTTP compartida por el proceso (reutiliza conexiones TLS)."""
+    global _sesion
+    with _lock:
+        if _sesion is None:
+            tam = getattr(settings, "MICROSOFT_GRAPH_POOL", 10)
+            adapter = requests.adapters.HTTPAdapter(pool_connections=tam, pool_maxsize=tam)
+            _sesion = requests.Session()
+            _sesion.mount("https://", adapter)
+            _sesion.mount("http://", adapter)
+        return _sesion
+
+
+class CacheToken:
+    """
+    Access token cacheado hasta `margen` segundos antes de su expires_in.
+
+    Args:
+        solicitar: Callable sin argumentos que devuelve el resultado de MSAL
+            ({"access_token", "expires_in"} o {"error", ...})
+    """
+
+    def __init__(self, solicitar, margen=120):
+        self.solicitar = solicitar
+        self.margen = margen
+        self._token = None
+        self._caduca = 0.0
+        self._lock = threading.Lock()
+
+    def obtener(self):
+        if self._token and time.monotonic() < self._caduca:
+            return self._token
+        with self._lock:
+            # Otro hilo puede haberlo renovado mientras esperábamos
+            if self._token and time.monotonic() < self._caduca:
+                return self._token
+            result = self.solicitar()
+            if "access_token" not in result:
+                error_msg = result.get("error_description", result.get("error", "Unknown error"))
+                raise Exception(f"MSAL token error: {error_msg}")
+            self._token = result["access_token"]
+            self._caduca = time.monotonic() + max(int(result.get("expires_in", 3600)) - self.margen, 0)
+            return self._token
+
+    def invalidar(self):
+        with self._lock:
+            self._token = None
+
+
+def cache_token(client_id, client_secret, tenant_id, scope):
+    """CacheToken del proceso para una app de Azure AD."""
+    clave = (tenant_id, client_id)
+    with _lock:
+        cache = _tokens.get(clave)
+        if cache is None:
+            app = {}
+
+            def solicitar():
+                # La app MSAL se crea una vez (descubrimiento de la authority incluido)
+                if "msal" not in app:
+                    app["msal"] = msal.ConfidentialClientApplication(
+                        client_id=client_id,
+                        client_credential=client_secret,
+                        authority=f"https://login.microsoftonline.com/{tenant_id}",
+                    )
+                return app["msal"].acquire_token_for_client(scopes=scope)
+
+            cache = _tokens[clave] = CacheToken(solicitar)
+        return cache
+
+
 class MicrosoftOAuth2EmailBackend(BaseEmailBackend):
     """
     Backend de email usando OAuth2 con Microsoft Graph API.
@@ -106,10 +198,11 @@ class MicrosoftOAuth2EmailBackend(BaseEmailBackend):
         self.scope = ["https://graph.microsoft.com/.default"]
 
         # Microsoft Graph API endpoint
-        self.graph_endpoint = "https://graph.microsoft.com/v1.0"
+        self.graph_endpoint = getattr(settings, "MICROSOFT_GRAPH_ENDPOINT", "https://graph.microsoft.com/v1.0").rstrip("/")
+        self.timeout = getattr(settings, "MICROSOFT_GRAPH_TIMEOUT", (5, 30))
 
-        # Cache de access token
-        self._access_token = None
+        # Cache de access token (compartida por todas las instancias del proceso)
+        self.tokens = cache_token(self.client_id, self.client_secret, self.tenant_id, self.scope)
 
     def _get_access_token(self):
         """
@@ -119,26 +212,9 @@ class MicrosoftOAuth2EmailBackend(BaseEmailBackend):
             str: Access token válido
         """
         try:
-            # Crear cliente confidencial de MSAL
-            app = msal.ConfidentialClientApplication(
-                client_id=self.client_id,
-                client_credential=self.client_secret,
-                authority=self.authority
-            )
-
-            # Obtener token usando client credentials flow
-            result = app.acquire_token_for_client(scopes=self.scope)
-
-            if "access_token" in result:
-                logger.debug("Access token obtenido exitosamente")
-                return result["access_token"]
-            else:
-                error_msg = result.get("error_description", result.get("error", "Unknown error"))
-                logger.error(f"Error obteniendo access token: {error_msg}")
-                if not self.fail_silently:
-                    raise Exception(f"MSAL token error: {error_msg}")
-                return None
-
+            token = self.tokens.obtener()
+            logger.debug("Access token obtenido exitosamente")
+            return token
         except Exception as e:
             logger.error(f"Exception obteniendo access token: {e}")
             if not self.fail_silently:
@@ -164,17 +240,84 @@ class MicrosoftOAuth2EmailBackend(BaseEmailBackend):
             logger.error("No se pudo obtener access token")
             return 0
 
-        num_sent = 0
-        for message in email_messages:
+        if len(email_messages) == 1:
             try:
-                if self._send_message(message, access_token):
-                    num_sent += 1
+                return int(bool(self._send_message(email_messages[0], access_token)))
             except Exception as e:
                 logger.error(f"Error enviando email: {e}")
                 if not self.fail_silently:
                     raise
+                return 0
+
+        errores = self.send_batch(email_messages, access_token)
+        fallidos = [e for e in errores if e]
+        if fallidos and not self.fail_silently:
+            raise Exception(f"Graph API error: {fallidos[0]}")
+        return len(errores) - len(fallidos)
 
-        return num_sent
+    def send_batch(self, email_messages, access_token=None):
+        """
+        Envía varios mensajes con $batch de Graph (GRAPH_BATCH_MAX por petición).
+
+        Returns:
+            list: Por cada mensaje, None si Graph lo aceptó o el texto del error
+        """
+        access_token = access_token or self._get_access_token()
+        errores = [None] * len(email_messages)
+        for inicio in range(0, len(email_messages), GRAPH_BATCH_MAX):
+            lote = list(enumerate(email_messages[inicio:inicio + GRAPH_BATCH_MAX], start=inicio))
+            peticiones = []
+            for i, message in lote:
+                try:
+                    from_email = extract_and_validate_email(message.from_email or self.from_email)
+                    body = self._build_graph_message(message)
+                except Exception as e:
+                    errores[i] = str(e)
+                    continue
+                peticiones.append({
+                    "id": str(i),
+                    "method": "POST",
+                    "url": f"/users/{from_email}/sendMail",
+                    "headers": {"Content-Type": "application/json"},
+                    "body": body,
+                })
+            if not peticiones:
+                continue
+            try:
+                response = self._post("/$batch", {"requests": peticiones}, access_token)
+                if response.status_code != 200:
+                    raise Exception(f"status {response.status_code}: {response.text}")
+                respuestas = {r["id"]: r for r in response.json().get("responses", [])}
+            except Exception as e:
+                logger.error(f"Error enviando lote de emails: {e}")
+                for p in peticiones:
+                    errores[int(p["id"])] = str(e)
+                continue
+            for p in peticiones:
+                r = respuestas.get(p["id"], {})
+                if r.get("status") != 202:
+                    errores[int(p["id"])] = f"status {r.get('status')}: {r.get('body')}"
+        enviados = sum(1 for e in errores if e is None)
+        logger.info(f"Lote de emails enviado: {enviados}/{len(email_messages)}")
+        return errores
+
+    def _post(self, path, payload, access_token):
+        """POST a Graph por la sesión compartida; con 401 renueva el token una vez."""
+        for intento in range(2):
+            response = sesion_graph().post(
+                f"{self.graph_endpoint}{path}",
+                headers={
+                    'Authorization': f'Bearer {access_token}',
+                    'Content-Type': 'application/json'
+                },
+                json=payload,
+                timeout=self.timeout,
+            )
+            if response.status_code != 401 or intento:
+                return response
+            self.tokens.invalidar()
+            access_token = self._get_access_token()
+        return response
 
     def _send_message(self, message, access_token):
         """
@@ -191,12 +334,6 @@ class MicrosoftOAuth2EmailBackend(BaseEmailBackend):
             # Construir payload de Microsoft Graph
             graph_message = self._build_graph_message(message)
 
-            # Headers de la petición
-            headers = {
-                'Authorization': f'Bearer {access_token}',
-                'Content-Type': 'application/json'
-            }
-
             # ✅ Endpoint para enviar email con validación robusta
             # Extraer y validar email limpio del remitente
             from_email = message.from_email or self.from_email
@@ -211,14 +348,8 @@ class MicrosoftOAuth2EmailBackend(BaseEmailBackend):
                     raise
                 return False
 
-            endpoint = f"{self.graph_endpoint}/users/{from_email}/sendMail"
-
             # Enviar petición
-            response = requests.post(
-                endpoint,
-                headers=headers,
-                json=graph_message
-            )
+            response = self._post(f"/users/{from_email}/sendMail", graph_message, access_token)
 
             if response.status_code == 202:  # Accepted
                 logger.info(f"Email enviado exitosamente a {message.to}")
@@ -276,8 +407,13 @@ class MicrosoftOAuth2EmailBackend(BaseEmailBackend):
                 except ValidationError:
                     logger.warning(f"Skipping invalid BCC email: {addr}")
 
-        # Determinar content type
+        # Determinar content type (send_mail(html_message=...) lo deja como alternativa)
         content_type = "HTML" if message.content_subtype == "html" else "Text"
+        body = message.body
+        for contenido, mimetype in getattr(message, "alternatives", None) or []:
+            if mimetype == "text/html":
+                content_type, body = "HTML", contenido
+                break
 
         # Construir mensaje en formato Graph
         graph_message = {
@@ -285,7 +421,7 @@ class MicrosoftOAuth2EmailBackend(BaseEmailBackend):
                 "subject": message.subject,
                 "body": {
                     "contentType": content_type,
-                    "content": message.body
+                    "content": body
                 },
                 "toRecipients": to_recipients,
             },
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from security.cola_correo import vaciar_cola
+
+
+class Command(BaseCommand):
+    help = 'Envía los correos pendientes de la cola de salida (CorreoSaliente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Vacía la cola y termina (para cron) en lugar de quedarse escuchando',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=5,
+            help='Segundos entre pasadas cuando la cola está vacía (por defecto 5)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            enviados = vaciar_cola()
+            if enviados:
+                self.stdout.write(f"✉️ {enviados} correos enviados")
+            if options['una_vez']:
+                return
+            if not enviados:
+                time.sleep(options['intervalo'])
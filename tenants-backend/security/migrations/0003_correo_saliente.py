@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('security', '0002_loginhistory_region'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorreoSaliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mensaje', models.JSONField(verbose_name='Mensaje serializado')),
+                ('destinatarios', models.TextField(blank=True, verbose_name='Destinatarios')),
+                ('asunto', models.CharField(blank=True, max_length=255, verbose_name='Asunto')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviado', 'Enviado'), ('error', 'Error definitivo')], default='pendiente', max_length=10, verbose_name='Estado')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próximo intento')),
+                ('ultimo_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('creado', models.DateTimeField(auto_now_add=True, verbose_name='Creado')),
+                ('enviado', models.DateTimeField(blank=True, null=True, verbose_name='Enviado')),
+            ],
+            options={
+                'verbose_name': 'Correo saliente',
+                'verbose_name_plural': 'Correos salientes',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='correo_cola_idx')],
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -143,3 +144,39 @@ class LoginHistory(models.Model):
         else:
             # Sin geolocalización (IP privada)
             return f"IP: {self.ip}"
+
+
+class CorreoSaliente(models.Model):
+    """
+    Correo pendiente de envío (cola de salida, ver security/cola_correo.py).
+
+    Las vistas solo insertan la fila; los workers la envían con el backend
+    real (CORREO_BACKEND_ENVIO) y reintentan con espera creciente.
+    """
+
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('enviado', 'Enviado'),
+        ('error', 'Error definitivo'),
+    ]
+
+    mensaje = models.JSONField(verbose_name='Mensaje serializado')
+    destinatarios = models.TextField(blank=True, verbose_name='Destinatarios')
+    asunto = models.CharField(max_length=255, blank=True, verbose_name='Asunto')
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='pendiente', verbose_name='Estado')
+    intentos = models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')
+    proximo_intento = models.DateTimeField(default=timezone.now, verbose_name='Próximo intento')
+    ultimo_error = models.TextField(blank=True, verbose_name='Último error')
+    creado = models.DateTimeField(auto_now_add=True, verbose_name='Creado')
+    enviado = models.DateTimeField(null=True, blank=True, verbose_name='Enviado')
+
+    class Meta:
+        verbose_name = 'Correo saliente'
+        verbose_name_plural = 'Correos salientes'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento'], name='correo_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.asunto} → {self.destinatarios} ({self.estado})"
@@ -0,0 +1,157 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from django.core.mail import EmailMessage, send_mail
+
+
+class GraphFalso(BaseHTTPRequestHandler):
+    """Graph mínimo: sendMail y $batch; rechaza destinatarios con 'rechazo'."""
+
+    peticiones = []
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status, payload=None):
+        body = json.dumps(payload or {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def _status(mensaje):
+        destinos = [r["emailAddress"]["address"] for r in mensaje["message"]["toRecipients"]]
+        return 400 if any("rechazo" in d for d in destinos) else 202
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.peticiones.append((self.path, self.headers["Authorization"], payload))
+        if self.headers["Authorization"] == "Bearer caducado":
+            return self._responder(401, {"error": {"code": "InvalidAuthenticationToken"}})
+        if self.path.endswith("/$batch"):
+            return self._responder(200, {"responses": [
+                {"id": r["id"], "status": self._status(r["body"]), "body": {}} for r in payload["requests"]
+            ]})
+        return self._responder(self._status(payload))
+
+
+@pytest.fixture
+def graph(settings, monkeypatch):
+    from security import email_backend
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), GraphFalso)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    GraphFalso.peticiones = []
+    settings.MICROSOFT_CLIENT_ID = "cliente"
+    settings.MICROSOFT_CLIENT_SECRET = "secreto"
+    settings.MICROSOFT_TENANT_ID = "tenant"
+    settings.DEFAULT_FROM_EMAIL = "Zirqulo <noreply@zirqulo.test>"
+    settings.MICROSOFT_GRAPH_ENDPOINT = f"http://127.0.0.1:{servidor.server_port}/v1.0"
+
+    tokens = []
+
+    def solicitar():
+        tokens.append(1)
+        return {"access_token": tokens_emitidos.pop(0) if tokens_emitidos else "valido", "expires_in": 3600}
+
+    tokens_emitidos = []
+    cache = email_backend.CacheToken(solicitar)
+    monkeypatch.setattr(email_backend, "cache_token", lambda *a: cache)
+    yield GraphFalso.peticiones, tokens, tokens_emitidos
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _backend(**kwargs):
+    from security.email_backend import MicrosoftOAuth2EmailBackend
+
+    return MicrosoftOAuth2EmailBackend(**kwargs)
+
+
+def test_token_cacheado_y_lote(graph):
+    """Un token por proceso y un único $batch para varios mensajes"""
+    peticiones, tokens, _ = graph
+
+    for k in range(2):
+        assert _backend().send_messages([EmailMessage("Hola", "cuerpo", to=[f"a{k}@x.com"])]) == 1
+    assert len(tokens) == 1
+    assert [p for p, _, _ in peticiones] == ["/v1.0/users/noreply@zirqulo.test/sendMail"] * 2
+
+    mensajes = [EmailMessage("Lote", "cuerpo", to=[d]) for d in ("b@x.com", "rechazo@x.com", "c@x.com")]
+    assert _backend(fail_silently=True).send_messages(mensajes) == 2
+    assert len(peticiones) == 3 and peticiones[-1][0] == "/v1.0/$batch"
+    errores = _backend().send_batch(mensajes)
+    assert [e is None for e in errores] == [True, False, True]
+    assert len(tokens) == 1
+
+
+def test_token_renovado_con_401(graph):
+    peticiones, tokens, emitidos = graph
+    emitidos.append("caducado")
+
+    assert _backend().send_messages([EmailMessage("Hola", "cuerpo", to=["a@x.com"])]) == 1
+    assert [a for _, a, _ in peticiones] == ["Bearer caducado", "Bearer valido"]
+    assert len(tokens) == 2
+
+
+@pytest.mark.django_db
+def test_cola_encola_y_el_worker_envia(graph, settings, django_capture_on_commit_callbacks):
+    """send_mail solo inserta en la cola; el lote sale por Graph y los fallos se reintentan"""
+    from security.cola_correo import procesar_lote
+    from security.models import CorreoSaliente
+
+    peticiones, _, _ = graph
+    settings.EMAIL_BACKEND = "security.cola_correo.ColaCorreoBackend"
+    settings.CORREO_BACKEND_ENVIO = "security.email_backend.MicrosoftOAuth2EmailBackend"
+
+    with django_capture_on_commit_callbacks(execute=True):
+        send_mail("Código OTP", "123456", None, ["otp@x.com"], html_message="<b>123456</b>")
+        send_mail("Otro", "texto", None, ["rechazo@x.com"])
+        msg = EmailMessage("Contrato", "adjunto", to=["kyc@x.com"])
+        msg.attach("contrato.pdf", b"%PDF-1.4 binario", "application/pdf")
+        msg.send()
+    assert peticiones == []
+    assert CorreoSaliente.objects.filter(estado="pendiente").count() == 3
+
+    assert procesar_lote() == (2, 1)
+    assert len(peticiones) == 1
+    cuerpos = [r["body"]["message"] for r in peticiones[0][2]["requests"]]
+    assert cuerpos[0]["body"] == {"contentType": "HTML", "content": "<b>123456</b>"}
+    assert cuerpos[2]["attachments"][0]["name"] == "contrato.pdf"
+
+    fallido = CorreoSaliente.objects.get(destinatarios="rechazo@x.com")
+    assert (fallido.estado, fallido.intentos) == ("pendiente", 1)
+    assert procesar_lote() == (0, 0)  # aún no toca reintentar
+    assert set(CorreoSaliente.objects.filter(estado="enviado").values_list("destinatarios", flat=True)) == {"otp@x.com", "kyc@x.com"}
+
+
+@pytest.mark.django_db
+def test_cola_reserva_el_lote_antes_de_enviar(settings, monkeypatch):
+    """El lote se reserva antes de enviar: si el worker cae a mitad, vuelve a salir al vencer la reserva"""
+    from django.utils import timezone
+    from security import cola_correo
+    from security.models import CorreoSaliente
+
+    settings.EMAIL_BACKEND = "security.cola_correo.ColaCorreoBackend"
+    settings.CORREO_BACKEND_ENVIO = "django.core.mail.backends.locmem.EmailBackend"
+    send_mail("Código OTP", "123456", None, ["otp@x.com"])
+
+    def _caida(mensajes):
+        raise SystemExit("worker detenido")
+
+    monkeypatch.setattr(cola_correo, "_enviar", _caida)
+    with pytest.raises(SystemExit):
+        cola_correo.procesar_lote()
+    fila = CorreoSaliente.objects.get()
+    assert (fila.estado, fila.intentos) == ("pendiente", 0)
+    assert fila.proximo_intento > timezone.now()
+    monkeypatch.undo()
+    assert cola_correo.procesar_lote() == (0, 0)
+
+    CorreoSaliente.objects.update(proximo_intento=timezone.now())
+    assert cola_correo.procesar_lote() == (1, 0)
+    assert CorreoSaliente.objects.get().estado == "enviado"
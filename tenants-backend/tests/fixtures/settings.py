@@ -14,6 +14,38 @@ def _password_hashers(settings) -> None:
     ]
 
 
+@pytest.fixture(autouse=True)
+def _local_cache(settings) -> None:
+    """Uses an in-memory cache: tests don't have the shared Redis."""
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    }
+
+
+@pytest.fixture(autouse=True)
+def _outbox_sin_hilo(settings) -> None:
+    """Drains the notification outbox in the on_commit callback: a thread wouldn't see the test transaction."""
+    settings.NOTIFICACIONES_OUTBOX_EN_HILO = False
+
+
+@pytest.fixture(autouse=True)
+def _cola_correo_sin_hilo(settings) -> None:
+    """Queued mail is sent by calling procesar_lote explicitly, not from a background thread."""
+    settings.CORREO_COLA_EN_PROCESO = False
+
+
+@pytest.fixture(autouse=True)
+def _pdf_sin_pool(settings) -> None:
+    """Renders PDFs in the test process: a pool process wouldn't see the test transaction."""
+    settings.PDF_RENDER_WORKERS = 0
+
+
+@pytest.fixture(autouse=True)
+def _fanout_sin_hilos(settings) -> None:
+    """Runs the per-tenant fan-out in the test thread: pool threads wouldn't see the test transaction."""
+    settings.TENANT_FANOUT_WORKERS = 0
+
+
 @pytest.fixture(autouse=True)
 def _debug(settings) -> None:
     """Sets proper DEBUG and TEMPLATE debug mode for coverage."""